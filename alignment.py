@@ -0,0 +1,278 @@
+import os
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+ALIGNED_DATA_FILENAME = 'aligned.npz'
+ALIGNMENT_INFO_FILENAME = 'alignment.json'
+
+# Dimensione di una parola FIFO (tag + 6 byte dati)
+FIFO_WORD_SIZE = 7
+
+# Campioni della griglia comune più lontani di così da un campione reale
+# vengono marcati come NaN (buchi di trasmissione)
+DEFAULT_MAX_GAP_MS = 100.0
+
+# Reiezione outlier nella stima del clock (multipli della MAD)
+CLOCK_OUTLIER_MAD = 3.0
+
+AXES = ('x', 'y', 'z')
+
+
+# ============================================================================
+# CLOCK ESTIMATION
+# ============================================================================
+
+def estimate_clock(
+    packet_timestamps: np.ndarray,
+    packet_sizes: np.ndarray,
+    decoded_ts: np.ndarray
+) -> Dict[str, float]:
+    """
+    Stima offset e drift del clock di un sensore rispetto al logger.
+
+    Ogni header di demux porta il timestamp_ms del logger alla ricezione del
+    pacchetto. La fine di ogni pacchetto viene associata al campione
+    decodificato corrispondente (in proporzione ai byte di payload), e la
+    retta logger = offset + drift * decoded viene stimata ai minimi quadrati
+    con una passata di reiezione outlier.
+
+    Args:
+        packet_timestamps: timestamp_ms degli header del sensore
+        packet_sizes: data_size degli header del sensore [byte]
+        decoded_ts: Timestamp decodificati del sensore, ordinati
+
+    Returns:
+        Dict con offset_ms, drift, residual_ms, pairs
+    """
+    n_samples = len(decoded_ts)
+    if n_samples == 0 or len(packet_timestamps) == 0:
+        return {'offset_ms': 0.0, 'drift': 1.0, 'residual_ms': None, 'pairs': 0}
+
+    # Indice dell'ultimo campione contenuto in ciascun pacchetto
+    words = np.cumsum(packet_sizes // FIFO_WORD_SIZE).astype(np.float64)
+    end_idx = np.clip(np.round(n_samples * words / words[-1]).astype(np.int64) - 1, 0, n_samples - 1)
+    x = decoded_ts[end_idx].astype(np.float64)
+    y = packet_timestamps.astype(np.float64)
+
+    if len(x) < 2 or np.ptp(x) == 0:
+        # Un solo punto utile: solo offset, drift nominale
+        return {'offset_ms': float(y[-1] - x[-1]), 'drift': 1.0, 'residual_ms': None, 'pairs': len(x)}
+
+    drift, offset = np.polyfit(x, y, 1)
+    residuals = y - (offset + drift * x)
+    mad = np.median(np.abs(residuals - np.median(residuals)))
+
+    if mad > 0:
+        keep = np.abs(residuals) <= CLOCK_OUTLIER_MAD * 1.4826 * mad
+        if keep.sum() >= 2 and np.ptp(x[keep]) > 0:
+            drift, offset = np.polyfit(x[keep], y[keep], 1)
+            residuals = y[keep] - (offset + drift * x[keep])
+
+    return {
+        'offset_ms': float(offset),
+        'drift': float(drift),
+        'residual_ms': float(np.sqrt(np.mean(residuals ** 2))),
+        'pairs': int(len(x))
+    }
+
+
+# ============================================================================
+# RESAMPLING
+# ============================================================================
+
+def _collapse_duplicates(t: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Media dei campioni con timestamp identico (richiesto da interp)."""
+    t_unique, inverse, counts = np.unique(t, return_inverse=True, return_counts=True)
+    if len(t_unique) == len(t):
+        return t, values
+    sums = np.zeros((len(t_unique), values.shape[1]), dtype=np.float64)
+    np.add.at(sums, inverse, values)
+    return t_unique, (sums / counts[:, None]).astype(values.dtype)
+
+
+def interpolate_block(
+    t_src: np.ndarray,
+    values: np.ndarray,
+    t_grid: np.ndarray,
+    max_gap_ms: float = DEFAULT_MAX_GAP_MS
+) -> np.ndarray:
+    """
+    Interpolazione lineare di un blocco (n, channels) su una griglia.
+
+    Indici e pesi sono calcolati una volta sola e applicati a tutti i
+    canali insieme. I punti fuori copertura o dentro un buco più lungo
+    di max_gap_ms valgono NaN.
+
+    Args:
+        t_src: Timestamp sorgente strettamente crescenti
+        values: Campioni sorgente (n, channels)
+        t_grid: Griglia di destinazione
+        max_gap_ms: Distanza massima tra campioni adiacenti [ms]
+
+    Returns:
+        Array float32 (len(t_grid), channels)
+    """
+    out = np.full((len(t_grid), values.shape[1]), np.nan, dtype=np.float32)
+    if len(t_src) < 2:
+        return out
+
+    hi = np.searchsorted(t_src, t_grid, side='left')
+    valid = (hi > 0) & (hi < len(t_src))
+    exact = (hi < len(t_src)) & (t_src[np.minimum(hi, len(t_src) - 1)] == t_grid)
+
+    hi_v = np.where(valid, hi, 1)
+    t0 = t_src[hi_v - 1]
+    t1 = t_src[hi_v]
+    valid &= (t1 - t0) <= max_gap_ms
+
+    w = ((t_grid - t0) / (t1 - t0))[:, None]
+    blended = values[hi_v - 1] * (1.0 - w) + values[hi_v] * w
+    out[valid] = blended[valid]
+    out[exact] = values[hi[exact]]
+
+    return out
+
+
+class AlignedSession:
+    """
+    Tutti i sensori ricampionati su una griglia temporale comune.
+
+    Attributes:
+        time_ms: Griglia temporale uniforme sul clock del logger [ms]
+        data: Array float32 (n_samples, n_channels)
+        channels: Etichette canali, es. 's0_acc_z'
+        clocks: Parametri di clock stimati per sensore
+    """
+
+    def __init__(self, time_ms: np.ndarray, data: np.ndarray, channels: List[str], clocks: Dict[int, Dict]):
+        self.time_ms = time_ms
+        self.data = data
+        self.channels = list(channels)
+        self.clocks = clocks
+
+    @property
+    def fs(self) -> float:
+        if len(self.time_ms) < 2:
+            return 0.0
+        return float(1000.0 / (self.time_ms[1] - self.time_ms[0]))
+
+    def channel(self, name: str) -> np.ndarray:
+        """Vista (senza copia) di un singolo canale."""
+        return self.data[:, self.channels.index(name)]
+
+    def save(self, session_dir: str) -> None:
+        np.savez(
+            os.path.join(session_dir, ALIGNED_DATA_FILENAME),
+            time_ms=self.time_ms, data=self.data, channels=np.array(self.channels)
+        )
+        with open(os.path.join(session_dir, ALIGNMENT_INFO_FILENAME), 'w') as f:
+            json.dump({
+                'fs': self.fs,
+                'samples': len(self.time_ms),
+                'channels': self.channels,
+                'clocks': {str(k): v for k, v in self.clocks.items()}
+            }, f, indent=2)
+        logging.info(f"  🕒 Aligned {len(self.channels)} channels x {len(self.time_ms)} samples")
+
+    @classmethod
+    def load(cls, session_dir: str) -> Optional['AlignedSession']:
+        data_path = os.path.join(session_dir, ALIGNED_DATA_FILENAME)
+        info_path = os.path.join(session_dir, ALIGNMENT_INFO_FILENAME)
+        if not os.path.exists(data_path) or not os.path.exists(info_path):
+            return None
+        with np.load(data_path) as npz, open(info_path, 'r') as f:
+            info = json.load(f)
+            return cls(
+                npz['time_ms'], npz['data'], [str(c) for c in npz['channels']],
+                {int(k): v for k, v in info['clocks'].items()}
+            )
+
+
+def align_sensors(
+    streams: Dict[int, Dict[str, Tuple[np.ndarray, np.ndarray]]],
+    packets: np.ndarray,
+    fs: float,
+    max_gap_ms: float = DEFAULT_MAX_GAP_MS,
+    chunk_samples: Optional[int] = None
+) -> AlignedSession:
+    """
+    Stima i clock e ricampiona tutti i sensori sulla stessa griglia.
+
+    Con `chunk_samples` l'esecuzione è a basso consumo di memoria: un solo
+    flusso alla volta viene portato sul clock del logger e interpolato a
+    blocchi di `chunk_samples` punti della griglia direttamente nell'array
+    finale. Il risultato è identico.
+
+    Args:
+        streams: conn_handle -> {gruppo ('acc', 'gyro') -> (decoded_ts, valori (n, 3))}
+        packets: Tabella header di demux (conn_handle, timestamp_ms, data_size)
+        fs: Frequenza della griglia comune [Hz]
+        max_gap_ms: Buco massimo interpolabile [ms]
+        chunk_samples: Punti della griglia per blocco (None = tutto in memoria)
+
+    Returns:
+        AlignedSession con la griglia nell'intervallo coperto da tutti i sensori
+    """
+    clocks = {}
+    sources = {}
+
+    for sensor, groups in streams.items():
+        decoded_ts = np.sort(np.concatenate([t for t, _ in groups.values()]))
+        sel = packets['conn_handle'] == sensor
+        clocks[sensor] = estimate_clock(packets['timestamp_ms'][sel], packets['data_size'][sel], decoded_ts)
+        for group, (t, values) in groups.items():
+            if len(t) >= 2:
+                sources[(sensor, group)] = (t, values)
+
+    def to_logger(key):
+        t, values = sources[key]
+        clock = clocks[key[0]]
+        t_logger = clock['offset_ms'] + clock['drift'] * t.astype(np.float64)
+        order = np.argsort(t_logger, kind='stable')
+        return _collapse_duplicates(t_logger[order], values[order])
+
+    if not sources:
+        return AlignedSession(np.empty(0), np.empty((0, 0), dtype=np.float32), [], clocks)
+
+    if chunk_samples is None:
+        mapped = {key: to_logger(key) for key in sources}
+        spans = {key: (t[0], t[-1]) for key, (t, _) in mapped.items()}
+    else:
+        # Estremi senza mappare: la trasformazione del clock è lineare
+        mapped = None
+        spans = {}
+        for key, (t, _) in sources.items():
+            clock = clocks[key[0]]
+            ends = clock['offset_ms'] + clock['drift'] * np.array([t.min(), t.max()], dtype=np.float64)
+            spans[key] = (ends.min(), ends.max())
+
+    # Intervallo comune a tutti i flussi
+    start = max(lo for lo, _ in spans.values())
+    end = min(hi for _, hi in spans.values())
+    step_ms = 1000.0 / fs
+    t_grid = np.arange(start, end, step_ms) if end > start else np.empty(0)
+
+    keys = sorted(sources)
+    channels = [f"s{sensor}_{group}_{axis}" for sensor, group in keys for axis in AXES]
+
+    if mapped is not None:
+        blocks = [interpolate_block(*mapped[key], t_grid, max_gap_ms) for key in keys]
+        data = np.hstack(blocks) if len(t_grid) else np.empty((0, len(channels)), dtype=np.float32)
+        return AlignedSession(t_grid, data, channels, clocks)
+
+    data = np.empty((len(t_grid), len(channels)), dtype=np.float32)
+    for i, key in enumerate(keys):
+        t, values = to_logger(key)
+        for lo in range(0, len(t_grid), chunk_samples):
+            hi = min(lo + chunk_samples, len(t_grid))
+            data[lo:hi, 3 * i:3 * i + 3] = interpolate_block(t, values, t_grid[lo:hi], max_gap_ms)
+        del t, values
+    return AlignedSession(t_grid, data, channels, clocks)
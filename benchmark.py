@@ -0,0 +1,259 @@
+import os
+import sys
+import json
+import time
+import shutil
+import struct
+import logging
+import platform
+import argparse
+import tempfile
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import train
+from memory import PeakRSSMonitor
+from columns import ColumnStore, save_session_columns
+from synthetic import generate_ride
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+REFERENCE_FILE = 'R001.BIN'
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+
+# Uscite sintetiche: nome -> durata [s]
+SYNTHETIC_RIDES = {
+    'ride_1min': 60,
+    'ride_10min': 10 * 60,
+    'ride_1h': 60 * 60,
+    'ride_4h': 4 * 60 * 60,
+}
+
+SYNTHETIC_SENSORS = 2
+WORDS_PER_PACKET = 10
+
+# Scostamento oltre il quale un tempo è considerato una regressione
+DEFAULT_TOLERANCE = 0.20
+
+FIFO_WORD_SIZE = 7
+
+
+# ============================================================================
+# INPUTS
+# ============================================================================
+
+def read_payloads(path: str) -> List[bytes]:
+    """Payload dei pacchetti `<HIH` di un file, nell'ordine di registrazione."""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    payloads = []
+    offset = 0
+    while offset + train.DEMUX_HEADER_SIZE <= len(raw):
+        _, _, size = struct.unpack_from(train.DEMUX_HEADER_FORMAT, raw, offset)
+        payloads.append(raw[offset + train.DEMUX_HEADER_SIZE:offset + train.DEMUX_HEADER_SIZE + size])
+        offset += train.DEMUX_HEADER_SIZE + size
+    return payloads
+
+
+def synthesize_ride(path: str, duration_s: float, sensors: int = SYNTHETIC_SENSORS,
+                    fs: float = train.DEFAULT_SAMPLE_RATE_HZ) -> str:
+    """Uscita sintetica multi-sensore (vedi synthetic.generate_ride), riproducibile."""
+    generate_ride(path, sensors=sensors, duration_s=duration_s, fs=fs, packet_words=WORDS_PER_PACKET, seed=0)
+    return path
+
+
+def count_samples(path: str) -> int:
+    """Parole FIFO nel file (campioni acc + gyro di tutti i sensori)."""
+    return sum(len(payload) for payload in read_payloads(path)) // FIFO_WORD_SIZE
+
+
+# ============================================================================
+# MEASUREMENT
+# ============================================================================
+
+def measure(fn: Callable, repeat: int) -> Dict:
+    """Latenza (mediana e minimo su `repeat` esecuzioni) e picco RSS."""
+    latencies = []
+    peak_delta = 0.0
+    result = None
+    for _ in range(repeat):
+        with PeakRSSMonitor() as mem:
+            started = time.perf_counter()
+            result = fn()
+            latencies.append(time.perf_counter() - started)
+        peak_delta = max(peak_delta, mem.delta_mb)
+    return {
+        'latency_s': float(np.median(latencies)),
+        'latency_min_s': float(min(latencies)),
+        'peak_rss_delta_mb': round(peak_delta, 2),
+        'result': result,
+    }
+
+
+def bench_input(path: str, repeat: int) -> Dict[str, Dict]:
+    """
+    Esegue tutti gli stadi della pipeline su un file e ne misura i tempi.
+
+    Ogni stadio riparte dall'output dello stadio precedente, così le
+    misure non includono il lavoro degli altri stadi.
+    """
+    session_dir = os.path.dirname(path)
+    stages = {}
+
+    def record(name: str, fn: Callable, samples: int):
+        stats = measure(fn, repeat)
+        result = stats.pop('result')
+        stats['samples'] = samples
+        stats['throughput_sps'] = round(samples / stats['latency_s'], 1) if stats['latency_s'] > 0 else None
+        stages[name] = stats
+        print(f"  {name:<16} {stats['latency_s'] * 1000:10.1f} ms  "
+              f"{(stats['throughput_sps'] or 0) / 1e6:8.2f} Msamples/s  {stats['peak_rss_delta_mb']:8.1f} MB")
+        return result
+
+    samples = count_samples(path)
+    sensor_bins = record('demux', lambda: train.demux_binary_file(path), samples)
+
+    if not os.path.exists(train.DECODER_EXECUTABLE):
+        print(f"  decoder {train.DECODER_EXECUTABLE} not found: skipping decode and later stages")
+        return stages
+
+    def decode():
+        csv_paths = []
+        for conn_handle, bin_path in sorted(sensor_bins.items()):
+            csv_path = f"{os.path.splitext(bin_path)[0]}.csv"
+            if train.decode_sensor_binary(bin_path, csv_path):
+                csv_paths.append(csv_path)
+        return csv_paths
+
+    csv_paths = record('decode', decode, samples)
+    session = record('load_csv', lambda: train.load_session_data(csv_paths), samples)
+
+    acc_samples = sum(len(session.group(int(s), 'acc')[0]) for s in session.sensors)
+    record('low_pass_filter', lambda: [
+        train.low_pass_filter(session.channel(int(s), 'acc', 'z')[1], train.DEFAULT_CUTOFF_HZ,
+                              train.DEFAULT_SAMPLE_RATE_HZ)
+        for s in session.sensors
+    ], acc_samples)
+
+    record('spectral', lambda: train.build_feature_table(session_dir, session), samples)
+    record('save_columns', lambda: save_session_columns(session_dir, session), samples)
+    # Lettura delle colonne dei campioni dalle mappe .npy (copiate: le fette da sole non leggono nulla)
+    record('load_columnar', lambda: [np.array(column) for _, column in ColumnStore.open(session_dir).select()],
+           samples)
+    record('analyze_and_plot', lambda: train.analyze_and_plot(session), samples)
+
+    return stages
+
+
+# ============================================================================
+# BASELINE
+# ============================================================================
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Confronta le latenze con la baseline.
+
+    Returns:
+        Elenco delle regressioni oltre la tolleranza
+    """
+    regressions = []
+    print(f"\n{'input':<12} {'stage':<16} {'baseline':>10} {'current':>10} {'delta':>8}")
+    for name, stages in results['inputs'].items():
+        for stage, stats in stages.items():
+            ref = baseline.get('inputs', {}).get(name, {}).get(stage)
+            if ref is None:
+                continue
+            delta = stats['latency_s'] / ref['latency_s'] - 1.0 if ref['latency_s'] > 0 else 0.0
+            flag = ''
+            if delta > tolerance:
+                flag = '  ⚠️ REGRESSION'
+                regressions.append(f"{name}/{stage}: {delta:+.0%}")
+            print(f"{name:<12} {stage:<16} {ref['latency_s'] * 1000:9.1f}ms {stats['latency_s'] * 1000:9.1f}ms "
+                  f"{delta:+7.0%}{flag}")
+    return regressions
+
+
+def environment() -> Dict:
+    import scipy
+    import pandas as pd
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'pandas': pd.__version__,
+        'pipeline_version': train.PIPELINE_VERSION,
+    }
+
+
+def run_benchmarks(rides: List[str], repeat: int, workdir: Optional[str] = None) -> Dict:
+    """
+    Misura tutti gli input richiesti. Gli input vivono in una cartella
+    bcp_bench_* creata qui (dentro `workdir` se indicata) e rimossa alla
+    fine: `workdir` stessa non viene mai cancellata.
+    """
+    if workdir:
+        os.makedirs(workdir, exist_ok=True)
+    workdir = tempfile.mkdtemp(prefix='bcp_bench_', dir=workdir or None)
+    results = {'created_at': time.time(), 'environment': environment(), 'repeat': repeat, 'inputs': {}}
+
+    try:
+        for name in rides:
+            input_dir = os.path.join(workdir, name)
+            os.makedirs(input_dir, exist_ok=True)
+            path = os.path.join(input_dir, f"{name}.bin")
+
+            if name == 'R001':
+                shutil.copyfile(REFERENCE_FILE, path)
+            else:
+                synthesize_ride(path, SYNTHETIC_RIDES[name])
+
+            print(f"\n▶ {name} ({os.path.getsize(path) / 1e6:.1f} MB)")
+            results['inputs'][name] = bench_input(path, repeat)
+            shutil.rmtree(input_dir, ignore_errors=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark della pipeline di analisi')
+    parser.add_argument('--rides', nargs='+', default=['R001'] + list(SYNTHETIC_RIDES),
+                        choices=['R001'] + list(SYNTHETIC_RIDES), help='Input da misurare')
+    parser.add_argument('--repeat', type=int, default=3, help='Ripetizioni per stadio (si usa la mediana)')
+    parser.add_argument('--output', type=str, default=None, help='Salva i risultati in JSON')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE, help='Baseline JSON da confrontare')
+    parser.add_argument('--save-baseline', action='store_true', help='Sovrascrive la baseline con questi risultati')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='Regressione tollerata (0.2 = +20%%)')
+    parser.add_argument('--workdir', type=str, default=None, help='Cartella in cui creare la sottocartella temporanea degli input')
+
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if 'R001' in args.rides and not os.path.exists(REFERENCE_FILE):
+        print(f"ERRORE: File {REFERENCE_FILE} non trovato!")
+        sys.exit(1)
+
+    results = run_benchmarks(args.rides, max(args.repeat, 1), args.workdir)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressions: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n✅ No regressions")
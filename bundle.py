@@ -0,0 +1,334 @@
+import os
+import sys
+import json
+import mmap
+import zlib
+import time
+import struct
+import argparse
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+BUNDLE_MAGIC = b'BCPSESS\x00'
+BUNDLE_VERSION = 1
+BUNDLE_EXTENSION = '.bcpb'
+
+# Header a offset 0: magic, versione, lunghezza del TOC, inizio dei dati
+HEADER_STRUCT = struct.Struct('<8sHHIQ')
+
+# Il TOC (JSON) sta sempre a questo offset, in un'area a dimensione fissa:
+# basta una lettura per sapere dove sta ogni sezione
+TOC_OFFSET = 64
+TOC_CAPACITY = 64 * 1024
+DATA_OFFSET = TOC_OFFSET + TOC_CAPACITY
+
+# Sezioni allineate per viste numpy dirette sulla mappa del file
+SECTION_ALIGNMENT = 64
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+SECTION_KINDS = ('bytes', 'array', 'json')
+
+
+class BundleError(ValueError):
+    """File bundle non valido o incompleto."""
+
+
+# ============================================================================
+# WRITER
+# ============================================================================
+
+class BundleWriter:
+    """
+    Scrive un bundle di sessione: sezioni binarie, array numpy e JSON.
+
+    Il file viene scritto in un .tmp e rinominato alla chiusura: un
+    bundle con questo nome è sempre completo.
+
+    Usage:
+        with BundleWriter('ride.bcpb', meta={'session_id': 'ride'}) as writer:
+            writer.add_array('packets', packets)
+            writer.add_json('summary', summary)
+    """
+
+    def __init__(self, path: str, meta: Optional[Dict] = None):
+        self.path = path
+        self.meta = dict(meta or {})
+        self.sections: Dict[str, Dict] = {}
+        self._tmp_path = f"{path}.tmp"
+        self._file = open(self._tmp_path, 'wb')
+        self._file.seek(DATA_OFFSET)
+
+    def __enter__(self) -> 'BundleWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._tmp_path)
+
+    def _begin(self, name: str) -> int:
+        if name in self.sections:
+            raise ValueError(f"Duplicate bundle section: {name}")
+        pad = -self._file.tell() % SECTION_ALIGNMENT
+        if pad:
+            self._file.write(b'\0' * pad)
+        return self._file.tell()
+
+    def add_stream(self, name: str, stream: BinaryIO) -> None:
+        """Copia a blocchi un file aperto (es. la telemetria, anche .gz)."""
+        offset = self._begin(name)
+        crc = 0
+        for chunk in iter(lambda: stream.read(COPY_BUFFER_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+            self._file.write(chunk)
+        self.sections[name] = {'kind': 'bytes', 'offset': offset,
+                               'length': self._file.tell() - offset, 'crc32': crc}
+
+    def add_array(self, name: str, array: np.ndarray) -> None:
+        array = np.ascontiguousarray(array)
+        offset = self._begin(name)
+        raw = array.reshape(-1).view(np.uint8)
+        self._file.write(raw)
+        self.sections[name] = {'kind': 'array', 'offset': offset, 'length': raw.nbytes,
+                               'crc32': zlib.crc32(raw), 'shape': list(array.shape),
+                               'dtype': np.lib.format.dtype_to_descr(array.dtype)}
+
+    def add_json(self, name: str, obj) -> None:
+        data = json.dumps(obj).encode()
+        offset = self._begin(name)
+        self._file.write(data)
+        self.sections[name] = {'kind': 'json', 'offset': offset, 'length': len(data),
+                               'crc32': zlib.crc32(data)}
+
+    def close(self) -> str:
+        toc = json.dumps({'meta': self.meta, 'sections': self.sections}).encode()
+        if len(toc) > TOC_CAPACITY:
+            self._file.close()
+            os.remove(self._tmp_path)
+            raise BundleError(f"Table of contents too large: {len(toc)} > {TOC_CAPACITY} bytes")
+        self._file.seek(0)
+        self._file.write(HEADER_STRUCT.pack(BUNDLE_MAGIC, BUNDLE_VERSION, 0, len(toc), DATA_OFFSET))
+        self._file.seek(TOC_OFFSET)
+        self._file.write(toc)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+        return self.path
+
+
+# ============================================================================
+# READER
+# ============================================================================
+
+def check_section(name: str, entry, file_size: int) -> None:
+    """
+    Controlla una voce del TOC: tipo, offset e lunghezza dentro il file,
+    forma e dtype coerenti con la lunghezza per gli array.
+
+    Raises:
+        BundleError: Se la voce non è valida
+    """
+    if not isinstance(entry, dict) or entry.get('kind') not in SECTION_KINDS:
+        raise BundleError(f"Invalid section entry: {name}")
+    fields = [entry.get(key) for key in ('offset', 'length', 'crc32')]
+    if not all(isinstance(v, int) and not isinstance(v, bool) and v >= 0 for v in fields):
+        raise BundleError(f"Invalid offset, length or crc32 for section {name}")
+    offset, length, _ = fields
+    if offset < DATA_OFFSET or offset + length > file_size:
+        raise BundleError(f"Section {name} out of bounds ({offset}+{length} bytes, file is {file_size} bytes)")
+    if entry['kind'] == 'array':
+        try:
+            dtype = np.dtype(np.lib.format.descr_to_dtype(entry['dtype']))
+            shape = [int(n) for n in entry['shape']]
+        except (KeyError, TypeError, ValueError) as e:
+            raise BundleError(f"Invalid dtype or shape for section {name}: {e}") from e
+        if any(n < 0 for n in shape) or int(np.prod(shape, dtype=np.int64)) * dtype.itemsize != length:
+            raise BundleError(f"Shape {shape} of section {name} does not match its {length} bytes")
+
+
+class SessionBundle:
+    """
+    Lettura di un bundle: header e TOC con una sola lettura, poi ogni
+    sezione è una vista sulla mappa del file (nessuna copia, nessuna
+    lettura delle altre sezioni).
+
+    Usage:
+        with SessionBundle('ride.bcpb') as bundle:
+            counts = bundle.array('sensor/2/counts')
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._map: Optional[mmap.mmap] = None
+        self._file = open(path, 'rb')
+        try:
+            self.meta, self.sections = self._read_toc()
+        except BaseException:
+            self._file.close()
+            raise
+
+    def _read_toc(self) -> Tuple[Dict, Dict[str, Dict]]:
+        """
+        Header e TOC validati: ogni sezione sta dentro il file.
+
+        Raises:
+            BundleError: Se header o TOC sono corrotti o troncati
+        """
+        head = self._file.read(TOC_OFFSET)
+        if len(head) < HEADER_STRUCT.size:
+            raise BundleError(f"Not a session bundle: {self.path}")
+        magic, version, _, toc_length, _ = HEADER_STRUCT.unpack_from(head)
+        if magic != BUNDLE_MAGIC:
+            raise BundleError(f"Not a session bundle: {self.path}")
+        if version != BUNDLE_VERSION:
+            raise BundleError(f"Unsupported bundle version {version}")
+        if toc_length > TOC_CAPACITY:
+            raise BundleError(f"Table of contents too large: {toc_length} > {TOC_CAPACITY} bytes")
+
+        raw = self._file.read(toc_length)
+        try:
+            toc = json.loads(raw)
+        except ValueError as e:
+            raise BundleError(f"Corrupted table of contents: {e}") from e
+        if not (isinstance(toc, dict) and isinstance(toc.get('meta'), dict) and isinstance(toc.get('sections'), dict)):
+            raise BundleError("Corrupted table of contents: missing meta or sections")
+
+        file_size = os.fstat(self._file.fileno()).st_size
+        for name, entry in toc['sections'].items():
+            check_section(name, entry, file_size)
+        return toc['meta'], toc['sections']
+
+    def __enter__(self) -> 'SessionBundle':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # Viste ancora vive: la mappa si chiude con l'ultima
+                pass
+            self._map = None
+        self._file.close()
+
+    def _mapped(self) -> mmap.mmap:
+        if self._map is None:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _section(self, name: str, kind: str) -> Dict:
+        entry = self.sections.get(name)
+        if entry is None:
+            raise KeyError(f"Section not in bundle: {name}")
+        if entry['kind'] != kind:
+            raise BundleError(f"Section {name} is {entry['kind']}, not {kind}")
+        return entry
+
+    def names(self, prefix: str = '') -> List[str]:
+        return sorted(name for name in self.sections if name.startswith(prefix))
+
+    def bytes(self, name: str) -> memoryview:
+        entry = self._section(name, 'bytes')
+        return memoryview(self._mapped())[entry['offset']:entry['offset'] + entry['length']]
+
+    def array(self, name: str) -> np.ndarray:
+        """Array in sola lettura, vista diretta sulla mappa del file."""
+        entry = self._section(name, 'array')
+        dtype = np.dtype(np.lib.format.descr_to_dtype(entry['dtype']))
+        count = entry['length'] // dtype.itemsize if dtype.itemsize else 0
+        return np.frombuffer(self._mapped(), dtype=dtype, count=count,
+                             offset=entry['offset']).reshape(entry['shape'])
+
+    def json(self, name: str):
+        entry = self._section(name, 'json')
+        self._file.seek(entry['offset'])
+        return json.loads(self._file.read(entry['length']))
+
+    def copy_to(self, name: str, dest_path: str) -> str:
+        """Estrae una sezione binaria in un file (scrittura atomica)."""
+        view = self.bytes(name)
+        tmp_path = f"{dest_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            for start in range(0, len(view), COPY_BUFFER_SIZE):
+                f.write(view[start:start + COPY_BUFFER_SIZE])
+        os.replace(tmp_path, dest_path)
+        return dest_path
+
+    def verify(self) -> List[str]:
+        """Sezioni con CRC32 diverso da quello del TOC (lista vuota: bundle integro)."""
+        data = memoryview(self._mapped())
+        return [
+            name for name, entry in self.sections.items()
+            if zlib.crc32(data[entry['offset']:entry['offset'] + entry['length']]) != entry['crc32']
+        ]
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Bundle di sessione in un singolo file (esportazione/importazione)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    info = sub.add_parser('info', help='Mostra metadati e sezioni di un bundle')
+    info.add_argument('bundle', help='File .bcpb')
+    info.add_argument('--verify', action='store_true', help='Controlla i CRC di tutte le sezioni')
+
+    export = sub.add_parser('export', help='Esporta una sessione di uploads/ in un bundle')
+    export.add_argument('session_id', help='ID della sessione (nome cartella)')
+    export.add_argument('-o', '--output', help=f'File di destinazione (default: <session_id>{BUNDLE_EXTENSION})')
+
+    imp = sub.add_parser('import', help='Importa un bundle come nuova sessione in uploads/')
+    imp.add_argument('bundle', help='File .bcpb')
+    imp.add_argument('--session-id', help='ID della sessione (default: quello salvato nel bundle)')
+
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        with SessionBundle(args.bundle) as bundle:
+            print(json.dumps(bundle.meta, indent=2))
+            for name in bundle.names():
+                entry = bundle.sections[name]
+                shape = f" {entry['dtype']} {tuple(entry['shape'])}" if entry['kind'] == 'array' else ''
+                print(f"  {name:<32} {entry['kind']:<6} {entry['length']:>12,} B{shape}")
+            if args.verify:
+                bad = bundle.verify()
+                print(f"❌ Corrupted sections: {bad}" if bad else "✅ All sections verified")
+                return 1 if bad else 0
+        return 0
+
+    # Import tardivo: train importa questo modulo
+    import train
+
+    if args.command == 'export':
+        session_dir = train.get_session_dir(args.session_id)
+        if session_dir is None:
+            print(f"❌ Session not found: {args.session_id}")
+            return 1
+        started = time.perf_counter()
+        path = train.export_session_bundle(session_dir, args.output or f"{args.session_id}{BUNDLE_EXTENSION}")
+        print(f"✅ {path} ({os.path.getsize(path) / 2**20:.1f} MB, {time.perf_counter() - started:.2f}s)")
+        return 0
+
+    started = time.perf_counter()
+    session_dir = train.import_session_bundle(args.bundle, args.session_id)
+    print(f"✅ Imported into {session_dir} ({time.perf_counter() - started:.2f}s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
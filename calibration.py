@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+DEFAULT_DEVICE_ID = 'default'
+SENSOR_GROUPS = ('acc', 'gyro')
+
+# Rimappatura assi per nome, es. ["z", "-x", "y"]
+AXIS_INDEX = {'x': 0, 'y': 1, 'z': 2}
+
+# Tolleranza su R·Rᵀ = I e det(R) = +1 (matrici stimate e arrotondate dal client)
+ROTATION_TOLERANCE = 1e-3
+
+
+# ============================================================================
+# PROFILE VALIDATION
+# ============================================================================
+
+def _axes_to_rotation(axes: List[str]) -> np.ndarray:
+    """Converte una rimappatura tipo ["z", "-x", "y"] in matrice 3x3."""
+    if len(axes) != 3:
+        raise ValueError("axes must list exactly 3 entries")
+    rotation = np.zeros((3, 3))
+    for row, name in enumerate(axes):
+        name = str(name).strip().lower()
+        sign = -1.0 if name.startswith('-') else 1.0
+        axis = name.lstrip('+-')
+        if axis not in AXIS_INDEX:
+            raise ValueError(f"Invalid axis name: {name}")
+        rotation[row, AXIS_INDEX[axis]] = sign
+    if not np.isclose(abs(np.linalg.det(rotation)), 1.0):
+        raise ValueError(f"axes must be a permutation of x, y, z: {axes}")
+    return rotation
+
+
+def normalize_group_profile(profile: Dict) -> Dict:
+    """
+    Valida il profilo di un gruppo (acc o gyro) e lo porta in forma canonica.
+
+    Args:
+        profile: Dict con offset [3], scale [3] e rotation 3x3 oppure axes [3]
+
+    Returns:
+        Dict con offset, scale, rotation come liste
+
+    Raises:
+        ValueError: Se un campo ha forma o valori non validi
+    """
+    if not isinstance(profile, dict):
+        raise ValueError("Group profile must be an object")
+    try:
+        offset = np.asarray(profile.get('offset', [0.0, 0.0, 0.0]), dtype=np.float64)
+        scale = np.asarray(profile.get('scale', [1.0, 1.0, 1.0]), dtype=np.float64)
+
+        if 'axes' in profile:
+            rotation = _axes_to_rotation(profile['axes'])
+        else:
+            rotation = np.asarray(profile.get('rotation', np.eye(3)), dtype=np.float64)
+    except TypeError:
+        raise ValueError("offset, scale and rotation must be numeric arrays")
+
+    if offset.shape != (3,) or scale.shape != (3,):
+        raise ValueError("offset and scale must have 3 elements")
+    if rotation.shape != (3, 3):
+        raise ValueError("rotation must be a 3x3 matrix")
+    if not (np.all(np.isfinite(offset)) and np.all(np.isfinite(scale)) and np.all(np.isfinite(rotation))):
+        raise ValueError("Calibration values must be finite")
+    # Solo rotazioni proprie: una riflessione inverte la terna degli assi
+    if not np.allclose(rotation @ rotation.T, np.eye(3), atol=ROTATION_TOLERANCE):
+        raise ValueError("rotation must be orthonormal")
+    if abs(np.linalg.det(rotation) - 1.0) > ROTATION_TOLERANCE:
+        raise ValueError("rotation must have determinant +1 (no reflections)")
+
+    return {'offset': offset.tolist(), 'scale': scale.tolist(), 'rotation': rotation.tolist()}
+
+
+def fuse_affine(profile: Optional[Dict], sensitivity: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compone sensibilità, scala, offset e rotazione in un'unica trasformazione.
+
+        y = R @ (diag(scale) @ (sensitivity * counts) - offset)
+          = M @ counts + b
+
+    Args:
+        profile: Profilo normalizzato del gruppo (None = solo sensibilità)
+        sensitivity: Conversione LSB -> unità fisiche
+
+    Returns:
+        (M, b) in float32, M di forma (3, 3) e b di forma (3,)
+    """
+    if profile is None:
+        return np.eye(3, dtype=np.float32) * np.float32(sensitivity), np.zeros(3, dtype=np.float32)
+
+    rotation = np.asarray(profile['rotation'], dtype=np.float64)
+    scale = np.asarray(profile['scale'], dtype=np.float64)
+    offset = np.asarray(profile['offset'], dtype=np.float64)
+
+    matrix = rotation @ np.diag(scale * sensitivity)
+    bias = -rotation @ offset
+    return matrix.astype(np.float32), bias.astype(np.float32)
+
+
+def apply_affine(counts: np.ndarray, transform: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    """
+    Applica (M, b) a un blocco di campioni int16 (n, 3) in un solo passaggio.
+
+    Returns:
+        Array float32 (n, 3) in unità fisiche
+    """
+    matrix, bias = transform
+    out = np.matmul(counts.astype(np.float32, copy=False), matrix.T)
+    out += bias
+    return out
+
+
+# ============================================================================
+# STORE
+# ============================================================================
+
+class CalibrationStore:
+    """
+    Archivio profili di calibrazione, un file JSON per dispositivo.
+
+    Struttura di un profilo:
+        {"device_id": "...", "updated_at": ..., "sensors": {
+            "<conn_handle>": {"acc": {...}, "gyro": {...}}}}
+
+    Gli offset sono in unità fisiche (g per acc, deg/s per gyro) e vengono
+    sottratti dopo la scala; la rotazione è applicata per ultima.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, device_id: str) -> str:
+        return os.path.join(self.root, f"{device_id}.json")
+
+    def list_devices(self) -> List[str]:
+        return sorted(os.path.splitext(f)[0] for f in os.listdir(self.root) if f.endswith('.json'))
+
+    def get(self, device_id: str) -> Optional[Dict]:
+        path = self._path(device_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def put(self, device_id: str, payload: Dict) -> Dict:
+        """
+        Valida e salva il profilo di un dispositivo (sostituisce il precedente).
+
+        Raises:
+            ValueError: Se il profilo non è valido
+        """
+        sensors = payload.get('sensors')
+        if not isinstance(sensors, dict) or not sensors:
+            raise ValueError("Calibration profile requires a non-empty 'sensors' object")
+
+        normalized = {}
+        for conn_handle, groups in sensors.items():
+            try:
+                conn_handle = str(int(conn_handle))
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid conn_handle: {conn_handle}")
+            if not isinstance(groups, dict):
+                raise ValueError(f"Sensor {conn_handle}: expected object with 'acc'/'gyro'")
+            normalized[conn_handle] = {
+                group: normalize_group_profile(groups[group])
+                for group in SENSOR_GROUPS if group in groups
+            }
+
+        profile = {'device_id': device_id, 'updated_at': time.time(), 'sensors': normalized}
+
+        # Scrittura atomica
+        path = self._path(device_id)
+        tmp_path = f"{path}.tmp"
+        with self._lock:
+            with open(tmp_path, 'w') as f:
+                json.dump(profile, f, indent=2)
+            os.replace(tmp_path, path)
+
+        logging.info(f"🎯 Calibration profile saved: {device_id} ({len(normalized)} sensors)")
+        return profile
+
+    def group_profile(self, device_id: Optional[str], conn_handle: int, group: str) -> Optional[Dict]:
+        """Profilo del gruppo per dispositivo/sensore, con fallback su 'default'."""
+        for candidate in (device_id, DEFAULT_DEVICE_ID):
+            if not candidate:
+                continue
+            profile = self.get(candidate)
+            if profile is None:
+                continue
+            group_profile = profile['sensors'].get(str(conn_handle), {}).get(group)
+            if group_profile is not None:
+                return group_profile
+        return None
+
+    def fingerprint(self, device_id: Optional[str]) -> str:
+        """
+        Impronta dei profili che group_profile() può usare per il dispositivo
+        (il suo e 'default'): cambia solo se cambiano i parametri, non con
+        il semplice salvataggio.
+        """
+        profiles = {}
+        for candidate in (device_id, DEFAULT_DEVICE_ID):
+            if candidate and candidate not in profiles:
+                profile = self.get(candidate)
+                profiles[candidate] = profile['sensors'] if profile is not None else None
+        return hashlib.sha256(json.dumps(profiles, sort_keys=True).encode()).hexdigest()
+
+    def transform(
+        self,
+        device_id: Optional[str],
+        conn_handle: int,
+        group: str,
+        sensitivity: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Trasformazione affine fusa (M, b) per un gruppo di un sensore."""
+        return fuse_affine(self.group_profile(device_id, conn_handle, group), sensitivity)
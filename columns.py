@@ -0,0 +1,223 @@
+import io
+import os
+import json
+import zipfile
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from session import SessionData, GROUPS, AXES
+from fifo import DSV16X_TICK_MS
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Colonne decodificate della sessione, un .npy per colonna (mappabile)
+COLUMNS_DIRNAME = 'columns'
+COLUMNS_MANIFEST = 'columns.json'
+COLUMNS_VERSION = 2
+COLUMN_FILENAME = 's{sensor}_{group}_{column}.npy'
+# Tempo in millisecondi (float64) sul clock del sensore: i tick dei CSV
+# decodificati vengono convertiti una volta al salvataggio
+TIME_COLUMN = 'time_ms'
+
+# Blocchi dello stream di esportazione
+EXPORT_CHUNK_BYTES = 1024 * 1024
+
+
+# ============================================================================
+# COLUMN STORE
+# ============================================================================
+
+def _save_npy(path: str, array: np.ndarray) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def save_session_columns(session_dir: str, session: SessionData, calibration: str = '') -> Dict:
+    """
+    Salva i campioni della sessione come colonne separate: tempo [ms]
+    (float64) e un asse (float32) per file, per sensore e gruppo. Ogni colonna è
+    contigua, quindi qualunque selezione è una fetta della mappa del file.
+
+    Il manifest viene scritto per ultimo: se c'è, le colonne sono complete.
+    `calibration` è l'impronta dei profili applicati ai valori
+    (CalibrationStore.fingerprint).
+
+    Returns:
+        Manifest {'version', 'calibration', 'sensors': {sensor: {group: {'samples', 't_start_ms', 't_end_ms'}}}}
+    """
+    columns_dir = os.path.join(session_dir, COLUMNS_DIRNAME)
+    os.makedirs(columns_dir, exist_ok=True)
+    manifest = {'version': COLUMNS_VERSION, 'calibration': calibration, 'sensors': {}}
+
+    for sensor in session.sensors:
+        sensor = int(sensor)
+        groups = {}
+        for group in GROUPS:
+            ticks, block = session.group(sensor, group)
+            t = ticks.astype(np.float64) * DSV16X_TICK_MS
+            _save_npy(os.path.join(columns_dir, COLUMN_FILENAME.format(sensor=sensor, group=group, column=TIME_COLUMN)), t)
+            for k, axis in enumerate(AXES):
+                _save_npy(os.path.join(columns_dir, COLUMN_FILENAME.format(sensor=sensor, group=group, column=axis)),
+                          np.ascontiguousarray(block[:, k], dtype=np.float32))
+            groups[group] = {'samples': len(t),
+                             't_start_ms': float(t[0]) if len(t) else None,
+                             't_end_ms': float(t[-1]) if len(t) else None}
+        manifest['sensors'][str(sensor)] = groups
+
+    tmp_path = os.path.join(columns_dir, f"{COLUMNS_MANIFEST}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(columns_dir, COLUMNS_MANIFEST))
+    return manifest
+
+
+def parse_channels(spec: Optional[str]) -> Dict[str, Tuple[str, ...]]:
+    """
+    'acc_z,gyro' -> {'acc': ('z',), 'gyro': ('x', 'y', 'z')}; None/vuoto: tutti i canali.
+
+    Raises:
+        ValueError: Se un canale non esiste
+    """
+    if not spec:
+        return {group: AXES for group in GROUPS}
+    selected: Dict[str, List[str]] = {}
+    for item in (s.strip() for s in spec.split(',') if s.strip()):
+        group, _, axis = item.partition('_')
+        if group not in GROUPS or (axis and axis not in AXES):
+            raise ValueError(f"Unknown channel: {item} (expected <acc|gyro>[_<x|y|z>])")
+        axes = selected.setdefault(group, [])
+        axes.extend(a for a in ((axis,) if axis else AXES) if a not in axes)
+    return {group: tuple(a for a in AXES if a in axes) for group, axes in selected.items()}
+
+
+class ColumnStore:
+    """
+    Colonne decodificate di una sessione, lette come mappe dei file .npy.
+
+    Usage:
+        store = ColumnStore.open(session_dir)
+        for name, column in store.select(sensors=[2], channels='acc_z', t0=10_000, t1=20_000):
+            ...
+    """
+
+    def __init__(self, columns_dir: str, manifest: Dict):
+        self.columns_dir = columns_dir
+        self.manifest = manifest
+
+    @classmethod
+    def open(cls, session_dir: str, calibration: Optional[str] = None) -> Optional['ColumnStore']:
+        """
+        Colonne della sessione; None se mancano, hanno un altro formato o
+        (con `calibration`) sono state calibrate con profili diversi.
+        """
+        columns_dir = os.path.join(session_dir, COLUMNS_DIRNAME)
+        try:
+            with open(os.path.join(columns_dir, COLUMNS_MANIFEST), 'r') as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if manifest.get('version') != COLUMNS_VERSION:
+            return None
+        if calibration is not None and manifest.get('calibration') != calibration:
+            return None
+        return cls(columns_dir, manifest)
+
+    @property
+    def sensors(self) -> List[int]:
+        return sorted(int(s) for s in self.manifest['sensors'])
+
+    def column(self, sensor: int, group: str, column: str) -> np.ndarray:
+        path = os.path.join(self.columns_dir, COLUMN_FILENAME.format(sensor=sensor, group=group, column=column))
+        return np.load(path, mmap_mode='r')
+
+    def select(
+        self,
+        sensors: Optional[Iterable[int]] = None,
+        channels: Optional[str] = None,
+        t0: Optional[float] = None,
+        t1: Optional[float] = None
+    ) -> List[Tuple[str, np.ndarray]]:
+        """
+        Colonne selezionate come fette delle mappe (nessuna copia): per ogni
+        sensore e gruppo il tempo e gli assi richiesti, in [t0, t1] [ms].
+
+        Returns:
+            Lista di (nome, array), es. ('s2_acc_time_ms', ...), ('s2_acc_z', ...)
+
+        Raises:
+            KeyError: Se un sensore non è nella sessione
+            ValueError: Se un canale non esiste
+        """
+        wanted = parse_channels(channels)
+        selected = []
+        for sensor in (self.sensors if sensors is None else sensors):
+            if str(sensor) not in self.manifest['sensors']:
+                raise KeyError(f"Sensor {sensor} not in session")
+            for group, axes in wanted.items():
+                t = self.column(sensor, group, TIME_COLUMN)
+                lo = 0 if t0 is None else int(np.searchsorted(t, t0, side='left'))
+                hi = len(t) if t1 is None else int(np.searchsorted(t, t1, side='right'))
+                prefix = f"s{sensor}_{group}"
+                selected.append((f"{prefix}_{TIME_COLUMN}", t[lo:hi]))
+                selected.extend((f"{prefix}_{axis}", self.column(sensor, group, axis)[lo:hi]) for axis in axes)
+        return selected
+
+
+# ============================================================================
+# STREAMING EXPORT
+# ============================================================================
+
+def npy_header(array: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.lib.format.write_array_header_1_0(buffer, np.lib.format.header_data_from_array_1_0(array))
+    return buffer.getvalue()
+
+
+def array_chunks(array: np.ndarray, chunk_bytes: int = EXPORT_CHUNK_BYTES) -> Iterator[memoryview]:
+    """Byte di un array contiguo a blocchi, come viste sulla sua memoria (o mappa)."""
+    data = memoryview(array).cast('B') if array.size else memoryview(b'')
+    for start in range(0, len(data), chunk_bytes):
+        yield data[start:start + chunk_bytes]
+
+
+class _StreamSink:
+    """File in sola scrittura e non posizionabile: accumula i byte finché lo stream non li preleva."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        parts, self.parts = self.parts, []
+        yield from parts
+
+
+def stream_npz(members: Iterable[Tuple[str, np.ndarray]], chunk_bytes: int = EXPORT_CHUNK_BYTES) -> Iterator[bytes]:
+    """
+    Archivio .npz (zip non compresso, leggibile da np.load) generato al
+    volo: ogni array passa a blocchi dalla sua mappa alla risposta, senza
+    essere mai materializzato per intero.
+    """
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for name, array in members:
+            with archive.open(f"{name}.npy", 'w', force_zip64=True) as member:
+                member.write(npy_header(array))
+                yield from sink.drain()
+                for chunk in array_chunks(array, chunk_bytes):
+                    member.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
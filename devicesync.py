@@ -0,0 +1,594 @@
+import os
+import re
+import sys
+import json
+import time
+import queue
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+import http.client
+import http.server
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote, unquote, urlparse
+
+from werkzeug.utils import secure_filename
+
+import train
+from storage import touch
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Logger sulla bici (server di bcp_api.yml)
+DEFAULT_DEVICE_URL = 'http://192.168.4.1/v1'
+DEVICE_TOKEN = os.environ.get('BCP_DEVICE_TOKEN')
+
+# Download contemporanei, ognuno su una connessione keep-alive del pool
+DEFAULT_WORKERS = 3
+
+# Stato della sincronizzazione e download parziali (ripresi con Range)
+SYNC_STATE_FILENAME = 'device_sync.json'
+PARTIAL_DIRNAME = '.device_partial'
+PARTIAL_SUFFIX = '.part'
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+REQUEST_TIMEOUT_S = 30
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF_S = 0.5
+
+CONTENT_RANGE_PATTERN = re.compile(r'bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)')
+
+
+class DeviceError(RuntimeError):
+    """Risposta inattesa o trasferimento non completato dal logger."""
+
+
+# ============================================================================
+# DEVICE CLIENT
+# ============================================================================
+
+class ConnectionPool:
+    """
+    Connessioni HTTP/1.1 keep-alive verso il logger, riusate tra i thread.
+
+    Una connessione torna nel pool solo dopo una risposta letta per
+    intero; dopo un errore viene chiusa e sostituita alla richiesta dopo.
+    """
+
+    def __init__(self, host: str, port: int, size: int, timeout_s: float = REQUEST_TIMEOUT_S):
+        self.host = host
+        self.port = port
+        self.timeout_s = timeout_s
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self) -> Iterator[http.client.HTTPConnection]:
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout_s)
+            try:
+                yield conn
+            except BaseException:
+                conn.close()
+                raise
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class DeviceClient:
+    """
+    Client delle API del logger (bcp_api.yml): elenco, configurazione e
+    download dei log, con ripresa dei download interrotti.
+
+    Usage:
+        client = DeviceClient('http://192.168.4.1/v1', pool_size=3)
+        for name in client.list_logs():
+            client.download_data(name, f'/tmp/{name}.bin')
+    """
+
+    def __init__(self, base_url: str, pool_size: int = DEFAULT_WORKERS, token: Optional[str] = DEVICE_TOKEN):
+        url = urlparse(base_url)
+        self.prefix = url.path.rstrip('/')
+        self.headers = {'Authorization': f'Bearer {token}'} if token else {}
+        self.pool = ConnectionPool(url.hostname, url.port or 80, pool_size)
+
+    def _path(self, *parts: str) -> str:
+        return '/'.join([self.prefix] + [quote(part, safe='') for part in parts])
+
+    def _get(self, path: str, headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                with self.pool.connection() as conn:
+                    conn.request('GET', path, headers={**self.headers, **(headers or {})})
+                    response = conn.getresponse()
+                    return response.status, response.read()
+            except (http.client.HTTPException, OSError) as e:
+                if attempt + 1 == MAX_ATTEMPTS:
+                    raise DeviceError(f"GET {path} failed: {e}")
+                time.sleep(RETRY_BACKOFF_S * (attempt + 1))
+
+    def list_logs(self) -> List[str]:
+        status, body = self._get(self._path('logs'))
+        if status != 200:
+            raise DeviceError(f"GET /logs returned {status}")
+        return list(json.loads(body).get('data', []))
+
+    def get_config(self, name: str) -> Optional[Dict]:
+        """Configurazione della registrazione, None se il logger non la ha."""
+        status, body = self._get(self._path('logs', name, 'config'))
+        if status == 404:
+            return None
+        if status != 200:
+            raise DeviceError(f"GET /logs/{name}/config returned {status}")
+        return json.loads(body)
+
+    def delete_log(self, name: str) -> None:
+        with self.pool.connection() as conn:
+            conn.request('DELETE', self._path('logs', name), headers=self.headers)
+            response = conn.getresponse()
+            response.read()
+        if response.status not in (204, 404):
+            raise DeviceError(f"DELETE /logs/{name} returned {response.status}")
+
+    def download_data(self, name: str, dest_path: str) -> int:
+        """
+        Scarica il payload binario in `dest_path`, riprendendo da quanto già
+        presente con una richiesta Range (se il logger risponde 200 invece
+        di 206 il download riparte da zero).
+
+        Returns:
+            Dimensione del file completo
+
+        Raises:
+            DeviceError: Se il trasferimento non si completa in MAX_ATTEMPTS tentativi
+        """
+        path = self._path('logs', name, 'data')
+        last_error = None
+
+        for attempt in range(MAX_ATTEMPTS):
+            offset = os.path.getsize(dest_path) if os.path.exists(dest_path) else 0
+            headers = dict(self.headers)
+            if offset:
+                headers['Range'] = f'bytes={offset}-'
+            try:
+                with self.pool.connection() as conn:
+                    conn.request('GET', path, headers=headers)
+                    response = conn.getresponse()
+                    size = self._receive(name, response, offset, dest_path)
+                if size is not None:
+                    return size
+            except (http.client.HTTPException, OSError) as e:
+                last_error = e
+                logging.warning(f"⚠️  {name}: transfer interrupted at "
+                                f"{os.path.getsize(dest_path) if os.path.exists(dest_path) else 0} bytes ({e})")
+                time.sleep(RETRY_BACKOFF_S * (attempt + 1))
+
+        raise DeviceError(f"Download of {name} failed after {MAX_ATTEMPTS} attempts: {last_error}")
+
+    def _receive(self, name: str, response: http.client.HTTPResponse, offset: int, dest_path: str) -> Optional[int]:
+        """Scrive una risposta di /data. Returns: dimensione finale, None per ripartire."""
+        if response.status == 404:
+            response.read()
+            raise DeviceError(f"Log not found on device: {name}")
+
+        content_range = CONTENT_RANGE_PATTERN.match(response.getheader('Content-Range') or '')
+        total = int(content_range.group(3)) if content_range and content_range.group(3) != '*' else None
+
+        if response.status == 416:
+            # Range oltre la fine: il parziale è già completo, oppure non è più valido
+            response.read()
+            if total == offset:
+                return offset
+            os.remove(dest_path)
+            return None
+
+        if response.status == 206 and content_range and content_range.group(1) is not None \
+                and int(content_range.group(1)) == offset:
+            mode = 'ab'
+        elif response.status == 200:
+            mode, offset = 'wb', 0
+            length = response.getheader('Content-Length')
+            total = int(length) if length is not None else None
+        else:
+            response.read()
+            raise DeviceError(f"GET /logs/{name}/data returned {response.status}")
+
+        with open(dest_path, mode) as f:
+            for chunk in iter(lambda: response.read(DOWNLOAD_CHUNK_SIZE), b''):
+                f.write(chunk)
+            size = f.tell()
+
+        if total is not None and size != total:
+            raise http.client.IncompleteRead(b'', total - size)
+        return size
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+# ============================================================================
+# SYNC
+# ============================================================================
+
+def load_sync_state(path: str) -> Dict[str, Dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f).get('logs', {})
+
+
+def save_sync_state(path: str, logs: Dict[str, Dict]) -> None:
+    """Scrittura atomica: un'interruzione lascia sempre uno stato valido."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'updated_at': time.time(), 'logs': logs}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def session_id_for_log(name: str) -> str:
+    base = name[:-len('.bin')] if name.lower().endswith('.bin') else name
+    return secure_filename(base) or f"device_{int(time.time())}"
+
+
+def ingest_log(name: str, data_path: str, bike_config: Optional[Dict], upload_folder: str) -> str:
+    """
+    Sposta un log scaricato nella sua sessione e lancia l'analisi completa.
+
+    Returns:
+        ID della sessione
+    """
+    session_id = session_id_for_log(name)
+    session_dir = os.path.join(upload_folder, session_id)
+    os.makedirs(session_dir, exist_ok=True)
+    touch(session_dir)
+
+    if bike_config is not None:
+        with open(os.path.join(session_dir, 'bike_config.json'), 'w') as f:
+            json.dump(bike_config, f, indent=2)
+
+    file_path = os.path.join(session_dir, f"{session_id}.bin")
+    os.replace(data_path, file_path)
+    train.analyze_session(file_path, session_dir, bike_config)
+    return session_id
+
+
+class DeviceSync:
+    """
+    Sincronizzazione incrementale dei log del logger verso uploads/.
+
+    Scarica solo i log non ancora importati (stato in device_sync.json; le
+    sessioni già caricate dal telefono con lo stesso nome contano come
+    importate), con `workers` download in parallelo sul pool di
+    connessioni. Ogni log completato passa subito all'analisi, in un
+    thread separato e uno alla volta (il budget di memoria è per analisi),
+    mentre gli altri download proseguono.
+
+    Usage:
+        DeviceSync('http://192.168.4.1/v1', 'uploads', workers=3).run()
+    """
+
+    def __init__(self, base_url: str, upload_folder: str, workers: int = DEFAULT_WORKERS,
+                 delete_after: bool = False, token: Optional[str] = DEVICE_TOKEN):
+        self.client = DeviceClient(base_url, workers, token)
+        self.upload_folder = upload_folder
+        self.workers = workers
+        self.delete_after = delete_after
+        self.state_path = os.path.join(upload_folder, SYNC_STATE_FILENAME)
+        self.partial_dir = os.path.join(upload_folder, PARTIAL_DIRNAME)
+        self.state = load_sync_state(self.state_path)
+        self._state_lock = threading.Lock()
+
+    def _record(self, name: str, entry: Dict) -> None:
+        with self._state_lock:
+            self.state[name] = entry
+            save_sync_state(self.state_path, self.state)
+
+    def pending(self, names: List[str]) -> List[str]:
+        todo = []
+        for name in names:
+            if self.state.get(name, {}).get('status') == 'ingested':
+                continue
+            session_dir = os.path.join(self.upload_folder, session_id_for_log(name))
+            if name not in self.state and os.path.isdir(session_dir) and train.find_session_telemetry(session_dir):
+                self._record(name, {'status': 'ingested', 'session_id': session_id_for_log(name),
+                                    'source': 'existing', 'ingested_at': time.time()})
+                continue
+            todo.append(name)
+        return todo
+
+    def _download(self, name: str) -> Tuple[str, Optional[Dict], int, float]:
+        started = time.perf_counter()
+        bike_config = self.client.get_config(name)
+        partial_path = os.path.join(self.partial_dir, f"{secure_filename(name) or 'log'}{PARTIAL_SUFFIX}")
+        size = self.client.download_data(name, partial_path)
+        return partial_path, bike_config, size, time.perf_counter() - started
+
+    def _ingest_worker(self, jobs: queue.Queue, results: Dict[str, bool]) -> None:
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            name, partial_path, bike_config, size, download_s = job
+            started = time.perf_counter()
+            try:
+                session_id = ingest_log(name, partial_path, bike_config, self.upload_folder)
+                self._record(name, {'status': 'ingested', 'session_id': session_id, 'bytes': size,
+                                    'download_s': round(download_s, 3),
+                                    'ingest_s': round(time.perf_counter() - started, 3),
+                                    'ingested_at': time.time()})
+                results[name] = True
+                logging.info(f"✅ {name} -> {session_id} ({size / 2**20:.1f} MB)")
+                if self.delete_after:
+                    self.client.delete_log(name)
+            except Exception as e:
+                self._record(name, {'status': 'failed', 'stage': 'ingest', 'error': str(e), 'at': time.time()})
+                results[name] = False
+                logging.error(f"❌ Ingest of {name} failed: {e}", exc_info=True)
+
+    def run(self) -> Dict[str, bool]:
+        """
+        Una sincronizzazione completa.
+
+        Returns:
+            log -> True se importato, False se fallito (solo quelli tentati)
+        """
+        os.makedirs(self.partial_dir, exist_ok=True)
+        names = self.client.list_logs()
+        todo = self.pending(names)
+        logging.info(f"🔄 Device sync: {len(names)} logs on device, {len(todo)} to download")
+
+        results: Dict[str, bool] = {}
+        jobs: queue.Queue = queue.Queue()
+        ingest = threading.Thread(target=self._ingest_worker, args=(jobs, results), name='device-ingest')
+        ingest.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='device-download') as pool:
+                futures = {pool.submit(self._download, name): name for name in todo}
+                for future in as_completed(futures):
+                    name = futures[future]
+                    try:
+                        jobs.put((name,) + future.result())
+                    except Exception as e:
+                        self._record(name, {'status': 'failed', 'stage': 'download', 'error': str(e), 'at': time.time()})
+                        results[name] = False
+                        logging.error(f"❌ Download of {name} failed: {e}")
+        finally:
+            jobs.put(None)
+            ingest.join()
+            self.client.close()
+        return results
+
+
+# ============================================================================
+# STAND-IN DEVICE
+# ============================================================================
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Logger finto che implementa bcp_api.yml su una cartella di log
+    (<nome>.bin + <nome>.json), con Range su /data per provare la ripresa.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    server: 'StandInDevice'
+
+    def log_message(self, format, *args):
+        logging.debug(f"stand-in: {format % args}")
+
+    def _send(self, status: int, body: bytes = b'', content_type: str = 'application/json',
+              headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _route(self) -> Optional[Tuple[str, ...]]:
+        path = urlparse(self.path).path
+        if not path.startswith(self.server.prefix + '/'):
+            return None
+        parts = tuple(unquote(p) for p in path[len(self.server.prefix) + 1:].split('/'))
+        if self.server.token and self.headers.get('Authorization') != f'Bearer {self.server.token}':
+            self._send(401)
+            return ()
+        return parts
+
+    def _log_path(self, name: str, extension: str) -> Optional[str]:
+        path = os.path.join(self.server.logs_dir, f"{secure_filename(name)}{extension}")
+        return path if secure_filename(name) == name and os.path.exists(path) else None
+
+    def do_GET(self):
+        parts = self._route()
+        if parts == ():
+            return
+        if parts == ('health',):
+            self._send(200, b'SUCCESS', 'text/plain')
+        elif parts == ('logs',):
+            names = sorted(f[:-len('.bin')] for f in os.listdir(self.server.logs_dir) if f.endswith('.bin'))
+            self._send(200, json.dumps({'data': names, 'meta': {'totalItems': len(names)}}).encode())
+        elif parts and len(parts) == 3 and parts[0] == 'logs' and parts[2] == 'config':
+            path = self._log_path(parts[1], '.json')
+            if path is None:
+                self._send(404)
+            else:
+                with open(path, 'rb') as f:
+                    self._send(200, f.read())
+        elif parts and len(parts) == 3 and parts[0] == 'logs' and parts[2] == 'data':
+            self._send_data(parts[1])
+        else:
+            self._send(404)
+
+    def _send_data(self, name: str) -> None:
+        path = self._log_path(name, '.bin')
+        if path is None:
+            self._send(404)
+            return
+        size = os.path.getsize(path)
+        start, status, headers = 0, 200, {'Accept-Ranges': 'bytes'}
+
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            if start >= size:
+                self._send(416, headers={'Content-Range': f'bytes */{size}'})
+                return
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{size - 1}/{size}'
+
+        # Taglio della connessione a metà (solo per la prima richiesta completa del log)
+        cut = None
+        if self.server.drop_after and not match and name not in self.server.dropped:
+            self.server.dropped.add(name)
+            cut = self.server.drop_after
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(size - start))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+
+        sent = 0
+        with open(path, 'rb') as f:
+            f.seek(start)
+            for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+                if cut is not None and sent + len(chunk) > cut:
+                    self.wfile.write(chunk[:cut - sent])
+                    self.close_connection = True
+                    return
+                self.wfile.write(chunk)
+                sent += len(chunk)
+
+    def do_DELETE(self):
+        parts = self._route()
+        if parts == ():
+            return
+        if parts == ('logs',):
+            for f in os.listdir(self.server.logs_dir):
+                if f.endswith(('.bin', '.json')):
+                    os.remove(os.path.join(self.server.logs_dir, f))
+            self._send(204)
+        elif parts and len(parts) == 2 and parts[0] == 'logs':
+            paths = [p for p in (self._log_path(parts[1], '.bin'), self._log_path(parts[1], '.json')) if p]
+            for path in paths:
+                os.remove(path)
+            self._send(204 if paths else 404)
+        else:
+            self._send(404)
+
+    def do_PUT(self):
+        parts = self._route()
+        if parts == ():
+            return
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if parts == ('config',):
+            self.server.config = json.loads(body or b'{}')
+            self._send(200)
+        else:
+            self._send(404)
+
+
+class StandInDevice(http.server.ThreadingHTTPServer):
+    """
+    Server locale al posto del logger, per provare la sincronizzazione.
+
+    Usage:
+        with StandInDevice(logs_dir, port=0) as device:
+            threading.Thread(target=device.serve_forever, daemon=True).start()
+            DeviceSync(device.url, 'uploads').run()
+    """
+
+    daemon_threads = True
+
+    def __init__(self, logs_dir: str, port: int = 0, prefix: str = '/v1', token: Optional[str] = None,
+                 drop_after: int = 0):
+        super().__init__(('127.0.0.1', port), StandInHandler)
+        self.logs_dir = logs_dir
+        self.prefix = prefix
+        self.token = token
+        self.drop_after = drop_after
+        self.dropped = set()
+        self.config: Optional[Dict] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{self.prefix}"
+
+
+def generate_device_logs(logs_dir: str, count: int, duration_s: float, sensors: int) -> List[str]:
+    """Log sintetici (synthetic.generate_ride) con configurazione, come sul logger."""
+    from synthetic import generate_ride
+
+    os.makedirs(logs_dir, exist_ok=True)
+    names = []
+    for i in range(count):
+        name = f"ride_{i:03d}"
+        generate_ride(os.path.join(logs_dir, f"{name}.bin"), sensors=sensors, duration_s=duration_s, seed=i)
+        with open(os.path.join(logs_dir, f"{name}.json"), 'w') as f:
+            json.dump({'type': 'Hardtail', 'hardware': {'sensor_count': sensors, 'sample_rate': 120}}, f)
+        names.append(name)
+    return names
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Sincronizzazione dei log dal logger della bici (bcp_api.yml)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    sync = sub.add_parser('sync', help='Scarica e importa i log non ancora presenti')
+    sync.add_argument('--url', type=str, default=DEFAULT_DEVICE_URL, help='URL base delle API del logger')
+    sync.add_argument('--uploads', type=str, default=train.UPLOAD_FOLDER, help='Cartella delle sessioni')
+    sync.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Download contemporanei')
+    sync.add_argument('--delete-after', action='store_true', help='Elimina dal logger i log importati')
+
+    serve = sub.add_parser('serve', help='Avvia un logger finto su una cartella di log')
+    serve.add_argument('--logs', type=str, default=None, help='Cartella con <nome>.bin e <nome>.json')
+    serve.add_argument('--port', type=int, default=8079, help='Porta locale')
+    serve.add_argument('--generate', type=int, default=0, help='Genera N log sintetici nella cartella')
+    serve.add_argument('--ride-s', type=float, default=60, help='Durata dei log sintetici [s]')
+    serve.add_argument('--sensors', type=int, default=2, help='Sensori dei log sintetici')
+    serve.add_argument('--drop-after', type=int, default=0, help='Interrompe il primo download di ogni log dopo N byte')
+
+    args = parser.parse_args()
+
+    if args.command == 'sync':
+        results = DeviceSync(args.url, args.uploads, max(args.workers, 1), args.delete_after).run()
+        ok = sum(results.values())
+        print(f"Synced {ok} logs, {len(results) - ok} failed")
+        sys.exit(1 if ok < len(results) else 0)
+
+    logs_dir = args.logs or tempfile.mkdtemp(prefix='bcp_device_')
+    if args.generate:
+        generate_device_logs(logs_dir, args.generate, args.ride_s, args.sensors)
+    device = StandInDevice(logs_dir, args.port, token=DEVICE_TOKEN, drop_after=args.drop_after)
+    print(f"Stand-in device on {device.url} serving {logs_dir}")
+    try:
+        device.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        device.server_close()
+        if not args.logs:
+            shutil.rmtree(logs_dir, ignore_errors=True)
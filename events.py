@@ -0,0 +1,181 @@
+import os
+import logging
+from typing import Optional
+
+import numpy as np
+from scipy.signal import find_peaks
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+EVENT_INDEX_FILENAME = 'events.npy'
+
+# Tabella eventi compatta: un record per impatto/atterraggio
+EVENT_DTYPE = np.dtype([
+    ('time_ms', '<i8'),       # timestamp del picco
+    ('peak_g', '<f4'),        # ampiezza del picco rispetto al baseline statico [g]
+    ('duration_ms', '<f4'),   # larghezza del picco a metà altezza
+    ('sensor', '<u2'),        # conn_handle del sensore
+])
+
+# Soglie di default per il detector
+DEFAULT_MIN_PEAK_G = 1.0
+DEFAULT_MIN_DURATION_MS = 10.0
+DEFAULT_MAX_DURATION_MS = 1000.0
+DEFAULT_MIN_SEPARATION_MS = 250.0
+
+
+# ============================================================================
+# DETECTION
+# ============================================================================
+
+def detect_events(
+    time_ms: np.ndarray,
+    acc_z_g: np.ndarray,
+    fs: float,
+    sensor: int,
+    min_peak_g: float = DEFAULT_MIN_PEAK_G,
+    min_duration_ms: float = DEFAULT_MIN_DURATION_MS,
+    max_duration_ms: float = DEFAULT_MAX_DURATION_MS,
+    min_separation_ms: float = DEFAULT_MIN_SEPARATION_MS
+) -> np.ndarray:
+    """
+    Rileva impatti e atterraggi sull'accelerazione verticale già filtrata.
+
+    Il baseline statico (gravità + orientamento sensore) viene stimato con la
+    mediana; i picchi sono cercati sul modulo della deviazione così da coprire
+    sia gli impatti (compressione) sia le fasi di volo (scarico).
+
+    Args:
+        time_ms: Timestamp dei campioni [ms]
+        acc_z_g: Accelerazione verticale filtrata [g]
+        fs: Frequenza di campionamento [Hz]
+        sensor: conn_handle del sensore
+        min_peak_g: Ampiezza minima del picco [g]
+        min_duration_ms: Durata minima del picco a metà altezza [ms]
+        max_duration_ms: Durata massima del picco a metà altezza [ms]
+        min_separation_ms: Distanza minima tra due eventi [ms]
+
+    Returns:
+        Array strutturato EVENT_DTYPE ordinato per tempo
+    """
+    if len(acc_z_g) < 3:
+        return np.empty(0, dtype=EVENT_DTYPE)
+
+    deviation = np.abs(acc_z_g - np.median(acc_z_g))
+    samples_per_ms = fs / 1000.0
+
+    peaks, props = find_peaks(
+        deviation,
+        height=min_peak_g,
+        width=(max(min_duration_ms * samples_per_ms, 1.0), max_duration_ms * samples_per_ms),
+        distance=max(int(min_separation_ms * samples_per_ms), 1),
+        rel_height=0.5
+    )
+
+    table = np.empty(len(peaks), dtype=EVENT_DTYPE)
+    table['time_ms'] = time_ms[peaks]
+    table['peak_g'] = props['peak_heights']
+    table['duration_ms'] = props['widths'] / samples_per_ms
+    table['sensor'] = sensor
+
+    return table
+
+
+# ============================================================================
+# INDEX
+# ============================================================================
+
+class EventIndex:
+    """
+    Indice eventi di una sessione, ordinato per tempo.
+
+    Mantiene anche la permutazione ordinata per ampiezza così che sia il
+    filtro per intervallo temporale sia quello per soglia si risolvano con
+    una ricerca binaria; il filtro residuo lavora solo sui candidati.
+    """
+
+    def __init__(self, table: np.ndarray):
+        order = np.argsort(table['time_ms'], kind='stable')
+        self.table = table[order]
+        self._by_peak = np.argsort(self.table['peak_g'], kind='stable')
+        self._sorted_peaks = self.table['peak_g'][self._by_peak]
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    @classmethod
+    def from_tables(cls, tables) -> 'EventIndex':
+        tables = list(tables)
+        if not tables:
+            return cls(np.empty(0, dtype=EVENT_DTYPE))
+        return cls(np.concatenate(tables))
+
+    def save(self, session_dir: str) -> str:
+        path = os.path.join(session_dir, EVENT_INDEX_FILENAME)
+        np.save(path, self.table)
+        logging.info(f"  📍 Event index saved: {len(self)} events -> {path}")
+        return path
+
+    @classmethod
+    def load(cls, session_dir: str) -> Optional['EventIndex']:
+        path = os.path.join(session_dir, EVENT_INDEX_FILENAME)
+        if not os.path.exists(path):
+            return None
+        return cls(np.load(path))
+
+    def query(
+        self,
+        min_g: Optional[float] = None,
+        t0: Optional[float] = None,
+        t1: Optional[float] = None,
+        sensor: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Eventi con ampiezza >= min_g nell'intervallo [t0, t1].
+
+        Args:
+            min_g: Soglia minima di ampiezza [g]
+            t0: Inizio intervallo [ms]
+            t1: Fine intervallo [ms]
+            sensor: Filtra su un singolo conn_handle
+
+        Returns:
+            Array strutturato EVENT_DTYPE ordinato per tempo
+        """
+        times = self.table['time_ms']
+        lo = 0 if t0 is None else int(np.searchsorted(times, t0, side='left'))
+        hi = len(times) if t1 is None else int(np.searchsorted(times, t1, side='right'))
+
+        if min_g is not None:
+            first = int(np.searchsorted(self._sorted_peaks, min_g, side='left'))
+            # Parti dall'insieme di candidati più piccolo
+            if len(self._sorted_peaks) - first < hi - lo:
+                idx = np.sort(self._by_peak[first:])
+                idx = idx[(idx >= lo) & (idx < hi)]
+                result = self.table[idx]
+            else:
+                result = self.table[lo:hi]
+                result = result[result['peak_g'] >= min_g]
+        else:
+            result = self.table[lo:hi]
+
+        if sensor is not None:
+            result = result[result['sensor'] == sensor]
+
+        return result
+
+
+def events_to_json(table: np.ndarray) -> list:
+    """Converte la tabella eventi in lista di dict serializzabili."""
+    return [
+        {
+            'time_ms': int(e['time_ms']),
+            'peak_g': round(float(e['peak_g']), 3),
+            'duration_ms': round(float(e['duration_ms']), 1),
+            'sensor': int(e['sensor'])
+        }
+        for e in table
+    ]
@@ -0,0 +1,194 @@
+import os
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from spectral import welch_psd, band_energies, dominant_frequency, FREQUENCY_BANDS
+from fifo import ticks_to_s
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+FEATURES_FILENAME = 'features.npz'
+
+AXES = ('x', 'y', 'z')
+
+# Schema colonnare della feature store (una riga per sensore/gruppo/asse)
+FEATURE_COLUMNS = {
+    'sensor': np.uint16,
+    'group': '<U4',
+    'axis': '<U1',
+    'samples': np.int64,
+    'duration_s': np.float32,
+    'span_s': np.float32,
+    'dropout_rate': np.float32,
+    'min': np.float32,
+    'max': np.float32,
+    'mean': np.float32,
+    'rms': np.float32,
+    'peak_freq_hz': np.float32,
+    **{f'energy_{band}': np.float32 for band in FREQUENCY_BANDS},
+}
+
+
+# ============================================================================
+# FEATURE EXTRACTION
+# ============================================================================
+
+def dropout_stats(t: np.ndarray) -> Tuple[int, float]:
+    """
+    Campioni mancanti stimati dai buchi nei timestamp.
+
+    Il passo nominale è la mediana degli intervalli positivi; un intervallo
+    di k passi conta k - 1 campioni persi. Non dipende dall'unità dei
+    timestamp del decoder.
+
+    Returns:
+        (campioni_mancanti, dropout_rate)
+    """
+    if len(t) < 2:
+        return 0, 0.0
+    steps = np.diff(t)
+    positive = steps[steps > 0]
+    if len(positive) == 0:
+        return 0, 0.0
+    nominal = np.median(positive)
+    missing = int(np.clip(np.round(steps / nominal) - 1, 0, None).sum())
+    return missing, missing / (len(t) + missing)
+
+
+def channel_block_features(
+    t: np.ndarray,
+    values: np.ndarray,
+    fs: float
+) -> Tuple[Dict[str, np.ndarray], Tuple[np.ndarray, np.ndarray]]:
+    """
+    Feature di un gruppo (n, 3) calcolate per tutti gli assi insieme.
+
+    Args:
+        t: Timestamp decodificati
+        values: Campioni in unità fisiche (n, 3)
+        fs: Frequenza di campionamento [Hz]
+
+    Returns:
+        (dict colonna -> array per asse, (freqs, psd (n_freqs, 3)))
+
+    'duration_s' è la durata nominale (campioni attesi / fs), 'span_s' quella
+    misurata tra il primo e l'ultimo timestamp (tick del sensore, convertiti
+    in secondi): da quest'ultima si ricava la frequenza effettiva.
+    """
+    n = len(values)
+    missing, dropout_rate = dropout_stats(t)
+    mean = values.mean(axis=0, dtype=np.float64)
+    centered = values - mean.astype(values.dtype)
+
+    freqs, psd = welch_psd(centered, fs)
+    energies = band_energies(freqs, psd)
+
+    columns = {
+        'samples': np.full(3, n),
+        'duration_s': np.full(3, (n + missing) / fs),
+        'span_s': np.full(3, ticks_to_s(t[-1] - t[0])),
+        'dropout_rate': np.full(3, dropout_rate),
+        'min': values.min(axis=0),
+        'max': values.max(axis=0),
+        'mean': mean,
+        'rms': np.sqrt(np.mean(np.square(centered), axis=0, dtype=np.float64)),
+        'peak_freq_hz': dominant_frequency(freqs, psd),
+        **{f'energy_{band}': energy for band, energy in energies.items()},
+    }
+    return columns, (freqs, psd)
+
+
+# ============================================================================
+# FEATURE TABLE
+# ============================================================================
+
+class FeatureTable:
+    """
+    Tabella colonnare delle feature di una sessione.
+
+    Ogni colonna è un array numpy; le righe sono (sensore, gruppo, asse).
+    Salvata come npz non compresso: il caricamento è una lettura diretta
+    degli array senza parsing.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.columns['sensor'])
+
+    @classmethod
+    def from_blocks(cls, blocks: List[Dict[str, np.ndarray]]) -> 'FeatureTable':
+        columns = {}
+        for name, dtype in FEATURE_COLUMNS.items():
+            parts = [np.asarray(block[name]) for block in blocks]
+            columns[name] = np.concatenate(parts).astype(dtype) if parts else np.empty(0, dtype=dtype)
+        return cls(columns)
+
+    def save(self, session_dir: str) -> str:
+        path = os.path.join(session_dir, FEATURES_FILENAME)
+        np.savez(path, **self.columns)
+        logging.info(f"  🧮 Feature store saved: {len(self)} rows -> {path}")
+        return path
+
+    @classmethod
+    def load(cls, session_dir: str) -> Optional['FeatureTable']:
+        path = os.path.join(session_dir, FEATURES_FILENAME)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as npz:
+            return cls({name: npz[name] for name in npz.files})
+
+    def select(self, sensor: Optional[int] = None, group: Optional[str] = None, axis: Optional[str] = None) -> List[Dict]:
+        """Righe filtrate come lista di dict."""
+        mask = np.ones(len(self), dtype=bool)
+        if sensor is not None:
+            mask &= self.columns['sensor'] == sensor
+        if group is not None:
+            mask &= self.columns['group'] == group
+        if axis is not None:
+            mask &= self.columns['axis'] == axis
+        return self.to_records(mask)
+
+    def to_records(self, mask: Optional[np.ndarray] = None) -> List[Dict]:
+        columns = self.columns if mask is None else {k: v[mask] for k, v in self.columns.items()}
+        names = list(columns)
+        return [
+            {name: columns[name][i].item() for name in names}
+            for i in range(len(columns['sensor']))
+        ]
+
+
+def compute_sensor_features(
+    sensor: int,
+    groups: Dict[str, Tuple[np.ndarray, np.ndarray]],
+    fs: float
+) -> Tuple[List[Dict[str, np.ndarray]], Dict[str, Tuple[np.ndarray, np.ndarray]]]:
+    """
+    Feature di tutti i gruppi di un sensore.
+
+    Args:
+        sensor: conn_handle
+        groups: gruppo ('acc', 'gyro') -> (timestamp, valori (n, 3))
+        fs: Frequenza di campionamento [Hz]
+
+    Returns:
+        (blocchi di colonne per FeatureTable, spettri per gruppo)
+    """
+    blocks = []
+    spectra = {}
+    for group, (t, values) in groups.items():
+        if len(values) < 2:
+            continue
+        columns, spectrum = channel_block_features(t, values, fs)
+        columns['sensor'] = np.full(3, sensor)
+        columns['group'] = np.full(3, group)
+        columns['axis'] = np.array(AXES)
+        blocks.append(columns)
+        spectra[group] = spectrum
+    return blocks, spectra
@@ -0,0 +1,181 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Protocollo demuxing (come train.py)
+DEMUX_HEADER_FORMAT = '<HIH'  # conn_handle(2), timestamp(4), data_size(2)
+FIFO_WORD_SIZE = 7
+
+# Sensibilità LSM6DSV16X (come train.py): 16 g e 2000 dps
+ACC_SENSITIVITY_16G = 0.488 / 1000.0
+GYRO_SENSITIVITY_2000DPS = 70.0 / 1000.0
+
+# Tag FIFO LSM6DSV16X (st_fifo.c, fifo_ver 1)
+TAG_EMPTY = 0x00
+TAG_GY = 0x01
+TAG_XL = 0x02
+TAG_TS = 0x04
+TAG_ODRCHG = 0x05
+TAG_XL_NC_T_2 = 0x06
+TAG_XL_NC_T_1 = 0x07
+TAG_XL_2X = 0x08
+TAG_XL_3X = 0x09
+TAG_GY_NC_T_2 = 0x0A
+TAG_GY_NC_T_1 = 0x0B
+TAG_GY_2X = 0x0C
+TAG_GY_3X = 0x0D
+TAG_VALID_LIMIT = 0x1E
+
+# Tag -> (gruppo, compressione); gruppo come nel CSV decodificato (0 gyro, 1 acc)
+GROUP_GYRO = 0
+GROUP_ACC = 1
+SAMPLE_TAGS = {
+    TAG_GY: (GROUP_GYRO, 'nc'), TAG_XL: (GROUP_ACC, 'nc'),
+    TAG_XL_NC_T_2: (GROUP_ACC, 'nc_t_2'), TAG_XL_NC_T_1: (GROUP_ACC, 'nc_t_1'),
+    TAG_XL_2X: (GROUP_ACC, '2x'), TAG_XL_3X: (GROUP_ACC, '3x'),
+    TAG_GY_NC_T_2: (GROUP_GYRO, 'nc_t_2'), TAG_GY_NC_T_1: (GROUP_GYRO, 'nc_t_1'),
+    TAG_GY_2X: (GROUP_GYRO, '2x'), TAG_GY_3X: (GROUP_GYRO, '3x'),
+}
+
+# BDR selezionabili e passo del timestamp in tick del sensore
+DSV16X_BDR_HZ = (0, 1.875, 7.5, 15, 30, 60, 120, 240, 480, 960, 1920, 3840, 7680, 0, 0, 0)
+DSV16X_DTIME = (0, 24576, 6144, 3072, 1536, 768, 384, 192, 96, 48, 24, 12, 6, 0, 0, 0)
+# Un tick del timestamp del sensore: 384 tick per campione a 120 Hz (~21.7 µs).
+# I timestamp dei CSV decodificati sono in tick, non in millisecondi
+DSV16X_TICK_MS = 1000.0 / (120 * 384)
+DSV16X_TICK_S = DSV16X_TICK_MS / 1000.0
+
+
+# ============================================================================
+# FIFO DECODER
+# ============================================================================
+
+def ticks_to_s(ticks) -> np.ndarray:
+    """Durate in tick del sensore -> secondi."""
+    return np.asarray(ticks, dtype=np.float64) * DSV16X_TICK_S
+
+
+def _bdr_index(bdr: float) -> int:
+    return int(np.argmin(np.abs(np.array(DSV16X_BDR_HZ, dtype=np.float64) - bdr)))
+
+
+class FifoStreamDecoder:
+    """
+    Decodifica incrementale delle parole FIFO LSM6DSV16X (port di st_fifo.c).
+
+    Lo stato (timestamp, BDR, ultimi campioni per i delta compressi)
+    persiste tra una chiamata e l'altra: le parole possono arrivare a
+    pacchetti di qualunque lunghezza. I campioni escono in ordine di
+    decodifica, non riordinati per timestamp come fa il decoder C.
+    """
+
+    def __init__(self):
+        self.tag_counter_old = 0
+        self.dtime_min = self.dtime_xl = self.dtime_gy = 0
+        self.dtime_old = {GROUP_ACC: 0, GROUP_GYRO: 0}
+        self.timestamp = 0
+        self.last_timestamp = {GROUP_ACC: 0, GROUP_GYRO: 0}
+        self.bdr_changed = {GROUP_ACC: False, GROUP_GYRO: False}
+        self.last_data = {GROUP_ACC: (0, 0, 0), GROUP_GYRO: (0, 0, 0)}
+        self.invalid_words = 0
+
+    @property
+    def sample_rate(self) -> Dict[int, float]:
+        """BDR corrente per gruppo [Hz] (0 prima del primo ODRCHG)."""
+        return {group: (1000.0 / (dtime * DSV16X_TICK_MS) if dtime else 0.0)
+                for group, dtime in ((GROUP_ACC, self.dtime_xl), (GROUP_GYRO, self.dtime_gy))}
+
+    def _dtime(self, group: int) -> int:
+        return self.dtime_xl if group == GROUP_ACC else self.dtime_gy
+
+    def decode(self, words: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Args:
+            words: Parole FIFO (m, 7) uint8
+
+        Returns:
+            (tick del sensore uint32 (n,), gruppo int8 (n,), counts int16 (n, 3))
+        """
+        ticks: List[int] = []
+        groups: List[int] = []
+        samples: List[Tuple[int, int, int]] = []
+        raw = words.tolist()
+        payloads = np.ascontiguousarray(words[:, 1:]).view('<i2').tolist() if len(words) else []
+
+        for i, word in enumerate(raw):
+            tag = word[0] >> 3
+            tag_counter = (word[0] & 0x06) >> 1
+            if tag > TAG_VALID_LIMIT:
+                self.invalid_words += 1
+                continue
+
+            if tag_counter != self.tag_counter_old and self.dtime_min:
+                diff = tag_counter - self.tag_counter_old
+                self.timestamp = (self.timestamp + self.dtime_min * (diff if diff > 0 else diff + 4)) & 0xFFFFFFFF
+
+            if tag == TAG_ODRCHG:
+                bdr_xl = DSV16X_BDR_HZ[word[6] & 0x0F]
+                bdr_gy = DSV16X_BDR_HZ[(word[6] & 0xF0) >> 4]
+                bdr_vsens = DSV16X_BDR_HZ[word[4] & 0x0F] if (word[4] & 0x0F) < 10 else 0
+                self.dtime_old = {GROUP_ACC: self.dtime_xl, GROUP_GYRO: self.dtime_gy}
+                self.dtime_min = DSV16X_DTIME[_bdr_index(max(bdr_xl, bdr_gy, bdr_vsens))]
+                self.dtime_xl = DSV16X_DTIME[_bdr_index(bdr_xl)]
+                self.dtime_gy = DSV16X_DTIME[_bdr_index(bdr_gy)]
+                self.bdr_changed = {GROUP_ACC: True, GROUP_GYRO: True}
+            elif tag == TAG_TS:
+                self.timestamp = word[1] | (word[2] << 8) | (word[3] << 16) | (word[4] << 24)
+            elif tag in SAMPLE_TAGS:
+                group, mode = SAMPLE_TAGS[tag]
+                self._decode_samples(group, mode, word, payloads[i], ticks, groups, samples)
+            elif tag == TAG_EMPTY:
+                # Come st_fifo.c: la parola vuota non aggiorna il contatore
+                continue
+
+            self.tag_counter_old = tag_counter
+
+        return (np.array(ticks, dtype=np.uint32), np.array(groups, dtype=np.int8),
+                np.array(samples, dtype=np.int16).reshape(-1, 3))
+
+    def _decode_samples(self, group: int, mode: str, word: List[int], payload: List[int],
+                        ticks: List[int], groups: List[int], samples: List[Tuple[int, int, int]]) -> None:
+        dtime = self._dtime(group)
+        ts = self.timestamp
+
+        if mode == 'nc':
+            out = [(ts, tuple(payload))]
+            self.bdr_changed[group] = False
+        elif mode in ('nc_t_1', 'nc_t_2'):
+            if self.bdr_changed[group]:
+                stamp = self.last_timestamp[group] + self.dtime_old[group]
+            else:
+                stamp = ts - (1 if mode == 'nc_t_1' else 2) * dtime
+            out = [(stamp, tuple(payload))]
+        else:
+            if mode == '2x':
+                diffs = [b - 256 if b >= 128 else b for b in word[1:]]
+                diffs = [diffs[0:3], diffs[3:6]]
+                stamps = [ts - 2 * dtime, ts - dtime]
+            else:
+                diffs = []
+                for k in range(3):
+                    packed = word[1 + 2 * k] | (word[2 + 2 * k] << 8)
+                    fields = [(packed >> (5 * j)) & 0x1F for j in range(3)]
+                    diffs.append([f - 32 if f >= 16 else f for f in fields])
+                stamps = [ts - 2 * dtime, ts - dtime, ts]
+            out = []
+            last = self.last_data[group]
+            for stamp, delta in zip(stamps, diffs):
+                last = tuple(((last[a] + delta[a] + 32768) & 0xFFFF) - 32768 for a in range(3))
+                out.append((stamp, last))
+
+        for stamp, values in out:
+            ticks.append(stamp & 0xFFFFFFFF)
+            groups.append(group)
+            samples.append(values)
+        self.last_data[group] = out[-1][1]
+        self.last_timestamp[group] = out[-1][0] & 0xFFFFFFFF
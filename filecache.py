@@ -0,0 +1,277 @@
+import os
+import sys
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Cache hash contenuto -> file remoto, accanto ai manuali
+UPLOAD_CACHE_FILENAME = '.kb_uploads.json'
+
+# Upload e attese dello stato in parallelo
+DEFAULT_UPLOAD_WORKERS = 4
+
+# Un file che scade entro questo margine viene ricaricato
+EXPIRY_MARGIN_S = 3600
+
+# Durata assunta se l'API non riporta la scadenza (File API Gemini: 48h)
+DEFAULT_TTL_S = 48 * 3600
+
+# Attesa di PROCESSING -> ACTIVE: intervallo crescente fino al massimo
+POLL_INITIAL_S = 0.5
+POLL_MAX_S = 4.0
+PROCESSING_TIMEOUT_S = 300
+
+STATE_ACTIVE = 'ACTIVE'
+STATE_PROCESSING = 'PROCESSING'
+STATE_FAILED = 'FAILED'
+
+
+# ============================================================================
+# FILE APIS
+# ============================================================================
+
+class RemoteFile:
+    """
+    File caricato sul servizio remoto.
+
+    Attributes:
+        name: Identificativo remoto (es. 'files/abc123')
+        state: STATE_PROCESSING, STATE_ACTIVE o STATE_FAILED
+        expires_at: Scadenza [epoch s]
+        handle: Oggetto dell'API da passare al modello
+    """
+
+    def __init__(self, name: str, uri: str, mime_type: str, state: str, expires_at: float, handle=None):
+        self.name = name
+        self.uri = uri
+        self.mime_type = mime_type
+        self.state = state
+        self.expires_at = expires_at
+        self.handle = handle if handle is not None else self
+
+
+class GeminiFileAPI:
+    """File API di google.generativeai (modulo già configurato passato dal chiamante)."""
+
+    def __init__(self, genai):
+        self.genai = genai
+
+    def _wrap(self, f) -> RemoteFile:
+        expiration = getattr(f, 'expiration_time', None)
+        expires_at = expiration.timestamp() if expiration else time.time() + DEFAULT_TTL_S
+        return RemoteFile(f.name, f.uri, f.mime_type, f.state.name, expires_at, handle=f)
+
+    def upload(self, path: str, mime_type: str) -> RemoteFile:
+        return self._wrap(self.genai.upload_file(path, mime_type=mime_type, display_name=os.path.basename(path)))
+
+    def get(self, name: str) -> RemoteFile:
+        return self._wrap(self.genai.get_file(name))
+
+
+class FakeFileAPI:
+    """
+    File API finta in memoria, per provare cache e parallelismo senza rete.
+
+    Ogni file resta PROCESSING per `processing_polls` letture, poi diventa
+    ACTIVE; scade dopo `ttl_s`. Conta upload e letture.
+    """
+
+    def __init__(self, processing_polls: int = 2, ttl_s: float = DEFAULT_TTL_S, latency_s: float = 0.0):
+        self.processing_polls = processing_polls
+        self.ttl_s = ttl_s
+        self.latency_s = latency_s
+        self.uploads = 0
+        self.gets = 0
+        self._files: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _snapshot(self, name: str) -> RemoteFile:
+        entry = self._files[name]
+        state = STATE_ACTIVE if entry['polls'] >= self.processing_polls else STATE_PROCESSING
+        return RemoteFile(name, f"fake://{name}", entry['mime_type'], state, entry['expires_at'])
+
+    def upload(self, path: str, mime_type: str) -> RemoteFile:
+        time.sleep(self.latency_s)
+        with open(path, 'rb') as f:
+            size = len(f.read())
+        with self._lock:
+            name = f"files/{uuid.uuid4().hex[:12]}"
+            self._files[name] = {'mime_type': mime_type, 'size': size, 'polls': 0,
+                                 'expires_at': time.time() + self.ttl_s}
+            self.uploads += 1
+            return self._snapshot(name)
+
+    def get(self, name: str) -> RemoteFile:
+        time.sleep(self.latency_s)
+        with self._lock:
+            self.gets += 1
+            entry = self._files.get(name)
+            if entry is None or entry['expires_at'] <= time.time():
+                raise LookupError(f"File not found: {name}")
+            entry['polls'] += 1
+            return self._snapshot(name)
+
+
+# ============================================================================
+# UPLOAD CACHE
+# ============================================================================
+
+def content_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadCache:
+    """
+    Cache persistente hash del contenuto -> riferimento remoto e scadenza.
+
+    Usage:
+        cache = UploadCache('manuals/.kb_uploads.json')
+        files, stats = cache.sync(pdf_paths, GeminiFileAPI(genai))
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.entries = json.load(f).get('files', {})
+
+    def _save(self) -> None:
+        """Scrittura atomica: un'interruzione lascia sempre una cache valida."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'updated_at': time.time(), 'files': self.entries}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def lookup(self, digest: str) -> Optional[Dict]:
+        """Voce ancora valida (non in scadenza entro EXPIRY_MARGIN_S), None altrimenti."""
+        entry = self.entries.get(digest)
+        if entry is None or entry['expires_at'] - time.time() < EXPIRY_MARGIN_S:
+            return None
+        return entry
+
+    def store(self, digest: str, remote: RemoteFile, source: str) -> None:
+        with self._lock:
+            self.entries[digest] = {'name': remote.name, 'uri': remote.uri, 'mime_type': remote.mime_type,
+                                    'expires_at': remote.expires_at, 'source': source,
+                                    'uploaded_at': time.time()}
+            self._save()
+
+    def drop(self, digest: str) -> None:
+        with self._lock:
+            if self.entries.pop(digest, None) is not None:
+                self._save()
+
+    def _resolve(self, api, path: str, digest: str, mime_type: str) -> Tuple[RemoteFile, bool]:
+        """File remoto ACTIVE per un contenuto. Returns: (file, True se caricato ora)."""
+        entry = self.lookup(digest)
+        if entry is not None:
+            try:
+                remote = wait_active(api, api.get(entry['name']))
+                if remote.expires_at - time.time() >= EXPIRY_MARGIN_S:
+                    return remote, False
+            except Exception as e:
+                print(f"    Cache non valida per {os.path.basename(path)} ({e}): nuovo upload")
+            self.drop(digest)
+
+        remote = wait_active(api, api.upload(path, mime_type))
+        self.store(digest, remote, os.path.basename(path))
+        return remote, True
+
+    def sync(self, paths: List[str], api, mime_type: str = 'application/pdf',
+             workers: int = DEFAULT_UPLOAD_WORKERS) -> Tuple[List[RemoteFile], Dict[str, int]]:
+        """
+        File remoti ACTIVE per tutti i path: i contenuti già in cache costano
+        solo una lettura di stato, gli altri vengono caricati. Upload e
+        attese procedono in parallelo; un contenuto duplicato viene caricato
+        una volta sola.
+
+        Returns:
+            (file remoti nell'ordine dei path, {'uploaded', 'cached', 'failed'})
+        """
+        stats = {'uploaded': 0, 'cached': 0, 'failed': 0}
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            digests = list(pool.map(content_sha256, paths))
+            first_path = {}
+            for path, digest in zip(paths, digests):
+                first_path.setdefault(digest, path)
+            futures = {digest: pool.submit(self._resolve, api, path, digest, mime_type)
+                       for digest, path in first_path.items()}
+
+            resolved: Dict[str, Optional[RemoteFile]] = {}
+            for digest, future in futures.items():
+                try:
+                    remote, uploaded = future.result()
+                    resolved[digest] = remote
+                    stats['uploaded' if uploaded else 'cached'] += 1
+                except Exception as e:
+                    resolved[digest] = None
+                    stats['failed'] += 1
+                    print(f"    ERRORE {os.path.basename(first_path[digest])}: {e}")
+
+        return [resolved[d] for d in digests if resolved[d] is not None], stats
+
+
+def wait_active(api, remote: RemoteFile, timeout_s: float = PROCESSING_TIMEOUT_S) -> RemoteFile:
+    """
+    Attende che il file esca da PROCESSING, con intervallo crescente.
+
+    Raises:
+        RuntimeError: Se l'elaborazione fallisce
+        TimeoutError: Se il file resta in PROCESSING oltre `timeout_s`
+    """
+    deadline = time.monotonic() + timeout_s
+    interval = POLL_INITIAL_S
+    while remote.state == STATE_PROCESSING:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{remote.name} still processing after {timeout_s:.0f}s")
+        time.sleep(interval)
+        interval = min(interval * 2, POLL_MAX_S)
+        remote = api.get(remote.name)
+    if remote.state != STATE_ACTIVE:
+        raise RuntimeError(f"{remote.name} processing failed (state {remote.state})")
+    return remote
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Prova della cache di upload dei manuali con la File API finta')
+    parser.add_argument('folder', nargs='?', default=os.path.join('manuals', 'paper'), help='Cartella dei PDF')
+    parser.add_argument('--workers', type=int, default=DEFAULT_UPLOAD_WORKERS, help='Upload in parallelo')
+    parser.add_argument('--latency', type=float, default=0.2, help='Latenza simulata per chiamata [s]')
+    args = parser.parse_args()
+
+    pdfs = sorted(os.path.join(args.folder, f) for f in os.listdir(args.folder) if f.lower().endswith('.pdf'))
+    if not pdfs:
+        print(f"ERRORE: Nessun PDF in {args.folder}")
+        sys.exit(1)
+
+    api = FakeFileAPI(latency_s=args.latency)
+    cache_path = os.path.join(args.folder, f"{UPLOAD_CACHE_FILENAME}.fake")
+    try:
+        for run in ('primo avvio', 'secondo avvio'):
+            started = time.perf_counter()
+            files, stats = UploadCache(cache_path).sync(pdfs, api, workers=args.workers)
+            print(f"{run}: {len(files)} file attivi, {stats['uploaded']} upload, {stats['cached']} da cache, "
+                  f"{stats['failed']} errori in {time.perf_counter() - started:.2f}s")
+    finally:
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
@@ -0,0 +1,396 @@
+import os
+import re
+import glob
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+MANUALS_FOLDER = 'manuals'
+SOURCE_PATTERNS = ('*.md', os.path.join('paper', '*.pdf'))
+
+# Indice salvato accanto ai manuali
+INDEX_DIRNAME = '.kb_index'
+INDEX_META_FILENAME = 'index.json'
+INDEX_POSTINGS_FILENAME = 'postings.npz'
+INDEX_VERSION = 1
+
+# Passaggi: finestre di parole sovrapposte, dentro una sezione o pagina
+CHUNK_WORDS = 120
+CHUNK_OVERLAP_WORDS = 30
+
+# Parametri BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Stemming leggero per italiano/inglese: troncamento dei termini
+STEM_LENGTH = 7
+MIN_TOKEN_LENGTH = 2
+
+STOPWORDS = frozenset("""
+il lo la i gli le un uno una di a da in con su per tra fra e ed o od ma se che chi non si ci ne del dello
+della dei degli delle al allo alla ai agli alle dal dallo dalla dai dagli dalle nel nello nella nei negli
+nelle sul sullo sulla sui sugli sulle è sono come più anche questo questa questi queste quello quella
+essere ha hanno può cui the of and or to in on for with by is are be as at it this that from an not was
+were which their these those have has can its into than also such other
+""".split())
+
+PDFTOTEXT_TIMEOUT_SEC = 60
+
+TOKEN_PATTERN = re.compile(r'\w+')
+HEADING_PATTERN = re.compile(r'^#{1,6}\s+(.*)$')
+
+
+# ============================================================================
+# TEXT EXTRACTION & CHUNKING
+# ============================================================================
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extract_pdf_pages(path: str) -> Optional[List[str]]:
+    """
+    Testo di ogni pagina del PDF: pypdf se installato, altrimenti pdftotext
+    (poppler-utils).
+
+    Returns:
+        Lista di pagine, None se nessun estrattore è disponibile
+    """
+    if PdfReader is not None:
+        return [page.extract_text() or '' for page in PdfReader(path).pages]
+    try:
+        result = subprocess.run(['pdftotext', '-layout', '-enc', 'UTF-8', path, '-'],
+                                capture_output=True, timeout=PDFTOTEXT_TIMEOUT_SEC)
+    except FileNotFoundError:
+        return None
+    if result.returncode != 0:
+        raise RuntimeError(f"pdftotext failed: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout.decode('utf-8', errors='replace').split('\f')
+
+
+def markdown_sections(text: str) -> List[Tuple[str, str]]:
+    """(titolo, testo) per ogni sezione del markdown."""
+    sections, title, lines = [], '', []
+    for line in text.splitlines():
+        match = HEADING_PATTERN.match(line.strip())
+        if match:
+            if any(l.strip() for l in lines):
+                sections.append((title, '\n'.join(lines)))
+            title, lines = match.group(1).strip('*# '), []
+        else:
+            lines.append(line)
+    if any(l.strip() for l in lines):
+        sections.append((title, '\n'.join(lines)))
+    return sections
+
+
+def window_chunks(text: str, prefix: str = '') -> List[str]:
+    """Finestre di CHUNK_WORDS parole con CHUNK_OVERLAP_WORDS di sovrapposizione."""
+    words = text.split()
+    step = CHUNK_WORDS - CHUNK_OVERLAP_WORDS
+    chunks = []
+    for start in range(0, max(len(words) - CHUNK_OVERLAP_WORDS, 1), step):
+        body = ' '.join(words[start:start + CHUNK_WORDS])
+        if body:
+            chunks.append(f"{prefix}{body}")
+    return chunks
+
+
+def chunk_source(path: str) -> Optional[List[Dict]]:
+    """
+    Passaggi di un file della knowledge base.
+
+    Returns:
+        Lista di {'page', 'section', 'text'}, None se il file non è leggibile qui
+    """
+    if path.lower().endswith('.pdf'):
+        pages = extract_pdf_pages(path)
+        if pages is None:
+            return None
+        return [
+            {'page': number, 'section': None, 'text': text}
+            for number, page in enumerate(pages, start=1)
+            for text in window_chunks(page)
+        ]
+    with open(path, 'r', encoding='utf-8') as f:
+        sections = markdown_sections(f.read())
+    return [
+        {'page': None, 'section': title or None, 'text': text}
+        for title, body in sections
+        for text in window_chunks(body, f"{title}: " if title else '')
+    ]
+
+
+def tokenize(text: str) -> List[str]:
+    """Minuscolo, senza accenti, senza stopword, troncato a STEM_LENGTH."""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return [
+        token[:STEM_LENGTH] for token in TOKEN_PATTERN.findall(text)
+        if len(token) >= MIN_TOKEN_LENGTH and token not in STOPWORDS
+    ]
+
+
+# ============================================================================
+# INDEX
+# ============================================================================
+
+class KnowledgeIndex:
+    """
+    Indice BM25 dei manuali, salvato su disco e aggiornato in modo incrementale.
+
+    Solo i file con hash cambiato vengono riestratti e risuddivisi (la
+    parte costosa, soprattutto per i PDF); le posting list vengono poi
+    ricostruite da tutti i passaggi e salvate in npz, così una ricerca
+    carica array già pronti e costa pochi millisecondi.
+
+    Usage:
+        index = KnowledgeIndex('manuals')
+        index.update()
+        for hit in index.search('pressione gomme tubeless', k=5):
+            print(hit['score'], hit['source'], hit['text'])
+    """
+
+    def __init__(self, manuals_folder: str = MANUALS_FOLDER):
+        self.manuals_folder = manuals_folder
+        self.index_dir = os.path.join(manuals_folder, INDEX_DIRNAME)
+        self.files: Dict[str, Dict] = {}
+        self.chunks: List[Dict] = []
+        self.vocabulary: Dict[str, int] = {}
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.empty(0, dtype=np.int32)
+        self.tfs = np.empty(0, dtype=np.float32)
+        self.doc_len = np.empty(0, dtype=np.float32)
+        self.load()
+
+    def sources(self) -> List[str]:
+        """Path relativi dei file della knowledge base."""
+        found = []
+        for pattern in SOURCE_PATTERNS:
+            found.extend(os.path.relpath(p, self.manuals_folder)
+                         for p in glob.glob(os.path.join(self.manuals_folder, pattern)))
+        return sorted(found)
+
+    def load(self) -> bool:
+        meta_path = os.path.join(self.index_dir, INDEX_META_FILENAME)
+        postings_path = os.path.join(self.index_dir, INDEX_POSTINGS_FILENAME)
+        if not (os.path.exists(meta_path) and os.path.exists(postings_path)):
+            return False
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != INDEX_VERSION:
+            return False
+        self.files = meta['files']
+        self.chunks = meta['chunks']
+        with np.load(postings_path) as npz:
+            self.vocabulary = {term: i for i, term in enumerate(npz['vocabulary'].tolist())}
+            self.indptr, self.doc_ids, self.tfs, self.doc_len = (
+                npz['indptr'], npz['doc_ids'], npz['tfs'], npz['doc_len'])
+        return True
+
+    def update(self, force: bool = False) -> Dict[str, int]:
+        """
+        Reindicizza i file nuovi o modificati e rimuove quelli spariti.
+
+        Returns:
+            Conteggi {'indexed', 'unchanged', 'removed', 'skipped'}
+        """
+        stats = {'indexed': 0, 'unchanged': 0, 'removed': 0, 'skipped': 0}
+        sources = self.sources()
+        chunks_by_source: Dict[str, List[Dict]] = {}
+        for chunk in self.chunks:
+            chunks_by_source.setdefault(chunk['source'], []).append(chunk)
+
+        files = {}
+        for source in sources:
+            path = os.path.join(self.manuals_folder, source)
+            stat = os.stat(path)
+            known = self.files.get(source)
+            # Stessa dimensione e mtime: hash non ricalcolato
+            if not force and known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime:
+                files[source] = known
+                stats['unchanged'] += 1
+                continue
+            digest = file_sha256(path)
+            if not force and known and known['sha256'] == digest:
+                files[source] = dict(known, mtime=stat.st_mtime)
+                stats['unchanged'] += 1
+                continue
+
+            chunks = chunk_source(path)
+            if chunks is None:
+                print(f"⚠️  {source}: no PDF text extractor available (install pypdf or poppler-utils)")
+                stats['skipped'] += 1
+                continue
+            for chunk in chunks:
+                chunk['source'] = source
+            chunks_by_source[source] = chunks
+            files[source] = {'sha256': digest, 'size': stat.st_size, 'mtime': stat.st_mtime,
+                             'chunks': len(chunks)}
+            stats['indexed'] += 1
+
+        stats['removed'] = len(set(self.files) - set(sources))
+        rebuild = files.keys() != self.files.keys() or stats['indexed'] > 0
+        if rebuild or files != self.files or not os.path.exists(os.path.join(self.index_dir, INDEX_META_FILENAME)):
+            self.files = files
+            if rebuild:
+                self.chunks = [chunk for source in sorted(files) for chunk in chunks_by_source.get(source, [])]
+                self._build_postings()
+            self.save()
+        return stats
+
+    def version(self) -> str:
+        """Impronta del contenuto indicizzato: cambia solo se cambia un file."""
+        digest = hashlib.sha256()
+        for source in sorted(self.files):
+            digest.update(f"{source}\0{self.files[source]['sha256']}\n".encode())
+        return digest.hexdigest()[:16]
+
+    def _build_postings(self) -> None:
+        counts = [Counter(tokenize(chunk['text'])) for chunk in self.chunks]
+        vocabulary = sorted(set().union(*counts)) if counts else []
+        self.vocabulary = {term: i for i, term in enumerate(vocabulary)}
+
+        postings: List[List[Tuple[int, int]]] = [[] for _ in vocabulary]
+        for doc, counter in enumerate(counts):
+            for term, tf in counter.items():
+                postings[self.vocabulary[term]].append((doc, tf))
+
+        self.indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum([len(p) for p in postings])
+        flat = [entry for p in postings for entry in p]
+        self.doc_ids = np.array([d for d, _ in flat], dtype=np.int32)
+        self.tfs = np.array([tf for _, tf in flat], dtype=np.float32)
+        self.doc_len = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+
+    def save(self) -> None:
+        """Scrittura atomica di metadati e posting list."""
+        os.makedirs(self.index_dir, exist_ok=True)
+        postings_path = os.path.join(self.index_dir, INDEX_POSTINGS_FILENAME)
+        with open(f"{postings_path}.tmp", 'wb') as f:
+            np.savez(f, vocabulary=np.array(list(self.vocabulary), dtype=str), indptr=self.indptr,
+                     doc_ids=self.doc_ids, tfs=self.tfs, doc_len=self.doc_len)
+        os.replace(f"{postings_path}.tmp", postings_path)
+
+        meta_path = os.path.join(self.index_dir, INDEX_META_FILENAME)
+        with open(f"{meta_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'updated_at': time.time(), 'files': self.files,
+                       'chunks': self.chunks}, f, ensure_ascii=False)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    def search(self, query: str, k: int = 5) -> List[Dict]:
+        """
+        I `k` passaggi più rilevanti per BM25.
+
+        Returns:
+            Lista di {'score', 'source', 'page', 'section', 'text'}, dal più rilevante
+        """
+        n_docs = len(self.doc_len)
+        if n_docs == 0:
+            return []
+        scores = np.zeros(n_docs, dtype=np.float32)
+        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doc_len / self.doc_len.mean())
+
+        for term, qtf in Counter(tokenize(query)).items():
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            docs, tf = self.doc_ids[start:end], self.tfs[start:end]
+            idf = np.log(1.0 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += qtf * idf * tf * (BM25_K1 + 1.0) / (tf + norm[docs])
+
+        k = min(k, n_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [dict(self.chunks[i], score=round(float(scores[i]), 3)) for i in top if scores[i] > 0]
+
+
+# ============================================================================
+# TELEMETRY QUERIES
+# ============================================================================
+
+# Termini aggiunti alla query in base alla telemetria (vedi system prompt di test_ai)
+HIGH_FREQUENCY_HZ = 15.0
+HIGH_FREQUENCY_TERMS = 'vibrazioni alta frequenza harshness compressione alte velocità HSC ritorno mano'
+LOW_FREQUENCY_TERMS = 'bassa frequenza instabilità telaio compressione basse velocità LSC sag affondamento'
+HARSHNESS_TERMS = 'pressione gomme rigidità comfort esposizione vibrazioni'
+
+
+def telemetry_query(telemetry: Dict, notes: str = '') -> str:
+    """Query di ricerca dal riassunto della telemetria e dalle note del pilota."""
+    terms = [notes]
+    terms.append(HIGH_FREQUENCY_TERMS if telemetry.get('peak_hz', 0) >= HIGH_FREQUENCY_HZ else LOW_FREQUENCY_TERMS)
+    if telemetry.get('high_energy', 0) > telemetry.get('low_energy', 0):
+        terms.append(HARSHNESS_TERMS)
+    return ' '.join(t for t in terms if t)
+
+
+def format_passages(hits: List[Dict]) -> str:
+    """Passaggi recuperati, con la fonte, pronti per il prompt."""
+    lines = []
+    for hit in hits:
+        where = f"p. {hit['page']}" if hit.get('page') else (hit.get('section') or '')
+        lines.append(f"[{hit['source']}{', ' + where if where else ''}]\n{hit['text']}")
+    return '\n\n'.join(lines)
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Indice locale (BM25) della knowledge base dei manuali')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    index_cmd = sub.add_parser('index', help='Aggiorna l\'indice (solo i file modificati)')
+    index_cmd.add_argument('--manuals', type=str, default=MANUALS_FOLDER, help='Cartella dei manuali')
+    index_cmd.add_argument('--force', action='store_true', help='Reindicizza tutti i file')
+
+    search_cmd = sub.add_parser('search', help='Cerca i passaggi più rilevanti')
+    search_cmd.add_argument('query', help='Testo della ricerca')
+    search_cmd.add_argument('--manuals', type=str, default=MANUALS_FOLDER, help='Cartella dei manuali')
+    search_cmd.add_argument('-k', type=int, default=5, help='Numero di passaggi')
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.manuals):
+        print(f"ERRORE: Cartella {args.manuals} non trovata")
+        sys.exit(1)
+
+    if args.command == 'index':
+        started = time.perf_counter()
+        index = KnowledgeIndex(args.manuals)
+        stats = index.update(args.force)
+        print(f"Indexed {stats['indexed']}, unchanged {stats['unchanged']}, removed {stats['removed']}, "
+              f"skipped {stats['skipped']}: {len(index.chunks)} passages, {len(index.vocabulary)} terms "
+              f"({time.perf_counter() - started:.2f}s)")
+        sys.exit(0)
+
+    index = KnowledgeIndex(args.manuals)
+    started = time.perf_counter()
+    hits = index.search(args.query, args.k)
+    print(f"{len(hits)} passages in {(time.perf_counter() - started) * 1000:.1f} ms\n")
+    print(format_passages(hits))
@@ -0,0 +1,397 @@
+import time
+import struct
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.signal import butter, sosfilt, sosfilt_zi
+
+from spectral import FREQUENCY_BANDS, minmax_indices
+from fifo import (DEMUX_HEADER_FORMAT, FIFO_WORD_SIZE, ACC_SENSITIVITY_16G, GYRO_SENSITIVITY_2000DPS,
+                  GROUP_ACC, GROUP_GYRO, DSV16X_TICK_MS, FifoStreamDecoder)
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Ring buffer per sensore: secondi al BDR decodificato (alla frequenza di
+# default fino al primo ODRCHG), con un tetto di campioni per gruppo
+# (~18 MB per sensore: a BDR alti il buffer copre meno secondi)
+LIVE_BUFFER_SEC = 60
+LIVE_DEFAULT_SAMPLE_RATE_HZ = 120
+LIVE_MAX_BUFFER_SAMPLES = 65_536
+
+# Finestra delle statistiche mobili
+LIVE_STATS_WINDOW_SEC = 2.0
+
+# Sessioni live senza dati da questo tempo vengono rimosse
+LIVE_IDLE_SEC = 600
+
+BAND_FILTER_ORDER = 4
+
+# Colonne delle somme prefisse: x, x^2 e potenza per banda, per asse
+_STAT_COLUMNS = 3 * (2 + len(FREQUENCY_BANDS))
+
+
+# ============================================================================
+# RING BUFFER
+# ============================================================================
+
+class RingBuffer:
+    """
+    Ultimi `capacity` elementi di uno stream, a dimensione fissa.
+
+    Ogni elemento viene scritto due volte (in i e in i + capacity): la
+    finestra più recente, di qualunque lunghezza fino a `capacity`, è
+    sempre una fetta contigua, quindi i lettori ricevono una vista e non
+    una copia del buffer.
+    """
+
+    def __init__(self, capacity: int, tail: Tuple[int, ...] = (), dtype=np.float64):
+        self.capacity = capacity
+        self.data = np.zeros((2 * capacity,) + tail, dtype=dtype)
+        self.count = 0
+        self.total = 0
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def resize(self, capacity: int) -> None:
+        """Nuova capacità, conservando gli elementi più recenti che ci stanno."""
+        if capacity == self.capacity:
+            return
+        latest = self.latest(capacity).copy()
+        total = self.total
+        self.capacity = capacity
+        self.data = np.zeros((2 * capacity,) + self.data.shape[1:], dtype=self.data.dtype)
+        self.count = 0
+        self.append(latest)
+        self.total = total
+
+    def append(self, block: np.ndarray) -> None:
+        n = len(block)
+        self.total += n
+        if n > self.capacity:
+            self.count += n - self.capacity
+            block = block[-self.capacity:]
+            n = self.capacity
+        pos = self.count % self.capacity
+        first = min(n, self.capacity - pos)
+        for start in (pos, pos + self.capacity):
+            self.data[start:start + first] = block[:first]
+        rest = n - first
+        if rest:
+            self.data[:rest] = block[first:]
+            self.data[self.capacity:self.capacity + rest] = block[first:]
+        self.count += n
+
+    def latest(self, n: int) -> np.ndarray:
+        """Vista in sola lettura sugli ultimi n elementi (meno se il buffer ne ha meno)."""
+        n = min(n, len(self))
+        end = self.count % self.capacity + self.capacity
+        view = self.data[end - n:end]
+        view.flags.writeable = False
+        return view
+
+
+# ============================================================================
+# SENSOR STREAM
+# ============================================================================
+
+class SensorStream:
+    """
+    Un sensore in diretta: decodifica incrementale, ring buffer di
+    accelerometro e giroscopio e statistiche mobili.
+
+    Per l'accelerometro si tengono le somme prefisse di x, x^2 e della
+    potenza del segnale filtrato per banda (filtri causali con stato tra
+    un blocco e l'altro): RMS ed energia per banda di qualunque finestra
+    recente costano due letture, senza ripassare i campioni.
+
+    I buffer sono dimensionati per `buffer_s` secondi al BDR decodificato
+    di ogni gruppo (fino a LIVE_MAX_BUFFER_SAMPLES): le finestre più
+    lunghe di quanto il buffer contiene vengono rifiutate.
+    """
+
+    def __init__(self, conn_handle: int, buffer_s: float = LIVE_BUFFER_SEC,
+                 default_fs: float = LIVE_DEFAULT_SAMPLE_RATE_HZ):
+        self.conn_handle = conn_handle
+        self.buffer_s = buffer_s
+        self.default_fs = default_fs
+        self.decoder = FifoStreamDecoder()
+        self.pending = bytearray()
+        self.packets = 0
+        self.last_packet_ms: Optional[int] = None
+
+        capacity = self._ring_capacity(default_fs)
+        self.acc_t = RingBuffer(capacity)
+        self.acc = RingBuffer(capacity, (3,), np.float32)
+        self.gyro_t = RingBuffer(capacity)
+        self.gyro = RingBuffer(capacity, (3,), np.float32)
+        self.csum = RingBuffer(capacity, (_STAT_COLUMNS,))
+        self.csum_total = np.zeros(_STAT_COLUMNS)
+
+        self.fs = 0.0
+        self.filters: Dict[str, Optional[Tuple[np.ndarray, Optional[np.ndarray]]]] = {}
+        self._last_tick: Optional[int] = None
+        self._last_abs = 0
+
+    @property
+    def sample_rate(self) -> float:
+        return self.decoder.sample_rate[GROUP_ACC] or self.default_fs
+
+    def _ring_capacity(self, fs: float) -> int:
+        return min(max(int(self.buffer_s * fs), 2), LIVE_MAX_BUFFER_SAMPLES)
+
+    def _fit_rings(self) -> None:
+        """Ridimensiona i buffer di ogni gruppo sul BDR decodificato (dopo un ODRCHG)."""
+        rates = self.decoder.sample_rate
+        if rates[GROUP_ACC]:
+            for ring in (self.acc_t, self.acc, self.csum):
+                ring.resize(self._ring_capacity(rates[GROUP_ACC]))
+        if rates[GROUP_GYRO]:
+            for ring in (self.gyro_t, self.gyro):
+                ring.resize(self._ring_capacity(rates[GROUP_GYRO]))
+
+    def _window_samples(self, window_s: float, fs: float, ring: RingBuffer) -> int:
+        """
+        Campioni di una finestra di `window_s` secondi.
+
+        Raises:
+            ValueError: Se la finestra è più lunga di quanto il buffer può contenere
+        """
+        n = max(int(round(window_s * fs)), 1)
+        if n > ring.capacity - 1:
+            raise ValueError(f"Window {window_s:g} s exceeds the live buffer of sensor {self.conn_handle} "
+                             f"({(ring.capacity - 1) / fs:.1f} s at {fs:g} Hz)")
+        return n
+
+    def add_payload(self, payload: bytes, logger_ms: int, packets: int = 1) -> None:
+        """Payload concatenati di uno o più pacchetti, con l'istante di logger dell'ultimo."""
+        self.pending += payload
+        self.packets += packets
+        self.last_packet_ms = logger_ms
+        n_words = len(self.pending) // FIFO_WORD_SIZE
+        if n_words == 0:
+            return
+        words = np.frombuffer(bytes(self.pending[:n_words * FIFO_WORD_SIZE]), dtype=np.uint8)
+        del self.pending[:n_words * FIFO_WORD_SIZE]
+
+        ticks, groups, counts = self.decoder.decode(words.reshape(-1, FIFO_WORD_SIZE))
+        self._fit_rings()
+        if len(ticks) == 0:
+            return
+        t_ms = self._time_ms(ticks)
+        acc = groups == GROUP_ACC
+        gyro = ~acc
+        if acc.any():
+            values = counts[acc].astype(np.float32) * np.float32(ACC_SENSITIVITY_16G)
+            self.acc_t.append(t_ms[acc])
+            self.acc.append(values)
+            self._update_stats(values)
+        if gyro.any():
+            self.gyro_t.append(t_ms[gyro])
+            self.gyro.append(counts[gyro].astype(np.float32) * np.float32(GYRO_SENSITIVITY_2000DPS))
+
+    def _time_ms(self, ticks: np.ndarray) -> np.ndarray:
+        """Tick uint32 -> ms dal primo campione, con gestione del giro del contatore."""
+        if self._last_tick is None:
+            self._last_tick = int(ticks[0])
+        steps = np.diff(np.concatenate(([self._last_tick], ticks)).astype(np.int64))
+        steps = (steps + 2 ** 31) % 2 ** 32 - 2 ** 31
+        absolute = self._last_abs + np.cumsum(steps)
+        self._last_tick, self._last_abs = int(ticks[-1]), int(absolute[-1])
+        return absolute * DSV16X_TICK_MS
+
+    def _init_filters(self, fs: float, first: np.ndarray) -> None:
+        nyq = fs / 2.0
+        self.fs = fs
+        self.filters = {}
+        for name, (f_lo, f_hi) in FREQUENCY_BANDS.items():
+            if f_lo >= nyq:
+                self.filters[name] = None
+                continue
+            sos = butter(BAND_FILTER_ORDER, [f_lo, min(f_hi, 0.99 * nyq)], btype='band', fs=fs, output='sos')
+            # Stato iniziale a regime sul primo campione: niente transitorio di avvio
+            self.filters[name] = (sos, sosfilt_zi(sos)[:, :, None] * first.astype(np.float64))
+
+    def _update_stats(self, x: np.ndarray) -> None:
+        if self.sample_rate != self.fs:
+            self._init_filters(self.sample_rate, x[0])
+        columns = np.zeros((len(x), _STAT_COLUMNS))
+        columns[:, 0:3] = x
+        columns[:, 3:6] = np.square(x, dtype=np.float64)
+        for k, name in enumerate(FREQUENCY_BANDS):
+            band = self.filters[name]
+            if band is None:
+                continue
+            sos, zi = band
+            y, zi = sosfilt(sos, x, axis=0, zi=zi)
+            self.filters[name] = (sos, zi)
+            columns[:, 6 + 3 * k:9 + 3 * k] = np.square(y)
+        prefix = np.cumsum(columns, axis=0)
+        prefix += self.csum_total
+        self.csum_total = prefix[-1].copy()
+        self.csum.append(prefix)
+
+    def stats(self, window_s: float = LIVE_STATS_WINDOW_SEC) -> Dict:
+        """
+        RMS (media rimossa) ed energia per banda dell'accelerometro negli ultimi `window_s` secondi.
+
+        Raises:
+            ValueError: Se la finestra è più lunga del buffer
+        """
+        fs = self.sample_rate
+        info = {'sensor': self.conn_handle, 'sample_rate': fs, 'packets': self.packets,
+                'buffer_s': round((self.csum.capacity - 1) / fs, 3),
+                'acc_samples': self.acc.total, 'gyro_samples': self.gyro.total,
+                'invalid_words': self.decoder.invalid_words, 'last_packet_ms': self.last_packet_ms}
+        # Finché lo stream è più corto della finestra, si usa quello che c'è;
+        # se il buffer ha scartato righe, la più vecchia serve da base
+        held = len(self.csum)
+        available = held if self.csum.total == held else held - 1
+        window = min(self._window_samples(window_s, fs, self.csum), available)
+        if window <= 0:
+            return info
+        before = self.csum.latest(window + 1)[0] if window < held else np.zeros(_STAT_COLUMNS)
+        mean = (self.csum_total - before) / window
+        rms = np.sqrt(np.maximum(mean[3:6] - mean[0:3] ** 2, 0.0))
+        info.update({'window_s': window / fs, 't_ms': float(self.acc_t.latest(1)[0]),
+                     'rms': np.round(rms, 5).tolist()})
+        for k, name in enumerate(FREQUENCY_BANDS):
+            info[f'energy_{name}'] = np.round(mean[6 + 3 * k:9 + 3 * k], 6).tolist() if self.filters.get(name) else None
+        return info
+
+    def window(self, window_s: float, group: str = 'acc') -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Viste (tempo [ms], valori (n, 3)) sugli ultimi `window_s` secondi di un gruppo.
+
+        Raises:
+            ValueError: Se la finestra è più lunga del buffer
+        """
+        t_ring, v_ring = (self.acc_t, self.acc) if group == 'acc' else (self.gyro_t, self.gyro)
+        fs = self.decoder.sample_rate[GROUP_ACC if group == 'acc' else GROUP_GYRO] or self.default_fs
+        n = self._window_samples(window_s, fs, v_ring)
+        return t_ring.latest(n), v_ring.latest(n)
+
+
+# ============================================================================
+# LIVE SESSIONS
+# ============================================================================
+
+class LiveSession:
+    """
+    Stream `<HIH` di una sessione in diretta: i byte possono arrivare
+    spezzati in qualunque punto, i pacchetti incompleti restano in attesa
+    del blocco successivo.
+    """
+
+    def __init__(self, session_id: str, buffer_s: float = LIVE_BUFFER_SEC,
+                 default_fs: float = LIVE_DEFAULT_SAMPLE_RATE_HZ):
+        self.session_id = session_id
+        self.buffer_s = buffer_s
+        self.default_fs = default_fs
+        self.sensors: Dict[int, SensorStream] = {}
+        self.pending = bytearray()
+        self.bytes_received = 0
+        self.packets = 0
+        self.started = time.time()
+        self.updated = self.started
+        self.lock = threading.Lock()
+        self._header = struct.Struct(DEMUX_HEADER_FORMAT)
+
+    def feed(self, data: bytes) -> int:
+        """
+        Aggiunge byte dello stream e decodifica i pacchetti completi.
+
+        Returns:
+            Numero di pacchetti completi in questo blocco
+        """
+        with self.lock:
+            self.pending += data
+            self.bytes_received += len(data)
+            self.updated = time.time()
+
+            by_sensor: Dict[int, List[Tuple[bytes, int]]] = {}
+            offset, size = 0, len(self.pending)
+            header_size = self._header.size
+            while size - offset >= header_size:
+                conn_handle, logger_ms, data_size = self._header.unpack_from(self.pending, offset)
+                end = offset + header_size + data_size
+                if end > size:
+                    break
+                by_sensor.setdefault(conn_handle, []).append((bytes(self.pending[offset + header_size:end]), logger_ms))
+                offset = end
+            del self.pending[:offset]
+
+            # Un'unica decodifica per sensore e blocco
+            count = 0
+            for conn_handle, packets in by_sensor.items():
+                stream = self.sensors.get(conn_handle)
+                if stream is None:
+                    stream = self.sensors[conn_handle] = SensorStream(conn_handle, self.buffer_s, self.default_fs)
+                stream.add_payload(b''.join(p for p, _ in packets), packets[-1][1], len(packets))
+                count += len(packets)
+            self.packets += count
+            return count
+
+    def stats(self, window_s: float = LIVE_STATS_WINDOW_SEC) -> Dict:
+        with self.lock:
+            return {'session_id': self.session_id, 'bytes': self.bytes_received, 'packets': self.packets,
+                    'started': self.started, 'updated': self.updated,
+                    'sensors': [self.sensors[s].stats(window_s) for s in sorted(self.sensors)]}
+
+    def window(self, sensor: int, window_s: float, group: str = 'acc', max_points: Optional[int] = None) -> Dict:
+        """
+        Ultima finestra di un sensore; con `max_points` decimata min/max
+        sull'asse z. Copia solo i punti restituiti.
+
+        Raises:
+            KeyError: Se il sensore non è (ancora) nello stream
+        """
+        with self.lock:
+            t, values = self.sensors[sensor].window(window_s, group)
+            if max_points and len(t) > max_points:
+                idx = minmax_indices(values[:, 2], max_points)
+                t, values = t[idx], values[idx]
+            return {'sensor': sensor, 'group': group, 'samples': len(t),
+                    't_ms': np.round(t, 3).tolist(),
+                    'x': np.round(values[:, 0], 5).tolist(),
+                    'y': np.round(values[:, 1], 5).tolist(),
+                    'z': np.round(values[:, 2], 5).tolist()}
+
+
+class LiveRegistry:
+    """Sessioni live attive; quelle ferme da più di `idle_s` vengono rimosse."""
+
+    def __init__(self, idle_s: float = LIVE_IDLE_SEC, buffer_s: float = LIVE_BUFFER_SEC):
+        self.idle_s = idle_s
+        self.buffer_s = buffer_s
+        self._sessions: Dict[str, LiveSession] = {}
+        self._lock = threading.Lock()
+
+    def _prune(self) -> None:
+        now = time.time()
+        for key, live in list(self._sessions.items()):
+            if now - live.updated > self.idle_s:
+                del self._sessions[key]
+
+    def open(self, session_id: str) -> LiveSession:
+        """Sessione live esistente (riconnessione del telefono) o nuova."""
+        with self._lock:
+            self._prune()
+            live = self._sessions.get(session_id)
+            if live is None:
+                live = self._sessions[session_id] = LiveSession(session_id, self.buffer_s)
+            return live
+
+    def get(self, session_id: str) -> Optional[LiveSession]:
+        with self._lock:
+            self._prune()
+            return self._sessions.get(session_id)
+
+    def list(self) -> List[str]:
+        with self._lock:
+            self._prune()
+            return sorted(self._sessions)
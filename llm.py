@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+DEFAULT_GEMINI_MODEL = 'gemini-1.5-flash'
+
+# Server locale compatibile con l'API di Ollama
+DEFAULT_OLLAMA_URL = os.environ.get('BCP_OLLAMA_URL', 'http://localhost:11434')
+DEFAULT_OLLAMA_MODEL = 'llama3.1'
+OLLAMA_TIMEOUT_SEC = 300
+
+# Cache delle risposte: un file JSON per chiave
+RESPONSE_CACHE_DIRNAME = '.llm_cache'
+CACHE_KEY_VERSION = 2
+
+# Cifre significative dei valori di telemetria nel prompt (e quindi nella chiave della cache)
+SUMMARY_SIGNIFICANT_DIGITS = 6
+
+DEFAULT_BATCH_WORKERS = 4
+
+
+# ============================================================================
+# BACKENDS
+# ============================================================================
+# Ogni backend espone:
+#   name: identificativo (backend:modello), parte della chiave della cache
+#   supports_files: True se accetta i PDF caricati come allegati
+#   generate(system_prompt, user_prompt, attachments) -> testo
+
+class GeminiBackend:
+    """Modello cloud via google.generativeai (modulo già configurato passato dal chiamante)."""
+
+    supports_files = True
+
+    def __init__(self, genai, model_name: str = DEFAULT_GEMINI_MODEL):
+        self.genai = genai
+        self.model_name = model_name
+        self.name = f"gemini:{model_name}"
+
+    def generate(self, system_prompt: str, user_prompt: str, attachments: Optional[List] = None) -> str:
+        model = self.genai.GenerativeModel(model_name=self.model_name, system_instruction=system_prompt)
+        # Gemini 1.5 supporta nativamente una lista mista di testo e file
+        return model.generate_content([user_prompt] + list(attachments or [])).text
+
+
+class OllamaBackend:
+    """Modello locale via HTTP (API /api/chat di Ollama). Nessun allegato: usare i passaggi dell'indice locale."""
+
+    supports_files = False
+
+    def __init__(self, url: str = DEFAULT_OLLAMA_URL, model_name: str = DEFAULT_OLLAMA_MODEL,
+                 timeout_s: float = OLLAMA_TIMEOUT_SEC):
+        self.url = url.rstrip('/')
+        self.model_name = model_name
+        self.timeout_s = timeout_s
+        self.name = f"ollama:{model_name}"
+
+    def generate(self, system_prompt: str, user_prompt: str, attachments: Optional[List] = None) -> str:
+        if attachments:
+            raise ValueError("Ollama backend does not accept file attachments")
+        body = json.dumps({
+            'model': self.model_name,
+            'stream': False,
+            'options': {'temperature': 0},
+            'messages': [{'role': 'system', 'content': system_prompt},
+                         {'role': 'user', 'content': user_prompt}],
+        }).encode()
+        request = urllib.request.Request(f"{self.url}/api/chat", data=body,
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout_s) as response:
+            return json.loads(response.read())['message']['content']
+
+
+class StubBackend:
+    """Backend deterministico senza rete: stessa richiesta, stessa risposta. Conta le chiamate."""
+
+    supports_files = True
+
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.name = 'stub'
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, system_prompt: str, user_prompt: str, attachments: Optional[List] = None) -> str:
+        time.sleep(self.latency_s)
+        with self._lock:
+            self.calls += 1
+        digest = hashlib.sha256(f"{system_prompt}\0{user_prompt}".encode()).hexdigest()[:12]
+        lines = [line.strip() for line in user_prompt.splitlines() if line.strip().startswith('-')]
+        return f"[stub {digest}] {len(attachments or [])} allegati\n" + '\n'.join(lines)
+
+
+def make_backend(kind: str, model_name: Optional[str] = None, genai=None, url: str = DEFAULT_OLLAMA_URL):
+    if kind == 'gemini':
+        if genai is None:
+            raise ValueError("Gemini backend requires google.generativeai")
+        return GeminiBackend(genai, model_name or DEFAULT_GEMINI_MODEL)
+    if kind == 'ollama':
+        return OllamaBackend(url, model_name or DEFAULT_OLLAMA_MODEL)
+    if kind == 'stub':
+        return StubBackend()
+    raise ValueError(f"Unknown LLM backend: {kind}")
+
+
+# ============================================================================
+# RESPONSE CACHE
+# ============================================================================
+
+def normalize_summary(summary: Dict) -> Dict:
+    """Riassunto della telemetria con chiavi ordinate e numeri a precisione fissa."""
+    normalized = {}
+    for key in sorted(summary):
+        value = summary[key]
+        if isinstance(value, (float, np.floating)):
+            value = float(f"{float(value):.{SUMMARY_SIGNIFICANT_DIGITS}g}")
+        elif isinstance(value, np.integer):
+            value = int(value)
+        normalized[str(key)] = value
+    return normalized
+
+
+def response_key(backend_name: str, user_prompt: str, system_prompt: str, kb_version: str) -> str:
+    """
+    Chiave della cache: il prompt utente già costruito, cioè esattamente
+    il testo inviato al modello (riassunto, note, passaggi dell'indice e
+    il template di build_prompt), più backend, system prompt e knowledge base.
+    """
+    payload = json.dumps({
+        'v': CACHE_KEY_VERSION,
+        'backend': backend_name,
+        'user': user_prompt,
+        'system': system_prompt.strip(),
+        'kb': kb_version,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Risposte già generate, una per file in `<folder>/<chiave>.json`.
+    Scritture atomiche: più report in parallelo non si intralciano.
+    """
+
+    def __init__(self, folder: str = RESPONSE_CACHE_DIRNAME):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)['text']
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return None
+
+    def put(self, key: str, text: str, backend_name: str) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'text': text, 'backend': backend_name, 'created_at': time.time()}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+# ============================================================================
+# REPORT AGENT
+# ============================================================================
+
+class ReportAgent:
+    """
+    Genera i report con un backend intercambiabile, passando dalla cache.
+
+    Il prompt è costruito dal chiamante (`build_prompt(summary, notes, passages)`,
+    col riassunto normalizzato); la chiave della cache è l'impronta del prompt
+    costruito, del backend, del system prompt e della versione della
+    knowledge base.
+
+    Usage:
+        agent = ReportAgent(StubBackend(), SYSTEM_PROMPT, build_prompt, ResponseCache(), kb_version)
+        text, cached = agent.report(summary, notes)
+    """
+
+    def __init__(self, backend, system_prompt: str, build_prompt, cache: Optional[ResponseCache] = None,
+                 kb_version: str = ''):
+        self.backend = backend
+        self.system_prompt = system_prompt
+        self.build_prompt = build_prompt
+        self.cache = cache
+        self.kb_version = kb_version
+
+    def prompt(self, summary: Dict, notes: str, passages: Optional[str] = None) -> str:
+        return self.build_prompt(normalize_summary(summary), notes, passages)
+
+    def key(self, user_prompt: str) -> str:
+        return response_key(self.backend.name, user_prompt, self.system_prompt, self.kb_version)
+
+    def report(self, summary: Dict, notes: str, attachments: Optional[List] = None,
+               passages: Optional[str] = None) -> Tuple[str, bool]:
+        """Returns: (testo del report, True se preso dalla cache)."""
+        user_prompt = self.prompt(summary, notes, passages)
+        key = self.key(user_prompt)
+        if self.cache is not None:
+            text = self.cache.get(key)
+            if text is not None:
+                return text, True
+        text = self.backend.generate(self.system_prompt, user_prompt, attachments)
+        if self.cache is not None:
+            self.cache.put(key, text, self.backend.name)
+        return text, False
+
+    def batch(self, jobs: List[Dict], attachments: Optional[List] = None,
+              workers: int = DEFAULT_BATCH_WORKERS) -> List[Dict]:
+        """
+        Report per molte sessioni in parallelo. Ogni job ha 'summary', 'notes'
+        e opzionalmente 'passages'; richieste identiche vengono generate una volta.
+
+        Returns:
+            Per ogni job, nell'ordine: {'text', 'cached', 'error'}
+        """
+        keys = [self.key(self.prompt(job['summary'], job.get('notes', ''), job.get('passages'))) for job in jobs]
+        first_job = {}
+        for key, job in zip(keys, jobs):
+            first_job.setdefault(key, job)
+
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            futures = {key: pool.submit(self.report, job['summary'], job.get('notes', ''),
+                                        attachments, job.get('passages'))
+                       for key, job in first_job.items()}
+
+        results = {}
+        for key, future in futures.items():
+            try:
+                text, cached = future.result()
+                results[key] = {'text': text, 'cached': cached, 'error': None}
+            except Exception as e:
+                results[key] = {'text': None, 'cached': False, 'error': str(e)}
+        return [dict(results[key]) for key in keys]
@@ -0,0 +1,378 @@
+import os
+import io
+import sys
+import json
+import time
+import uuid
+import shutil
+import logging
+import argparse
+import tempfile
+import itertools
+import threading
+import subprocess
+import http.client
+import urllib.request
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+
+import train
+from synthetic import generate_ride
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+ENDPOINTS = ('upload', 'upload_and_analyze', 'analysis')
+
+DEFAULT_CONCURRENCY = [1, 2, 4, 8]
+DEFAULT_REQUESTS = 20
+DEFAULT_RIDE_S = 60
+DEFAULT_SENSORS = 2
+DEFAULT_PORT = 8077
+
+# Prefisso delle sessioni create dal test (rimosse a fine run)
+SESSION_PREFIX = 'loadtest'
+# Marcatore scritto dal test in ogni sessione che crea: senza, la sessione non si tocca
+SESSION_MARKER_FILENAME = '.loadtest'
+
+# Saturazione: raddoppiare la concorrenza porta meno del 10% di throughput
+SATURATION_GAIN = 0.10
+
+REQUEST_TIMEOUT_S = 300
+GUNICORN_STARTUP_TIMEOUT_S = 30
+
+
+# ============================================================================
+# PAYLOAD
+# ============================================================================
+
+def build_ride(duration_s: float, sensors: int) -> bytes:
+    """File telemetria sintetico (vedi synthetic.generate_ride) in memoria."""
+    with tempfile.TemporaryDirectory(prefix='bcp_load_') as tmp:
+        path = os.path.join(tmp, 'ride.bin')
+        generate_ride(path, sensors=sensors, duration_s=duration_s, seed=0)
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+def bike_config_json(sensors: int) -> str:
+    return json.dumps({'type': 'enduro', 'hardware': {'sensor_count': sensors, 'sample_rate': 120}})
+
+
+def encode_multipart(fields: Dict[str, str], files: Dict[str, Tuple[str, bytes]]) -> Tuple[bytes, str]:
+    """Corpo multipart/form-data per i client HTTP senza dipendenze esterne."""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data) in files.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                   f'Content-Type: application/octet-stream\r\n\r\n'.encode())
+        body.write(data)
+        body.write(b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode())
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+# ============================================================================
+# CLIENTS
+# ============================================================================
+
+class InProcessClient:
+    """
+    Richieste all'app Flask nello stesso processo, tramite il test client.
+
+    Nessun socket né serializzazione HTTP: misura il costo degli handler.
+    I thread condividono il GIL, come i thread del server di sviluppo.
+    """
+
+    def __init__(self):
+        self.app = train.app
+        self.upload_folder = train.UPLOAD_FOLDER
+        self.local = threading.local()
+
+    def request(self, method: str, path: str, fields: Optional[Dict[str, str]] = None,
+                files: Optional[Dict[str, Tuple[str, bytes]]] = None) -> Tuple[int, bytes]:
+        if not hasattr(self.local, 'client'):
+            self.local.client = self.app.test_client()
+        data = dict(fields or {})
+        for name, (filename, payload) in (files or {}).items():
+            data[name] = (io.BytesIO(payload), filename)
+        response = self.local.client.open(path, method=method, data=data or None,
+                                          content_type='multipart/form-data' if files else None)
+        return response.status_code, response.get_data()
+
+
+class HttpClient:
+    """Richieste HTTP reali (es. gunicorn locale), una connessione keep-alive per thread."""
+
+    def __init__(self, base_url: str):
+        url = urlparse(base_url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.upload_folder = None
+        self.local = threading.local()
+
+    def request(self, method: str, path: str, fields: Optional[Dict[str, str]] = None,
+                files: Optional[Dict[str, Tuple[str, bytes]]] = None) -> Tuple[int, bytes]:
+        body, headers = None, {}
+        if fields or files:
+            body, content_type = encode_multipart(fields or {}, files or {})
+            headers['Content-Type'] = content_type
+
+        for attempt in range(2):
+            if not hasattr(self.local, 'conn'):
+                self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=REQUEST_TIMEOUT_S)
+            try:
+                self.local.conn.request(method, path, body=body, headers=headers)
+                response = self.local.conn.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # Connessione chiusa dal server (es. worker riavviato): un solo nuovo tentativo
+                self.local.conn.close()
+                del self.local.conn
+                if attempt:
+                    raise
+
+
+# ============================================================================
+# SCENARIOS
+# ============================================================================
+
+def make_request(client, endpoint: str, seq: int, run_id: str, ride: bytes, sensors: int,
+                 analysis_id: Optional[str]) -> Tuple[int, bytes]:
+    if endpoint == 'analysis':
+        return client.request('GET', f'/api/analysis/{analysis_id}')
+
+    route = '/api/upload' if endpoint == 'upload' else '/api/upload_and_analyze'
+    fields = {'session_name': f'{SESSION_PREFIX}_{run_id}_{seq}', 'bike_config': bike_config_json(sensors)}
+    status, body = client.request('POST', route, fields=fields, files={'file': ('ride.bin', ride)})
+    if status == 200 and client.upload_folder:
+        mark_test_session(client.upload_folder, json.loads(body)['session_id'], run_id)
+    return status, body
+
+
+def mark_test_session(upload_folder: str, session_id: str, run_id: str) -> None:
+    """Segna una sessione come creata dal test di carico (unica condizione per rimuoverla)."""
+    session_dir = os.path.join(upload_folder, session_id)
+    if os.path.isdir(session_dir):
+        with open(os.path.join(session_dir, SESSION_MARKER_FILENAME), 'w') as f:
+            f.write(run_id)
+
+
+def seed_analysis_session(client, run_id: str, ride: bytes, sensors: int) -> str:
+    """Carica una sessione da interrogare con /api/analysis/<id>."""
+    status, body = make_request(client, 'upload', 0, f'{run_id}_seed', ride, sensors, None)
+    if status != 200:
+        raise RuntimeError(f"Seed upload failed with HTTP {status}: {body[:200]!r}")
+    return json.loads(body)['session_id']
+
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+def summarize(latencies: List[float], errors: int, wall_s: float, concurrency: int) -> Dict:
+    total = len(latencies)
+    lat_ms = np.array(latencies) * 1000.0 if total else np.zeros(1)
+    p50, p95, p99 = np.percentile(lat_ms, [50, 95, 99])
+    return {
+        'concurrency': concurrency,
+        'requests': total,
+        'errors': errors,
+        'error_rate': errors / total if total else 0.0,
+        'throughput_rps': total / wall_s if wall_s > 0 else 0.0,
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'wall_s': round(wall_s, 3),
+    }
+
+
+def run_level(client, endpoint: str, concurrency: int, n_requests: int, run_id: str, ride: bytes,
+              sensors: int, analysis_id: Optional[str] = None) -> Dict:
+    """
+    `n_requests` richieste verso un endpoint con `concurrency` client paralleli.
+
+    Ogni client invia la richiesta successiva appena riceve la risposta
+    (modello a ciclo chiuso), quindi il throughput misurato è quello che il
+    server sostiene a quella concorrenza.
+    """
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies = []
+    errors = 0
+
+    def worker():
+        nonlocal errors
+        while True:
+            seq = next(counter)
+            if seq >= n_requests:
+                return
+            started = time.perf_counter()
+            try:
+                status, _ = make_request(client, endpoint, seq, run_id, ride, sensors, analysis_id)
+                failed = status >= 400
+            except Exception as e:
+                logging.debug(f"Request {endpoint}#{seq} failed: {e}")
+                failed = True
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                errors += failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return summarize(latencies, errors, time.perf_counter() - started, concurrency)
+
+
+def find_saturation(levels: List[Dict]) -> Optional[Dict]:
+    """
+    Primo livello oltre il quale più concorrenza non porta throughput.
+
+    Returns:
+        Il livello saturo, None se il throughput cresce fino all'ultimo
+    """
+    for previous, current in zip(levels, levels[1:]):
+        if current['throughput_rps'] < previous['throughput_rps'] * (1.0 + SATURATION_GAIN):
+            return previous
+    return None
+
+
+def sweep(client, endpoints: List[str], concurrency: List[int], n_requests: int, ride: bytes,
+          sensors: int) -> Dict[str, Dict]:
+    run_id = uuid.uuid4().hex[:8]
+    analysis_id = seed_analysis_session(client, run_id, ride, sensors) if 'analysis' in endpoints else None
+    results = {}
+
+    for endpoint in endpoints:
+        print(f"\n▶ {endpoint}")
+        levels = []
+        for c in concurrency:
+            stats = run_level(client, endpoint, c, n_requests, f'{run_id}_c{c}', ride, sensors, analysis_id)
+            levels.append(stats)
+            print(f"  c={c:<4} {stats['throughput_rps']:8.2f} req/s  p50 {stats['p50_ms']:9.1f} ms  "
+                  f"p95 {stats['p95_ms']:9.1f} ms  p99 {stats['p99_ms']:9.1f} ms  errors {stats['error_rate']:6.1%}")
+
+        saturation = find_saturation(levels)
+        if saturation:
+            print(f"  ⚡ saturates at concurrency {saturation['concurrency']} "
+                  f"({saturation['throughput_rps']:.2f} req/s)")
+        else:
+            print("  ⚡ no saturation within the sweep")
+        results[endpoint] = {
+            'levels': levels,
+            'saturation_concurrency': saturation['concurrency'] if saturation else None
+        }
+
+    return results
+
+
+# ============================================================================
+# TARGETS
+# ============================================================================
+
+def wait_healthy(base_url: str, timeout_s: float) -> None:
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'{base_url}/api/health', timeout=2) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} not healthy after {timeout_s:.0f}s")
+
+
+@contextmanager
+def local_gunicorn(workers: int, port: int, threads: int = 1) -> Iterator[str]:
+    """Avvia `gunicorn train:app` sulla porta indicata e lo ferma all'uscita."""
+    base_url = f'http://127.0.0.1:{port}'
+    cmd = [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(threads),
+           '--bind', f'127.0.0.1:{port}', '--timeout', str(REQUEST_TIMEOUT_S), '--log-level', 'warning',
+           'train:app']
+    process = subprocess.Popen(cmd)
+    try:
+        wait_healthy(base_url, GUNICORN_STARTUP_TIMEOUT_S)
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def remove_test_sessions(upload_folder: str) -> int:
+    """
+    Elimina le sessioni create dal test di carico.
+
+    Servono sia il prefisso sia il marcatore scritto da `mark_test_session`:
+    una sessione reale chiamata "loadtest_..." non viene mai rimossa.
+    """
+    removed = 0
+    if not os.path.isdir(upload_folder):
+        return removed
+    for name in os.listdir(upload_folder):
+        session_dir = os.path.join(upload_folder, name)
+        if name.startswith(f'{SESSION_PREFIX}_') and os.path.isfile(os.path.join(session_dir, SESSION_MARKER_FILENAME)):
+            shutil.rmtree(session_dir, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Test di carico degli endpoint Flask')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS), help='Endpoint da misurare')
+    parser.add_argument('--concurrency', nargs='+', type=int, default=DEFAULT_CONCURRENCY, help='Livelli di concorrenza')
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help='Richieste per livello')
+    parser.add_argument('--ride-s', type=float, default=DEFAULT_RIDE_S, help='Durata dell\'uscita sintetica [s]')
+    parser.add_argument('--sensors', type=int, default=DEFAULT_SENSORS, help='Sensori dell\'uscita sintetica')
+    parser.add_argument('--url', type=str, default=None, help='Server già avviato (es. http://127.0.0.1:8000)')
+    parser.add_argument('--gunicorn', type=int, default=None, metavar='WORKERS', help='Avvia gunicorn locale con N worker')
+    parser.add_argument('--threads', type=int, default=1, help='Thread per worker gunicorn')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Porta del gunicorn locale')
+    parser.add_argument('--output', type=str, default=None, help='Salva i risultati in JSON')
+    parser.add_argument('--keep-sessions', action='store_true', help='Non eliminare le sessioni create')
+
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    concurrency = sorted(set(c for c in args.concurrency if c > 0))
+    if not concurrency or args.requests < 1:
+        print("ERRORE: concurrency e requests devono essere positivi")
+        sys.exit(1)
+
+    ride = build_ride(args.ride_s, args.sensors)
+    print(f"Synthetic ride: {len(ride) / 1e6:.2f} MB, {args.sensors} sensors, {args.ride_s:.0f}s")
+
+    if args.gunicorn:
+        target = f'gunicorn x{args.gunicorn} (threads {args.threads})'
+        with local_gunicorn(args.gunicorn, args.port, args.threads) as base_url:
+            client = HttpClient(base_url)
+            client.upload_folder = train.UPLOAD_FOLDER
+            results = sweep(client, args.endpoints, concurrency, args.requests, ride, args.sensors)
+    else:
+        client = HttpClient(args.url) if args.url else InProcessClient()
+        target = args.url or 'in-process'
+        results = sweep(client, args.endpoints, concurrency, args.requests, ride, args.sensors)
+
+    # Le sessioni di test si possono rimuovere solo se il server è locale
+    if not args.keep_sessions and client.upload_folder:
+        print(f"\nRemoved {remove_test_sessions(client.upload_folder)} test sessions")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'created_at': time.time(), 'target': target, 'ride_bytes': len(ride),
+                       'requests_per_level': args.requests, 'endpoints': results}, f, indent=2)
+
+    failed = any(level['errors'] for result in results.values() for level in result['levels'])
+    sys.exit(1 if failed else 0)
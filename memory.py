@@ -0,0 +1,314 @@
+import os
+import json
+import time
+import logging
+import struct
+import resource
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+from fifo import DEMUX_HEADER_FORMAT, FIFO_WORD_SIZE, SAMPLE_TAGS
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Intervallo di campionamento della RSS durante un'analisi
+RSS_SAMPLE_INTERVAL_SEC = 0.02
+
+# Modello del picco di un'analisi sopra la RSS di partenza. Coefficienti
+# misurati su uscite sintetiche a 4 sensori (1-2 h); tarare con i record
+# stima vs misura (memory_plan.json delle sessioni, o il log BCP_MEMORY_PLAN_LOG).
+PLAN_FIXED_MB = 16.0               # indici, buffer di I/O, tabelle
+
+# Campioni per parola FIFO: dipendono dalla compressione (parole 2x/3x) e
+# dalla BDR (quota di parole TS), quindi si misurano dai tag di un
+# sottoinsieme di pacchetti per sensore (~0.98 senza compressione, ~2.8
+# con la 3x). Senza payload leggibile si assume il massimo, tutte parole 3x
+PLAN_SAMPLES_PER_TAG = {tag: {'2x': 2, '3x': 3}.get(mode, 1) for tag, (_, mode) in SAMPLE_TAGS.items()}
+PLAN_SAMPLES_PER_WORD_MAX = 3.0
+PLAN_TAG_SAMPLE_PACKETS = 1024     # pacchetti letti per sensore (~70 KB)
+
+# Frazione della MemAvailable del sistema che una singola analisi può usare
+PLAN_MEMAVAILABLE_FRACTION = 0.8
+# Byte per campione della sessione, per modalità, in ordine di preferenza
+# (la prima che sta nel budget vince). In entrambe la SessionData, eventi,
+# feature e finestre sono interamente in memoria: non esiste un percorso in
+# streaming. 'memory': CSV interi e allineamento di tutti i sensori insieme;
+# 'lean': CSV letti a blocchi e allineamento un sensore alla volta, che
+# abbassano solo i due transitori più alti (misurati ~75 vs ~57 B/campione,
+# coefficienti con ~8% di margine)
+PLAN_PEAK_BYTES = {'memory': 80, 'lean': 62}
+PLAN_CHUNK_ROWS = 200_000
+
+MEMORY_PLAN_FILENAME = 'memory_plan.json'
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_DEMUX_HEADER_SIZE = struct.calcsize(DEMUX_HEADER_FORMAT)
+
+
+# ============================================================================
+# RSS MEASUREMENT
+# ============================================================================
+
+def current_rss_bytes() -> int:
+    """
+    RSS attuale del processo.
+
+    Su Linux (Raspberry Pi) legge /proc/self/statm; altrove ripiega sul
+    picco di getrusage, che è il meglio disponibile senza dipendenze.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS riporta byte, Linux kilobyte
+        return maxrss if maxrss > 1 << 32 else maxrss * 1024
+
+
+def available_memory_mb() -> Optional[float]:
+    """MemAvailable del sistema [MB], None dove /proc/meminfo non esiste."""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, IndexError, ValueError):
+        pass
+    return None
+
+
+class PeakRSSMonitor:
+    """
+    Misura il picco di RSS durante un blocco di codice.
+
+    Un thread daemon campiona la RSS ogni RSS_SAMPLE_INTERVAL_SEC; con
+    richieste concorrenti il picco è quello del processo, non della
+    singola analisi.
+
+    Usage:
+        with PeakRSSMonitor() as mem:
+            ...
+        mem.peak_mb, mem.delta_mb
+    """
+
+    def __init__(self, interval_s: float = RSS_SAMPLE_INTERVAL_SEC):
+        self.interval_s = interval_s
+        self.baseline_bytes = 0
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        self.peak_bytes = max(self.peak_bytes, current_rss_bytes())
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self._sample()
+
+    def __enter__(self) -> 'PeakRSSMonitor':
+        self.baseline_bytes = current_rss_bytes()
+        self.peak_bytes = self.baseline_bytes
+        self._thread = threading.Thread(target=self._run, name='rss-monitor', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    @property
+    def peak_mb(self) -> float:
+        return self.peak_bytes / (1024 * 1024)
+
+    @property
+    def delta_mb(self) -> float:
+        return (self.peak_bytes - self.baseline_bytes) / (1024 * 1024)
+
+    def check_budget(self, headroom_mb: float, label: str = 'Analysis') -> bool:
+        """Logga il picco e segnala se la crescita ha superato il margine dell'analisi."""
+        within = self.delta_mb <= headroom_mb
+        message = f"🧠 {label} peak RSS: {self.peak_mb:.1f} MB (+{self.delta_mb:.1f} MB, headroom {headroom_mb} MB)"
+        if within:
+            logging.info(message)
+        else:
+            logging.warning(f"{message} - BUDGET EXCEEDED")
+        return within
+
+
+# ============================================================================
+# MEMORY PLANNER
+# ============================================================================
+
+class MemoryBudgetError(RuntimeError):
+    """L'analisi stimata non sta nel margine nemmeno in modalità 'lean'."""
+
+
+class MemoryPlan:
+    """
+    Modalità di esecuzione scelta prima della decodifica.
+
+    Attributes:
+        mode: 'memory' (caricamento intero), 'lean' (picco ridotto, vedi PLAN_PEAK_BYTES) o 'reject'
+        samples: Campioni stimati per sensore (conn_handle -> n)
+        samples_per_word: Campioni per parola FIFO usati nella stima, per sensore
+        estimates_mb: Picco stimato sopra la RSS attuale per ogni modalità
+        headroom_mb: Margine configurato per un'analisi
+        available_mb: Margine effettivo (limitato dalla MemAvailable del sistema)
+    """
+
+    def __init__(self, mode: str, samples: Dict[int, int], samples_per_word: Dict[int, float],
+                 estimates_mb: Dict[str, float], headroom_mb: float, available_mb: float):
+        self.mode = mode
+        self.samples = samples
+        self.samples_per_word = samples_per_word
+        self.estimates_mb = estimates_mb
+        self.headroom_mb = headroom_mb
+        self.available_mb = available_mb
+
+    @property
+    def estimate_mb(self) -> float:
+        """Picco stimato della modalità scelta (della più leggera se rifiutata)."""
+        return self.estimates_mb.get(self.mode, min(self.estimates_mb.values()))
+
+    def to_dict(self) -> Dict:
+        return {
+            'mode': self.mode,
+            'samples': {str(k): v for k, v in self.samples.items()},
+            'samples_per_word': {str(k): round(v, 3) for k, v in self.samples_per_word.items()},
+            'estimates_mb': {k: round(v, 1) for k, v in self.estimates_mb.items()},
+            'headroom_mb': self.headroom_mb,
+            'available_mb': round(self.available_mb, 1),
+        }
+
+
+def estimate_peak_mb(samples: Dict[int, int], mode: str) -> float:
+    """
+    Picco di memoria dell'analisi sopra la RSS di partenza [MB].
+
+    Il picco è la SessionData residente (20 B/campione) più il transitorio
+    dello stadio più pesante, l'allineamento tra sensori: entrambi crescono
+    col numero totale di campioni.
+    """
+    return PLAN_FIXED_MB + sum(samples.values()) * PLAN_PEAK_BYTES[mode] / (1024 * 1024)
+
+
+def measure_samples_per_word(file_path: str, packet_index: np.ndarray,
+                             max_packets: int = PLAN_TAG_SAMPLE_PACKETS) -> Dict[int, float]:
+    """
+    Campioni per parola FIFO di ogni sensore, dai tag delle parole di al più
+    `max_packets` pacchetti equispaziati (la compressione può cambiare
+    lungo l'uscita). Legge pochi KB anche per file di ore.
+
+    Args:
+        file_path: File .bin multi-sensore originale
+        packet_index: Indice degli header del demux (campi offset, conn_handle, data_size)
+
+    Returns:
+        Dict conn_handle -> campioni per parola (PLAN_SAMPLES_PER_WORD_MAX se
+        il payload non è leggibile)
+    """
+    per_tag = np.zeros(256, dtype=np.float64)
+    for tag, n in PLAN_SAMPLES_PER_TAG.items():
+        per_tag[tag] = n
+
+    ratios = {}
+    with open(file_path, 'rb') as f:
+        for handle in np.unique(packet_index['conn_handle']):
+            packets = packet_index[packet_index['conn_handle'] == handle]
+            picks = np.unique(np.linspace(0, len(packets) - 1, min(max_packets, len(packets))).astype(np.int64))
+            words = samples = 0
+            for packet in packets[picks]:
+                f.seek(int(packet['offset']) + _DEMUX_HEADER_SIZE)
+                payload = np.frombuffer(f.read(int(packet['data_size'])), dtype=np.uint8)
+                # Tag nei 5 bit alti del primo byte di ogni parola
+                tags = payload[:len(payload) - len(payload) % FIFO_WORD_SIZE:FIFO_WORD_SIZE] >> 3
+                words += len(tags)
+                samples += per_tag[tags].sum()
+            ratios[int(handle)] = samples / words if words else PLAN_SAMPLES_PER_WORD_MAX
+    return ratios
+
+
+def analysis_headroom_mb(headroom_mb: float) -> float:
+    """Margine di un'analisi: quello configurato, se la MemAvailable del sistema lo consente."""
+    available = available_memory_mb()
+    if available is None:
+        return headroom_mb
+    return min(headroom_mb, available * PLAN_MEMAVAILABLE_FRACTION)
+
+
+def plan_memory(packet_index: np.ndarray, headroom_mb: float,
+                samples_per_word: Optional[Dict[int, float]] = None,
+                word_size: int = FIFO_WORD_SIZE) -> MemoryPlan:
+    """
+    Sceglie la modalità di esecuzione dalla tabella degli header dei pacchetti.
+
+    I campioni per sensore si stimano dai byte di payload (parole FIFO x
+    campioni per parola, vedi measure_samples_per_word). Le stime sono
+    crescite sopra la RSS di partenza e si confrontano col margine
+    dell'analisi, non con la RSS assoluta del worker (librerie caricate,
+    cache, altre analisi): quello che le altre analisi tolgono al sistema
+    lo misura la MemAvailable.
+
+    Args:
+        packet_index: Array con campi conn_handle e data_size (un record per pacchetto)
+        headroom_mb: Memoria che un'analisi può aggiungere alla RSS del processo [MB]
+        samples_per_word: Campioni per parola per sensore (default PLAN_SAMPLES_PER_WORD_MAX)
+        word_size: Byte per parola FIFO
+
+    Returns:
+        MemoryPlan con la modalità più veloce che sta nel margine
+    """
+    handles, inverse = np.unique(packet_index['conn_handle'], return_inverse=True)
+    payload = np.bincount(inverse, weights=packet_index['data_size'].astype(np.float64), minlength=len(handles))
+    ratios = {int(h): (samples_per_word or {}).get(int(h), PLAN_SAMPLES_PER_WORD_MAX) for h in handles}
+    samples = {int(h): int(b / word_size * ratios[int(h)]) for h, b in zip(handles, payload)}
+
+    estimates = {mode: estimate_peak_mb(samples, mode) for mode in PLAN_PEAK_BYTES}
+    available = analysis_headroom_mb(headroom_mb)
+
+    mode = next((m for m in PLAN_PEAK_BYTES if estimates[m] <= available), 'reject')
+    return MemoryPlan(mode, samples, ratios, estimates, headroom_mb, available)
+
+
+def record_memory_plan(plan: Optional[MemoryPlan], monitor: PeakRSSMonitor, actual_samples: int,
+                       session_dir: str, headroom_mb: float, log_path: Optional[str] = None) -> Dict:
+    """
+    Salva stima e misura: memory_plan.json nella sessione (esposto da
+    GET /api/analysis, con l'eventuale sforamento del margine) e una riga
+    in `log_path` (JSONL) per tarare i coefficienti PLAN_* su molte
+    sessioni. Senza `plan` (CSV caricato direttamente) salva solo la misura.
+    """
+    record = plan.to_dict() if plan is not None else {'mode': None, 'headroom_mb': headroom_mb}
+    record.update(
+        session=os.path.basename(os.path.normpath(session_dir)),
+        recorded_at=time.time(),
+        estimated_samples=sum(plan.samples.values()) if plan is not None else None,
+        actual_samples=int(actual_samples),
+        actual_delta_mb=round(monitor.delta_mb, 1),
+        actual_peak_mb=round(monitor.peak_mb, 1),
+        within_headroom=monitor.delta_mb <= headroom_mb,
+    )
+    record['estimate_ratio'] = (round(plan.estimate_mb / monitor.delta_mb, 2)
+                                if plan is not None and monitor.delta_mb > 0 else None)
+
+    with open(os.path.join(session_dir, MEMORY_PLAN_FILENAME), 'w') as f:
+        json.dump(record, f, indent=2)
+    if log_path:
+        with open(log_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+    return record
+
+
+def load_memory_plan(session_dir: str) -> Optional[Dict]:
+    """memory_plan.json della sessione, None se l'analisi non l'ha scritto."""
+    path = os.path.join(session_dir, MEMORY_PLAN_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
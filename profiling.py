@@ -0,0 +1,147 @@
+import os
+import sys
+import time
+import cProfile
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Sottocartella della sessione con i profili catturati
+PROFILE_DIRNAME = 'profiles'
+PROFILE_EXTENSIONS = ('.pstats', '.collapsed')
+
+# Intervallo del campionatore di stack
+SAMPLE_INTERVAL_SEC = 0.005
+
+
+# ============================================================================
+# PROFILER
+# ============================================================================
+
+# Un solo profilo per processo: da Python 3.12 cProfile.enable() con un
+# altro profiler attivo solleva ValueError
+_active_profile = threading.Lock()
+
+def collapse_stack(frame) -> str:
+    """Stack di un frame nel formato "collapsed" (radice;...;foglia) dei flame graph."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class RequestProfiler:
+    """
+    Profilo di una richiesta: cProfile deterministico più un campionatore
+    di stack sul thread della richiesta.
+
+    Il .pstats dà tempi e chiamate per funzione (snakeviz, pstats); il
+    .collapsed dà gli stack campionati per i flame graph (flamegraph.pl,
+    speedscope). Il campionatore gira mentre cProfile è attivo, quindi le
+    proporzioni risentono del suo overhead sulle funzioni molto brevi.
+
+    Le richieste concorrenti non vengono profilate: `start` restituisce
+    None finché un altro profilo è attivo.
+
+    Usage:
+        profiler = RequestProfiler().start()
+        if profiler is not None:
+            ...
+            profiler.stop()
+            profiler.save(session_dir, 'upload_and_analyze')
+    """
+
+    def __init__(self, interval_s: float = SAMPLE_INTERVAL_SEC):
+        self.interval_s = interval_s
+        self.profile = cProfile.Profile()
+        self.samples = Counter()
+        self.started = 0.0
+        self.elapsed_s = 0.0
+        self._target = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._active = False
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self._target)
+            if frame is not None:
+                self.samples[collapse_stack(frame)] += 1
+
+    def start(self) -> Optional['RequestProfiler']:
+        """Avvia il profilo, None se un altro profilo è già attivo nel processo."""
+        if not _active_profile.acquire(blocking=False):
+            return None
+        self._target = threading.get_ident()
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, name='request-profiler', daemon=True)
+        self._thread.start()
+        try:
+            self.profile.enable()
+        except ValueError:
+            # Profiler esterno al modulo già attivo (debugger, coverage, ...)
+            self._stop.set()
+            self._thread.join()
+            _active_profile.release()
+            return None
+        self._active = True
+        return self
+
+    def stop(self) -> None:
+        if not self._active:
+            return
+        self.profile.disable()
+        self.elapsed_s = time.perf_counter() - self.started
+        self._stop.set()
+        self._thread.join()
+        self._active = False
+        _active_profile.release()
+
+    def save(self, session_dir: str, label: str) -> str:
+        """
+        Scrive <timestamp>_<label>.pstats e .collapsed in <session>/profiles.
+
+        Returns:
+            Nome base dei file salvati
+        """
+        directory = os.path.join(session_dir, PROFILE_DIRNAME)
+        os.makedirs(directory, exist_ok=True)
+        base = f"{time.strftime('%Y%m%d-%H%M%S')}_{int(self.elapsed_s * 1000)}ms_{label}"
+
+        self.profile.dump_stats(os.path.join(directory, f"{base}.pstats"))
+        with open(os.path.join(directory, f"{base}.collapsed"), 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return base
+
+
+# ============================================================================
+# STORAGE
+# ============================================================================
+
+def list_profiles(session_dir: str) -> List[Dict]:
+    """Profili catturati di una sessione, dal più recente."""
+    directory = os.path.join(session_dir, PROFILE_DIRNAME)
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if not name.endswith(PROFILE_EXTENSIONS):
+            continue
+        stat = os.stat(os.path.join(directory, name))
+        profiles.append({'name': name, 'bytes': stat.st_size, 'created_at': stat.st_mtime})
+    return sorted(profiles, key=lambda p: (p['created_at'], p['name']), reverse=True)
+
+
+def profile_path(session_dir: str, name: str) -> Optional[str]:
+    """Path di un profilo catturato, None se il nome non è tra quelli elencati."""
+    if name not in {p['name'] for p in list_profiles(session_dir)}:
+        return None
+    return os.path.join(session_dir, PROFILE_DIRNAME, name)
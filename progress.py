@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Un canale concluso resta disponibile per chi si collega in ritardo
+PROGRESS_RETENTION_SEC = 300
+
+# Commento SSE periodico: tiene aperta la connessione attraverso i proxy
+HEARTBEAT_SEC = 15
+
+# Attesa massima di chi si iscrive a un'analisi che non parte: poi evento
+# 'timeout' e lo stream si chiude
+PENDING_TIMEOUT_SEC = 120
+
+# Eventi che chiudono lo stream
+TERMINAL_EVENTS = ('done', 'error')
+
+# Gli eventi sono anche scritti in progress.jsonl nella sessione: con più
+# worker gunicorn l'iscritto può finire in un processo diverso
+# dall'analisi e legge da lì, rileggendo il file ogni PROGRESS_POLL_SEC
+PROGRESS_FILENAME = 'progress.jsonl'
+PROGRESS_POLL_SEC = 0.5
+
+
+# ============================================================================
+# PROGRESS CHANNEL
+# ============================================================================
+
+class ProgressChannel:
+    """
+    Eventi di avanzamento di un'analisi, in ordine e numerati.
+
+    Gli eventi restano nel canale: chi si collega tardi (o si ricollega
+    con Last-Event-ID) riceve tutto quello che ha perso. Con `path` ogni
+    evento viene anche aggiunto al file, per gli iscritti degli altri
+    worker (FileProgressChannel).
+    """
+
+    def __init__(self, key: str, path: Optional[str] = None):
+        self.key = key
+        self.path = path
+        self.created = time.time()
+        self.started = False
+        self.finished_at: Optional[float] = None
+        self.events: List[Tuple[int, str, Dict]] = []
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def publish(self, name: str, data: Dict) -> None:
+        with self._cond:
+            event_id = len(self.events) + 1
+            self.events.append((event_id, name, data))
+            if name in TERMINAL_EVENTS:
+                self.finished_at = time.time()
+            if self.path is not None:
+                self._append(event_id, name, data)
+            self._cond.notify_all()
+
+    def _append(self, event_id: int, name: str, data: Dict) -> None:
+        # Una riga intera per write(): chi legge non vede mai mezzo evento
+        line = json.dumps({'id': event_id, 'event': name, 'data': data}, separators=(',', ':')) + '\n'
+        try:
+            with open(self.path, 'a') as f:
+                f.write(line)
+        except OSError as e:
+            logging.warning(f"Progress file write failed ({self.path}): {e}")
+
+    def wait(self, last_id: int, timeout: float) -> Tuple[List[Tuple[int, str, Dict]], bool]:
+        """
+        Eventi successivi a `last_id`, attendendo fino a `timeout` se non ce ne sono.
+
+        Returns:
+            (eventi nuovi, True se il canale è concluso)
+        """
+        with self._cond:
+            if len(self.events) <= last_id and not self.finished:
+                self._cond.wait(timeout)
+            return self.events[last_id:], self.finished
+
+
+class FileProgressChannel:
+    """
+    Canale letto dal progress.jsonl di una sessione, scritto da un
+    ProgressChannel forse in un altro processo. Stessa interfaccia di
+    ProgressChannel per sse_stream(): l'analisi è partita quando il file
+    esiste.
+    """
+
+    def __init__(self, key: str, path: str, poll_s: float = PROGRESS_POLL_SEC):
+        self.key = key
+        self.path = path
+        self.poll_s = poll_s
+        self.events: List[Tuple[int, str, Dict]] = []
+
+    @property
+    def started(self) -> bool:
+        return os.path.exists(self.path)
+
+    @property
+    def finished(self) -> bool:
+        return bool(self.events) and self.events[-1][1] in TERMINAL_EVENTS
+
+    def _reload(self) -> None:
+        try:
+            with open(self.path, 'r') as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return
+        events = []
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            events.append((record['id'], record['event'], record['data']))
+        self.events = events
+
+    def wait(self, last_id: int, timeout: float) -> Tuple[List[Tuple[int, str, Dict]], bool]:
+        """Come ProgressChannel.wait(), rileggendo il file ogni `poll_s`."""
+        deadline = time.monotonic() + timeout
+        while True:
+            self._reload()
+            remaining = deadline - time.monotonic()
+            if len(self.events) > last_id or self.finished or remaining <= 0:
+                return self.events[last_id:], self.finished
+            time.sleep(min(self.poll_s, remaining))
+
+
+class ProgressRegistry:
+    """
+    Canali di avanzamento per chiave (ID sessione) delle analisi di questo
+    processo; una nuova analisi della stessa sessione apre un canale nuovo.
+    Gli iscritti senza un canale qui leggono il file (FileProgressChannel).
+    """
+
+    def __init__(self, retention_s: float = PROGRESS_RETENTION_SEC):
+        self.retention_s = retention_s
+        self._channels: Dict[str, ProgressChannel] = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float) -> None:
+        for key, channel in list(self._channels.items()):
+            since = channel.finished_at if channel.finished else (None if channel.started else channel.created)
+            if since is not None and now - since > self.retention_s:
+                del self._channels[key]
+
+    def open(self, key: str, path: Optional[str] = None) -> ProgressChannel:
+        """
+        Canale per una nuova analisi (lato pipeline). Con `path` il file
+        degli eventi viene azzerato e poi scritto a ogni evento.
+        """
+        with self._lock:
+            self._prune(time.time())
+            channel = self._channels[key] = ProgressChannel(key, path)
+            channel.started = True
+        if path is not None:
+            try:
+                open(path, 'w').close()
+            except OSError as e:
+                logging.warning(f"Progress file reset failed ({path}): {e}")
+        return channel
+
+    def get(self, key: str) -> Optional[ProgressChannel]:
+        """Canale corrente di una chiave in questo processo, None se non esiste."""
+        with self._lock:
+            self._prune(time.time())
+            return self._channels.get(key)
+
+
+# ============================================================================
+# PIPELINE HOOKS
+# ============================================================================
+
+_current_channel: ContextVar[Optional[ProgressChannel]] = ContextVar('bcp_progress_channel', default=None)
+
+
+def bind_progress(channel: Optional[ProgressChannel]):
+    """Collega il canale al contesto corrente; ritorna il token per unbind_progress()."""
+    return _current_channel.set(channel)
+
+
+def unbind_progress(token) -> None:
+    _current_channel.reset(token)
+
+
+def emit(name: str, **data) -> None:
+    """Pubblica un evento sul canale del contesto corrente (nessun effetto senza canale)."""
+    channel = _current_channel.get()
+    if channel is not None:
+        channel.publish(name, data)
+
+
+# ============================================================================
+# SERVER-SENT EVENTS
+# ============================================================================
+
+def sse_event(event_id: int, name: str, data: Dict) -> str:
+    return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def sse_stream(channel, last_id: int = 0, heartbeat_s: float = HEARTBEAT_SEC,
+               pending_timeout_s: float = PENDING_TIMEOUT_SEC) -> Iterator[str]:
+    """
+    Stream SSE del canale (ProgressChannel o FileProgressChannel) da
+    `last_id` in poi; termina dopo l'evento
+    conclusivo, o con un evento 'timeout' se l'analisi non parte entro
+    `pending_timeout_s`.
+    """
+    # Il client si ricollega dopo 2 s se la connessione cade
+    yield "retry: 2000\n\n"
+    deadline = time.monotonic() + pending_timeout_s
+    while True:
+        remaining = deadline - time.monotonic()
+        if not channel.started and remaining <= 0:
+            data = json.dumps({'error': 'Analysis did not start', 'waited_s': pending_timeout_s}, separators=(',', ':'))
+            yield f"event: timeout\ndata: {data}\n\n"
+            return
+        events, finished = channel.wait(last_id, heartbeat_s if channel.started else min(heartbeat_s, remaining))
+        for event_id, name, data in events:
+            yield sse_event(event_id, name, data)
+            last_id = event_id
+        if finished and not events:
+            return
+        if not events and (channel.started or time.monotonic() < deadline):
+            yield ": keepalive\n\n"
@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import time
+import logging
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+import train
+from storage import open_maybe_compressed
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+MANIFEST_FILENAME = 'reprocess_manifest.json'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# File di ingresso che determinano il risultato dell'analisi
+INPUT_CONFIG_FILES = ('bike_config.json', 'session_config.json')
+
+
+# ============================================================================
+# MANIFEST
+# ============================================================================
+
+def input_hash(session_dir: str, telemetry_path: str, calibration: str = '') -> str:
+    """
+    SHA-256 del file telemetria, delle configurazioni della sessione e
+    dell'impronta della calibrazione applicata alla decodifica.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"calibration:{calibration}".encode())
+    for path in [telemetry_path] + [os.path.join(session_dir, name) for name in INPUT_CONFIG_FILES]:
+        if not (os.path.exists(path) or os.path.exists(f"{path}.gz")):
+            continue
+        digest.update(os.path.basename(path).encode())
+        with open_maybe_compressed(path) as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(path: str) -> Dict[str, Dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f).get('sessions', {})
+
+
+def save_manifest(path: str, sessions: Dict[str, Dict]) -> None:
+    """Scrittura atomica: un'interruzione lascia sempre un manifest valido."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'updated_at': time.time(), 'sessions': sessions}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def is_current(entry: Optional[Dict], digest: str) -> bool:
+    return (
+        entry is not None
+        and entry.get('status') == 'ok'
+        and entry.get('input_hash') == digest
+        and entry.get('pipeline_version') == train.PIPELINE_VERSION
+    )
+
+
+# ============================================================================
+# WORKER
+# ============================================================================
+
+def init_worker(verbose: bool) -> None:
+    """I log della pipeline coprirebbero l'avanzamento: solo warning ed errori."""
+    if not verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+
+def reprocess_session(session_dir: str, telemetry_path: str, digest: str) -> Dict:
+    """
+    Rifà demux, decodifica e artefatti derivati di una sessione.
+    Eseguita nei processi del pool: non solleva mai, riporta l'esito.
+    Uno stadio derivato fallito rende la sessione 'error': verrà ritentata.
+    """
+    started = time.time()
+    entry = {'input_hash': digest, 'pipeline_version': train.PIPELINE_VERSION}
+    try:
+        bike_config = train.load_session_bike_config(session_dir)
+        session = train.analyze_session(telemetry_path, session_dir, bike_config, strict=True)
+        entry.update(status='ok', sensors=len(session))
+    except Exception as e:
+        entry.update(status='error', error=str(e))
+    entry.update(duration_s=round(time.time() - started, 3), processed_at=time.time())
+    return entry
+
+
+# ============================================================================
+# BATCH
+# ============================================================================
+
+def plan_sessions(upload_folder: str, manifest: Dict[str, Dict], force: bool, only: Optional[List[str]]):
+    """
+    Sessioni da riprocessare e sessioni già aggiornate.
+
+    Returns:
+        (lista di (session_id, session_dir, telemetry_path, hash), numero saltate)
+    """
+    todo = []
+    skipped = 0
+    for session_id in sorted(os.listdir(upload_folder)):
+        session_dir = os.path.join(upload_folder, session_id)
+        if not os.path.isdir(session_dir) or (only and session_id not in only):
+            continue
+        telemetry_path = train.find_session_telemetry(session_dir)
+        if telemetry_path is None:
+            continue
+        device_id = train.extract_device_id(train.load_session_bike_config(session_dir))
+        digest = input_hash(session_dir, telemetry_path, train.calibration_store.fingerprint(device_id))
+        if not force and is_current(manifest.get(session_id), digest):
+            skipped += 1
+            continue
+        todo.append((session_id, session_dir, telemetry_path, digest))
+    return todo, skipped
+
+
+def run_batch(
+    upload_folder: str,
+    workers: int,
+    force: bool = False,
+    only: Optional[List[str]] = None,
+    verbose: bool = False
+) -> int:
+    """
+    Riprocessa tutte le sessioni non aggiornate in un pool di processi.
+
+    Il manifest viene salvato dopo ogni sessione completata, quindi un
+    run interrotto riprende da dove si era fermato.
+
+    Returns:
+        Numero di sessioni fallite
+    """
+    manifest_path = os.path.join(upload_folder, MANIFEST_FILENAME)
+    manifest = load_manifest(manifest_path)
+    todo, skipped = plan_sessions(upload_folder, manifest, force, only)
+
+    print(f"Pipeline v{train.PIPELINE_VERSION}: {len(todo)} sessions to process, {skipped} up to date")
+    if not todo:
+        return 0
+
+    failed = 0
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(verbose,)) as pool:
+        futures = {
+            pool.submit(reprocess_session, session_dir, telemetry_path, digest): session_id
+            for session_id, session_dir, telemetry_path, digest in todo
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            session_id = futures[future]
+            entry = future.result()
+            manifest[session_id] = entry
+            save_manifest(manifest_path, manifest)
+
+            if entry['status'] == 'ok':
+                print(f"[{done}/{len(todo)}] ✅ {session_id} ({entry['duration_s']:.1f}s)")
+            else:
+                failed += 1
+                print(f"[{done}/{len(todo)}] ❌ {session_id}: {entry['error']}")
+
+    print(f"Done in {time.time() - started:.1f}s: {len(todo) - failed} ok, {failed} failed, {skipped} skipped")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Riprocessa in batch le sessioni in uploads/')
+    parser.add_argument('--uploads', type=str, default=train.UPLOAD_FOLDER, help='Cartella delle sessioni')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processi paralleli')
+    parser.add_argument('--force', action='store_true', help='Riprocessa anche le sessioni già aggiornate')
+    parser.add_argument('--session', action='append', default=None, help='Solo questa sessione (ripetibile)')
+    parser.add_argument('--verbose', action='store_true', help='Mostra i log della pipeline')
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.uploads):
+        print(f"ERRORE: Cartella {args.uploads} non trovata")
+        sys.exit(1)
+
+    sys.exit(1 if run_batch(args.uploads, max(args.workers, 1), args.force, args.session, args.verbose) else 0)
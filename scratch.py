@@ -0,0 +1,194 @@
+import os
+import shutil
+import logging
+import tempfile
+import threading
+from typing import Optional
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# tmpfs per gli intermedi (niente scritture sulla SD del Raspberry Pi)
+SCRATCH_RAM_ROOT = '/dev/shm'
+SCRATCH_PREFIX = 'bcp_scratch_'
+
+# Tetto complessivo degli intermedi in RAM, condiviso tra i worker
+DEFAULT_RAM_CAP_MB = 128
+
+# Margine lasciato libero sul tmpfs (è memoria del sistema)
+RAM_FREE_MARGIN_MB = 32
+
+# Spazio libero sotto cui il tmpfs si considera pieno (scrittura fallita per ENOSPC)
+RAM_FULL_BYTES = 1024 * 1024
+
+# Sottocartella della sessione usata quando la RAM non basta
+DISK_SCRATCH_PREFIX = '.scratch_'
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+_reserve_lock = threading.Lock()
+
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+def ram_scratch_usage(root: str = SCRATCH_RAM_ROOT) -> int:
+    """Byte occupati da tutte le aree scratch in RAM (anche di altri processi)."""
+    total = 0
+    try:
+        entries = [e for e in os.scandir(root) if e.name.startswith(SCRATCH_PREFIX) and e.is_dir()]
+    except OSError:
+        return 0
+    for entry in entries:
+        for dirpath, _, files in os.walk(entry.path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, name))
+                except OSError:
+                    pass
+    return total
+
+
+def remove_stale(root: str, prefix: str) -> None:
+    """Elimina le aree scratch lasciate da processi terminati (pid nel nome)."""
+    try:
+        entries = [e for e in os.scandir(root) if e.name.startswith(prefix) and e.is_dir()]
+    except OSError:
+        return
+    for entry in entries:
+        pid = entry.name[len(prefix):].split('_', 1)[0]
+        if not pid.isdigit():
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            shutil.rmtree(entry.path, ignore_errors=True)
+        except PermissionError:
+            pass
+
+
+def commit_file(src_path: str, dest_path: str) -> str:
+    """
+    Sposta un file nella destinazione finale con rename atomico.
+
+    Tra filesystem diversi (tmpfs -> SD) copia prima in un .tmp accanto alla
+    destinazione: un lettore vede il file vecchio o quello completo, mai
+    uno parziale.
+
+    Returns:
+        dest_path
+    """
+    try:
+        os.replace(src_path, dest_path)
+        return dest_path
+    except OSError:
+        pass
+    tmp_path = f"{dest_path}.tmp"
+    with open(src_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(tmp_path, dest_path)
+    os.remove(src_path)
+    return dest_path
+
+
+# ============================================================================
+# SCRATCH SPACE
+# ============================================================================
+
+class ScratchSpace:
+    """
+    Area temporanea per gli intermedi di un'analisi.
+
+    Ogni file viene messo in RAM (tmpfs) se la sua dimensione stimata sta
+    nel tetto condiviso e nello spazio libero del tmpfs, altrimenti in una
+    sottocartella nascosta della sessione su disco. I file finali passano
+    nella sessione con commit(); all'uscita tutto il resto viene eliminato.
+    Il tetto è verificato sullo spazio già occupato: analisi concorrenti
+    possono superarlo di quanto hanno appena riservato.
+
+    Usage:
+        with ScratchSpace(session_dir) as scratch:
+            tmp = scratch.path('ride_sensor_0.csv', estimated_bytes)
+            ...
+            scratch.commit(tmp, os.path.join(session_dir, 'ride_sensor_0.csv'))
+    """
+
+    def __init__(self, fallback_dir: str, ram_cap_mb: float = DEFAULT_RAM_CAP_MB,
+                 ram_root: str = SCRATCH_RAM_ROOT):
+        self.fallback_dir = fallback_dir
+        self.ram_cap_bytes = int(ram_cap_mb * 1024 * 1024)
+        self.ram_root = ram_root
+        self.ram_dir: Optional[str] = None
+        self.disk_dir: Optional[str] = None
+
+    def __enter__(self) -> 'ScratchSpace':
+        remove_stale(self.fallback_dir, DISK_SCRATCH_PREFIX)
+        if self.ram_cap_bytes > 0 and os.access(self.ram_root, os.W_OK):
+            remove_stale(self.ram_root, SCRATCH_PREFIX)
+            self.ram_dir = tempfile.mkdtemp(prefix=f"{SCRATCH_PREFIX}{os.getpid()}_", dir=self.ram_root)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        for directory in (self.ram_dir, self.disk_dir):
+            if directory is not None:
+                shutil.rmtree(directory, ignore_errors=True)
+        self.ram_dir = self.disk_dir = None
+
+    def _fits_in_ram(self, nbytes: int) -> bool:
+        if self.ram_dir is None:
+            return False
+        if ram_scratch_usage(self.ram_root) + nbytes > self.ram_cap_bytes:
+            return False
+        return shutil.disk_usage(self.ram_root).free - nbytes > RAM_FREE_MARGIN_MB * 1024 * 1024
+
+    def _disk(self) -> str:
+        if self.disk_dir is None:
+            self.disk_dir = tempfile.mkdtemp(prefix=f"{DISK_SCRATCH_PREFIX}{os.getpid()}_", dir=self.fallback_dir)
+        return self.disk_dir
+
+    def directory(self, nbytes: int) -> str:
+        """Cartella per `nbytes` di intermedi: RAM se c'è posto, altrimenti disco."""
+        with _reserve_lock:
+            if self._fits_in_ram(nbytes):
+                return self.ram_dir
+        logging.info(f"💾 Scratch spill to disk ({nbytes / 2**20:.1f} MB)")
+        return self._disk()
+
+    def path(self, name: str, nbytes: int) -> str:
+        """Path di un intermedio di dimensione stimata `nbytes`."""
+        return os.path.join(self.directory(nbytes), name)
+
+    def disk_path(self, name: str) -> str:
+        """Path su disco (es. per ripetere una scrittura che ha riempito il tmpfs)."""
+        return os.path.join(self._disk(), name)
+
+    def in_ram(self, path: str) -> bool:
+        return self.ram_dir is not None and os.path.dirname(path) == self.ram_dir
+
+    def exhausted(self, path: str) -> bool:
+        """
+        True se una scrittura fallita di `path` si spiega con la RAM: il
+        tmpfs è pieno (ENOSPC) o gli intermedi hanno superato il tetto
+        perché la stima era troppo bassa. Solo in questi casi ha senso
+        ripeterla su disco; gli altri errori si ripeterebbero uguali.
+        """
+        if not self.in_ram(path):
+            return False
+        if ram_scratch_usage(self.ram_root) > self.ram_cap_bytes:
+            return True
+        return shutil.disk_usage(self.ram_root).free < RAM_FULL_BYTES
+
+    def release(self, path: str) -> None:
+        """Elimina subito un intermedio non più necessario (libera la RAM)."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def commit(self, path: str, dest_path: str) -> str:
+        return commit_file(path, dest_path)
@@ -0,0 +1,173 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Tag types nel CSV decodificato
+TAG_GYRO = 0
+TAG_ACC = 1
+
+# Tag -> gruppo; l'ordine dei tag è l'ordine dei gruppi in memoria
+TAG_GROUPS = {TAG_GYRO: 'gyro', TAG_ACC: 'acc'}
+GROUPS = ('acc', 'gyro')
+AXES = ('x', 'y', 'z')
+
+_GROUP_SLOT = {group: slot for slot, group in enumerate(TAG_GROUPS[tag] for tag in sorted(TAG_GROUPS))}
+
+
+# ============================================================================
+# SESSION DATA
+# ============================================================================
+
+class SessionData:
+    """
+    Campioni decodificati e calibrati di una sessione, in memoria.
+
+    Tutti i sensori condividono due array contigui: `time_ms` (int64) e
+    `values` (float32, (n, 3)). Ogni sensore occupa un tratto contiguo,
+    ordinato una sola volta per tag e poi per tempo, così ogni coppia
+    (sensore, gruppo) è una fetta [start, end) della tabella `offsets`.
+    Tutte le letture restituiscono viste, mai copie.
+
+    Usage:
+        t, acc_z = session.channel(2, 'acc', 'z', t0=10_000, t1=20_000)
+    """
+
+    __slots__ = ('sensors', 'time_ms', 'values', 'offsets')
+
+    def __init__(self, sensors: np.ndarray, time_ms: np.ndarray, values: np.ndarray, offsets: np.ndarray):
+        self.sensors = sensors
+        self.time_ms = time_ms
+        self.values = values
+        self.offsets = offsets
+
+    @classmethod
+    def build(
+        cls,
+        parts: Iterable[Tuple[int, np.ndarray, np.ndarray, np.ndarray]],
+        calibrate: Callable[[int, str, np.ndarray], np.ndarray]
+    ) -> 'SessionData':
+        """
+        Costruisce la sessione dai campioni grezzi di ogni sensore.
+
+        Args:
+            parts: (conn_handle, timestamp, tag, counts int16 (n, 3)) per sensore
+            calibrate: (conn_handle, gruppo, counts) -> valori float32 (n, 3)
+
+        Returns:
+            SessionData con i sensori in ordine di conn_handle
+        """
+        parts = sorted(parts, key=lambda part: part[0])
+        n_groups = len(TAG_GROUPS)
+        tags_sorted = np.array(sorted(TAG_GROUPS))
+
+        # Campioni con tag sconosciuti (es. temperatura) restano fuori
+        kept = [np.isin(tags, tags_sorted) for _, _, tags, _ in parts]
+        total = int(sum(mask.sum() for mask in kept))
+
+        sensors = np.array([part[0] for part in parts], dtype=np.uint16)
+        time_ms = np.empty(total, dtype=np.int64)
+        values = np.empty((total, 3), dtype=np.float32)
+        offsets = np.zeros(len(parts) * n_groups + 1, dtype=np.int64)
+
+        pos = 0
+        for i, ((sensor, timestamps, tags, counts), mask) in enumerate(zip(parts, kept)):
+            tags = tags[mask]
+            order = np.lexsort((timestamps[mask], tags))
+            tags = tags[order]
+            bounds = pos + np.searchsorted(tags, tags_sorted, side='left')
+            offsets[i * n_groups:(i + 1) * n_groups] = bounds
+            n = len(order)
+
+            time_ms[pos:pos + n] = timestamps[mask][order]
+            sensor_counts = counts[mask][order]
+            for slot, tag in enumerate(tags_sorted):
+                start = bounds[slot] - pos
+                end = (bounds[slot + 1] - pos) if slot + 1 < n_groups else n
+                if end > start:
+                    values[pos + start:pos + end] = calibrate(int(sensor), TAG_GROUPS[int(tag)], sensor_counts[start:end])
+            pos += n
+
+        offsets[-1] = pos
+        return cls(sensors, time_ms, values, offsets)
+
+    def __len__(self) -> int:
+        return len(self.sensors)
+
+    def __contains__(self, sensor: int) -> bool:
+        return bool(np.any(self.sensors == sensor))
+
+    @property
+    def nbytes(self) -> int:
+        return self.time_ms.nbytes + self.values.nbytes + self.offsets.nbytes
+
+    def _span(self, sensor: int, group: str) -> Tuple[int, int]:
+        matches = np.flatnonzero(self.sensors == sensor)
+        if len(matches) == 0:
+            raise KeyError(f"Sensor {sensor} not in session")
+        if group not in _GROUP_SLOT:
+            raise KeyError(f"Unknown sensor group: {group}")
+        k = int(matches[0]) * len(TAG_GROUPS) + _GROUP_SLOT[group]
+        return int(self.offsets[k]), int(self.offsets[k + 1])
+
+    def group(
+        self,
+        sensor: int,
+        group: str,
+        t0: Optional[float] = None,
+        t1: Optional[float] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Timestamp e blocco (n, 3) di un gruppo, opzionalmente in [t0, t1].
+
+        Returns:
+            (time_ms, values) come viste sugli array della sessione
+
+        Raises:
+            KeyError: Se sensore o gruppo non esistono
+        """
+        start, end = self._span(sensor, group)
+        t = self.time_ms[start:end]
+        lo = 0 if t0 is None else int(np.searchsorted(t, t0, side='left'))
+        hi = len(t) if t1 is None else int(np.searchsorted(t, t1, side='right'))
+        return t[lo:hi], self.values[start + lo:start + hi]
+
+    def channel(
+        self,
+        sensor: int,
+        group: str,
+        axis: str,
+        t0: Optional[float] = None,
+        t1: Optional[float] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Come group(), ma per un singolo asse ('x', 'y', 'z')."""
+        if axis not in AXES:
+            raise KeyError(f"Unknown axis: {axis}")
+        t, block = self.group(sensor, group, t0, t1)
+        return t, block[:, AXES.index(axis)]
+
+    def streams(self) -> Dict[int, Dict[str, Tuple[np.ndarray, np.ndarray]]]:
+        """Vista conn_handle -> {gruppo -> (timestamp, valori)} per gli stadi di analisi."""
+        return {
+            int(sensor): {group: self.group(int(sensor), group) for group in GROUPS}
+            for sensor in self.sensors
+        }
+
+    def describe(self) -> List[Dict]:
+        """Conteggio campioni e intervallo temporale per sensore e gruppo."""
+        info = []
+        for sensor in self.sensors:
+            for group in GROUPS:
+                t, _ = self.group(int(sensor), group)
+                info.append({
+                    'sensor': int(sensor),
+                    'group': group,
+                    'samples': len(t),
+                    't_start_ms': int(t[0]) if len(t) else None,
+                    't_end_ms': int(t[-1]) if len(t) else None
+                })
+        return info
@@ -0,0 +1,159 @@
+from typing import Dict, Tuple
+
+import numpy as np
+from scipy import signal
+from scipy.signal import sosfilt, sosfilt_zi
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Bande di frequenza MTB (zone di tuning), come in telemetry_analyzer.py
+FREQUENCY_BANDS = {
+    'low': (0.5, 5.0),     # Pilot input / telaio
+    'mid': (5.0, 15.0),    # Lavoro sospensione
+    'high': (15.0, 50.0),  # Harshness / chatter
+}
+
+WELCH_NPERSEG = 1024
+
+# Punti della PSD decimata (griglia logaritmica) salvata nei riassunti
+PSD_POINTS = 64
+PSD_MIN_FREQ_HZ = 0.5
+
+
+# ============================================================================
+# SPECTRAL HELPERS
+# ============================================================================
+
+def welch_psd(data: np.ndarray, fs: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    PSD con metodo di Welch, segmento adattato alla lunghezza del segnale.
+
+    Args:
+        data: Segnale (n,) oppure blocco di canali (n, k); la media viene rimossa
+        fs: Frequenza di campionamento [Hz]
+
+    Returns:
+        (freqs, psd) con psd di forma (n_freqs,) oppure (n_freqs, k)
+    """
+    nperseg = min(WELCH_NPERSEG, len(data))
+    return signal.welch(data, fs, nperseg=nperseg, axis=0)
+
+
+def band_energies(freqs: np.ndarray, psd: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Energia integrata (trapezi) in ciascuna banda di FREQUENCY_BANDS.
+
+    Args:
+        freqs: Frequenze della PSD
+        psd: PSD (n_freqs,) oppure (n_freqs, n_channels)
+
+    Returns:
+        Dict banda -> energia (scalare o array per canale)
+    """
+    energies = {}
+    for name, (f_lo, f_hi) in FREQUENCY_BANDS.items():
+        mask = (freqs >= f_lo) & (freqs < f_hi)
+        if mask.sum() > 1:
+            energies[name] = np.trapz(psd[mask], freqs[mask], axis=0)
+        else:
+            energies[name] = np.zeros(psd.shape[1:])
+    return energies
+
+
+def dominant_frequency(freqs: np.ndarray, psd: np.ndarray) -> np.ndarray:
+    """Frequenza del picco più alto della PSD per canale (esclusa la DC)."""
+    if len(psd) < 2:
+        return np.zeros(psd.shape[1:])
+    return freqs[1:][np.argmax(psd[1:], axis=0)]
+
+
+def decimate_psd(freqs: np.ndarray, psd: np.ndarray, fs: float, points: int = PSD_POINTS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Riduce la PSD a una griglia logaritmica fissa fino a Nyquist.
+
+    Sessioni con la stessa frequenza di campionamento condividono la stessa
+    griglia, così le curve si possono sovrapporre direttamente.
+
+    Returns:
+        (freqs, psd) con `points` elementi
+    """
+    grid = np.geomspace(PSD_MIN_FREQ_HZ, fs / 2.0, points)
+    return grid, np.interp(grid, freqs, psd)
+
+
+# ============================================================================
+# FILTERING
+# ============================================================================
+
+def _odd_extension(x: np.ndarray, n: int) -> np.ndarray:
+    """Estensione dispari lungo l'asse 0 (stessa convenzione di filtfilt)."""
+    left = 2 * x[0] - x[n:0:-1]
+    right = 2 * x[-1] - x[-2:-n - 2:-1]
+    return np.concatenate((left, x, right))
+
+
+def sosfiltfilt_lean(sos: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """
+    Filtraggio a fase zero lungo l'asse 0 che conserva il dtype dell'input.
+
+    scipy.signal.sosfiltfilt promuove sempre a float64; qui coefficienti e
+    condizioni iniziali sono portati al dtype del segnale, così un segnale
+    float32 resta float32 in tutti i passaggi intermedi.
+
+    Args:
+        sos: Sezioni del filtro (butter(..., output='sos'))
+        x: Segnale (n,) oppure (n, k), float32 o float64
+
+    Returns:
+        Segnale filtrato con lo stesso dtype e la stessa forma di x
+
+    Raises:
+        ValueError: Se il segnale è più corto del padding del filtro
+    """
+    dtype = x.dtype if x.dtype in (np.float32, np.float64) else np.float64
+    x = x.astype(dtype, copy=False)
+    padlen = 3 * (2 * len(sos) + 1 - min((sos[:, 2] == 0).sum(), (sos[:, 5] == 0).sum()))
+    if len(x) <= padlen:
+        raise ValueError(f"Signal length ({len(x)}) must exceed padlen ({padlen})")
+
+    sos = sos.astype(dtype)
+    zi = sosfilt_zi(sos).astype(dtype).reshape((len(sos), 2) + (1,) * (x.ndim - 1))
+
+    ext = _odd_extension(x, padlen)
+    y, _ = sosfilt(sos, ext, axis=0, zi=zi * ext[0])
+    y = y[::-1]
+    y, _ = sosfilt(sos, y, axis=0, zi=zi * y[0])
+    return np.ascontiguousarray(y[::-1][padlen:-padlen])
+
+
+def minmax_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Indici per decimazione min/max (per i grafici) senza cicli Python.
+
+    Ogni bucket contribuisce con l'indice del minimo e del massimo, così i
+    picchi restano visibili anche con pochi punti.
+
+    Args:
+        y: Segnale 1D
+        max_points: Numero massimo di punti in uscita
+
+    Returns:
+        Indici ordinati (tutti se il segnale è già abbastanza corto)
+    """
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+
+    bucket = -(-n // (max_points // 2))
+    n_full = (n // bucket) * bucket
+    blocks = y[:n_full].reshape(-1, bucket)
+    offsets = np.arange(len(blocks)) * bucket
+
+    idx = np.stack((blocks.argmin(axis=1) + offsets, blocks.argmax(axis=1) + offsets), axis=1)
+    idx = np.sort(idx, axis=1).ravel()
+    if n_full < n:
+        idx = np.append(idx, n - 1)
+    return idx
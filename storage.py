@@ -0,0 +1,341 @@
+import os
+import re
+import gzip
+import time
+import shutil
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Quota della cartella uploads oltre la quale si liberano artefatti derivati
+DEFAULT_QUOTA_MB = 4096
+
+# Sessioni non lette da più di N giorni vengono compresse
+DEFAULT_COLD_AFTER_DAYS = 14
+
+# Intervallo tra due passate del gestore in background
+DEFAULT_SWEEP_INTERVAL_SEC = 600
+
+COMPRESS_LEVEL = 6
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Marker il cui mtime è l'ultimo accesso alla sessione, aggiornato al più
+# una volta per intervallo: le letture non diventano una scrittura ciascuna
+ACCESS_MARKER = '.last_access'
+ACCESS_TOUCH_INTERVAL_SEC = 300
+LOCK_FILENAME = '.storage.lock'
+
+# Lock di una sessione: tenuto da analisi e ricostruzioni, le passate del
+# gestore saltano le sessioni occupate
+SESSION_LOCK_FILENAME = '.session.lock'
+
+# Intermedi del demux, inutili dopo la decodifica
+INTERMEDIATE_PATTERN = re.compile(r'_sensor_\d+\.bin$')
+
+# File grandi compressi a freddo: telemetria originale e CSV decodificati
+COLD_PATTERN = re.compile(r'\.bin$|_sensor_\d+\.csv$')
+
+# Artefatti derivati rigenerabili (eventi, finestre e colonne di
+# esportazione alla prima richiesta, allineamento con il riprocessamento).
+# I profili catturati (profiles/) non sono rigenerabili e non vengono mai liberati
+EVICTABLE_PATTERN = re.compile(r'^(events\.npy|aligned\.npz|windows_.*\.npz)$')
+EVICTABLE_DIRS = ('columns',)
+
+
+# ============================================================================
+# ACCESS TRACKING
+# ============================================================================
+
+def touch(session_dir: str, interval_s: float = ACCESS_TOUCH_INTERVAL_SEC) -> None:
+    """
+    Registra un accesso alla sessione (ordine LRU e sessioni fredde). Il
+    marker viene riscritto solo se più vecchio di `interval_s`.
+    """
+    marker = os.path.join(session_dir, ACCESS_MARKER)
+    try:
+        if time.time() - os.path.getmtime(marker) >= interval_s:
+            os.utime(marker)
+    except FileNotFoundError:
+        open(marker, 'a').close()
+    except OSError as e:
+        logging.debug(f"Access marker update failed for {session_dir}: {e}")
+
+
+def last_access(session_dir: str) -> float:
+    """Ultimo accesso registrato, altrimenti l'ultima modifica della cartella."""
+    try:
+        return os.path.getmtime(os.path.join(session_dir, ACCESS_MARKER))
+    except OSError:
+        return os.path.getmtime(session_dir)
+
+
+@contextmanager
+def session_lock(session_dir: str, blocking: bool = True) -> Iterator[bool]:
+    """
+    Lock esclusivo su file di una sessione, tra thread e processi.
+
+    Yields:
+        True se il lock è preso; False (solo con blocking=False) se è di
+        qualcun altro
+    """
+    with open(os.path.join(session_dir, SESSION_LOCK_FILENAME), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+# ============================================================================
+# COMPACTION & COMPRESSION
+# ============================================================================
+
+def compact_intermediates(session_dir: str) -> int:
+    """
+    Elimina i .bin per sensore del demux se il CSV decodificato esiste, e
+    le copie compresse superate da una nuova decodifica.
+
+    Returns:
+        Byte liberati
+    """
+    freed = 0
+    names = os.listdir(session_dir)
+    for name in names:
+        if name.endswith('.csv.gz') and name[:-len('.gz')] in names:
+            path = os.path.join(session_dir, name)
+            freed += os.path.getsize(path)
+            os.remove(path)
+            continue
+        if not INTERMEDIATE_PATTERN.search(name):
+            continue
+        csv_name = name[:-len('.bin')] + '.csv'
+        if not (os.path.exists(os.path.join(session_dir, csv_name))
+                or os.path.exists(os.path.join(session_dir, csv_name + '.gz'))):
+            continue
+        path = os.path.join(session_dir, name)
+        freed += os.path.getsize(path)
+        os.remove(path)
+    return freed
+
+
+def compress_file(path: str) -> int:
+    """
+    Sostituisce `path` con `path.gz` (scrittura atomica, mtime conservato).
+
+    Returns:
+        Byte risparmiati
+    """
+    gz_path = f"{path}.gz"
+    tmp_path = f"{gz_path}.tmp"
+    stat = os.stat(path)
+    with open(path, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=COMPRESS_LEVEL) as dst:
+        shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+    os.utime(tmp_path, (stat.st_atime, stat.st_mtime))
+    os.replace(tmp_path, gz_path)
+    os.remove(path)
+    return stat.st_size - os.path.getsize(gz_path)
+
+
+def restore_file(path: str) -> str:
+    """
+    Decompressione alla lettura: se esiste solo `path.gz`, ricrea `path`.
+
+    Returns:
+        `path`, pronto per essere letto
+    """
+    gz_path = f"{path}.gz"
+    if os.path.exists(path) or not os.path.exists(gz_path):
+        return path
+    tmp_path = f"{path}.tmp"
+    with gzip.open(gz_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+    os.replace(tmp_path, path)
+    os.remove(gz_path)
+    logging.info(f"📦 Restored {path}")
+    return path
+
+
+def open_maybe_compressed(path: str):
+    """Apre `path` in lettura binaria, oppure `path.gz` decompresso al volo."""
+    if not os.path.exists(path) and os.path.exists(f"{path}.gz"):
+        return gzip.open(f"{path}.gz", 'rb')
+    return open(path, 'rb')
+
+
+def compress_session(session_dir: str) -> int:
+    """Comprime telemetria e CSV di una sessione. Returns: byte risparmiati."""
+    saved = 0
+    for name in os.listdir(session_dir):
+        if COLD_PATTERN.search(name):
+            saved += compress_file(os.path.join(session_dir, name))
+    return saved
+
+
+def evict_derived(session_dir: str) -> int:
+    """Rimuove gli artefatti rigenerabili di una sessione. Returns: byte liberati."""
+    freed = 0
+    for name in os.listdir(session_dir):
+        path = os.path.join(session_dir, name)
+        if EVICTABLE_PATTERN.match(name):
+            freed += os.path.getsize(path)
+            os.remove(path)
+        elif name in EVICTABLE_DIRS and os.path.isdir(path):
+            freed += directory_size(path)
+            shutil.rmtree(path, ignore_errors=True)
+    return freed
+
+
+# ============================================================================
+# LIFECYCLE MANAGER
+# ============================================================================
+
+class StorageManager:
+    """
+    Ciclo di vita dei file delle sessioni, in un thread in background.
+
+    A ogni passata: compatta gli intermedi delle sessioni decodificate,
+    comprime le sessioni non lette da `cold_after_days` e, se la cartella
+    supera la quota, rimuove gli artefatti derivati partendo dalle sessioni
+    lette meno di recente. Con più worker gunicorn un lock su file fa sì
+    che la passata giri in un solo processo alla volta; le sessioni con il
+    session_lock preso (analisi in corso) vengono saltate.
+
+    Usage:
+        manager = StorageManager('uploads', quota_mb=4096).start()
+        manager.stats()
+    """
+
+    def __init__(
+        self,
+        upload_folder: str,
+        quota_mb: float = DEFAULT_QUOTA_MB,
+        cold_after_days: float = DEFAULT_COLD_AFTER_DAYS,
+        interval_s: float = DEFAULT_SWEEP_INTERVAL_SEC
+    ):
+        self.upload_folder = upload_folder
+        self.quota_bytes = int(quota_mb * 1024 * 1024)
+        self.cold_after_s = cold_after_days * 86400.0
+        self.interval_s = interval_s
+        self.last_sweep: Optional[Dict] = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sessions(self) -> List[str]:
+        # Le cartelle nascoste sono di lavoro (.import_*, .scratch_*, ...), non sessioni
+        return [
+            os.path.join(self.upload_folder, name) for name in os.listdir(self.upload_folder)
+            if not name.startswith('.') and os.path.isdir(os.path.join(self.upload_folder, name))
+        ]
+
+    def sweep(self) -> Optional[Dict]:
+        """
+        Una passata completa. Returns: statistiche, None se un altro processo la sta già eseguendo.
+        """
+        with open(os.path.join(self.upload_folder, LOCK_FILENAME), 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            try:
+                return self._sweep()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _sweep(self) -> Dict:
+        started = time.time()
+        stats = {'compacted_bytes': 0, 'compressed_sessions': 0, 'compressed_saved_bytes': 0,
+                 'evicted_sessions': 0, 'evicted_bytes': 0}
+        sessions = self._sessions()
+
+        for session_dir in sessions:
+            try:
+                with session_lock(session_dir, blocking=False) as locked:
+                    if not locked:
+                        continue
+                    stats['compacted_bytes'] += compact_intermediates(session_dir)
+                    if started - last_access(session_dir) > self.cold_after_s:
+                        saved = compress_session(session_dir)
+                        if saved:
+                            stats['compressed_sessions'] += 1
+                            stats['compressed_saved_bytes'] += saved
+            except OSError as e:
+                logging.error(f"Storage sweep failed on {session_dir}: {e}")
+
+        usage = directory_size(self.upload_folder)
+        for session_dir in sorted(sessions, key=last_access):
+            if usage <= self.quota_bytes:
+                break
+            try:
+                with session_lock(session_dir, blocking=False) as locked:
+                    freed = evict_derived(session_dir) if locked else 0
+            except OSError as e:
+                logging.error(f"Eviction failed on {session_dir}: {e}")
+                continue
+            if freed:
+                usage -= freed
+                stats['evicted_sessions'] += 1
+                stats['evicted_bytes'] += freed
+
+        if usage > self.quota_bytes:
+            logging.warning(f"⚠️  Storage still over quota after eviction: {usage / 2**20:.0f} MB "
+                            f"(quota {self.quota_bytes / 2**20:.0f} MB)")
+
+        stats.update(usage_bytes=usage, quota_bytes=self.quota_bytes, finished_at=time.time(),
+                     duration_s=round(time.time() - started, 3))
+        self.last_sweep = stats
+        logging.info(f"🧹 Storage sweep: {usage / 2**20:.0f} MB used, "
+                     f"{(stats['compacted_bytes'] + stats['compressed_saved_bytes'] + stats['evicted_bytes']) / 2**20:.1f} MB freed")
+        return stats
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                logging.error(f"Storage sweep error: {e}", exc_info=True)
+            if self._stop.wait(self.interval_s):
+                return
+
+    def start(self) -> 'StorageManager':
+        with self._start_lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='storage-manager', daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict:
+        return {
+            'quota_mb': round(self.quota_bytes / 2**20, 1),
+            'cold_after_days': self.cold_after_s / 86400.0,
+            'last_sweep': self.last_sweep,
+        }
@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from spectral import decimate_psd, FREQUENCY_BANDS
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+SUMMARY_FILENAME = 'summary.json'
+
+# Metriche affiancate nella risposta di confronto
+COMPARE_METRICS = ('rms_g', 'dominant_frequency_hz', 'event_count')
+
+
+# ============================================================================
+# SUMMARY
+# ============================================================================
+
+def summarize_sensor(acc_z: Dict, freqs: np.ndarray, psd: np.ndarray, fs: float, event_count: int) -> Dict:
+    """
+    Riassunto vibrazionale dell'accelerazione verticale di un sensore.
+
+    Le metriche scalari arrivano dalla feature store; qui si aggiunge solo
+    la PSD decimata e il conteggio eventi.
+
+    Args:
+        acc_z: Riga della feature store per acc/z
+        freqs: Frequenze della PSD di acc/z
+        psd: PSD di acc/z
+        fs: Frequenza di campionamento [Hz]
+        event_count: Numero di eventi (impatti/atterraggi) del sensore
+
+    Returns:
+        Dict con rms, energie per banda, frequenza dominante e PSD decimata
+    """
+    psd_freqs, psd_power = decimate_psd(freqs, psd, fs)
+
+    return {
+        'samples': int(acc_z['samples']),
+        'rms_g': round(float(acc_z['rms']), 4),
+        'dominant_frequency_hz': round(float(acc_z['peak_freq_hz']), 2),
+        'band_energy': {
+            band: float(f"{acc_z[f'energy_{band}']:.4e}") for band in FREQUENCY_BANDS
+        },
+        'event_count': int(event_count),
+        'psd': {
+            'freqs': np.round(psd_freqs, 3).tolist(),
+            'power': [float(f"{p:.4e}") for p in psd_power]
+        }
+    }
+
+
+def save_summary(session_dir: str, summary: Dict) -> str:
+    path = os.path.join(session_dir, SUMMARY_FILENAME)
+    with open(path, 'w') as f:
+        json.dump(summary, f)
+    logging.info(f"  📊 Session summary saved: {path}")
+    return path
+
+
+def load_summary(session_dir: str) -> Optional[Dict]:
+    path = os.path.join(session_dir, SUMMARY_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def build_summary(session_id: str, sensors: Dict[str, Dict], fs: float, duration_s: float) -> Dict:
+    """Assembla il riassunto di sessione dai riassunti per sensore."""
+    return {
+        'session_id': session_id,
+        'created_at': time.time(),
+        'sample_rate': fs,
+        'duration_s': round(duration_s, 3),
+        'event_count': int(sum(s['event_count'] for s in sensors.values())),
+        'sensors': sensors
+    }
+
+
+def compare_summaries(summaries: List[Dict]) -> Dict:
+    """
+    Affianca i riassunti di più sessioni.
+
+    Returns:
+        Dict con una tabella per metrica (session_id -> sensore -> valore)
+        e le curve PSD decimate da sovrapporre
+    """
+    metrics = {name: {} for name in COMPARE_METRICS}
+    metrics['band_energy'] = {}
+    psd_curves = []
+
+    for summary in summaries:
+        session_id = summary['session_id']
+        for name in COMPARE_METRICS:
+            metrics[name][session_id] = {
+                sensor: data[name] for sensor, data in summary['sensors'].items()
+            }
+        metrics['band_energy'][session_id] = {
+            sensor: data['band_energy'] for sensor, data in summary['sensors'].items()
+        }
+        for sensor, data in summary['sensors'].items():
+            psd_curves.append({
+                'session_id': session_id,
+                'sensor': sensor,
+                'freqs': data['psd']['freqs'],
+                'power': data['psd']['power']
+            })
+
+    return {
+        'sessions': [
+            {
+                'session_id': s['session_id'],
+                'created_at': s['created_at'],
+                'duration_s': s['duration_s'],
+                'sample_rate': s['sample_rate'],
+                'event_count': s['event_count']
+            }
+            for s in summaries
+        ],
+        'metrics': metrics,
+        'psd': psd_curves
+    }
@@ -0,0 +1,499 @@
+import os
+import sys
+import time
+import argparse
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy.signal import butter, sosfilt
+
+from fifo import (FIFO_WORD_SIZE, ACC_SENSITIVITY_16G, GYRO_SENSITIVITY_2000DPS, TAG_GY, TAG_XL, TAG_TS,
+                  TAG_ODRCHG, TAG_XL_NC_T_2, TAG_XL_NC_T_1, TAG_XL_2X, TAG_XL_3X, TAG_GY_NC_T_2, TAG_GY_NC_T_1,
+                  TAG_GY_2X, TAG_GY_3X, DSV16X_BDR_HZ, DSV16X_DTIME, DSV16X_TICK_MS)
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Per modalità di compressione: campioni per parola, tag di ripiego per
+# posizione (ultimo campione = timestamp corrente), range dei delta,
+# anticipo del timestamp rispetto all'ultimo campione
+COMPRESSION_MODES = {
+    'none': {'samples': 1, 'acc': [TAG_XL], 'gyro': [TAG_GY], 'range': None, 'lead': 0},
+    '2x': {'samples': 2, 'acc': [TAG_XL_NC_T_2, TAG_XL_NC_T_1], 'gyro': [TAG_GY_NC_T_2, TAG_GY_NC_T_1],
+           'range': (-128, 127), 'lead': 1},
+    '3x': {'samples': 3, 'acc': [TAG_XL_NC_T_2, TAG_XL_NC_T_1, TAG_XL], 'gyro': [TAG_GY_NC_T_2, TAG_GY_NC_T_1, TAG_GY],
+           'range': (-16, 15), 'lead': 0},
+}
+COMPRESSED_TAG = {('2x', 'acc'): TAG_XL_2X, ('2x', 'gyro'): TAG_GY_2X,
+                  ('3x', 'acc'): TAG_XL_3X, ('3x', 'gyro'): TAG_GY_3X}
+
+DEFAULT_PACKET_WORDS = 10
+DEFAULT_TS_EVERY = 8
+DEFAULT_CHUNK_S = 60.0
+# Periodo del segnale ripetuto (0 = segnale sintetizzato per tutta la durata)
+DEFAULT_LOOP_S = 60.0
+LOGGER_START_MS = 20000
+
+# Bit di parità pari del byte di tag
+_PARITY = np.array([bin(b).count('1') & 1 for b in range(256)], dtype=np.uint8)
+
+# Guadagni per canale (acc x/y/z [g], gyro x/y/z [dps]) del modello di segnale
+_TERRAIN_GAIN = np.array([0.15, 0.1, 0.4, 20.0, 40.0, 10.0], dtype=np.float32)
+_BUMP_GAIN = np.array([0.2, 0.1, 1.0, 30.0, 80.0, 15.0], dtype=np.float32)
+_NOISE_GAIN = np.array([0.002, 0.002, 0.002, 0.1, 0.1, 0.1], dtype=np.float32)
+
+
+# ============================================================================
+# SIGNAL MODEL
+# ============================================================================
+
+class RideSignal:
+    """
+    Segnale di un sensore montato sulla bici, generato a blocchi.
+
+    Terreno (rumore filtrato 1-15 Hz) e impatti (impulsi sparsi su un
+    risonatore smorzato a ~8 Hz, la sospensione) modulati da un inviluppo
+    pedalata/sosta; i filtri mantengono lo stato tra un blocco e l'altro
+    così il segnale è continuo su qualunque durata.
+    """
+
+    def __init__(self, fs: float, rng: np.random.Generator):
+        self.fs = fs
+        self.rng = rng
+        f_hi = min(15.0, 0.45 * fs)
+        self.terrain_sos = butter(2, [min(1.0, f_hi / 2), f_hi], btype='band', fs=fs, output='sos').astype(np.float32)
+        self.bump_sos = butter(2, [min(6.0, 0.4 * fs), min(10.0, 0.45 * fs)], btype='band', fs=fs,
+                               output='sos').astype(np.float32)
+        self.terrain_zi = np.zeros((len(self.terrain_sos), 2, 6), dtype=np.float32)
+        self.bump_zi = np.zeros((len(self.bump_sos), 2, 1), dtype=np.float32)
+        self.riding = False
+        self.segment_left = 0
+        self.offset = np.array([*rng.normal(0.0, 0.05, 2), 1.0, 0.0, 0.0, 0.0], dtype=np.float32)
+
+    def next(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Prossimi n campioni.
+
+        Returns:
+            (acc [g] (n, 3), gyro [dps] (n, 3)) float32
+        """
+        rng = self.rng
+
+        # Inviluppo: segmenti di pedalata e soste di qualche decina di secondi
+        envelope = np.empty((n, 1), dtype=np.float32)
+        pos = 0
+        while pos < n:
+            if self.segment_left == 0:
+                self.riding = not self.riding
+                self.segment_left = int(rng.exponential(120.0 if self.riding else 20.0) * self.fs) + 1
+            length = min(self.segment_left, n - pos)
+            envelope[pos:pos + length] = 1.0 if self.riding else 0.02
+            self.segment_left -= length
+            pos += length
+
+        terrain, self.terrain_zi = sosfilt(self.terrain_sos, rng.standard_normal((n, 6), dtype=np.float32),
+                                           axis=0, zi=self.terrain_zi)
+
+        # Impatti: pochi impulsi per secondo, stesso filtro su tutti i canali
+        impulses = np.zeros((n, 1), dtype=np.float32)
+        n_bumps = rng.binomial(n, min(0.5 / self.fs, 1.0))
+        impulses[rng.integers(0, n, n_bumps), 0] = rng.standard_normal(n_bumps, dtype=np.float32) * 40.0
+        bumps, self.bump_zi = sosfilt(self.bump_sos, impulses, axis=0, zi=self.bump_zi)
+
+        motion = terrain * _TERRAIN_GAIN
+        motion += bumps * _BUMP_GAIN
+        motion *= envelope
+        motion += self.offset
+        noise = rng.standard_normal((n, 6), dtype=np.float32)
+        noise *= _NOISE_GAIN
+        motion += noise
+        return motion[:, :3], motion[:, 3:]
+
+
+# ============================================================================
+# FIFO ENCODING
+# ============================================================================
+
+def quantize(values: np.ndarray, sensitivity: float) -> np.ndarray:
+    return np.clip(np.round(values / sensitivity), -32768, 32767).astype(np.int32)
+
+
+def encode_group(
+    counts: np.ndarray,
+    last: np.ndarray,
+    mode: str,
+    group: str
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parole FIFO di un gruppo (acc o gyro) per un blocco di slot.
+
+    Ogni slot copre `samples` campioni: se tutti i delta rientrano nel
+    range della compressione diventa una sola parola compressa, altrimenti
+    una parola non compressa per campione (tag NC_T_2 / NC_T_1 / NC), come
+    fa il sensore quando la compressione non è possibile.
+
+    Args:
+        counts: Campioni int (n_slots * samples, 3)
+        last: Ultimo campione del blocco precedente (3,)
+        mode: 'none', '2x' o '3x'
+        group: 'acc' o 'gyro'
+
+    Returns:
+        (parole (n_slots, samples, 7) uint8, validità (n_slots, samples))
+    """
+    spec = COMPRESSION_MODES[mode]
+    k = spec['samples']
+    n_slots = len(counts) // k
+
+    words = np.zeros((n_slots, k, FIFO_WORD_SIZE), dtype=np.uint8)
+    words[:, :, 0] = np.array(spec[group], dtype=np.uint8) << 3
+    words[:, :, 1:] = np.ascontiguousarray(counts, dtype='<i2').view(np.uint8).reshape(n_slots, k, 6)
+    valid = np.ones((n_slots, k), dtype=bool)
+
+    if spec['range'] is None:
+        return words, valid
+
+    lo, hi = spec['range']
+    diffs = np.diff(counts, axis=0, prepend=last[None, :]).reshape(n_slots, k, 3)
+    compressible = np.all((diffs >= lo) & (diffs <= hi), axis=(1, 2))
+
+    if mode == '2x':
+        packed = diffs.astype(np.int8).view(np.uint8).reshape(n_slots, 6)
+    else:
+        fields = (diffs & 0x1F).astype(np.uint16)
+        packed = (fields[..., 0] | (fields[..., 1] << 5) | (fields[..., 2] << 10)).astype('<u2')
+        packed = packed.view(np.uint8).reshape(n_slots, 6)
+
+    words[compressible, 0, 0] = COMPRESSED_TAG[(mode, group)] << 3
+    words[compressible, 0, 1:] = packed[compressible]
+    valid[compressible, 1:] = False
+    return words, valid
+
+
+class SensorStream:
+    """
+    Flusso FIFO di un sensore: segnale, codifica e stato tra i blocchi.
+
+    Il flusso si apre con ODRCHG (la BDR scelta, così il decoder conosce il
+    passo temporale), TAG_TS e un primo campione non compresso per gruppo,
+    che fa da riferimento per i delta e chiude il cambio di BDR nel
+    decoder. Poi ogni `ts_every` slot viene inserita una parola TAG_TS con
+    il timestamp del sensore; il contatore a 2 bit del tag avanza con gli
+    slot come nel sensore reale.
+
+    Con `loop_slots` > 0 il segnale viene sintetizzato e codificato una
+    volta sola per un periodo di `loop_slots` slot (arrotondato così che
+    contatore e TAG_TS si ripetano uguali) e poi ripetuto: per ogni
+    ripetizione si aggiornano solo le parole TAG_TS e gli istanti, quindi
+    la generazione procede alla velocità di una copia in memoria.
+    """
+
+    def __init__(self, conn_handle: int, fs: float, mode: str, ts_every: int,
+                 drift_ppm: float, rng: np.random.Generator, loop_slots: int = 0):
+        self.conn_handle = conn_handle
+        self.bdr_idx = int(np.argmin(np.abs(np.array(DSV16X_BDR_HZ[1:]) - fs))) + 1
+        self.fs = DSV16X_BDR_HZ[self.bdr_idx]
+        self.dtime = DSV16X_DTIME[self.bdr_idx]
+        self.mode = mode
+        self.k = COMPRESSION_MODES[mode]['samples']
+        self.ts_every = max(ts_every, 1)
+        self.signal = RideSignal(self.fs, rng)
+        self.rng = rng
+
+        self.sensor_ts0 = int(rng.integers(0, 2 ** 24))
+        self.logger_t0_ms = LOGGER_START_MS + float(rng.uniform(0.0, 50.0))
+        self.ms_per_tick = DSV16X_TICK_MS * (1.0 + drift_ppm * 1e-6)
+        self.slot = 0
+        self.last = None
+
+        period = np.lcm(4 // np.gcd(self.k, 4), self.ts_every)
+        self.loop_slots = int(-(-loop_slots // period) * period) if loop_slots > 0 else 0
+        self.loop = None
+
+    def _quantize(self, n: int) -> Dict[str, np.ndarray]:
+        acc, gyro = self.signal.next(n)
+        return {'acc': quantize(acc, ACC_SENSITIVITY_16G), 'gyro': quantize(gyro, GYRO_SENSITIVITY_2000DPS)}
+
+    def header_words(self) -> np.ndarray:
+        """ODRCHG, TAG_TS e primo campione acc/gyro (self.last) non compresso, contatore 0."""
+        words = np.zeros((4, FIFO_WORD_SIZE), dtype=np.uint8)
+        words[0, 0] = TAG_ODRCHG << 3
+        words[0, 6] = (self.bdr_idx << 4) | self.bdr_idx
+        words[1, 0] = TAG_TS << 3
+        words[1, 1:5] = np.array([self.sensor_ts0], dtype='<u4').view(np.uint8)
+        words[2, 0] = TAG_XL << 3
+        words[2, 1:] = self.last['acc'].astype('<i2').view(np.uint8)
+        words[3, 0] = TAG_GY << 3
+        words[3, 1:] = self.last['gyro'].astype('<i2').view(np.uint8)
+        words[:, 0] |= _PARITY[words[:, 0]]
+        return words
+
+    def _encode(self, counts: Dict[str, np.ndarray], first_slot: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Parole FIFO di un blocco di slot a partire da `first_slot`.
+
+        Returns:
+            (parole (m, 7) uint8, tick del sensore di ogni parola (m,), indici delle parole TAG_TS)
+        """
+        n_slots = len(counts['acc']) // self.k
+        blocks = []
+        valids = []
+        for group in ('acc', 'gyro'):
+            words, valid = encode_group(counts[group], self.last[group], self.mode, group)
+            self.last[group] = counts[group][-1]
+            blocks.append(words)
+            valids.append(valid)
+
+        # Slot: [TS][acc x k][gyro x k]; il campione 0 è nell'intestazione
+        slots = np.arange(first_slot, first_slot + n_slots, dtype=np.int64)
+        ticks = ((slots + 1) * self.k + COMPRESSION_MODES[self.mode]['lead']) * self.dtime
+
+        ts_words = np.zeros((n_slots, 1, FIFO_WORD_SIZE), dtype=np.uint8)
+        ts_words[:, 0, 0] = TAG_TS << 3
+        ts_valid = ((slots + 1) % self.ts_every == 0)[:, None]
+
+        words = np.concatenate([ts_words] + blocks, axis=1)
+        valid = np.concatenate([ts_valid] + valids, axis=1)
+
+        counter = ((ticks // self.dtime) & 0x3).astype(np.uint8)
+        words[:, :, 0] |= counter[:, None] << 1
+        words[:, :, 0] |= _PARITY[words[:, :, 0]]
+
+        is_ts = np.zeros(valid.shape, dtype=bool)
+        is_ts[:, 0] = True
+        words = words[valid]
+        ts_idx = np.flatnonzero(is_ts[valid])
+        ticks = np.broadcast_to(ticks[:, None], valid.shape)[valid]
+        self._stamp(words, ticks, ts_idx)
+        return words, ticks, ts_idx
+
+    def _stamp(self, words: np.ndarray, ticks: np.ndarray, ts_idx: np.ndarray) -> None:
+        """Scrive il timestamp del sensore nelle parole TAG_TS (byte 1..4)."""
+        stamp = ((self.sensor_ts0 + ticks[ts_idx]) & 0xFFFFFFFF).astype('<u4')
+        words[ts_idx, 1:5] = stamp.view(np.uint8).reshape(-1, 4)
+
+    def _loop_block(self, slot: int, n_slots: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Parole e tick degli slot [slot, slot + n_slots) presi dal periodo, senza attraversarne il bordo."""
+        words, ticks, ts_idx, bounds = self.loop
+        turn, pos = divmod(slot, self.loop_slots)
+        lo, hi = bounds[pos], bounds[pos + n_slots]
+        offset = turn * self.loop_slots * self.k * self.dtime
+
+        words = words[lo:hi].copy()
+        ticks = ticks[lo:hi] + offset
+        if turn:
+            ts_idx = ts_idx[(ts_idx >= lo) & (ts_idx < hi)] - lo
+            self._stamp(words, ticks, ts_idx)
+        return words, ticks
+
+    def next(self, n_slots: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Parole FIFO dei prossimi n_slots slot.
+
+        Returns:
+            (parole (m, 7) uint8, istante di logger di ogni parola [ms] (m,))
+        """
+        header = None
+
+        if self.loop_slots:
+            if self.loop is None:
+                # Il primo campione del periodo segue l'ultimo: i delta del
+                # bordo sono validi a ogni ripetizione, intestazione compresa
+                counts = self._quantize(self.loop_slots * self.k)
+                self.last = {group: values[-1] for group, values in counts.items()}
+                header = self.header_words()
+                words, ticks, ts_idx = self._encode(counts, 0)
+                slot_of_word = (ticks // self.dtime - COMPRESSION_MODES[self.mode]['lead']) // self.k - 1
+                bounds = np.searchsorted(slot_of_word, np.arange(self.loop_slots + 1))
+                self.loop = (words, ticks, ts_idx, bounds)
+
+            pieces = []
+            slot, end = self.slot, self.slot + n_slots
+            while slot < end:
+                take = min(end - slot, self.loop_slots - slot % self.loop_slots)
+                pieces.append(self._loop_block(slot, take))
+                slot += take
+            words = np.concatenate([p[0] for p in pieces])
+            ticks = np.concatenate([p[1] for p in pieces])
+        else:
+            if self.last is None:
+                self.last = {group: values[0] for group, values in self._quantize(1).items()}
+                header = self.header_words()
+            words, ticks, _ = self._encode(self._quantize(n_slots * self.k), self.slot)
+
+        times = self.logger_t0_ms + ticks * self.ms_per_tick
+        if header is not None:
+            words = np.concatenate([header, words])
+            times = np.concatenate([np.full(len(header), self.logger_t0_ms), times])
+
+        self.slot += n_slots
+        return words, times
+
+
+# ============================================================================
+# FILE WRITER
+# ============================================================================
+
+def packetize(
+    conn_handle: int,
+    words: np.ndarray,
+    times: np.ndarray,
+    packet_words: int,
+    jitter_ms: float,
+    rng: np.random.Generator,
+    min_timestamp_ms: float = 0.0
+) -> Tuple[np.ndarray, int]:
+    """
+    Raggruppa le parole in pacchetti completi `<HIH` + payload.
+
+    Il timestamp di logger è l'istante dell'ultima parola del pacchetto più
+    un ritardo di trasmissione con jitter (sempre >= 0).
+
+    Returns:
+        (record strutturati, numero di parole usate; le altre passano al blocco successivo)
+    """
+    n_packets = len(words) // packet_words
+    used = n_packets * packet_words
+    payload_size = packet_words * FIFO_WORD_SIZE
+
+    record = np.dtype([('conn_handle', '<u2'), ('timestamp_ms', '<u4'), ('data_size', '<u2'),
+                       ('payload', 'u1', (payload_size,))])
+    packets = np.empty(n_packets, dtype=record)
+    packets['conn_handle'] = conn_handle
+    arrival = times[packet_words - 1:used:packet_words] + np.abs(rng.normal(0.0, jitter_ms, n_packets))
+    packets['timestamp_ms'] = np.maximum.accumulate(np.maximum(arrival, min_timestamp_ms))
+    packets['data_size'] = payload_size
+    packets['payload'] = words[:used].reshape(n_packets, payload_size)
+    return packets, used
+
+
+def generate_ride(
+    path: str,
+    sensors: int = 2,
+    duration_s: float = 60.0,
+    fs: float = 120.0,
+    packet_words: int = DEFAULT_PACKET_WORDS,
+    compression: str = '3x',
+    ts_every: int = DEFAULT_TS_EVERY,
+    jitter_ms: float = 5.0,
+    drift_ppm: float = 50.0,
+    truncate_bytes: int = 0,
+    seed: Optional[int] = 0,
+    chunk_s: float = DEFAULT_CHUNK_S,
+    loop_s: float = DEFAULT_LOOP_S
+) -> Dict:
+    """
+    Scrive un file multi-sensore `<HIH` con parole FIFO LSM6DSV16X.
+
+    Il file viene generato a blocchi di `chunk_s` secondi, quindi la
+    memoria resta costante qualunque sia la durata. Con `loop_s` > 0 il
+    segnale di ogni sensore ha periodo `loop_s` e i blocchi coincidono col
+    periodo: oltre il primo periodo il costo è solo copia e scrittura.
+
+    Args:
+        path: File di uscita
+        sensors: Numero di sensori (conn_handle 0..sensors-1)
+        duration_s: Durata dell'uscita [s]
+        fs: Frequenza di campionamento richiesta (arrotondata alla BDR più vicina)
+        packet_words: Parole FIFO per pacchetto
+        compression: 'none', '2x' o '3x'
+        ts_every: Una parola TAG_TS ogni N slot
+        jitter_ms: Deviazione standard del ritardo di trasmissione [ms]
+        drift_ppm: Deriva massima del clock dei sensori [ppm]
+        truncate_bytes: Byte tolti dalla fine del file (scrittura interrotta)
+        seed: Seed del generatore casuale
+        chunk_s: Durata di un blocco di generazione [s]
+        loop_s: Periodo del segnale ripetuto [s] (0 = mai ripetuto)
+
+    Returns:
+        Dict con statistiche del file generato
+    """
+    if compression not in COMPRESSION_MODES:
+        raise ValueError(f"Unknown compression mode: {compression}")
+
+    rng = np.random.default_rng(seed)
+    k = COMPRESSION_MODES[compression]['samples']
+    loop_slots = min(int(loop_s * fs), int(duration_s * fs)) // k if loop_s > 0 else 0
+    streams = [
+        SensorStream(conn_handle, fs, compression, ts_every, rng.uniform(-drift_ppm, drift_ppm), rng, loop_slots)
+        for conn_handle in range(sensors)
+    ]
+    slots_total = int(duration_s * streams[0].fs) // k
+    slots_per_chunk = streams[0].loop_slots or max(int(chunk_s * streams[0].fs) // k, 1)
+
+    pending = {s.conn_handle: (np.empty((0, FIFO_WORD_SIZE), dtype=np.uint8), np.empty(0)) for s in streams}
+    last_timestamp = {s.conn_handle: 0.0 for s in streams}
+    stats = {'packets': 0, 'words': 0, 'bytes': 0}
+    started = time.time()
+
+    with open(path, 'wb') as f:
+        done = 0
+        while done < slots_total:
+            n_slots = min(slots_per_chunk, slots_total - done)
+            chunk = []
+            for stream in streams:
+                words, times = stream.next(n_slots)
+                old_words, old_times = pending[stream.conn_handle]
+                words = np.concatenate([old_words, words])
+                times = np.concatenate([old_times, times])
+                packets, used = packetize(stream.conn_handle, words, times, packet_words, jitter_ms, rng,
+                                          last_timestamp[stream.conn_handle])
+                pending[stream.conn_handle] = (words[used:], times[used:])
+                if len(packets):
+                    last_timestamp[stream.conn_handle] = float(packets['timestamp_ms'][-1])
+                chunk.append(packets)
+                stats['words'] += used
+
+            # I sensori condividono il link: pacchetti in ordine di arrivo
+            packets = np.concatenate(chunk)
+            packets = packets[np.argsort(packets['timestamp_ms'], kind='stable')]
+            f.write(memoryview(packets).cast('B'))
+            stats['packets'] += len(packets)
+            done += n_slots
+
+    if truncate_bytes > 0:
+        size = os.path.getsize(path)
+        os.truncate(path, max(size - truncate_bytes, 0))
+
+    stats.update(
+        bytes=os.path.getsize(path),
+        sensors=sensors,
+        fs=streams[0].fs,
+        compression=compression,
+        duration_s=slots_total * k / streams[0].fs,
+        elapsed_s=round(time.time() - started, 3)
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Genera file telemetria sintetici multi-sensore (<HIH> + FIFO LSM6DSV16X)')
+    parser.add_argument('output', type=str, help='File .bin di uscita')
+    parser.add_argument('--sensors', type=int, default=2, help='Numero di sensori')
+    parser.add_argument('--duration', type=float, default=60.0, help='Durata [s]')
+    parser.add_argument('--fs', type=float, default=120.0, help='Frequenza di campionamento [Hz]')
+    parser.add_argument('--packet-words', type=int, default=DEFAULT_PACKET_WORDS, help='Parole FIFO per pacchetto')
+    parser.add_argument('--compression', choices=list(COMPRESSION_MODES), default='3x', help='Compressione FIFO')
+    parser.add_argument('--ts-every', type=int, default=DEFAULT_TS_EVERY, help='Parola timestamp ogni N slot')
+    parser.add_argument('--jitter-ms', type=float, default=5.0, help='Jitter timestamp di logger [ms]')
+    parser.add_argument('--drift-ppm', type=float, default=50.0, help='Deriva massima clock sensori [ppm]')
+    parser.add_argument('--truncate', type=int, default=0, help='Byte da togliere in fondo al file')
+    parser.add_argument('--seed', type=int, default=0, help='Seed del generatore')
+    parser.add_argument('--loop', type=float, default=DEFAULT_LOOP_S,
+                        help='Periodo del segnale ripetuto [s] (0 = sintetizza tutta la durata)')
+
+    args = parser.parse_args()
+
+    if args.sensors < 1 or args.duration <= 0 or args.packet_words < 1:
+        print("ERRORE: sensors, duration e packet-words devono essere positivi")
+        sys.exit(1)
+
+    result = generate_ride(
+        args.output, args.sensors, args.duration, args.fs, args.packet_words, args.compression,
+        args.ts_every, args.jitter_ms, args.drift_ppm, args.truncate, args.seed, loop_s=args.loop
+    )
+    rate = result['bytes'] / 1e6 / max(result['elapsed_s'], 1e-9)
+    print(f"✅ {args.output}: {result['bytes'] / 1e6:.1f} MB, {result['packets']} packets, "
+          f"{result['sensors']} sensors @ {result['fs']} Hz ({result['elapsed_s']:.2f}s, {rate:.0f} MB/s)")
@@ -3,8 +3,15 @@ import numpy as np
 from scipy import signal
 import argparse
 import json
+import os
 import sys
 
+from features import FeatureTable
+
+# Scostamento massimo della frequenza misurata da quella nominale: oltre,
+# 'span_s' non è attendibile (feature store calcolate con i tick presi per ms)
+MAX_RATE_DEVIATION = 0.1
+
 def load_and_prep_data(filepath, col_name='acc_z'):
     """
     Carica il CSV e prepara i dati dell'accelerazione verticale.
@@ -79,6 +86,42 @@ def analyze_vibrations(data, fs):
         }
     }
 
+def load_session_analysis(session_dir, sensor=None):
+    """
+    Legge l'analisi dalla feature store di una sessione già processata
+    dal server (nessuna rilettura del CSV).
+    """
+    table = FeatureTable.load(session_dir)
+    if table is None:
+        print(f"ERRORE: Nessuna feature store in '{session_dir}'. Analizza prima la sessione sul server.")
+        sys.exit(1)
+
+    rows = table.select(sensor=sensor, group='acc', axis='z')
+    if not rows:
+        print(f"ERRORE: Nessuna feature acc/z per il sensore {sensor}.")
+        sys.exit(1)
+    row = rows[0]
+
+    # Frequenza effettiva: intervalli attesi (inclusi i campioni persi) / durata misurata.
+    # Feature store senza 'span_s' o con uno span non plausibile: frequenza nominale
+    expected = row['samples'] / (1.0 - row['dropout_rate'])
+    nominal = expected / row['duration_s']
+    span_s = row.get('span_s', 0.0)
+    fs = (expected - 1) / span_s if span_s > 0 else nominal
+    if abs(fs / nominal - 1.0) > MAX_RATE_DEVIATION:
+        fs = nominal
+
+    return {
+        "sampling_rate_hz": round(fs, 1),
+        "total_rms_g": round(row['rms'], 2),  # Già in G
+        "dominant_frequency_hz": round(row['peak_freq_hz'], 1),
+        "energy_distribution": {
+            "low_freq_zone_0_5hz_chassis": round(row['energy_low'], 2),
+            "mid_freq_zone_5_15hz_suspension": round(row['energy_mid'], 2),
+            "high_freq_zone_15_50hz_harshness": round(row['energy_high'], 2)
+        }
+    }
+
 def generate_ai_prompt(analysis, user_notes):
     """
     Formatta l'output in un messaggio pronto per l'AI.
@@ -111,14 +154,18 @@ Basandoti sui manuali e sulla teoria delle vibrazioni, quali click devo modifica
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='MTB Telemetry Analyzer for AI')
-    parser.add_argument('file', type=str, help='Path al file CSV')
+    parser.add_argument('file', type=str, help='Path al file CSV oppure alla cartella di una sessione analizzata')
     parser.add_argument('--col', type=str, default='acc_z', help='Nome colonna accelerazione verticale (default: acc_z)')
     parser.add_argument('--note', type=str, default='Nessuna nota specifica', help='Sensazioni del pilota')
+    parser.add_argument('--sensor', type=int, default=None, help='conn_handle del sensore (solo cartella sessione)')
 
     args = parser.parse_args()
 
-    data, fs = load_and_prep_data(args.file, args.col)
-    analysis = analyze_vibrations(data, fs)
+    if os.path.isdir(args.file):
+        analysis = load_session_analysis(args.file, args.sensor)
+    else:
+        data, fs = load_and_prep_data(args.file, args.col)
+        analysis = analyze_vibrations(data, fs)
     final_prompt = generate_ai_prompt(analysis, args.note)
 
     print("\nCopia tutto il testo qui sotto e incollalo nella tua AI:\n")
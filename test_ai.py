@@ -1,19 +1,29 @@
 import os
 import sys
 import glob
-import time
+import hashlib
 import argparse
 import numpy as np
 import pandas as pd
 from scipy import signal
-import google.generativeai as genai
+try:
+    import google.generativeai as genai
+except ImportError:
+    # Solo i backend locali (Ollama, stub) sono disponibili
+    genai = None
+
+from features import FeatureTable
+from knowledge import KnowledgeIndex, telemetry_query, format_passages
+from filecache import UploadCache, GeminiFileAPI, UPLOAD_CACHE_FILENAME, DEFAULT_UPLOAD_WORKERS, content_sha256
+from llm import ReportAgent, ResponseCache, make_backend, DEFAULT_BATCH_WORKERS
 
 # --- CONFIGURAZIONE ---
 # Incolla qui la tua API KEY oppure impostala come variabile d'ambiente
 API_KEY = "INCOLLA_LA_TUA_API_KEY_QUI" 
 
 # Configura Gemini
-genai.configure(api_key=API_KEY)
+if genai is not None:
+    genai.configure(api_key=API_KEY)
 
 # --- 1. MODULO TELEMETRIA (MATEMATICA) ---
 def analyze_telemetry(filepath, col_name='acc_z'):
@@ -55,47 +65,56 @@ def analyze_telemetry(filepath, col_name='acc_z'):
         print(f"Errore analisi telemetria: {e}")
         sys.exit(1)
 
+def load_session_telemetry(session_dir, sensor=None):
+    """Legge le statistiche dalla feature store di una sessione analizzata dal server."""
+    table = FeatureTable.load(session_dir)
+    rows = table.select(sensor=sensor, group='acc', axis='z') if table is not None else []
+    if not rows:
+        print(f"Errore: nessuna feature acc/z in '{session_dir}'. Analizza prima la sessione sul server.")
+        sys.exit(1)
+    row = rows[0]
+
+    return {
+        "rms_g": round(row['rms'], 2),
+        "peak_hz": round(row['peak_freq_hz'], 1),
+        "low_energy": round(row['energy_low'], 2),
+        "high_energy": round(row['energy_high'], 2)
+    }
+
 # --- 2. MODULO GESTIONE FILE (KNOWLEDGE BASE) ---
-def upload_knowledge_base(folder_path="manuali"):
+def upload_knowledge_base(folder_path="manuali", workers=DEFAULT_UPLOAD_WORKERS):
     """
-    Cerca tutti i PDF nella cartella, li carica su Google e restituisce gli oggetti file.
+    Cerca tutti i PDF nella cartella e restituisce i file remoti (stato ACTIVE).
+    I manuali invariati vengono riusati dalla cache degli upload (nessun nuovo
+    upload finché non scadono); gli altri vengono caricati e attesi in parallelo.
     """
-    uploaded_files = []
-    pdf_files = glob.glob(os.path.join(folder_path, "*.pdf"))
+    pdf_files = sorted(glob.glob(os.path.join(folder_path, "*.pdf")))
     
     if not pdf_files:
         print(f"ATTENZIONE: Nessun PDF trovato nella cartella '{folder_path}'. L'AI non avrà manuali.")
         return []
 
-    print(f"--> Caricamento di {len(pdf_files)} manuali su Google AI...")
-    
-    for pdf in pdf_files:
-        print(f"    Caricamento: {os.path.basename(pdf)}...", end=" ")
-        try:
-            # Carica il file sui server di Google (File API)
-            file_ref = genai.upload_file(pdf, mime_type="application/pdf")
-            uploaded_files.append(file_ref)
-            print("OK.")
-        except Exception as e:
-            print(f"ERRORE: {e}")
-            
-    # Attendiamo che i file siano processati (stato ACTIVE)
-    print("--> Verifica stato file...")
-    for f in uploaded_files:
-        while f.state.name == "PROCESSING":
-            time.sleep(2)
-            f = genai.get_file(f.name)
-            
-    return uploaded_files
-
-# --- 3. IL CERVELLO (GEMINI AGENT) ---
-def run_agent(telemetry_data, user_notes, knowledge_files):
+    print(f"--> Preparazione di {len(pdf_files)} manuali su Google AI...")
+    cache = UploadCache(os.path.join(folder_path, UPLOAD_CACHE_FILENAME))
+    remote_files, stats = cache.sync(pdf_files, GeminiFileAPI(genai), workers=workers)
+    print(f"--> {len(remote_files)} manuali pronti: {stats['uploaded']} caricati, "
+          f"{stats['cached']} dalla cache, {stats['failed']} errori.")
+    return [f.handle for f in remote_files]
+
+def retrieve_passages(telemetry_data, user_notes, folder_path="manuals", k=6):
     """
-    Configura il modello, il system prompt e genera la risposta.
+    Passaggi rilevanti dall'indice locale dei manuali (offline, nessun upload).
+    L'indice viene aggiornato solo per i file modificati.
     """
-    
-    # SYSTEM PROMPT (La "Bibbia" dell'Agente)
-    system_instruction = """
+    index = KnowledgeIndex(folder_path)
+    index.update()
+    hits = index.search(telemetry_query(telemetry_data, user_notes), k)
+    print(f"--> {len(hits)} passaggi recuperati dall'indice locale ({len(index.chunks)} totali).")
+    return format_passages(hits)
+
+# --- 3. IL CERVELLO (AGENTE LLM) ---
+# SYSTEM PROMPT (La "Bibbia" dell'Agente)
+SYSTEM_INSTRUCTION = """
     Sei un Senior MTB Race Engineer. Il tuo compito è ottimizzare le sospensioni basandoti ESCLUSIVAMENTE su:
     1. I manuali tecnici e gli studi scientifici forniti.
     2. I dati di telemetria calcolati (RMS, FFT, Spettro).
@@ -109,7 +128,8 @@ def run_agent(telemetry_data, user_notes, knowledge_files):
     Sii conciso, diretto e professionale. Fornisci azioni concrete (es. "Chiudi LSR di 2 click").
     """
 
-    # Creazione del Prompt Utente con i dati processati
+def build_prompt(telemetry_data, user_notes, passages=None):
+    """Prompt utente con i dati processati e, se presenti, i passaggi dell'indice locale."""
     user_prompt = f"""
     ANALISI GIRO:
     - RMS (Fatica fisica): {telemetry_data['rms_g']} G
@@ -124,46 +144,92 @@ def run_agent(telemetry_data, user_notes, knowledge_files):
     Analizza la correlazione tra il feedback e i dati numerici. 
     Controlla nei manuali allegati le impostazioni per la mia forcella/ammortizzatore e suggerisci le modifiche ai click.
     """
+    if passages:
+        user_prompt += f"""
+    ESTRATTI DAI MANUALI (cita la fonte tra parentesi quadre):
+{passages}
+    """
+    return user_prompt
 
-    print("--> Interrogazione Gemini 1.5 Flash (può richiedere qualche secondo)...")
-    
-    # Configurazione Modello
-    model = genai.GenerativeModel(
-        model_name="gemini-1.5-flash",
-        system_instruction=system_instruction
-    )
-
-    # Invio richiesta: Prompt + Lista dei PDF (Knowledge Base)
-    # Gemini 1.5 supporta nativamente una lista mista di testo e file
-    request_content = [user_prompt] + knowledge_files
-    
-    response = model.generate_content(request_content)
-    
-    return response.text
+def knowledge_base_version(local_kb, folder_path):
+    """Impronta della knowledge base usata: entra nella chiave della cache delle risposte."""
+    if local_kb:
+        return f"local:{KnowledgeIndex(folder_path).version()}"
+    digest = hashlib.sha256()
+    for pdf in sorted(glob.glob(os.path.join(folder_path, "*.pdf"))):
+        digest.update(content_sha256(pdf).encode())
+    return f"files:{digest.hexdigest()[:16]}"
+
+def make_agent(backend="gemini", model_name=None, kb_version="", use_cache=True):
+    return ReportAgent(make_backend(backend, model_name, genai), SYSTEM_INSTRUCTION, build_prompt,
+                       ResponseCache() if use_cache else None, kb_version)
+
+def run_agent(telemetry_data, user_notes, knowledge_files, passages=None, agent=None):
+    """
+    Genera la risposta con il backend dell'agente (default: Gemini, con cache).
+    I passaggi dell'indice locale, se presenti, vanno nel prompt al posto dei PDF.
+    """
+    agent = agent or make_agent()
+    print(f"--> Interrogazione {agent.backend.name} (può richiedere qualche secondo)...")
+    text, cached = agent.report(telemetry_data, user_notes, knowledge_files, passages)
+    if cached:
+        print("--> Risposta dalla cache (stessa telemetria, note e knowledge base).")
+    return text
+
+def load_telemetry(path, col_name='acc_z', sensor=None):
+    # Analisi Matematica (feature store se disponibile)
+    if os.path.isdir(path):
+        return load_session_telemetry(path, sensor)
+    return analyze_telemetry(path, col_name)
 
 # --- MAIN ---
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument('csv_file', help='Il file CSV della telemetria')
+    parser.add_argument('csv_file', nargs='+', help='Il file CSV della telemetria oppure la cartella di una sessione analizzata (più di uno: report in batch)')
     parser.add_argument('--col', default='acc_z', help='Nome colonna accelerazione')
     parser.add_argument('--note', default='Nessuna nota', help='Il tuo feedback')
+    parser.add_argument('--sensor', type=int, default=None, help='conn_handle del sensore (solo cartella sessione)')
+    parser.add_argument('--local-kb', action='store_true', help='Usa l\'indice locale dei manuali invece di caricare i PDF')
+    parser.add_argument('--backend', choices=['gemini', 'ollama', 'stub'], default='gemini', help='Backend LLM')
+    parser.add_argument('--model', default=None, help='Nome del modello (default del backend se assente)')
+    parser.add_argument('--no-cache', action='store_true', help='Ignora la cache delle risposte')
+    parser.add_argument('--workers', type=int, default=DEFAULT_BATCH_WORKERS, help='Report in parallelo (batch)')
     args = parser.parse_args()
 
-    # 1. Analisi Matematica
-    telemetry_stats = analyze_telemetry(args.csv_file, args.col)
-    
-    # 2. Caricamento PDF (Manuali)
+    # 1. Analisi Matematica di ogni sessione
+    telemetry = [load_telemetry(path, args.col, args.sensor) for path in args.csv_file]
+
+    # 2. Knowledge base: passaggi dall'indice locale oppure upload dei PDF
     # Assicurati di avere la cartella "manuali" con i PDF dentro
-    knowledge_base = upload_knowledge_base("manuali")
-    
+    backend = make_backend(args.backend, args.model, genai)
+    local_kb = args.local_kb or not backend.supports_files
+    kb_folder = "manuals" if local_kb else "manuali"
+    knowledge_base = []
+    passages = [None] * len(telemetry)
+    if local_kb:
+        passages = [retrieve_passages(stats, args.note, kb_folder) for stats in telemetry]
+    else:
+        knowledge_base = upload_knowledge_base(kb_folder)
+    agent = ReportAgent(backend, SYSTEM_INSTRUCTION, build_prompt,
+                        None if args.no_cache else ResponseCache(), knowledge_base_version(local_kb, kb_folder))
+
     # 3. Reasoning AI
-    risposta = run_agent(telemetry_stats, args.note, knowledge_base)
-    
-    print("\n" + "="*50)
-    print("REPORT INGEGNERE AI:")
-    print("="*50)
-    print(risposta)
+    if len(telemetry) == 1:
+        risposta = run_agent(telemetry[0], args.note, knowledge_base, passages[0], agent)
+        
+        print("\n" + "="*50)
+        print("REPORT INGEGNERE AI:")
+        print("="*50)
+        print(risposta)
+    else:
+        print(f"--> {len(telemetry)} report con {backend.name} ({args.workers} in parallelo)...")
+        jobs = [{'summary': stats, 'notes': args.note, 'passages': p} for stats, p in zip(telemetry, passages)]
+        for path, result in zip(args.csv_file, agent.batch(jobs, knowledge_base, args.workers)):
+            print("\n" + "="*50)
+            print(f"REPORT INGEGNERE AI: {path}{' (cache)' if result['cached'] else ''}")
+            print("="*50)
+            print(result['text'] if result['error'] is None else f"ERRORE: {result['error']}")
     
     # Pulizia opzionale: Google cancella i file dopo 48h, 
     # ma potremmo volerli cancellare subito se lo script gira spesso.
-    # Per ora li lasciamo gestire alla retention policy automatica.
\ No newline at end of file
+    # Per ora li lasciamo gestire alla retention policy automatica.
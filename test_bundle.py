@@ -0,0 +1,159 @@
+import io
+import os
+import json
+import struct
+
+import numpy as np
+import pytest
+
+import train
+from bundle import (BundleError, BundleWriter, SessionBundle, HEADER_STRUCT, TOC_OFFSET, BUNDLE_MAGIC,
+                    BUNDLE_VERSION)
+
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+SENSORS = (0, 3)
+
+
+def open_fds() -> int:
+    return len(os.listdir('/proc/self/fd'))
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    folder = tmp_path / 'uploads'
+    folder.mkdir()
+    monkeypatch.setattr(train, 'UPLOAD_FOLDER', str(folder))
+    monkeypatch.setattr(train, 'STORAGE_MANAGER_ENABLED', False)
+    return folder
+
+
+@pytest.fixture
+def session_dir(uploads):
+    """Sessione decodificata: telemetria grezza, CSV nel formato del decoder, configurazione."""
+    rng = np.random.default_rng(0)
+    folder = uploads / 'ride'
+    folder.mkdir()
+    (folder / 'ride.bin').write_bytes(rng.integers(0, 256, size=4096, dtype=np.uint8).tobytes())
+    (folder / 'bike_config.json').write_text(json.dumps({'hardware': {'sample_rate': 120}}))
+    for sensor in SENSORS:
+        n = 1000 + sensor
+        train.write_decoded_csv(
+            str(folder / f"ride_sensor_{sensor}.csv"),
+            np.cumsum(rng.integers(300, 400, size=n)),
+            rng.integers(0, 2, size=n).astype(np.int8),
+            rng.integers(-32768, 32767, size=(n, 3)).astype(np.int16)
+        )
+    return folder
+
+
+@pytest.fixture
+def bundle_path(session_dir, tmp_path):
+    return train.export_session_bundle(str(session_dir), str(tmp_path / 'ride.bcpb'))
+
+
+def rewrite_toc(path, toc_bytes: bytes) -> None:
+    """Sostituisce il TOC (e la sua lunghezza nell'header) di un bundle."""
+    with open(path, 'r+b') as f:
+        f.seek(0)
+        f.write(HEADER_STRUCT.pack(BUNDLE_MAGIC, BUNDLE_VERSION, 0, len(toc_bytes), 0))
+        f.seek(TOC_OFFSET)
+        f.write(toc_bytes)
+
+
+# ============================================================================
+# ROUND TRIP
+# ============================================================================
+
+def test_sections_round_trip(tmp_path):
+    path = str(tmp_path / 'sections.bcpb')
+    array = np.arange(12, dtype='<i2').reshape(4, 3)
+    with BundleWriter(path, meta={'session_id': 'x'}) as writer:
+        writer.add_stream('raw', io.BytesIO(b'telemetry'))
+        writer.add_array('array', array)
+        writer.add_json('doc', {'a': [1, 2]})
+
+    with SessionBundle(path) as bundle:
+        assert bundle.meta == {'session_id': 'x'}
+        assert bytes(bundle.bytes('raw')) == b'telemetry'
+        np.testing.assert_array_equal(bundle.array('array'), array)
+        assert bundle.json('doc') == {'a': [1, 2]}
+        assert bundle.verify() == []
+
+
+def test_export_import_is_byte_identical(session_dir, bundle_path):
+    imported = train.import_session_bundle(bundle_path, 'ride_copy')
+    assert os.path.basename(imported) == 'ride_copy'
+    for name in ['ride.bin', 'bike_config.json'] + [f"ride_sensor_{s}.csv" for s in SENSORS]:
+        original = (session_dir / name).read_bytes()
+        with open(os.path.join(imported, name), 'rb') as f:
+            copy = f.read()
+        if name.endswith('.json'):
+            assert json.loads(copy) == json.loads(original)
+        else:
+            assert copy == original, name
+
+
+# ============================================================================
+# CORRUPTION
+# ============================================================================
+
+def test_crc_corruption_is_detected(uploads, bundle_path):
+    with SessionBundle(bundle_path) as bundle:
+        entry = bundle.sections['sensor/3/counts']
+    with open(bundle_path, 'r+b') as f:
+        f.seek(entry['offset'] + entry['length'] // 2)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    with SessionBundle(bundle_path) as bundle:
+        assert bundle.verify() == ['sensor/3/counts']
+    with pytest.raises(BundleError):
+        train.import_session_bundle(bundle_path, 'ride_copy')
+    # Nessuna sessione parziale, nessuna cartella di staging rimasta
+    assert sorted(os.listdir(uploads)) == ['ride']
+
+
+@pytest.mark.parametrize('toc', [b'{"meta": {}, "sect', b'[]', b'{"meta": {}}', b'\xff\xfe'])
+def test_corrupt_toc_raises_bundle_error_and_closes_file(bundle_path, toc):
+    rewrite_toc(bundle_path, toc)
+    before = open_fds()
+    with pytest.raises(BundleError):
+        SessionBundle(bundle_path)
+    assert open_fds() == before
+
+
+def test_truncated_file_is_out_of_bounds(bundle_path):
+    size = os.path.getsize(bundle_path)
+    with open(bundle_path, 'r+b') as f:
+        f.truncate(size - 100)
+    with pytest.raises(BundleError, match='out of bounds'):
+        SessionBundle(bundle_path)
+
+
+def test_array_shape_must_match_length(bundle_path):
+    with SessionBundle(bundle_path) as bundle:
+        toc = {'meta': bundle.meta, 'sections': bundle.sections}
+    toc['sections']['sensor/0/counts']['shape'] = [10 ** 9, 3]
+    rewrite_toc(bundle_path, json.dumps(toc).encode())
+    with pytest.raises(BundleError, match='does not match'):
+        SessionBundle(bundle_path)
+
+
+def test_not_a_bundle(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(struct.pack('<8s', b'NOTABNDL') + b'\0' * 100)
+    with pytest.raises(BundleError):
+        SessionBundle(str(path))
+
+
+def test_import_endpoint_rejects_corrupt_toc(uploads, bundle_path):
+    rewrite_toc(bundle_path, b'{"meta": {}, "sect')
+    with open(bundle_path, 'rb') as f:
+        response = train.app.test_client().post('/api/bundle', data={'file': (f, 'ride.bcpb')})
+    assert response.status_code == 400
+    assert sorted(os.listdir(uploads)) == ['ride']
@@ -0,0 +1,109 @@
+import json
+import threading
+
+import numpy as np
+import pytest
+
+import train
+from calibration import CalibrationStore
+
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+BIKE_CONFIG = {'hardware': {'device_id': 'bike1'}}
+PROFILE = {'sensors': {'0': {'acc': {'offset': [0.01, 0.0, -0.02], 'scale': [1.0, 1.0, 1.0]}}}}
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    folder = tmp_path / 'uploads'
+    folder.mkdir()
+    monkeypatch.setattr(train, 'UPLOAD_FOLDER', str(folder))
+    monkeypatch.setattr(train, 'STORAGE_MANAGER_ENABLED', False)
+    monkeypatch.setattr(train, 'calibration_store', CalibrationStore(str(tmp_path / 'calibration')))
+    return folder
+
+
+@pytest.fixture
+def session_dir(uploads):
+    """Sessione analizzata con i profili attuali (nessun profilo salvato)."""
+    session_dir = uploads / 'ride'
+    session_dir.mkdir()
+    (session_dir / 'bike_config.json').write_text(json.dumps(BIKE_CONFIG))
+    (session_dir / 'summary.json').write_text(json.dumps(train.build_summary('ride', {}, 120.0, 60.0)))
+    train.save_calibration_stamp(str(session_dir), train.session_calibration_fingerprint(BIKE_CONFIG))
+    return session_dir
+
+
+# ============================================================================
+# RECALIBRATION
+# ============================================================================
+
+def test_session_goes_stale_when_its_profile_changes(session_dir):
+    client = train.app.test_client()
+    assert not train.calibration_stale(str(session_dir))
+    assert client.put('/api/calibration/bike1', json=PROFILE).status_code == 200
+    assert train.calibration_stale(str(session_dir))
+    # Un profilo di un altro dispositivo non riguarda la sessione
+    train.save_calibration_stamp(str(session_dir), train.session_calibration_fingerprint(BIKE_CONFIG))
+    assert client.put('/api/calibration/bike2', json=PROFILE).status_code == 200
+    assert not train.calibration_stale(str(session_dir))
+
+
+def test_reads_flag_stale_data_and_rebuild_in_background(session_dir, monkeypatch):
+    rebuilt = threading.Event()
+    calls = []
+
+    def rebuild(path):
+        # Al posto della rianalisi: aggiorna solo l'impronta
+        calls.append(path)
+        train.save_calibration_stamp(path, train.session_calibration_fingerprint(BIKE_CONFIG))
+        with train._rebuild_lock:
+            train._rebuild_pending.discard(path)
+        rebuilt.set()
+
+    monkeypatch.setattr(train, 'rebuild_calibrated_session', rebuild)
+    client = train.app.test_client()
+    client.put('/api/calibration/bike1', json=PROFILE)
+
+    response = client.get('/api/compare?ids=ride')
+    assert response.get_json()['calibration_stale'] == ['ride']
+    assert rebuilt.wait(5.0)
+    assert calls == [str(session_dir)]
+    assert client.get('/api/compare?ids=ride').get_json()['calibration_stale'] == []
+
+
+def test_rebuild_without_telemetry_is_a_no_op(session_dir, monkeypatch):
+    train.calibration_store.put('bike1', PROFILE)
+    assert train.rebuild_calibrated_session(str(session_dir)) is False
+    assert train.calibration_stale(str(session_dir))
+
+
+# ============================================================================
+# PROFILE VALIDATION
+# ============================================================================
+
+@pytest.mark.parametrize('group', [
+    {'rotation': [[1, 0, 0], [0, 1, 0]]},
+    {'rotation': [[1, 0, 0], [0, 1, 0], [0, 0, float('nan')]]},
+    {'rotation': [[2, 0, 0], [0, 1, 0], [0, 0, 1]]},
+    {'rotation': [[1, 0.2, 0], [0, 1, 0], [0, 0, 1]]},
+    {'rotation': [[-1, 0, 0], [0, 1, 0], [0, 0, 1]]},
+    {'axes': ['-x', 'y', 'z']},
+    {'rotation': {'x': 1}},
+])
+def test_put_rejects_improper_rotations(uploads, group):
+    response = train.app.test_client().put('/api/calibration/bike1', json={'sensors': {'0': {'gyro': group}}})
+    assert response.status_code == 400
+    assert train.calibration_store.get('bike1') is None
+
+
+def test_put_accepts_a_rounded_rotation(uploads):
+    c, s = round(np.cos(0.3), 4), round(np.sin(0.3), 4)
+    rotation = [[c, -s, 0], [s, c, 0], [0, 0, 1]]
+    response = train.app.test_client().put('/api/calibration/bike1', json={'sensors': {'0': {
+        'acc': {'rotation': rotation}, 'gyro': {'axes': ['z', '-x', '-y']}}}})
+    assert response.status_code == 200
+    assert response.get_json()['sensors']['0']['acc']['rotation'] == rotation
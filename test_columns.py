@@ -0,0 +1,81 @@
+import io
+
+import numpy as np
+import pytest
+
+from columns import ColumnStore, save_session_columns, stream_npz, parse_channels
+from fifo import DSV16X_DTIME, DSV16X_TICK_MS
+from session import SessionData
+
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+FS = 120.0
+T0_TICKS = 5_000_000
+
+
+@pytest.fixture
+def session():
+    """Due sensori a 120 Hz, timestamp in tick del sensore come nei CSV decodificati."""
+    n = 10 * int(FS)
+    ticks = T0_TICKS + np.arange(n, dtype=np.int64) * DSV16X_DTIME[6]
+    parts = []
+    for sensor in (0, 2):
+        counts = np.random.default_rng(sensor).integers(-2000, 2000, size=(2 * n, 3)).astype(np.int16)
+        parts.append((sensor, np.repeat(ticks, 2), np.tile(np.array([0, 1], dtype=np.int8), n), counts))
+    return SessionData.build(parts, lambda sensor, group, c: c.astype(np.float32) * np.float32(0.5))
+
+
+@pytest.fixture
+def store(tmp_path, session):
+    save_session_columns(str(tmp_path), session, calibration='abc')
+    return ColumnStore.open(str(tmp_path))
+
+
+# ============================================================================
+# COLUMN STORE
+# ============================================================================
+
+def test_time_column_is_in_milliseconds(store):
+    t = store.column(0, 'acc', 'time_ms')
+    assert t.dtype == np.float64
+    assert t[0] == pytest.approx(T0_TICKS * DSV16X_TICK_MS)
+    np.testing.assert_allclose(np.diff(t), 1000.0 / FS)
+    assert store.manifest['sensors']['0']['acc']['t_end_ms'] == pytest.approx(float(t[-1]))
+
+
+def test_window_in_milliseconds_selects_one_second(store):
+    t_start = store.manifest['sensors']['2']['gyro']['t_start_ms']
+    members = dict(store.select([2], 'gyro_z', t0=t_start + 1000.0, t1=t_start + 2000.0))
+    assert sorted(members) == ['s2_gyro_time_ms', 's2_gyro_z']
+    assert len(members['s2_gyro_time_ms']) == int(FS) + 1
+    assert not members['s2_gyro_z'].flags.owndata
+
+
+def test_calibration_and_version_mismatch(tmp_path, store):
+    assert ColumnStore.open(str(tmp_path), 'abc') is not None
+    assert ColumnStore.open(str(tmp_path), 'other') is None
+    assert ColumnStore.open(str(tmp_path / 'missing')) is None
+
+
+def test_unknown_sensor_or_channel(store):
+    with pytest.raises(KeyError):
+        store.select([9])
+    with pytest.raises(ValueError):
+        parse_channels('acc_w')
+
+
+# ============================================================================
+# STREAMING EXPORT
+# ============================================================================
+
+def test_streamed_npz_round_trips(store, session):
+    members = store.select(channels='acc')
+    data = b''.join(bytes(chunk) for chunk in stream_npz(members, chunk_bytes=1000))
+    with np.load(io.BytesIO(data)) as npz:
+        assert sorted(npz.files) == sorted(name for name, _ in members)
+        _, block = session.group(2, 'acc')
+        np.testing.assert_array_equal(npz['s2_acc_y'], block[:, 1])
+        np.testing.assert_array_equal(npz['s0_acc_time_ms'], store.column(0, 'acc', 'time_ms'))
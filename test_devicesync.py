@@ -0,0 +1,101 @@
+import os
+import threading
+
+import pytest
+
+import devicesync
+import train
+from devicesync import DeviceClient, DeviceError, DeviceSync, StandInDevice, generate_device_logs, load_sync_state
+
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+@pytest.fixture
+def logs_dir(tmp_path):
+    folder = str(tmp_path / 'device')
+    generate_device_logs(folder, count=3, duration_s=5.0, sensors=1)
+    return folder
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    folder = tmp_path / 'uploads'
+    folder.mkdir()
+    return str(folder)
+
+
+def serve(logs_dir, **kwargs) -> StandInDevice:
+    device = StandInDevice(logs_dir, **kwargs)
+    threading.Thread(target=device.serve_forever, daemon=True).start()
+    return device
+
+
+@pytest.fixture
+def device(logs_dir, monkeypatch):
+    monkeypatch.setattr(devicesync, 'RETRY_BACKOFF_S', 0.0)
+    device = serve(logs_dir, drop_after=10_000)
+    yield device
+    device.shutdown()
+    device.server_close()
+
+
+@pytest.fixture
+def analyzed(monkeypatch):
+    """Analisi sostituita: il decoder C non serve per provare la sincronizzazione."""
+    sessions = []
+    monkeypatch.setattr(train, 'analyze_session', lambda file_path, session_dir, bike_config: sessions.append(
+        (os.path.basename(session_dir), os.path.getsize(file_path), bike_config)))
+    return sessions
+
+
+# ============================================================================
+# DOWNLOAD
+# ============================================================================
+
+def test_interrupted_download_resumes_with_range(device, logs_dir, tmp_path):
+    client = DeviceClient(device.url, pool_size=1, token=None)
+    dest = str(tmp_path / 'ride_000.part')
+    size = client.download_data('ride_000', dest)
+    client.close()
+    source = open(os.path.join(logs_dir, 'ride_000.bin'), 'rb').read()
+    assert 'ride_000' in device.dropped
+    assert size == len(source) and open(dest, 'rb').read() == source
+
+
+def test_token_is_required(logs_dir):
+    device = serve(logs_dir, token='secret')
+    try:
+        with pytest.raises(DeviceError):
+            DeviceClient(device.url, token=None).list_logs()
+        assert DeviceClient(device.url, token='secret').list_logs() == ['ride_000', 'ride_001', 'ride_002']
+    finally:
+        device.shutdown()
+        device.server_close()
+
+
+# ============================================================================
+# SYNC
+# ============================================================================
+
+def test_sync_is_incremental(device, uploads, analyzed, logs_dir):
+    results = DeviceSync(device.url, uploads, workers=2, token=None).run()
+    assert results == {'ride_000': True, 'ride_001': True, 'ride_002': True}
+    assert sorted(s[0] for s in analyzed) == ['ride_000', 'ride_001', 'ride_002']
+    assert all(s[2]['hardware']['sensor_count'] == 1 for s in analyzed)
+    assert os.path.getsize(os.path.join(uploads, 'ride_001', 'ride_001.bin')) == \
+        os.path.getsize(os.path.join(logs_dir, 'ride_001.bin'))
+
+    state = load_sync_state(os.path.join(uploads, devicesync.SYNC_STATE_FILENAME))
+    assert all(entry['status'] == 'ingested' for entry in state.values())
+    assert DeviceSync(device.url, uploads, token=None).run() == {}
+    assert len(analyzed) == 3
+
+
+def test_sessions_uploaded_by_the_phone_are_not_downloaded_again(device, uploads, analyzed):
+    os.makedirs(os.path.join(uploads, 'ride_001'))
+    with open(os.path.join(uploads, 'ride_001', 'ride_001.bin'), 'wb') as f:
+        f.write(b'\0' * 16)
+    results = DeviceSync(device.url, uploads, token=None).run()
+    assert sorted(results) == ['ride_000', 'ride_002']
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import train
+from events import EVENT_DTYPE, EventIndex
+
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    folder = tmp_path / 'uploads'
+    folder.mkdir()
+    monkeypatch.setattr(train, 'UPLOAD_FOLDER', str(folder))
+    monkeypatch.setattr(train, 'STORAGE_MANAGER_ENABLED', False)
+    return folder
+
+
+@pytest.fixture
+def index(uploads):
+    table = np.zeros(6, dtype=EVENT_DTYPE)
+    table['time_ms'] = [500, 100, 300, 200, 600, 400]
+    table['peak_g'] = [1.5, 3.0, 1.2, 2.5, 4.0, 1.1]
+    table['sensor'] = [0, 0, 1, 1, 0, 1]
+    session_dir = uploads / 'ride'
+    session_dir.mkdir()
+    index = EventIndex(table)
+    index.save(str(session_dir))
+    return index
+
+
+# ============================================================================
+# QUERIES
+# ============================================================================
+
+def test_query_filters_on_time_amplitude_and_sensor(index):
+    assert index.query()['time_ms'].tolist() == [100, 200, 300, 400, 500, 600]
+    assert index.query(min_g=2.0)['time_ms'].tolist() == [100, 200, 600]
+    assert index.query(min_g=1.2, t0=150, t1=500)['time_ms'].tolist() == [200, 300, 500]
+    assert index.query(sensor=1, t1=350)['time_ms'].tolist() == [200, 300]
+
+
+def test_events_route(index):
+    body = train.app.test_client().get('/api/events/ride?min_g=2').get_json()
+    assert body['total_events'] == 6 and body['count'] == 3
+
+
+# ============================================================================
+# SESSION IDS
+# ============================================================================
+
+@pytest.mark.parametrize('session_id', ['..', '.', '', '.hidden', 'a/b', '../uploads', 'ride\\x', 'rí de'])
+def test_unsafe_session_ids_never_resolve(uploads, session_id):
+    (uploads / '.hidden').mkdir()
+    (uploads / 'a').mkdir()
+    (uploads / 'a' / 'b').mkdir()
+    assert not train.valid_session_id(session_id)
+    assert train.get_session_dir(session_id) is None
+
+
+@pytest.mark.parametrize('path', ['/api/analysis/..', '/api/events/..', '/api/windows/%2E%2E',
+                                  '/api/progress/..?wait=0.1'])
+def test_routes_reject_traversal(uploads, path):
+    assert train.app.test_client().get(path).status_code == 404
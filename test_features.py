@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from features import FeatureTable, compute_sensor_features
+from fifo import DSV16X_DTIME, DSV16X_TICK_S
+from telemetry_analyzer import load_session_analysis
+
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+NOMINAL_FS = 120.0
+DTIME_120HZ = DSV16X_DTIME[6]
+
+
+def ride_group(n: int, drift: float, drop: float, seed: int):
+    """Timestamp in tick del sensore (clock con deriva `drift`) con una frazione `drop` di campioni persi."""
+    rng = np.random.default_rng(seed)
+    ticks = np.round(np.arange(n) * DTIME_120HZ * (1.0 + drift)).astype(np.int64) + 123_456
+    keep = np.ones(n, dtype=bool)
+    keep[1:-1] = rng.random(n - 2) >= drop
+    values = rng.normal(0.0, 0.3, size=(n, 3)).astype(np.float32)
+    return ticks[keep], values[keep]
+
+
+def save_features(session_dir, groups) -> None:
+    blocks, _ = compute_sensor_features(0, groups, NOMINAL_FS)
+    FeatureTable.from_blocks(blocks).save(str(session_dir))
+
+
+# ============================================================================
+# MEASURED RATE
+# ============================================================================
+
+def test_span_is_in_seconds(tmp_path):
+    n = 20 * int(NOMINAL_FS)
+    save_features(tmp_path, {'acc': ride_group(n, 0.0, 0.0, seed=1)})
+    row = FeatureTable.load(str(tmp_path)).select(0, 'acc', 'z')[0]
+    assert row['span_s'] == pytest.approx((n - 1) / NOMINAL_FS, rel=1e-6)
+    assert row['duration_s'] == pytest.approx(n / NOMINAL_FS)
+
+
+@pytest.mark.parametrize('drift', [0.0, 0.02, -0.03])
+def test_sampling_rate_from_the_measured_span(tmp_path, drift):
+    n = 60 * int(NOMINAL_FS)
+    save_features(tmp_path, {'acc': ride_group(n, drift, 0.05, seed=2)})
+    analysis = load_session_analysis(str(tmp_path), sensor=0)
+    # Il clock del sensore più veloce del nominale allunga gli intervalli: frequenza misurata più bassa
+    assert analysis['sampling_rate_hz'] == pytest.approx(NOMINAL_FS / (1.0 + drift), abs=0.2)
+
+
+def test_implausible_span_falls_back_to_the_nominal_rate(tmp_path):
+    n = 10 * int(NOMINAL_FS)
+    save_features(tmp_path, {'acc': ride_group(n, 0.0, 0.0, seed=3)})
+    table = FeatureTable.load(str(tmp_path))
+    # Feature store scritta quando i tick venivano presi per millisecondi
+    table.columns['span_s'] = table.columns['span_s'] / np.float32(1000.0 * DSV16X_TICK_S)
+    table.save(str(tmp_path))
+    assert load_session_analysis(str(tmp_path), sensor=0)['sampling_rate_hz'] == NOMINAL_FS
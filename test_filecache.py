@@ -0,0 +1,80 @@
+import pytest
+
+import filecache
+from filecache import FakeFileAPI, RemoteFile, UploadCache, wait_active, STATE_ACTIVE, STATE_PROCESSING
+
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(filecache, 'POLL_INITIAL_S', 0.001)
+    monkeypatch.setattr(filecache, 'POLL_MAX_S', 0.001)
+
+
+@pytest.fixture
+def pdfs(tmp_path):
+    paths = []
+    for name, content in (('fork.pdf', b'fork'), ('shock.pdf', b'shock'), ('fork_copy.pdf', b'fork')):
+        path = tmp_path / name
+        path.write_bytes(content)
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / filecache.UPLOAD_CACHE_FILENAME)
+
+
+# ============================================================================
+# UPLOAD CACHE
+# ============================================================================
+
+def test_second_sync_reuses_active_uploads(pdfs, cache_path):
+    api = FakeFileAPI(processing_polls=2)
+    files, stats = UploadCache(cache_path).sync(pdfs, api, workers=3)
+    # Contenuto duplicato caricato una volta sola
+    assert stats == {'uploaded': 2, 'cached': 0, 'failed': 0} and api.uploads == 2
+    assert len(files) == 3 and files[0].name == files[2].name
+    assert all(f.state == STATE_ACTIVE for f in files)
+
+    files_again, stats = UploadCache(cache_path).sync(pdfs, api)
+    assert stats == {'uploaded': 0, 'cached': 2, 'failed': 0} and api.uploads == 2
+    assert [f.name for f in files_again] == [f.name for f in files]
+
+
+def test_expiring_uploads_are_replaced(pdfs, cache_path):
+    api = FakeFileAPI(processing_polls=0, ttl_s=filecache.EXPIRY_MARGIN_S / 2)
+    UploadCache(cache_path).sync(pdfs[:1], api)
+    _, stats = UploadCache(cache_path).sync(pdfs[:1], api)
+    assert stats['uploaded'] == 1 and api.uploads == 2
+
+
+def test_remote_file_gone_triggers_a_new_upload(pdfs, cache_path):
+    UploadCache(cache_path).sync(pdfs[:2], FakeFileAPI(processing_polls=0))
+    # Stesso cache file, servizio che non conosce più i file
+    api = FakeFileAPI(processing_polls=0)
+    files, stats = UploadCache(cache_path).sync(pdfs[:2], api)
+    assert stats == {'uploaded': 2, 'cached': 0, 'failed': 0} and len(files) == 2
+
+
+# ============================================================================
+# PROCESSING STATE
+# ============================================================================
+
+class StuckAPI:
+    def __init__(self, state: str):
+        self.state = state
+
+    def get(self, name: str) -> RemoteFile:
+        return RemoteFile(name, 'fake://x', 'application/pdf', self.state, 0.0)
+
+
+def test_wait_active_fails_on_error_or_timeout():
+    with pytest.raises(RuntimeError):
+        wait_active(StuckAPI('FAILED'), RemoteFile('files/a', '', '', STATE_PROCESSING, 0.0))
+    with pytest.raises(TimeoutError):
+        wait_active(StuckAPI(STATE_PROCESSING), RemoteFile('files/a', '', '', STATE_PROCESSING, 0.0), timeout_s=0.01)
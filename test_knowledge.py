@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from knowledge import KnowledgeIndex, telemetry_query, format_passages, tokenize
+
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+FORK = """# Forcella
+## Compressione alte velocità
+Il registro HSC controlla la compressione alle alte velocità: chiudilo se la forcella
+affonda sui gradini, aprilo se trasmette vibrazioni e harshness alle mani.
+## Ritorno
+Il ritorno troppo lento fa impaccare la forcella sulle radici ravvicinate.
+"""
+
+TYRES = """# Gomme
+## Pressione
+Con il tubeless la pressione delle gomme si abbassa di 0.1 bar per più comfort e meno vibrazioni.
+"""
+
+
+@pytest.fixture
+def manuals(tmp_path):
+    folder = tmp_path / 'manuals'
+    folder.mkdir()
+    (folder / 'fork.md').write_text(FORK, encoding='utf-8')
+    (folder / 'tyres.md').write_text(TYRES, encoding='utf-8')
+    return folder
+
+
+# ============================================================================
+# INDEX
+# ============================================================================
+
+def test_search_ranks_the_matching_section_first(manuals):
+    index = KnowledgeIndex(str(manuals))
+    assert index.update() == {'indexed': 2, 'unchanged': 0, 'removed': 0, 'skipped': 0}
+    hits = index.search('pressione gomme tubeless', k=3)
+    assert hits[0]['source'] == 'tyres.md' and hits[0]['section'] == 'Pressione'
+    assert index.search('compressione alte velocità', k=1)[0]['section'] == 'Compressione alte velocità'
+    assert index.search('zzz qqq') == []
+
+
+def test_update_reindexes_only_changed_files(manuals):
+    index = KnowledgeIndex(str(manuals))
+    index.update()
+    version = index.version()
+
+    # Indice ricaricato dal disco, nessun file cambiato
+    reloaded = KnowledgeIndex(str(manuals))
+    assert reloaded.update() == {'indexed': 0, 'unchanged': 2, 'removed': 0, 'skipped': 0}
+    assert reloaded.version() == version
+
+    # mtime cambiato, contenuto uguale: hash ricontrollato, nessuna reindicizzazione
+    os.utime(manuals / 'fork.md', (1, 1))
+    assert reloaded.update()['indexed'] == 0 and reloaded.version() == version
+
+    (manuals / 'tyres.md').write_text(TYRES + 'Controlla la pressione prima di ogni uscita.\n', encoding='utf-8')
+    os.remove(manuals / 'fork.md')
+    stats = reloaded.update()
+    assert stats['indexed'] == 1 and stats['removed'] == 1
+    assert reloaded.version() != version
+    assert {hit['source'] for hit in reloaded.search('forcella ritorno pressione')} == {'tyres.md'}
+
+
+# ============================================================================
+# TELEMETRY QUERIES
+# ============================================================================
+
+def test_telemetry_query_and_passages(manuals):
+    index = KnowledgeIndex(str(manuals))
+    index.update()
+    query = telemetry_query({'peak_hz': 25.0, 'high_energy': 2.0, 'low_energy': 1.0}, 'mani indolenzite')
+    assert 'harshness' in query and 'pressione gomme' in query
+    text = format_passages(index.search(query, k=2))
+    assert text.startswith('[') and '[fork.md, Compressione alte velocità]' in text
+
+
+def test_tokenize_folds_accents_and_stems():
+    assert tokenize('Velocità delle Sospensioni') == tokenize('velocita sospensione')
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from fifo import DSV16X_DTIME, GROUP_ACC, GROUP_GYRO, FifoStreamDecoder
+from live import LiveSession
+from synthetic import SensorStream, generate_ride
+
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+FS = 120.0
+DURATION_S = 10.0
+
+
+def sensor_words(mode: str, n_slots: int) -> np.ndarray:
+    """Parole FIFO di un sensore: intestazione (ODRCHG, TS, primo campione) e `n_slots` slot."""
+    stream = SensorStream(0, FS, mode, ts_every=4, drift_ppm=0.0, rng=np.random.default_rng(0))
+    words, _ = stream.next(n_slots)
+    return words
+
+
+# ============================================================================
+# DECODER
+# ============================================================================
+
+@pytest.mark.parametrize('mode, per_slot', [('none', 1), ('2x', 2), ('3x', 3)])
+def test_decoder_recovers_every_sample_at_the_bdr(mode, per_slot):
+    n_slots = 300
+    decoder = FifoStreamDecoder()
+    # Pacchetti di lunghezza arbitraria: lo stato passa da una chiamata all'altra
+    words = sensor_words(mode, n_slots)
+    parts = [decoder.decode(chunk) for chunk in np.array_split(words, 7)]
+    ticks = np.concatenate([p[0] for p in parts]).astype(np.int64)
+    groups = np.concatenate([p[1] for p in parts])
+
+    assert decoder.invalid_words == 0
+    assert decoder.sample_rate == pytest.approx({GROUP_ACC: FS, GROUP_GYRO: FS})
+    for group in (GROUP_ACC, GROUP_GYRO):
+        t = np.sort(ticks[groups == group])
+        assert len(t) == n_slots * per_slot + 1
+        assert np.all(np.diff(t) == DSV16X_DTIME[6])
+
+
+# ============================================================================
+# LIVE SESSION
+# ============================================================================
+
+def test_live_session_decodes_a_split_stream(tmp_path):
+    path = str(tmp_path / 'ride.bin')
+    generate_ride(path, sensors=2, duration_s=DURATION_S, fs=FS, seed=1)
+    data = open(path, 'rb').read()
+
+    live = LiveSession('ride')
+    # Blocchi che spezzano header e payload in punti qualunque
+    for chunk in np.array_split(np.frombuffer(data, dtype=np.uint8), 13):
+        live.feed(chunk.tobytes())
+    stats = live.stats(window_s=2.0)
+
+    assert [s['sensor'] for s in stats['sensors']] == [0, 1]
+    for sensor in stats['sensors']:
+        assert sensor['sample_rate'] == pytest.approx(FS)
+        assert sensor['invalid_words'] == 0
+        assert abs(sensor['acc_samples'] - DURATION_S * FS) <= 30
+        assert sensor['window_s'] == pytest.approx(2.0)
+        assert all(r > 0 for r in sensor['rms'])
+
+    window = live.window(0, 1.0, 'acc')
+    assert window['samples'] == int(FS)
+    assert np.allclose(np.diff(window['t_ms']), 1000.0 / FS, rtol=1e-3)
+
+
+def test_window_longer_than_the_buffer_is_rejected():
+    live = LiveSession('ride', buffer_s=5)
+    live.feed(b'')
+    words = sensor_words('none', 100)
+    header = np.array([(0, 0, words.nbytes)], dtype=[('h', '<u2'), ('t', '<u4'), ('s', '<u2')]).tobytes()
+    live.feed(header + words.tobytes())
+    with pytest.raises(ValueError):
+        live.window(0, 60.0)
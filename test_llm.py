@@ -0,0 +1,67 @@
+import pytest
+
+from llm import ReportAgent, ResponseCache, StubBackend
+
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+SYSTEM_PROMPT = 'Sei un tecnico di sospensioni.'
+SUMMARY = {'rms_g': 0.4123456789, 'peak_hz': 12.5}
+
+
+def build_prompt(summary, notes, passages=None):
+    prompt = f"- RMS: {summary['rms_g']} G\n- Picco: {summary['peak_hz']} Hz\n- Note: {notes}\n"
+    return prompt + (f"ESTRATTI:\n{passages}\n" if passages else '')
+
+
+def build_prompt_v2(summary, notes, passages=None):
+    return 'Rispondi in inglese.\n' + build_prompt(summary, notes, passages)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / 'cache'))
+
+
+def make_agent(cache, template=build_prompt, kb_version='kb1'):
+    return ReportAgent(StubBackend(), SYSTEM_PROMPT, template, cache, kb_version)
+
+
+# ============================================================================
+# CACHE KEY
+# ============================================================================
+
+def test_same_rendered_prompt_hits_the_cache(cache):
+    agent = make_agent(cache)
+    text, cached = agent.report(SUMMARY, 'Forcella dura')
+    # Rumore oltre le cifre significative: stesso prompt, stessa risposta
+    again, cached_again = agent.report({'peak_hz': 12.5, 'rms_g': 0.41234568}, 'Forcella dura')
+    assert not cached and cached_again and again == text
+    assert agent.backend.calls == 1
+
+
+def test_retrieved_passages_change_the_key(cache):
+    agent = make_agent(cache)
+    _, first = agent.report(SUMMARY, 'Forcella dura', passages='[Fox 36] Chiudi LSC')
+    _, second = agent.report(SUMMARY, 'Forcella dura', passages='[Fox 36] Apri HSR')
+    assert not first and not second
+    assert agent.backend.calls == 2
+
+
+def test_template_and_knowledge_base_change_the_key(cache):
+    make_agent(cache).report(SUMMARY, 'ok')
+    for agent in (make_agent(cache, template=build_prompt_v2), make_agent(cache, kb_version='kb2')):
+        _, cached = agent.report(SUMMARY, 'ok')
+        assert not cached and agent.backend.calls == 1
+
+
+def test_batch_generates_each_prompt_once(cache):
+    agent = make_agent(cache)
+    jobs = [{'summary': SUMMARY, 'notes': 'a'}, {'summary': SUMMARY, 'notes': 'b'},
+            {'summary': SUMMARY, 'notes': 'a'}, {'summary': SUMMARY, 'notes': 'a', 'passages': 'x'}]
+    results = agent.batch(jobs, workers=2)
+    assert agent.backend.calls == 3
+    assert results[0] == results[2] and results[0]['text'] != results[1]['text']
+    assert all(r['error'] is None for r in results)
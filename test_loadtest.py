@@ -0,0 +1,15 @@
+from loadtest import mark_test_session, remove_test_sessions, SESSION_PREFIX
+
+
+# ============================================================================
+# CLEANUP
+# ============================================================================
+
+def test_only_marked_test_sessions_are_removed(tmp_path):
+    for name in (f'{SESSION_PREFIX}_run_0', f'{SESSION_PREFIX}_run_1', f'{SESSION_PREFIX}_ride', 'ride'):
+        (tmp_path / name).mkdir()
+    mark_test_session(str(tmp_path), f'{SESSION_PREFIX}_run_0', 'run')
+    mark_test_session(str(tmp_path), f'{SESSION_PREFIX}_run_1', 'run')
+
+    assert remove_test_sessions(str(tmp_path)) == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == [f'{SESSION_PREFIX}_ride', 'ride']
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+import memory
+import train
+from memory import plan_memory, measure_samples_per_word
+from synthetic import generate_ride
+
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+SENSORS = 4
+FS = 120.0
+HOUR_S = 3600.0
+
+
+@pytest.fixture
+def no_meminfo(monkeypatch):
+    """Margine dell'analisi solo da configurazione, indipendente dalla macchina dei test."""
+    monkeypatch.setattr(memory, 'available_memory_mb', lambda: None)
+
+
+def ride_index(tmp_path, compression: str, duration_s: float = HOUR_S):
+    path = str(tmp_path / f'ride_{compression}.bin')
+    generate_ride(path, sensors=SENSORS, duration_s=duration_s, fs=FS, compression=compression, seed=1)
+    train.demux_binary_file(path, str(tmp_path))
+    return path, train.load_packet_index(path)
+
+
+# ============================================================================
+# PLANNER
+# ============================================================================
+
+@pytest.mark.parametrize('compression', ['none', '3x'])
+def test_one_hour_ride_is_planned_not_rejected(tmp_path, no_meminfo, compression):
+    path, packets = ride_index(tmp_path, compression)
+    plan = plan_memory(packets, train.ANALYSIS_MEMORY_HEADROOM_MB, measure_samples_per_word(path, packets))
+    assert plan.mode in ('memory', 'lean')
+    # acc + gyro a 120 Hz per un'ora
+    for samples in plan.samples.values():
+        assert samples == pytest.approx(2 * FS * HOUR_S, rel=0.05)
+
+
+@pytest.mark.parametrize('compression', ['none', '2x', '3x'])
+def test_samples_per_word_matches_the_whole_stream(tmp_path, compression):
+    path, packets = ride_index(tmp_path, compression)
+    ratios = measure_samples_per_word(path, packets)
+    per_tag = np.zeros(256)
+    for tag, n in memory.PLAN_SAMPLES_PER_TAG.items():
+        per_tag[tag] = n
+    for handle in range(SENSORS):
+        tags = np.fromfile(str(tmp_path / f'ride_{compression}_sensor_{handle}.bin'), dtype=np.uint8)[::7] >> 3
+        assert ratios[handle] == pytest.approx(per_tag[tags].mean(), rel=0.02)
+    if compression == 'none':
+        # Solo parole TS oltre ai campioni
+        assert all(0.9 < r < 1.0 for r in ratios.values())
+
+
+def test_headroom_is_capped_by_mem_available(tmp_path, monkeypatch):
+    path, packets = ride_index(tmp_path, 'none', duration_s=600.0)
+    ratios = measure_samples_per_word(path, packets)
+    monkeypatch.setattr(memory, 'available_memory_mb', lambda: 4096.0)
+    assert plan_memory(packets, 256.0, ratios).mode == 'memory'
+    monkeypatch.setattr(memory, 'available_memory_mb', lambda: 20.0)
+    plan = plan_memory(packets, 256.0, ratios)
+    assert plan.mode == 'reject' and plan.available_mb == pytest.approx(20.0 * memory.PLAN_MEMAVAILABLE_FRACTION)
+
+
+def test_unknown_payload_assumes_the_densest_words(no_meminfo):
+    packets = np.array([(0, 0, 0, 700)], dtype=train.PACKET_INDEX_DTYPE)
+    plan = plan_memory(packets, 256.0)
+    assert plan.samples == {0: int(100 * memory.PLAN_SAMPLES_PER_WORD_MAX)}
+
+
+# ============================================================================
+# RECORDED USAGE
+# ============================================================================
+
+class FakeMonitor:
+    def __init__(self, delta_mb: float):
+        self.delta_mb = delta_mb
+        self.peak_mb = 100.0 + delta_mb
+
+
+def test_headroom_miss_is_surfaced_by_get_analysis(tmp_path, monkeypatch, no_meminfo):
+    monkeypatch.setattr(train, 'UPLOAD_FOLDER', str(tmp_path))
+    monkeypatch.setattr(train, 'STORAGE_MANAGER_ENABLED', False)
+    session_dir = tmp_path / 'ride'
+    session_dir.mkdir()
+    packets = np.array([(0, 0, 0, 7000)], dtype=train.PACKET_INDEX_DTYPE)
+    plan = plan_memory(packets, 64.0, {0: 1.0})
+
+    memory.record_memory_plan(plan, FakeMonitor(80.0), 1000, str(session_dir), 64.0)
+    record = train.app.test_client().get('/api/analysis/ride').get_json()['memory']
+    assert record['mode'] == 'memory' and record['within_headroom'] is False
+    assert record['actual_delta_mb'] == 80.0 and record['headroom_mb'] == 64.0
+
+    # CSV caricato direttamente: nessuna stima, solo la misura
+    record = memory.record_memory_plan(None, FakeMonitor(10.0), 1000, str(session_dir), 64.0)
+    assert record['within_headroom'] and record['estimate_ratio'] is None
@@ -0,0 +1,56 @@
+import os
+import threading
+
+import pytest
+
+import train
+from profiling import RequestProfiler, list_profiles
+
+
+# ============================================================================
+# PROFILER
+# ============================================================================
+
+def test_only_one_profile_is_active_at_a_time(tmp_path):
+    first = RequestProfiler().start()
+    assert first is not None
+    assert RequestProfiler().start() is None
+    sum(range(1000))
+    first.stop()
+    first.stop()
+
+    second = RequestProfiler().start()
+    assert second is not None
+    second.stop()
+    base = second.save(str(tmp_path), 'test')
+    assert {p['name'] for p in list_profiles(str(tmp_path))} == {f'{base}.pstats', f'{base}.collapsed'}
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    folder = tmp_path / 'uploads'
+    (folder / 'ride').mkdir(parents=True)
+    monkeypatch.setattr(train, 'UPLOAD_FOLDER', str(folder))
+    monkeypatch.setattr(train, 'STORAGE_MANAGER_ENABLED', False)
+    monkeypatch.setattr(train, 'PROFILE_ALL_REQUESTS', True)
+    return folder
+
+
+def test_concurrent_profiled_requests_do_not_fail(uploads):
+    barrier = threading.Barrier(4)
+    statuses = []
+
+    def worker():
+        client = train.app.test_client()
+        barrier.wait()
+        for _ in range(5):
+            statuses.append(client.get('/api/events/ride').status_code)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(statuses) == 20 and 500 not in statuses
+    assert os.listdir(uploads / 'ride' / 'profiles')
@@ -0,0 +1,103 @@
+import time
+import threading
+
+import numpy as np
+import pytest
+
+import train
+from fifo import DSV16X_DTIME
+from progress import ProgressRegistry, FileProgressChannel, sse_stream, PROGRESS_FILENAME
+from session import SessionData
+
+
+# ============================================================================
+# PREVIEW
+# ============================================================================
+
+def make_session(duration_s: float, fs: float = 120.0) -> SessionData:
+    """Sessione di due sensori con timestamp in tick del sensore (120 Hz)."""
+    n = int(duration_s * fs)
+    ticks = np.arange(n, dtype=np.int64) * DSV16X_DTIME[6] + 987_654
+    parts = []
+    for sensor in (0, 1):
+        tags = np.tile(np.array([0, 1], dtype=np.int8), n)
+        counts = np.random.default_rng(sensor).integers(-2000, 2000, size=(2 * n, 3)).astype(np.int16)
+        parts.append((sensor, np.repeat(ticks, 2), tags, counts))
+    return SessionData.build(parts, lambda sensor, group, c: c.astype(np.float32) * np.float32(0.001))
+
+
+def test_preview_duration_is_in_seconds():
+    preview = train.session_preview(make_session(600.0), max_points=100)
+    assert [s['sensor'] for s in preview['sensors']] == [0, 1]
+    for sensor in preview['sensors']:
+        assert sensor['samples'] == 600 * 120
+        assert sensor['duration_s'] == pytest.approx(600.0 - 1.0 / 120, abs=1e-3)
+        assert 0.0 <= sensor['t_s'][0] <= sensor['t_s'][-1] <= sensor['duration_s']
+        assert len(sensor['t_s']) == len(sensor['acc_z']) <= 100
+
+
+# ============================================================================
+# PROGRESS ACROSS WORKERS
+# ============================================================================
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    folder = tmp_path / 'uploads'
+    folder.mkdir()
+    monkeypatch.setattr(train, 'UPLOAD_FOLDER', str(folder))
+    monkeypatch.setattr(train, 'STORAGE_MANAGER_ENABLED', False)
+    return folder
+
+
+def test_events_reach_a_subscriber_in_another_process(tmp_path):
+    path = str(tmp_path / PROGRESS_FILENAME)
+    # Il worker dell'analisi e quello dell'iscritto non condividono la memoria
+    pipeline = ProgressRegistry().open('ride', path)
+    reader = FileProgressChannel('ride', path, poll_s=0.01)
+    stream = sse_stream(reader, heartbeat_s=0.05, pending_timeout_s=1.0)
+    assert next(stream).startswith('retry:')
+
+    def publish():
+        for stage in ('uploaded', 'decoded'):
+            time.sleep(0.05)
+            pipeline.publish('stage', {'stage': stage})
+        pipeline.publish('done', {'elapsed_s': 0.1})
+
+    worker = threading.Thread(target=publish)
+    worker.start()
+    chunks = list(stream)
+    worker.join()
+
+    events = [c for c in chunks if c.startswith('id:')]
+    assert [e.split('\n')[1] for e in events] == ['event: stage', 'event: stage', 'event: done']
+    assert events[0].startswith('id: 1\n') and events[-1].startswith('id: 3\n')
+
+
+def test_reopen_resets_the_progress_file(tmp_path):
+    path = str(tmp_path / PROGRESS_FILENAME)
+    registry = ProgressRegistry()
+    registry.open('ride', path).publish('done', {})
+    registry.open('ride', path).publish('stage', {'stage': 'uploaded'})
+    reader = FileProgressChannel('ride', path)
+    events, finished = reader.wait(0, 0.0)
+    assert [name for _, name, _ in events] == ['stage'] and not finished
+
+
+def test_progress_route_replays_a_finished_analysis(uploads):
+    session_dir = uploads / 'ride'
+    session_dir.mkdir()
+    channel = ProgressRegistry().open('ride', str(session_dir / PROGRESS_FILENAME))
+    channel.publish('stage', {'stage': 'uploaded'})
+    channel.publish('done', {'elapsed_s': 1.0})
+
+    response = train.app.test_client().get('/api/progress/ride', headers={'Last-Event-ID': '1'})
+    body = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert 'event: done' in body and 'event: stage' not in body
+
+
+def test_progress_route_unknown_session(uploads):
+    client = train.app.test_client()
+    assert client.get('/api/progress/nope').status_code == 404
+    body = client.get('/api/progress/nope?wait=0.1').get_data(as_text=True)
+    assert 'event: timeout' in body
@@ -0,0 +1,104 @@
+import os
+
+import pytest
+
+import train
+from scratch import ScratchSpace, commit_file
+from synthetic import generate_ride
+
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def ram_root(tmp_path):
+    """Cartella al posto del tmpfs: stessa logica, nessun file in /dev/shm."""
+    root = tmp_path / 'shm'
+    root.mkdir()
+    return str(root)
+
+
+@pytest.fixture
+def session_dir(tmp_path):
+    session_dir = tmp_path / 'ride'
+    session_dir.mkdir()
+    return str(session_dir)
+
+
+# ============================================================================
+# SCRATCH SPACE
+# ============================================================================
+
+def test_small_files_stay_in_ram_large_ones_spill(session_dir, ram_root):
+    with ScratchSpace(session_dir, ram_cap_mb=1, ram_root=ram_root) as scratch:
+        small = scratch.path('a.csv', 100_000)
+        large = scratch.path('b.csv', 2 * MB)
+        assert scratch.in_ram(small) and not scratch.in_ram(large)
+        assert os.path.dirname(large).startswith(session_dir)
+    assert os.listdir(ram_root) == [] and os.listdir(session_dir) == []
+
+
+def test_exhausted_only_when_the_cap_is_exceeded(session_dir, ram_root):
+    with ScratchSpace(session_dir, ram_cap_mb=1, ram_root=ram_root) as scratch:
+        path = scratch.path('a.csv', 100_000)
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 1000)
+        assert not scratch.exhausted(path)
+        with open(path, 'wb') as f:
+            f.write(b'\0' * (2 * MB))
+        assert scratch.exhausted(path)
+        assert not scratch.exhausted(scratch.disk_path('a.csv'))
+
+
+def test_commit_moves_the_complete_file(session_dir, ram_root):
+    with ScratchSpace(session_dir, ram_root=ram_root) as scratch:
+        path = scratch.path('a.csv', 10)
+        with open(path, 'w') as f:
+            f.write('done')
+        dest = commit_file(path, os.path.join(session_dir, 'a.csv'))
+    assert open(dest).read() == 'done' and os.listdir(session_dir) == ['a.csv']
+
+
+# ============================================================================
+# DECODE RETRY
+# ============================================================================
+
+@pytest.fixture
+def telemetry(session_dir, ram_root, monkeypatch):
+    path = os.path.join(session_dir, 'ride.bin')
+    generate_ride(path, sensors=1, duration_s=5.0, seed=1)
+    monkeypatch.setattr(train, 'ScratchSpace', lambda fallback_dir, cap: ScratchSpace(fallback_dir, 1, ram_root))
+    return path
+
+
+def fake_decoder(monkeypatch, ram_bytes: int, ok_on_disk: bool):
+    """Decoder che in RAM scrive `ram_bytes` e fallisce; su disco riesce se `ok_on_disk`."""
+    calls = []
+
+    def decode(bin_path, csv_path):
+        calls.append(csv_path)
+        in_ram = len(calls) == 1
+        with open(csv_path, 'wb') as f:
+            f.write(b'\0' * ram_bytes if in_ram else b'timestamp_ms,tag,x,y,z\n')
+        return not in_ram and ok_on_disk
+
+    monkeypatch.setattr(train, 'decode_sensor_binary', decode)
+    return calls
+
+
+def test_decode_retries_on_disk_when_ram_runs_out(telemetry, session_dir, monkeypatch):
+    calls = fake_decoder(monkeypatch, 2 * MB, ok_on_disk=True)
+    csv_paths = train.process_binary_to_csv(telemetry)
+    assert len(calls) == 2 and not calls[1].startswith(os.path.dirname(calls[0]))
+    assert csv_paths == [os.path.join(session_dir, 'ride_sensor_0.csv')]
+
+
+def test_other_decoder_failures_are_not_retried(telemetry, monkeypatch):
+    calls = fake_decoder(monkeypatch, 100, ok_on_disk=True)
+    with pytest.raises(RuntimeError):
+        train.process_binary_to_csv(telemetry)
+    assert len(calls) == 1
@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from session import SessionData, TAG_ACC, TAG_GYRO
+
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+TAG_TEMPERATURE = 2  # tag non gestito: deve restare fuori dalla sessione
+
+
+def make_part(sensor: int, n: int, seed: int):
+    """Campioni grezzi di un sensore con tag mescolati e timestamp fuori ordine."""
+    rng = np.random.default_rng(seed)
+    tags = rng.choice([TAG_GYRO, TAG_ACC, TAG_TEMPERATURE], size=n).astype(np.int8)
+    timestamps = rng.permutation(np.arange(n, dtype=np.int64) * 10)
+    counts = rng.integers(-2000, 2000, size=(n, 3)).astype(np.int16)
+    return sensor, timestamps, tags, counts
+
+
+def calibrate(sensor: int, group: str, counts: np.ndarray) -> np.ndarray:
+    # Scala diversa per sensore e gruppo: verifica che ogni tratto riceva la sua
+    scale = sensor + (0.5 if group == 'acc' else 0.25)
+    return counts.astype(np.float32) * np.float32(scale)
+
+
+def expected_group(part, group: str):
+    sensor, timestamps, tags, counts = part
+    mask = tags == (TAG_ACC if group == 'acc' else TAG_GYRO)
+    order = np.argsort(timestamps[mask], kind='stable')
+    return timestamps[mask][order], calibrate(sensor, group, counts[mask][order])
+
+
+@pytest.fixture
+def parts():
+    # Ordine di input diverso dall'ordine dei conn_handle
+    return [make_part(7, 500, seed=1), make_part(2, 300, seed=2)]
+
+
+@pytest.fixture
+def session(parts):
+    return SessionData.build(parts, calibrate)
+
+
+# ============================================================================
+# LAYOUT
+# ============================================================================
+
+def test_sensors_sorted_and_unknown_tags_dropped(parts, session):
+    assert session.sensors.tolist() == [2, 7]
+    known = sum(int(np.isin(tags, [TAG_ACC, TAG_GYRO]).sum()) for _, _, tags, _ in parts)
+    assert len(session.time_ms) == len(session.values) == known
+    assert session.time_ms.dtype == np.int64
+    assert session.values.dtype == np.float32
+
+
+def test_offsets_partition_the_arrays(session):
+    offsets = session.offsets
+    assert len(offsets) == 2 * len(session) + 1
+    assert offsets[0] == 0 and offsets[-1] == len(session.time_ms)
+    assert np.all(np.diff(offsets) >= 0)
+
+
+def test_groups_match_sorted_calibrated_samples(parts, session):
+    for part in parts:
+        for group in ('acc', 'gyro'):
+            t, values = session.group(part[0], group)
+            expected_t, expected_values = expected_group(part, group)
+            np.testing.assert_array_equal(t, expected_t)
+            np.testing.assert_array_equal(values, expected_values)
+
+
+# ============================================================================
+# VIEWS AND WINDOWS
+# ============================================================================
+
+def test_group_and_channel_are_views(session):
+    t, block = session.group(7, 'acc')
+    assert np.shares_memory(t, session.time_ms)
+    assert np.shares_memory(block, session.values)
+    _, acc_z = session.channel(7, 'acc', 'z')
+    assert np.shares_memory(acc_z, session.values)
+    np.testing.assert_array_equal(acc_z, block[:, 2])
+
+
+def test_window_bounds_are_inclusive(session):
+    t_all, block_all = session.group(2, 'gyro')
+    t0, t1 = int(t_all[10]), int(t_all[40])
+    t, block = session.group(2, 'gyro', t0=t0, t1=t1)
+    assert t[0] == t0 and t[-1] == t1
+    np.testing.assert_array_equal(block, block_all[10:41])
+
+    _, y = session.channel(2, 'gyro', 'y', t0=t0, t1=t1)
+    np.testing.assert_array_equal(y, block_all[10:41, 1])
+
+
+def test_window_outside_the_session_is_empty(session):
+    t_all, _ = session.group(7, 'acc')
+    t, block = session.group(7, 'acc', t0=int(t_all[-1]) + 1)
+    assert len(t) == 0 and block.shape == (0, 3)
+
+
+@pytest.mark.parametrize('args', [(99, 'acc', 'z'), (2, 'mag', 'z'), (2, 'acc', 'w')])
+def test_unknown_sensor_group_or_axis(session, args):
+    with pytest.raises(KeyError):
+        session.channel(*args)
+
+
+def test_streams_and_describe_cover_every_group(session):
+    streams = session.streams()
+    assert sorted(streams) == [2, 7]
+    described = {(row['sensor'], row['group']): row['samples'] for row in session.describe()}
+    for sensor, groups in streams.items():
+        for group, (t, _) in groups.items():
+            assert described[(sensor, group)] == len(t)
@@ -0,0 +1,102 @@
+import os
+import time
+
+import pytest
+
+from storage import (StorageManager, ACCESS_MARKER, touch, last_access, session_lock, compress_session,
+                     restore_file, open_maybe_compressed)
+
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+DAY = 86400.0
+
+
+def make_session(folder, name: str, age_days: float = 0.0):
+    """Sessione con telemetria, CSV decodificato, artefatti derivati e un profilo catturato."""
+    session_dir = folder / name
+    (session_dir / 'profiles').mkdir(parents=True)
+    (session_dir / 'ride.bin').write_bytes(b'\x01\x02' * 5000)
+    (session_dir / 'ride_sensor_0.csv').write_text('timestamp_ms,tag,x,y,z\n' + '1,1,0,0,0\n' * 2000)
+    (session_dir / 'events.npy').write_bytes(b'\0' * 4096)
+    (session_dir / 'profiles' / 'upload.pstats').write_bytes(b'\0' * 4096)
+    touch(str(session_dir))
+    stamp = time.time() - age_days * DAY
+    os.utime(session_dir / ACCESS_MARKER, (stamp, stamp))
+    return session_dir
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    folder = tmp_path / 'uploads'
+    folder.mkdir()
+    return folder
+
+
+# ============================================================================
+# ACCESS TRACKING
+# ============================================================================
+
+def test_touch_is_throttled(uploads):
+    session_dir = make_session(uploads, 'ride', age_days=0.0)
+    marker = session_dir / ACCESS_MARKER
+    recent = time.time() - 10
+    os.utime(marker, (recent, recent))
+    touch(str(session_dir), interval_s=300)
+    assert last_access(str(session_dir)) == pytest.approx(recent)
+
+    old = time.time() - 1000
+    os.utime(marker, (old, old))
+    touch(str(session_dir), interval_s=300)
+    assert last_access(str(session_dir)) > recent
+
+
+# ============================================================================
+# SWEEP
+# ============================================================================
+
+def test_cold_sessions_are_compressed_and_restored(uploads):
+    session_dir = make_session(uploads, 'old', age_days=30)
+    stats = StorageManager(str(uploads), quota_mb=1000, cold_after_days=14).sweep()
+    assert stats['compressed_sessions'] == 1
+    assert sorted(p.name for p in session_dir.iterdir() if p.suffix == '.gz') == ['ride.bin.gz', 'ride_sensor_0.csv.gz']
+
+    path = str(session_dir / 'ride.bin')
+    with open_maybe_compressed(path) as f:
+        assert f.read() == b'\x01\x02' * 5000
+    restore_file(path)
+    assert (session_dir / 'ride.bin').read_bytes() == b'\x01\x02' * 5000
+
+
+def test_hidden_work_dirs_are_not_sessions(uploads):
+    scratch = make_session(uploads, '.import_abc', age_days=30)
+    stats = StorageManager(str(uploads), quota_mb=0, cold_after_days=14).sweep()
+    assert stats['compressed_sessions'] == 0 and stats['evicted_sessions'] == 0
+    assert (scratch / 'ride_sensor_0.csv').exists() and (scratch / 'events.npy').exists()
+
+
+def test_locked_sessions_are_skipped(uploads):
+    session_dir = make_session(uploads, 'busy', age_days=30)
+    with session_lock(str(session_dir)):
+        stats = StorageManager(str(uploads), quota_mb=0, cold_after_days=14).sweep()
+    assert stats['compressed_sessions'] == 0 and stats['evicted_sessions'] == 0
+    assert (session_dir / 'ride_sensor_0.csv').exists()
+    with session_lock(str(session_dir), blocking=False) as locked:
+        assert locked
+
+
+def test_eviction_keeps_profiles(uploads):
+    session_dir = make_session(uploads, 'ride', age_days=1)
+    stats = StorageManager(str(uploads), quota_mb=0, cold_after_days=14).sweep()
+    assert stats['evicted_sessions'] == 1
+    assert not (session_dir / 'events.npy').exists()
+    assert (session_dir / 'profiles' / 'upload.pstats').exists()
+    assert (session_dir / 'ride_sensor_0.csv').exists()
+
+
+def test_compress_session_only_touches_cold_files(uploads):
+    session_dir = make_session(uploads, 'ride')
+    assert compress_session(str(session_dir)) > 0
+    assert (session_dir / 'events.npy').exists()
@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+
+from windows import (save_session_windows, load_session_windows, windows_filename, DEFAULT_WINDOW_CONFIGS,
+                     MAX_ON_DEMAND_WINDOW_CONFIGS)
+
+
+# ============================================================================
+# ON-DEMAND CACHE
+# ============================================================================
+
+ARRAYS = {'s0_acc_time_ms': np.arange(4, dtype=np.float64), 's0_acc_rms': np.ones((4, 3), dtype=np.float32)}
+
+
+def age(session_dir, window_s, hop_s, seconds_ago):
+    path = os.path.join(str(session_dir), windows_filename(window_s, hop_s))
+    stamp = os.path.getmtime(path) - seconds_ago
+    os.utime(path, (stamp, stamp))
+
+
+def test_on_demand_configs_are_capped_least_recently_used_first(tmp_path):
+    for window_s, hop_s in DEFAULT_WINDOW_CONFIGS:
+        save_session_windows(str(tmp_path), ARRAYS, window_s, hop_s)
+        age(tmp_path, window_s, hop_s, 10_000)
+
+    requested = [(float(w), w / 2.0) for w in range(2, 2 + MAX_ON_DEMAND_WINDOW_CONFIGS)]
+    for k, (window_s, hop_s) in enumerate(requested):
+        save_session_windows(str(tmp_path), ARRAYS, window_s, hop_s)
+        age(tmp_path, window_s, hop_s, 1000 - k)
+
+    # La più vecchia viene riletta: diventa la più recente e sopravvive
+    np.testing.assert_array_equal(load_session_windows(str(tmp_path), *requested[0])['s0_acc_rms'], ARRAYS['s0_acc_rms'])
+    save_session_windows(str(tmp_path), ARRAYS, 30.0, 15.0)
+
+    kept = {name for name in os.listdir(tmp_path) if name.startswith('windows_')}
+    assert len(kept) == len(DEFAULT_WINDOW_CONFIGS) + MAX_ON_DEMAND_WINDOW_CONFIGS
+    assert {windows_filename(*c) for c in DEFAULT_WINDOW_CONFIGS} <= kept
+    assert windows_filename(*requested[0]) in kept and windows_filename(30.0, 15.0) in kept
+    assert windows_filename(*requested[1]) not in kept
+    assert load_session_windows(str(tmp_path), *requested[1]) is None
@@ -0,0 +1,213 @@
+import time
+import bisect
+import threading
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+METRIC_PREFIX = 'bcp'
+
+# Limiti dei bucket degli istogrammi di durata [s]
+DURATION_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+# ============================================================================
+# REQUEST TRACE
+# ============================================================================
+
+class RequestTrace:
+    """
+    Span registrati durante una richiesta, per l'header Server-Timing.
+
+    Gli span possono essere annidati (es. render include filter): ognuno
+    riporta la propria durata, senza sottrarre quella dei figli.
+    """
+
+    __slots__ = ('started', 'spans')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, Optional[str], float]] = []
+
+    @property
+    def elapsed_s(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """Valore dell'header Server-Timing (durate in ms), con il totale in coda."""
+        entries = []
+        for stage, desc, seconds in self.spans:
+            desc_part = f';desc="{desc}"' if desc else ''
+            entries.append(f"{stage}{desc_part};dur={seconds * 1000.0:.1f}")
+        entries.append(f"total;dur={self.elapsed_s * 1000.0:.1f}")
+        return ', '.join(entries)
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar('bcp_request_trace', default=None)
+
+
+def start_trace() -> RequestTrace:
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+def finish_trace() -> Optional[RequestTrace]:
+    trace = _current_trace.get()
+    _current_trace.set(None)
+    return trace
+
+
+# ============================================================================
+# METRICS REGISTRY
+# ============================================================================
+
+class MetricsRegistry:
+    """
+    Istogrammi e contatori cumulativi del processo, in formato Prometheus.
+
+    Con più worker gunicorn ogni processo ha il proprio registro: lo
+    scrape di /api/metrics vede il worker che risponde. Disabilitato,
+    ogni metodo ritorna subito.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS_S, enabled: bool = True):
+        self.buckets = buckets
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # (metrica, etichette) -> [conteggi per bucket (+Inf in coda), somma, totale]
+        self._histograms: Dict[Tuple[str, Tuple], list] = {}
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._help: Dict[str, Tuple[str, str]] = {}
+
+    def _describe(self, name: str, kind: str, text: str) -> None:
+        if name not in self._help:
+            self._help[name] = (kind, text)
+
+    def observe(self, name: str, labels: Dict[str, str], seconds: float, help_text: str = '') -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        slot = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._describe(name, 'histogram', help_text)
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][slot] += 1
+            entry[1] += seconds
+            entry[2] += 1
+
+    def inc(self, name: str, labels: Dict[str, str], value: float = 1.0, help_text: str = '') -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._describe(name, 'counter', help_text)
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe_stage(self, stage: str, seconds: float, nbytes: int = 0) -> None:
+        self.observe('stage_duration_seconds', {'stage': stage}, seconds, 'Durata degli stadi della pipeline')
+        if nbytes:
+            self.inc('stage_bytes_total', {'stage': stage}, nbytes, 'Byte elaborati per stadio')
+
+    def observe_request(self, endpoint: str, method: str, status: int, seconds: float) -> None:
+        self.observe('http_request_duration_seconds', {'endpoint': endpoint}, seconds, 'Durata delle richieste HTTP')
+        self.inc('http_requests_total', {'endpoint': endpoint, 'method': method, 'status': str(status)},
+                 help_text='Richieste HTTP servite')
+
+    def render(self) -> str:
+        """Testo nel formato di esposizione Prometheus 0.0.4."""
+        def fmt_labels(labels: Tuple, extra: Optional[Tuple[str, str]] = None) -> str:
+            items = list(labels) + ([extra] if extra else [])
+            if not items:
+                return ''
+            return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+        with self._lock:
+            histograms = {key: (list(counts), total, n) for key, (counts, total, n) in self._histograms.items()}
+            counters = dict(self._counters)
+            described = dict(self._help)
+
+        lines = []
+        for name, (kind, text) in sorted(described.items()):
+            full = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {full} {text}")
+            lines.append(f"# TYPE {full} {kind}")
+            if kind == 'histogram':
+                for (metric, labels), (counts, total, n) in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + (float('inf'),), counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f"{full}_bucket{fmt_labels(labels, ('le', le))} {cumulative}")
+                    lines.append(f"{full}_sum{fmt_labels(labels)} {total:.6f}")
+                    lines.append(f"{full}_count{fmt_labels(labels)} {n}")
+            else:
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{full}{fmt_labels(labels)} {value:g}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+
+# ============================================================================
+# SPANS
+# ============================================================================
+
+class span:
+    """
+    Misura uno stadio della pipeline.
+
+    La durata va nella traccia della richiesta corrente (Server-Timing) e
+    nell'istogramma dello stadio. Senza traccia attiva e con le metriche
+    disabilitate non viene letto nemmeno l'orologio.
+
+    Usage:
+        with span('decode', desc='sensor 2', nbytes=size):
+            ...
+        with span('encode') as s:
+            ...
+            s.nbytes = len(png)
+        render = span('render').start()
+        ...
+        render.stop()
+    """
+
+    __slots__ = ('stage', 'desc', 'nbytes', '_trace', '_started')
+
+    def __init__(self, stage: str, desc: Optional[str] = None, nbytes: int = 0):
+        self.stage = stage
+        self.desc = desc
+        self.nbytes = nbytes
+        self._trace = None
+        self._started = None
+
+    def __enter__(self) -> 'span':
+        self._trace = _current_trace.get()
+        if self._trace is not None or metrics.enabled:
+            self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._started is None:
+            return
+        elapsed = time.perf_counter() - self._started
+        if self._trace is not None:
+            self._trace.spans.append((self.stage, self.desc, elapsed))
+        metrics.observe_stage(self.stage, elapsed, self.nbytes)
+
+    def start(self) -> 'span':
+        """Come `with`, per blocchi lunghi che non conviene reindentare."""
+        return self.__enter__()
+
+    def stop(self) -> None:
+        self.__exit__(None, None, None)
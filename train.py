@@ -6,11 +6,17 @@ import subprocess
 import json
 import time
 import struct
-from typing import Tuple, List, Dict, Optional
+import re
+import hmac
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Tuple, List, Dict, Optional
 
 # Flask imports
 try:
-    from flask import Flask, request, jsonify, send_file, Blueprint
+    from flask import Flask, request, jsonify, send_file, Blueprint, Response, g
     from werkzeug.utils import secure_filename
 except ImportError as e:
     sys.stderr.write(f"CRITICAL: Missing Flask module '{e.name}'. Install with: pip install flask\n")
@@ -24,17 +30,45 @@ try:
     matplotlib.use('Agg')  # Thread-safe backend
     from matplotlib.figure import Figure 
     from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-    from scipy.signal import butter, filtfilt
+    from scipy.signal import butter
 except ImportError as e:
     sys.stderr.write(f"CRITICAL: Missing scientific module '{e.name}'. Install with: pip install numpy pandas matplotlib scipy\n")
     sys.exit(1)
 
+# Local modules
+from events import EventIndex, detect_events, events_to_json
+from alignment import AlignedSession, align_sensors, ALIGNMENT_INFO_FILENAME
+from calibration import CalibrationStore, apply_affine
+from features import FeatureTable, compute_sensor_features
+from fifo import ticks_to_s
+from windows import (compute_session_windows, save_session_windows, load_session_windows,
+                     select_windows, DEFAULT_WINDOW_CONFIGS)
+from summary import summarize_sensor, build_summary, save_summary, load_summary, compare_summaries
+from spectral import sosfiltfilt_lean, minmax_indices
+from memory import (PeakRSSMonitor, MemoryPlan, MemoryBudgetError, plan_memory, record_memory_plan,
+                    load_memory_plan, measure_samples_per_word, PLAN_CHUNK_ROWS)
+from session import SessionData
+from timing import span, metrics, start_trace, finish_trace
+from profiling import RequestProfiler, list_profiles, profile_path
+from storage import StorageManager, touch, restore_file, compact_intermediates, open_maybe_compressed, session_lock
+from scratch import ScratchSpace
+from bundle import BundleWriter, SessionBundle, BundleError, BUNDLE_EXTENSION
+from progress import (ProgressRegistry, FileProgressChannel, bind_progress, unbind_progress, emit, sse_stream,
+                      PENDING_TIMEOUT_SEC, PROGRESS_FILENAME)
+from live import LiveRegistry, LIVE_STATS_WINDOW_SEC
+from columns import ColumnStore, save_session_columns, stream_npz
+
 
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 
 UPLOAD_FOLDER = 'uploads'
+CALIBRATION_FOLDER = 'calibration'
+
+# ID di sessione valido: nome di cartella come lo produce secure_filename,
+# mai '.'/'..', nascosto (cartelle di lavoro) o con separatori di path
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9-][A-Za-z0-9_.-]{0,254}$')
 DECODER_EXECUTABLE = './fifo_decoder'
 
 # Costanti sensore LSM6DSOX
@@ -51,13 +85,82 @@ MIN_SAMPLES_FOR_FILTER = 15
 DEMUX_HEADER_SIZE = 8
 DEMUX_HEADER_FORMAT = '<HIH'  # conn_handle(2), timestamp(4), data_size(2)
 
-# Tag types nel CSV decodificato
-TAG_GYRO = 0
-TAG_ACC = 1
+# Indice header dei pacchetti salvato accanto al file originale
+PACKET_INDEX_SUFFIX = '_packets.npy'
+PACKET_INDEX_DTYPE = np.dtype([
+    ('offset', '<u8'),
+    ('conn_handle', '<u2'),
+    ('timestamp_ms', '<u4'),
+    ('data_size', '<u2'),
+])
 
 # Timeout decoder
 DECODER_TIMEOUT_SEC = 60
 
+# Finestra massima per le statistiche a finestra mobile
+MAX_WINDOW_SEC = 600
+
+# Numero massimo di sessioni in un confronto
+MAX_COMPARE_SESSIONS = 10
+
+# Punti massimi per traccia nei grafici (decimazione min/max)
+MAX_PLOT_POINTS = 4000
+
+# Memoria che una singola analisi può aggiungere alla RSS del worker [MB],
+# limitata a sua volta dalla MemAvailable del sistema (vedi memory.py)
+ANALYSIS_MEMORY_HEADROOM_MB = float(os.environ.get('BCP_ANALYSIS_HEADROOM_MB', 256))
+
+# Log JSONL delle stime vs picchi misurati (taratura del planner): solo se
+# configurato, fuori dalla cartella dei dati. Ogni sessione ha comunque il suo memory_plan.json
+MEMORY_PLAN_LOG = os.environ.get('BCP_MEMORY_PLAN_LOG')
+
+# Metriche Prometheus su /api/metrics (False: solo Server-Timing, nessun istogramma)
+METRICS_ENABLED = True
+
+# Profilazione su richiesta: tutte le richieste di sessione, oppure solo
+# quelle con header PROFILE_HEADER uguale al token (client fidati)
+PROFILE_ALL_REQUESTS = False
+PROFILING_TOKEN = os.environ.get('BCP_PROFILING_TOKEN')
+PROFILE_HEADER = 'X-BCP-Profile'
+
+# Ciclo di vita dello storage (thread in background): compressione delle
+# sessioni fredde e rimozione LRU degli artefatti rigenerabili oltre la quota
+STORAGE_MANAGER_ENABLED = True
+STORAGE_QUOTA_MB = 4096
+STORAGE_COLD_AFTER_DAYS = 14
+STORAGE_SWEEP_INTERVAL_SEC = 600
+
+# Intermedi di demux e decodifica in RAM (tmpfs), con ripiego su disco
+# oltre il tetto; 0 disabilita la RAM
+SCRATCH_RAM_CAP_MB = 128
+
+# Stima della dimensione del CSV decodificato per byte di .bin del sensore
+DECODED_CSV_BYTES_PER_BIN_BYTE = 5
+
+# Versione della pipeline di analisi: incrementare quando cambiano gli
+# artefatti derivati, così il riprocessamento batch sa cosa rifare
+PIPELINE_VERSION = 2
+
+# Impronta della calibrazione con cui sono stati calcolati gli artefatti
+# derivati (eventi, feature, riassunto, finestre, allineamento)
+CALIBRATION_STAMP_FILENAME = 'calibration_stamp.json'
+
+# Anteprima inviata sullo stream di avanzamento appena finisce la decodifica
+PREVIEW_POINTS = 400
+
+# Ingest in diretta: lettura del corpo a blocchi, finestra massima servita
+LIVE_READ_CHUNK_BYTES = 4096
+LIVE_MAX_WINDOW_SEC = 30
+
+# Colonne attese nel CSV decodificato
+DECODED_CSV_COLUMNS = ['timestamp_ms', 'tag', 'x', 'y', 'z']
+
+# Contenuto dei bundle di sessione: configurazioni e array per sensore
+# (nell'ordine delle colonne di read_decoded_csv_chunked)
+BUNDLE_CONFIG_FILES = ('bike_config.json', 'session_config.json')
+BUNDLE_SENSOR_ARRAYS = ('timestamp_ms', 'tag', 'counts')
+SENSOR_CSV_PATTERN = re.compile(r'_sensor_(\d+)\.csv(\.gz)?$')
+
 
 # ============================================================================
 # FLASK APP SETUP
@@ -74,6 +177,19 @@ logging.basicConfig(
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+metrics.enabled = METRICS_ENABLED
+
+calibration_store = CalibrationStore(CALIBRATION_FOLDER)
+
+storage_manager = StorageManager(UPLOAD_FOLDER, STORAGE_QUOTA_MB, STORAGE_COLD_AFTER_DAYS, STORAGE_SWEEP_INTERVAL_SEC)
+
+# Avanzamento: canali in memoria più progress.jsonl per gli iscritti degli
+# altri worker. L'ingest in diretta resta nella memoria del processo: con
+# più worker il telefono deve restare sullo stesso (sticky session)
+progress_registry = ProgressRegistry()
+
+live_registry = LiveRegistry()
+
 api = Blueprint('api', __name__, url_prefix='/api')
 
 
@@ -92,7 +208,7 @@ def low_pass_filter(data: np.ndarray, cutoff: float, fs: float, order: int = FIL
         order: Ordine del filtro
         
     Returns:
-        Array numpy filtrato
+        Array numpy filtrato (stesso dtype dell'input, float32 resta float32)
     """
     if len(data) < MIN_SAMPLES_FOR_FILTER:
         logging.warning(f"Insufficient samples ({len(data)}) for filtering. Returning raw data.")
@@ -105,10 +221,10 @@ def low_pass_filter(data: np.ndarray, cutoff: float, fs: float, order: int = FIL
         logging.warning(f"Cutoff {cutoff}Hz exceeds Nyquist for fs={fs}Hz. Clamping to 0.99.")
         normal_cutoff = 0.99
         
-    b, a = butter(order, normal_cutoff, btype='low', analog=False)
+    sos = butter(order, normal_cutoff, btype='low', analog=False, output='sos')
     
     try:
-        filtered = filtfilt(b, a, data)
+        filtered = sosfiltfilt_lean(sos, data)
         return filtered
     except Exception as e:
         logging.error(f"Filtering failed: {e}. Returning raw data.")
@@ -134,6 +250,23 @@ def extract_sample_rate(bike_config: Optional[Dict]) -> int:
     return DEFAULT_SAMPLE_RATE_HZ
 
 
+def extract_device_id(bike_config: Optional[Dict]) -> Optional[str]:
+    """
+    Estrae l'identificativo del logger da bike_config (per la calibrazione).
+    
+    Args:
+        bike_config: Dizionario configurazione bici
+        
+    Returns:
+        device_id, None se non specificato
+    """
+    if bike_config and 'hardware' in bike_config:
+        device_id = bike_config['hardware'].get('device_id')
+        if device_id:
+            return secure_filename(str(device_id)) or None
+    return None
+
+
 # ============================================================================
 # HELPER FUNCTIONS - FILE MANAGEMENT
 # ============================================================================
@@ -166,11 +299,14 @@ def save_uploaded_file(
 
     session_dir = os.path.join(UPLOAD_FOLDER, safe_session_name)
     os.makedirs(session_dir, exist_ok=True)
+    touch(session_dir)
     
     # Salva telemetria
     filename = secure_filename(file.filename) or 'telemetry.bin'
     file_path = os.path.join(session_dir, filename)
-    file.save(file_path)
+    with span('save') as s:
+        file.save(file_path)
+        s.nbytes = os.path.getsize(file_path)
     logging.info(f"📁 Telemetry saved: {file_path} ({os.path.getsize(file_path)} bytes)")
     
     # Salva bike_config (da app Flutter)
@@ -197,7 +333,69 @@ def save_uploaded_file(
     return file_path, app_config_path, session_config_path, bike_config, session_dir
 
 
-def demux_binary_file(file_path: str) -> Dict[int, str]:
+def valid_session_id(session_id: str) -> bool:
+    """True se `session_id` è un nome di sessione sicuro da unire a UPLOAD_FOLDER."""
+    return bool(session_id) and SESSION_ID_PATTERN.match(session_id) is not None \
+        and secure_filename(session_id) == session_id
+
+
+def get_session_dir(session_id: str) -> Optional[str]:
+    """
+    Risolve la cartella di una sessione esistente. L'ID viene validato
+    prima di comporre il path: '..', '' o 'a/b' non risolvono mai a
+    UPLOAD_FOLDER o fuori.
+    
+    Returns:
+        Path della cartella, None se l'ID non è valido o la sessione non esiste
+    """
+    if not valid_session_id(session_id):
+        return None
+    session_dir = os.path.join(UPLOAD_FOLDER, session_id)
+    if not os.path.isdir(session_dir):
+        return None
+    touch(session_dir)
+    return session_dir
+
+
+def load_session_bike_config(session_dir: str) -> Optional[Dict]:
+    """Carica bike_config.json della sessione se presente."""
+    bike_config_path = os.path.join(session_dir, 'bike_config.json')
+    if not os.path.exists(bike_config_path):
+        return None
+    with open(bike_config_path, 'r') as f:
+        return json.load(f)
+
+
+def find_session_csvs(session_dir: str) -> List[str]:
+    """Elenca i CSV decodificati per sensore presenti nella sessione."""
+    return sorted(
+        os.path.join(session_dir, f) for f in os.listdir(session_dir)
+        if SENSOR_CSV_PATTERN.search(f)
+    )
+
+
+def session_calibration_fingerprint(bike_config: Optional[Dict]) -> str:
+    """Impronta dei profili di calibrazione che si applicano alla sessione."""
+    return calibration_store.fingerprint(extract_device_id(bike_config))
+
+
+def load_calibration_stamp(session_dir: str) -> Optional[str]:
+    """Impronta della calibrazione degli artefatti derivati, None se assente."""
+    try:
+        with open(os.path.join(session_dir, CALIBRATION_STAMP_FILENAME), 'r') as f:
+            return json.load(f).get('calibration')
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def save_calibration_stamp(session_dir: str, calibration: str) -> None:
+    path = os.path.join(session_dir, CALIBRATION_STAMP_FILENAME)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump({'calibration': calibration, 'updated_at': time.time()}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def demux_binary_file(file_path: str, output_dir: Optional[str] = None) -> Dict[int, str]:
     """
     Demultiplessa file binario multi-sensore in file separati per conn_handle.
     
@@ -206,6 +404,8 @@ def demux_binary_file(file_path: str) -> Dict[int, str]:
     
     Args:
         file_path: Path del file .bin multi-sensore
+        output_dir: Cartella dei .bin per sensore (default: quella del file);
+            l'indice degli header va sempre accanto al file originale
         
     Returns:
         Dict mapping conn_handle -> bin_path
@@ -217,6 +417,7 @@ def demux_binary_file(file_path: str) -> Dict[int, str]:
     base_name = os.path.splitext(os.path.basename(file_path))[0]
     
     sensor_files = {}
+    packet_headers = []
     header_struct = struct.Struct(DEMUX_HEADER_FORMAT)
     
     logging.info(f"🔄 Demuxing: {file_path}")
@@ -226,6 +427,7 @@ def demux_binary_file(file_path: str) -> Dict[int, str]:
             packet_count = 0
             
             while True:
+                packet_offset = f_in.tell()
                 header_bytes = f_in.read(DEMUX_HEADER_SIZE)
                 if len(header_bytes) < DEMUX_HEADER_SIZE:
                     break
@@ -234,7 +436,7 @@ def demux_binary_file(file_path: str) -> Dict[int, str]:
                 
                 # Inizializza file per nuovo sensore
                 if conn_handle not in sensor_files:
-                    bin_path = os.path.join(base_dir, f"{base_name}_sensor_{conn_handle}.bin")
+                    bin_path = os.path.join(output_dir or base_dir, f"{base_name}_sensor_{conn_handle}.bin")
                     sensor_files[conn_handle] = {
                         'file_handle': open(bin_path, 'wb'),
                         'bin_path': bin_path,
@@ -251,6 +453,7 @@ def demux_binary_file(file_path: str) -> Dict[int, str]:
                 # Scrivi payload (senza header)
                 sensor_files[conn_handle]['file_handle'].write(payload)
                 sensor_files[conn_handle]['packet_count'] += 1
+                packet_headers.append((packet_offset, conn_handle, timestamp_ms, data_size))
                 packet_count += 1
 
     except Exception as e:
@@ -267,9 +470,32 @@ def demux_binary_file(file_path: str) -> Dict[int, str]:
     if not sensor_files:
         raise RuntimeError("No sensors detected in binary file")
     
+    # Header dei pacchetti per allineamento temporale tra sensori
+    packet_index_path = os.path.join(base_dir, f"{base_name}{PACKET_INDEX_SUFFIX}")
+    with open(f"{packet_index_path}.tmp", 'wb') as f:
+        np.save(f, np.array(packet_headers, dtype=PACKET_INDEX_DTYPE))
+    os.replace(f"{packet_index_path}.tmp", packet_index_path)
+    
     return {ch: info['bin_path'] for ch, info in sensor_files.items()}
 
 
+def load_packet_index(file_path: str) -> Optional[np.ndarray]:
+    """
+    Carica l'indice header salvato da demux_binary_file.
+    
+    Args:
+        file_path: Path del file .bin multi-sensore originale
+        
+    Returns:
+        Array strutturato PACKET_INDEX_DTYPE, None se assente
+    """
+    base_name = os.path.splitext(file_path)[0]
+    packet_index_path = f"{base_name}{PACKET_INDEX_SUFFIX}"
+    if not os.path.exists(packet_index_path):
+        return None
+    return np.load(packet_index_path)
+
+
 def decode_sensor_binary(bin_path: str, csv_path: str) -> bool:
     """
     Decodifica file binario sensore usando decoder C esterno.
@@ -315,12 +541,18 @@ def decode_sensor_binary(bin_path: str, csv_path: str) -> bool:
         return False
 
 
-def process_binary_to_csv(file_path: str) -> List[str]:
+def process_binary_to_csv(file_path: str, before_decode: Optional[Callable[[str], None]] = None) -> List[str]:
     """
     Pipeline completa: demux + decode.
     
+    I .bin per sensore e i CSV in scrittura stanno nell'area scratch (RAM
+    se possibile): nella sessione arrivano solo i CSV completi, con rename
+    atomico.
+    
     Args:
         file_path: Path del file telemetria (può essere .bin multi-sensore o .csv singolo)
+        before_decode: Chiamata col path dopo il demux e prima della decodifica
+            (es. pianificazione della memoria); se solleva, la decodifica non parte
         
     Returns:
         Lista di path CSV generati (uno per sensore)
@@ -339,22 +571,43 @@ def process_binary_to_csv(file_path: str) -> List[str]:
     base_dir = os.path.dirname(file_path)
     base_name = os.path.splitext(os.path.basename(file_path))[0]
     
-    # Step 1: Demux
-    sensor_bins = demux_binary_file(file_path)
-    
-    # Step 2: Decode ogni sensore
     generated_csvs = []
     failed_sensors = []
     
-    for conn_handle, bin_path in sensor_bins.items():
-        csv_path = os.path.join(base_dir, f"{base_name}_sensor_{conn_handle}.csv")
+    with ScratchSpace(base_dir, SCRATCH_RAM_CAP_MB) as scratch:
+        # Step 1: Demux
+        telemetry_size = os.path.getsize(file_path)
+        with span('demux', nbytes=telemetry_size):
+            sensor_bins = demux_binary_file(file_path, scratch.directory(telemetry_size))
+        emit('stage', stage='demuxed', sensors=sorted(sensor_bins), bytes=telemetry_size)
         
-        logging.info(f"🔧 Decoding sensor {conn_handle}")
+        if before_decode is not None:
+            before_decode(file_path)
         
-        if decode_sensor_binary(bin_path, csv_path):
-            generated_csvs.append(csv_path)
-        else:
-            failed_sensors.append(conn_handle)
+        # Step 2: Decode ogni sensore
+        for k, (conn_handle, bin_path) in enumerate(sensor_bins.items(), start=1):
+            csv_name = f"{base_name}_sensor_{conn_handle}.csv"
+            bin_size = os.path.getsize(bin_path)
+            csv_path = scratch.path(csv_name, bin_size * DECODED_CSV_BYTES_PER_BIN_BYTE)
+            
+            logging.info(f"🔧 Decoding sensor {conn_handle}")
+            
+            with span('decode', desc=f'sensor {conn_handle}', nbytes=bin_size):
+                decoded = decode_sensor_binary(bin_path, csv_path)
+                # Stima sbagliata e tmpfs pieno (o tetto superato): si ripete su disco
+                if not decoded and scratch.exhausted(csv_path):
+                    scratch.release(csv_path)
+                    csv_path = scratch.disk_path(csv_name)
+                    decoded = decode_sensor_binary(bin_path, csv_path)
+            scratch.release(bin_path)
+            if not decoded:
+                scratch.release(csv_path)
+            
+            if decoded:
+                generated_csvs.append(scratch.commit(csv_path, os.path.join(base_dir, csv_name)))
+            else:
+                failed_sensors.append(conn_handle)
+            emit('stage', stage='decoded', sensor=conn_handle, index=k, total=len(sensor_bins), ok=decoded)
     
     # Fallimento critico se nemmeno un sensore funziona
     if not generated_csvs:
@@ -371,12 +624,576 @@ def process_binary_to_csv(file_path: str) -> List[str]:
 # HELPER FUNCTIONS - ANALYSIS & PLOTTING
 # ============================================================================
 
-def analyze_and_plot(csv_paths: List[str], bike_config: Optional[Dict] = None) -> io.BytesIO:
+def read_decoded_csv(csv_path: str) -> Optional[pd.DataFrame]:
     """
-    Genera grafico multi-sensore con accelerazione verticale e pitch rate.
+    Legge e valida un CSV prodotto dal decoder.
+    
+    Args:
+        csv_path: Path del CSV (timestamp_ms, tag, x, y, z)
+        
+    Returns:
+        DataFrame con colonne normalizzate (assi int16), None se vuoto o non valido
+    """
+    df = pd.read_csv(csv_path, dtype={'timestamp_ms': 'int64', 'tag': 'int8', 
+                                       'x': 'int16', 'y': 'int16', 'z': 'int16'})
+    
+    if df.empty:
+        logging.warning(f"Empty CSV: {csv_path}")
+        return None
+    
+    # Normalizza colonne
+    df.columns = [c.strip().lower() for c in df.columns]
+    
+    # Valida struttura
+    if not all(col in df.columns for col in DECODED_CSV_COLUMNS):
+        logging.error(f"Invalid CSV structure: {csv_path}")
+        return None
+    
+    return df
+
+
+def read_decoded_csv_chunked(csv_path: str, chunk_rows: int) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Come read_decoded_csv, ma a blocchi di `chunk_rows` righe.
+    
+    Il parser non tiene mai in memoria l'intero file tokenizzato: il
+    transitorio è un blocco, più i soli array finali.
+    
+    Returns:
+        (timestamp int64, tag int8, counts int16 (n, 3)), None se vuoto o non valido
+    """
+    timestamps, tags, counts = [], [], []
+    reader = pd.read_csv(csv_path, chunksize=chunk_rows,
+                         dtype={'timestamp_ms': 'int64', 'tag': 'int8', 'x': 'int16', 'y': 'int16', 'z': 'int16'})
+    for chunk in reader:
+        chunk.columns = [c.strip().lower() for c in chunk.columns]
+        if not all(col in chunk.columns for col in DECODED_CSV_COLUMNS):
+            logging.error(f"Invalid CSV structure: {csv_path}")
+            return None
+        timestamps.append(chunk['timestamp_ms'].to_numpy())
+        tags.append(chunk['tag'].to_numpy())
+        counts.append(chunk[['x', 'y', 'z']].to_numpy())
+    
+    if not timestamps:
+        logging.warning(f"Empty CSV: {csv_path}")
+        return None
+    return np.concatenate(timestamps), np.concatenate(tags), np.concatenate(counts)
+
+
+def sensor_id_from_csv(csv_path: str, default: int = 0) -> int:
+    """Ricava il conn_handle dal nome del CSV (<base>_sensor_<N>.csv)."""
+    match = SENSOR_CSV_PATTERN.search(os.path.basename(csv_path))
+    return int(match.group(1)) if match else default
+
+
+def load_session_data(
+    csv_paths: List[str],
+    device_id: Optional[str] = None,
+    chunk_rows: Optional[int] = None
+) -> SessionData:
+    """
+    Carica i CSV decodificati e applica la calibrazione del dispositivo.
+    
+    La calibrazione (sensibilità, scala, offset, rimappatura assi) è una
+    sola trasformazione affine applicata ai campioni int16 di ogni gruppo:
+    gli stadi successivi lavorano direttamente in unità fisiche. I campioni
+    sono ordinati per tag una sola volta, poi si lavora solo su viste.
     
     Args:
         csv_paths: Lista di path CSV (uno per sensore fisico)
+        device_id: Dispositivo per la ricerca del profilo di calibrazione
+        chunk_rows: Se indicato, CSV letti a blocchi (modalità 'lean' del planner)
+        
+    Returns:
+        SessionData con tutti i sensori caricati correttamente
+    """
+    parts = []
+    
+    for sensor_idx, csv_path in enumerate(csv_paths):
+        try:
+            if chunk_rows:
+                columns = read_decoded_csv_chunked(csv_path, chunk_rows)
+                if columns is None:
+                    continue
+                parts.append((sensor_id_from_csv(csv_path, sensor_idx),) + columns)
+                continue
+            
+            df = read_decoded_csv(csv_path)
+            if df is None:
+                continue
+            
+            parts.append((
+                sensor_id_from_csv(csv_path, sensor_idx),
+                df['timestamp_ms'].values,
+                df['tag'].values,
+                df[['x', 'y', 'z']].values
+            ))
+        except Exception as e:
+            logging.error(f"Error loading {csv_path}: {e}", exc_info=True)
+    
+    sensitivity = {'acc': ACC_SENSITIVITY_16G, 'gyro': GYRO_SENSITIVITY_2000DPS}
+    
+    def calibrate(sensor: int, group: str, counts: np.ndarray) -> np.ndarray:
+        return apply_affine(counts, calibration_store.transform(device_id, sensor, group, sensitivity[group]))
+    
+    return SessionData.build(parts, calibrate)
+
+
+def build_event_index(
+    session_dir: str, 
+    session: SessionData, 
+    bike_config: Optional[Dict] = None
+) -> EventIndex:
+    """
+    Costruisce e salva l'indice impatti/atterraggi della sessione.
+    
+    Eseguito una sola volta dopo la decodifica: le query successive
+    lavorano solo sulla tabella eventi salvata.
+    
+    Args:
+        session_dir: Cartella della sessione
+        session: Campioni della sessione (load_session_data)
+        bike_config: Dizionario configurazione bici
+        
+    Returns:
+        EventIndex della sessione
+    """
+    sample_rate = extract_sample_rate(bike_config)
+    tables = []
+    
+    for sensor in session.sensors:
+        try:
+            acc_t, acc_z = session.channel(int(sensor), 'acc', 'z')
+            if len(acc_z) < MIN_SAMPLES_FOR_FILTER:
+                continue
+            
+            acc_z_filtered = low_pass_filter(acc_z, DEFAULT_CUTOFF_HZ, sample_rate)
+            
+            tables.append(detect_events(
+                acc_t,
+                acc_z_filtered,
+                sample_rate,
+                int(sensor)
+            ))
+        except Exception as e:
+            logging.error(f"Event detection failed for sensor {sensor}: {e}", exc_info=True)
+    
+    index = EventIndex.from_tables(tables)
+    index.save(session_dir)
+    return index
+
+
+def build_aligned_session(
+    session_dir: str,
+    session: SessionData,
+    packets: np.ndarray,
+    bike_config: Optional[Dict] = None,
+    chunk_samples: Optional[int] = None
+) -> AlignedSession:
+    """
+    Allinea tutti i sensori sul clock del logger e li ricampiona su una
+    griglia comune (accelerazioni in g, velocità angolari in deg/s).
+    
+    Args:
+        session_dir: Cartella della sessione
+        session: Campioni della sessione (load_session_data)
+        packets: Indice header di demux
+        bike_config: Dizionario configurazione bici
+        chunk_samples: Ricampionamento un sensore alla volta, a blocchi (modalità 'lean')
+        
+    Returns:
+        AlignedSession salvata nella cartella della sessione
+    """
+    sample_rate = extract_sample_rate(bike_config)
+    aligned = align_sensors(session.streams(), packets, sample_rate, chunk_samples=chunk_samples)
+    aligned.save(session_dir)
+    return aligned
+
+
+def build_feature_table(
+    session_dir: str,
+    session: SessionData,
+    bike_config: Optional[Dict] = None
+) -> Tuple[FeatureTable, Dict[int, Dict]]:
+    """
+    Calcola una volta le feature per sensore/gruppo/asse e le salva.
+    
+    Args:
+        session_dir: Cartella della sessione
+        session: Campioni della sessione (load_session_data)
+        bike_config: Dizionario configurazione bici
+        
+    Returns:
+        (FeatureTable, spettri per sensore e gruppo)
+    """
+    sample_rate = extract_sample_rate(bike_config)
+    blocks = []
+    spectra = {}
+    
+    for sensor, groups in session.streams().items():
+        sensor_blocks, sensor_spectra = compute_sensor_features(sensor, groups, sample_rate)
+        blocks.extend(sensor_blocks)
+        spectra[sensor] = sensor_spectra
+    
+    table = FeatureTable.from_blocks(blocks)
+    table.save(session_dir)
+    return table, spectra
+
+
+def build_session_summary(
+    session_dir: str,
+    feature_table: FeatureTable,
+    spectra: Dict[int, Dict],
+    event_index: Optional[EventIndex],
+    bike_config: Optional[Dict] = None
+) -> Dict:
+    """
+    Calcola e salva il riassunto usato da /api/compare.
+    
+    Viene prodotto una volta al momento dell'analisi: i confronti tra
+    sessioni leggono solo questo file, mai i campioni grezzi.
+    
+    Args:
+        session_dir: Cartella della sessione
+        feature_table: Feature store della sessione
+        spectra: Spettri per sensore e gruppo (build_feature_table)
+        event_index: Indice eventi della sessione (per i conteggi)
+        bike_config: Dizionario configurazione bici
+        
+    Returns:
+        Dict riassunto della sessione
+    """
+    sample_rate = extract_sample_rate(bike_config)
+    per_sensor = {}
+    duration_s = 0.0
+    
+    for sensor, sensor_spectra in spectra.items():
+        rows = feature_table.select(sensor=sensor, group='acc', axis='z')
+        if not rows or 'acc' not in sensor_spectra:
+            continue
+        acc_z = rows[0]
+        freqs, psd = sensor_spectra['acc']
+        event_count = len(event_index.query(sensor=sensor)) if event_index is not None else 0
+        per_sensor[str(sensor)] = summarize_sensor(acc_z, freqs, psd[:, 2], sample_rate, event_count)
+        duration_s = max(duration_s, acc_z['duration_s'])
+    
+    summary = build_summary(os.path.basename(session_dir), per_sensor, sample_rate, duration_s)
+    save_summary(session_dir, summary)
+    return summary
+
+
+def build_session_windows(
+    session_dir: str,
+    session: SessionData,
+    bike_config: Optional[Dict] = None,
+    configs: Optional[List[Tuple[float, float]]] = None
+) -> Dict[Tuple[float, float], Dict[str, np.ndarray]]:
+    """
+    Calcola e salva le statistiche a finestra mobile (RMS, picco-picco,
+    energia per banda) per ogni coppia (finestra, passo) richiesta.
+    
+    Args:
+        session_dir: Cartella della sessione
+        session: Campioni della sessione (load_session_data)
+        bike_config: Dizionario configurazione bici
+        configs: Lista di (finestra [s], passo [s]), default DEFAULT_WINDOW_CONFIGS
+        
+    Returns:
+        Dict (finestra, passo) -> array salvati
+    """
+    sample_rate = extract_sample_rate(bike_config)
+    streams = session.streams()
+    results = {}
+    
+    for window_s, hop_s in (configs or DEFAULT_WINDOW_CONFIGS):
+        arrays = compute_session_windows(streams, sample_rate, window_s, hop_s)
+        save_session_windows(session_dir, arrays, window_s, hop_s)
+        results[(window_s, hop_s)] = arrays
+    
+    return results
+
+
+def session_preview(session: SessionData, max_points: int = PREVIEW_POINTS) -> Dict:
+    """
+    Anteprima leggera appena decodificata la sessione: accelerazione
+    verticale decimata (min/max) e statistiche di base per sensore.
+    I tempi sono in secondi dal primo campione (i timestamp sono in tick).
+
+    Returns:
+        Dict {'sensors': [{'sensor', 'samples', 'duration_s', 'rms', 'min', 'max', 't_s', 'acc_z'}]}
+    """
+    sensors = []
+    for sensor in session.sensors:
+        t, acc_z = session.channel(int(sensor), 'acc', 'z')
+        if len(t) == 0:
+            continue
+        idx = minmax_indices(acc_z, max_points)
+        centered = acc_z - acc_z.mean(dtype=np.float64)
+        sensors.append({
+            'sensor': int(sensor),
+            'samples': len(t),
+            'duration_s': round(float(ticks_to_s(t[-1] - t[0])), 3),
+            'rms': round(float(np.sqrt(np.mean(centered ** 2, dtype=np.float64))), 4),
+            'min': round(float(acc_z.min()), 4),
+            'max': round(float(acc_z.max()), 4),
+            't_s': np.round(ticks_to_s(t[idx] - t[0]), 3).tolist(),
+            'acc_z': np.round(acc_z[idx].astype(np.float64), 4).tolist()
+        })
+    return {'sensors': sensors}
+
+
+def find_session_telemetry(session_dir: str) -> Optional[str]:
+    """
+    File telemetria originale della sessione (non i .bin demultiplexati).
+    Se la sessione è stata compressa ritorna il path non compresso:
+    restore_file() lo ricrea prima della lettura.
+    
+    Returns:
+        Path del file, None se assente
+    """
+    candidates = sorted({
+        f[:-len('.gz')] if f.lower().endswith('.gz') else f for f in os.listdir(session_dir)
+        if f.lower().endswith(('.bin', '.bin.gz')) and not re.search(r'_sensor_\d+\.bin(\.gz)?$', f)
+    })
+    return os.path.join(session_dir, candidates[0]) if candidates else None
+
+
+def analyze_session(file_path: str, session_dir: str, bike_config: Optional[Dict] = None,
+                    strict: bool = False) -> SessionData:
+    """
+    Pipeline di analisi completa di una sessione: demux, decodifica,
+    calibrazione e tutti gli artefatti derivati (eventi, feature,
+    riassunto, finestre, allineamento).
+    
+    Gli stadi derivati sono indipendenti: un errore viene loggato e non
+    blocca gli altri. Usata dall'upload e dal riprocessamento batch.
+    
+    Args:
+        file_path: Path del file telemetria
+        session_dir: Cartella della sessione
+        bike_config: Dizionario configurazione bici
+        strict: Solleva se uno stadio derivato fallisce (riprocessamento batch)
+        
+    Returns:
+        SessionData decodificata e calibrata
+        
+    Raises:
+        MemoryBudgetError: Se la stima del picco non sta nel margine dell'analisi
+        RuntimeError: Se demux o decodifica falliscono, o con `strict` se
+            fallisce uno stadio derivato
+    """
+    # Il planner gira dopo il demux, prima della decodifica. Il lock della
+    # sessione tiene il gestore dello storage lontano dai file in uso
+    plans = []
+    with session_lock(session_dir), PeakRSSMonitor() as mem:
+        # Sessione compressa dal gestore dello storage: decompressione alla lettura
+        file_path = restore_file(file_path)
+        csv_paths = process_binary_to_csv(file_path, before_decode=lambda path: plans.append(plan_session_memory(path)))
+        compact_intermediates(session_dir)
+        plan = plans[0] if plans else None
+        chunk_rows = PLAN_CHUNK_ROWS if plan is not None and plan.mode == 'lean' else None
+        calibration = session_calibration_fingerprint(bike_config)
+        with span('load', nbytes=sum(os.path.getsize(p) for p in csv_paths)):
+            session = load_session_data(csv_paths, extract_device_id(bike_config), chunk_rows)
+        emit('preview', **session_preview(session))
+        
+        failed = build_session_artifacts(file_path, session_dir, session, bike_config, chunk_rows, calibration)
+    
+    # Sforamento del margine registrato nella sessione, non solo nel log
+    mem.check_budget(ANALYSIS_MEMORY_HEADROOM_MB, label=os.path.basename(session_dir))
+    try:
+        record_memory_plan(plan, mem, len(session.time_ms), session_dir, ANALYSIS_MEMORY_HEADROOM_MB, MEMORY_PLAN_LOG)
+    except OSError as e:
+        logging.error(f"Memory plan record failed: {e}")
+    if strict and failed:
+        raise RuntimeError(f"Derived stages failed: {', '.join(failed)}")
+    return session
+
+
+def plan_session_memory(file_path: str) -> Optional[MemoryPlan]:
+    """
+    Pianifica la memoria dell'analisi dall'indice degli header del demux.
+    
+    Returns:
+        MemoryPlan, None se l'indice non esiste
+        
+    Raises:
+        MemoryBudgetError: Se nemmeno la modalità 'lean' sta nel margine
+    """
+    packets = load_packet_index(file_path)
+    if packets is None:
+        return None
+    plan = plan_memory(packets, ANALYSIS_MEMORY_HEADROOM_MB, measure_samples_per_word(file_path, packets))
+    logging.info(f"🧠 Memory plan: {plan.mode} (estimate {plan.estimate_mb:.0f} MB, "
+                 f"available {plan.available_mb:.0f} MB)")
+    if plan.mode == 'reject':
+        raise MemoryBudgetError(f"Estimated peak {plan.estimate_mb:.0f} MB exceeds the "
+                                f"{plan.available_mb:.0f} MB available to an analysis")
+    return plan
+
+
+def build_session_artifacts(file_path: Optional[str], session_dir: str, session: SessionData,
+                            bike_config: Optional[Dict] = None, chunk_rows: Optional[int] = None,
+                            calibration: Optional[str] = None) -> List[str]:
+    """
+    Artefatti derivati di una sessione caricata (eventi, feature,
+    riassunto, finestre, allineamento). Un errore in uno stadio viene
+    loggato e non blocca gli altri; con `chunk_rows` l'allineamento
+    procede un sensore alla volta, a blocchi.
+    
+    `calibration` è l'impronta dei profili applicati a `session`: finisce
+    nel manifest delle colonne e nel calibration_stamp.json della sessione,
+    così un cambio di profilo invalida tutti gli artefatti.
+    
+    Returns:
+        Nomi degli stadi falliti (lista vuota se tutto è andato a buon fine)
+    """
+    failed = []
+    if calibration is None:
+        calibration = session_calibration_fingerprint(bike_config)
+    
+    # Colonne binarie per l'esportazione (lette come mappe dei file)
+    try:
+        with span('columns'):
+            save_session_columns(session_dir, session, calibration)
+        emit('stage', stage='columns', ok=True)
+    except Exception as e:
+        logging.error(f"Column store write failed: {e}", exc_info=True)
+        failed.append('columns')
+        emit('stage', stage='columns', ok=False)
+    
+    # Indice eventi (una volta per sessione decodificata)
+    event_index = None
+    try:
+        with span('events'):
+            event_index = build_event_index(session_dir, session, bike_config)
+    except Exception as e:
+        logging.error(f"Event index build failed: {e}", exc_info=True)
+        failed.append('events')
+    emit('stage', stage='events', ok=event_index is not None)
+    
+    # Feature store + riassunto per i confronti tra sessioni
+    try:
+        with span('features'):
+            feature_table, spectra = build_feature_table(session_dir, session, bike_config)
+            build_session_summary(session_dir, feature_table, spectra, event_index, bike_config)
+        emit('stage', stage='features', ok=True)
+    except Exception as e:
+        logging.error(f"Feature extraction failed: {e}", exc_info=True)
+        failed.append('features')
+        emit('stage', stage='features', ok=False)
+    
+    # Statistiche a finestra mobile (rugosità lungo il percorso)
+    try:
+        with span('windows'):
+            build_session_windows(session_dir, session, bike_config)
+        emit('stage', stage='windows', ok=True)
+    except Exception as e:
+        logging.error(f"Window statistics failed: {e}", exc_info=True)
+        failed.append('windows')
+        emit('stage', stage='windows', ok=False)
+    
+    # Allineamento temporale tra sensori
+    packets = load_packet_index(file_path) if file_path else None
+    if packets is not None:
+        try:
+            with span('alignment'):
+                build_aligned_session(session_dir, session, packets, bike_config, chunk_rows)
+            emit('stage', stage='alignment', ok=True)
+        except Exception as e:
+            logging.error(f"Sensor alignment failed: {e}", exc_info=True)
+            failed.append('alignment')
+            emit('stage', stage='alignment', ok=False)
+    
+    try:
+        save_calibration_stamp(session_dir, calibration)
+    except OSError as e:
+        logging.error(f"Calibration stamp write failed: {e}")
+    return failed
+
+
+# Ricostruzioni dopo un cambio di calibrazione: una alla volta per
+# processo, in background, mai dentro una richiesta
+_rebuild_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='calibration-rebuild')
+_rebuild_pending = set()
+_rebuild_lock = threading.Lock()
+
+
+def calibration_stale(session_dir: str) -> bool:
+    """
+    True se gli artefatti derivati sono stati calcolati con profili di
+    calibrazione diversi da quelli attuali (PUT /api/calibration dopo
+    l'analisi). Le sessioni senza calibration_stamp.json (analizzate prima
+    dell'impronta o importate) non risultano superate: le aggiorna
+    reprocess.py.
+    """
+    stamp = load_calibration_stamp(session_dir)
+    return stamp is not None and stamp != session_calibration_fingerprint(load_session_bike_config(session_dir))
+
+
+def schedule_calibration_rebuild(session_dir: str) -> None:
+    """Accoda la rianalisi della sessione, se non è già in coda."""
+    with _rebuild_lock:
+        if session_dir in _rebuild_pending:
+            return
+        _rebuild_pending.add(session_dir)
+    _rebuild_executor.submit(rebuild_calibrated_session, session_dir)
+
+
+def check_calibration(session_dir: str) -> bool:
+    """
+    Controllo delle route di lettura: se la sessione è superata accoda la
+    ricostruzione e ritorna True (i dati serviti nel frattempo sono quelli
+    vecchi, segnalati con 'calibration_stale').
+    """
+    stale = calibration_stale(session_dir)
+    if stale:
+        schedule_calibration_rebuild(session_dir)
+    return stale
+
+
+def rebuild_calibrated_session(session_dir: str) -> bool:
+    """
+    Rianalizza una sessione superata con lo stesso percorso del
+    riprocessamento (analyze_session: planner della memoria e lock della
+    sessione). Eseguita da _rebuild_executor, non solleva.
+    
+    Returns:
+        True se la sessione è stata rianalizzata
+    """
+    try:
+        if not calibration_stale(session_dir):
+            return False
+        telemetry_path = find_session_telemetry(session_dir)
+        if telemetry_path is None:
+            logging.warning(f"Calibration changed but {os.path.basename(session_dir)} has no telemetry to reprocess")
+            return False
+        # Un'analisi in corso (anche di un altro worker): ci riprova la prossima lettura
+        with session_lock(session_dir, blocking=False) as free:
+            if not free:
+                return False
+        
+        logging.info(f"🔄 Calibration changed: reprocessing {os.path.basename(session_dir)}")
+        # Finestre calcolate su richiesta: ricalcolate alla prossima richiesta
+        for name in os.listdir(session_dir):
+            if name.startswith('windows_') and name.endswith('.npz'):
+                os.remove(os.path.join(session_dir, name))
+        analyze_session(telemetry_path, session_dir, load_session_bike_config(session_dir))
+        return True
+    except Exception as e:
+        logging.error(f"Calibration rebuild failed for {session_dir}: {e}", exc_info=True)
+        return False
+    finally:
+        with _rebuild_lock:
+            _rebuild_pending.discard(session_dir)
+
+
+def analyze_and_plot(session, bike_config: Optional[Dict] = None) -> io.BytesIO:
+    """
+    Genera grafico multi-sensore con accelerazione verticale e pitch rate.
+    
+    Args:
+        session: SessionData (load_session_data) oppure lista di path CSV
         bike_config: Dizionario configurazione bici
     
     Returns:
@@ -385,15 +1202,21 @@ def analyze_and_plot(csv_paths: List[str], bike_config: Optional[Dict] = None) -
     Raises:
         ValueError: Se nessun dato valido trovato
     """
-    if isinstance(csv_paths, str):
-        csv_paths = [csv_paths]
+    if isinstance(session, str):
+        session = [session]
+    if not isinstance(session, SessionData):
+        with span('load'):
+            session = load_session_data(session, extract_device_id(bike_config))
+    
+    # Figura: render misura la costruzione, encode la rasterizzazione PNG
+    render = span('render').start()
     
     # Estrai parametri
     sample_rate = extract_sample_rate(bike_config)
     cutoff = DEFAULT_CUTOFF_HZ
     
     # Setup figura
-    fig = Figure(figsize=(14, 10))
+    fig = Figure(figsize=(14, 10), dpi=100)
     fig.patch.set_facecolor('white')
     
     # Titolo dinamico da bike_config
@@ -414,59 +1237,38 @@ def analyze_and_plot(csv_paths: List[str], bike_config: Optional[Dict] = None) -
     colors = ['#00A8E8', '#E84A5F', '#FFD460', '#2ECC71']
     plot_created = False
     
-    # Processa ogni CSV (sensore)
-    for sensor_idx, csv_path in enumerate(csv_paths):
+    # Processa ogni sensore
+    for sensor_idx, sensor in enumerate(session.sensors):
         try:
-            df = pd.read_csv(csv_path, dtype={'timestamp_ms': 'int64', 'tag': 'int32', 
-                                               'x': 'float32', 'y': 'float32', 'z': 'float32'})
-            
-            if df.empty:
-                logging.warning(f"Empty CSV: {csv_path}")
-                continue
-            
-            # Normalizza colonne
-            df.columns = [c.strip().lower() for c in df.columns]
-            
-            # Valida struttura
-            required_cols = ['timestamp_ms', 'tag', 'x', 'y', 'z']
-            if not all(col in df.columns for col in required_cols):
-                logging.error(f"Invalid CSV structure: {csv_path}")
-                continue
-            
             sensor_label = f"Sensor {sensor_idx + 1}"
             color = colors[sensor_idx % len(colors)]
             
-            # Separa per tag
-            df_acc = df[df['tag'] == TAG_ACC].copy()
-            df_gyro = df[df['tag'] == TAG_GYRO].copy()
-            
             # Plot 1: Accelerazione verticale (Z)
-            if not df_acc.empty and len(df_acc) > 2:
-                df_acc['acc_z_g'] = df_acc['z'] * ACC_SENSITIVITY_16G
+            acc_t, acc_raw = session.channel(int(sensor), 'acc', 'z')
+            if len(acc_raw) > 2:
+                with span('filter', desc=f'sensor {sensor}', nbytes=acc_raw.nbytes):
+                    acc_filtered = low_pass_filter(acc_raw, cutoff, sample_rate)
                 
-                time_s = df_acc['timestamp_ms'].values / 1000.0
-                acc_raw = df_acc['acc_z_g'].values
-                acc_filtered = low_pass_filter(acc_raw, cutoff, sample_rate)
-                
-                ax1.plot(time_s, acc_raw, label=f'{sensor_label} Raw', 
+                # Solo i punti visibili a 100 dpi: niente copie intere per il grafico
+                idx = minmax_indices(acc_raw, MAX_PLOT_POINTS)
+                ax1.plot(acc_t[idx] / 1000.0, acc_raw[idx], label=f'{sensor_label} Raw', 
                         alpha=0.15, color='gray', linewidth=0.5)
-                ax1.plot(time_s, acc_filtered, label=f'{sensor_label} Filtered', 
+                idx = minmax_indices(acc_filtered, MAX_PLOT_POINTS)
+                ax1.plot(acc_t[idx] / 1000.0, acc_filtered[idx], label=f'{sensor_label} Filtered', 
                         color=color, linewidth=1.8)
                 plot_created = True
             
             # Plot 2: Pitch rate (Gyro X)
-            if not df_gyro.empty and len(df_gyro) > 2:
-                df_gyro['gyro_x_dps'] = df_gyro['x'] * GYRO_SENSITIVITY_2000DPS
-                
-                time_s = df_gyro['timestamp_ms'].values / 1000.0
-                gyro_x = df_gyro['gyro_x_dps'].values
+            gyro_t, gyro_x = session.channel(int(sensor), 'gyro', 'x')
+            if len(gyro_x) > 2:
+                idx = minmax_indices(gyro_x, MAX_PLOT_POINTS)
                 
-                ax2.plot(time_s, gyro_x, label=sensor_label, 
+                ax2.plot(gyro_t[idx] / 1000.0, gyro_x[idx], label=sensor_label, 
                         color=color, linewidth=1.2, alpha=0.8)
                 plot_created = True
                 
         except Exception as e:
-            logging.error(f"Error analyzing {csv_path}: {e}", exc_info=True)
+            logging.error(f"Error analyzing sensor {sensor}: {e}", exc_info=True)
     
     if not plot_created:
         # Fallback se nessun dato valido
@@ -493,16 +1295,250 @@ def analyze_and_plot(csv_paths: List[str], bike_config: Optional[Dict] = None) -
     ax2.set_xlim(left=0)
     
     fig.tight_layout()
+    render.stop()
     
     # Renderizza in buffer
-    img_buf = io.BytesIO()
-    canvas = FigureCanvas(fig)
-    canvas.print_png(img_buf, dpi=100)
+    with span('encode') as s:
+        img_buf = io.BytesIO()
+        canvas = FigureCanvas(fig)
+        canvas.print_png(img_buf)
+        s.nbytes = img_buf.tell()
     img_buf.seek(0)
     
     return img_buf
 
 
+# ============================================================================
+# HELPER FUNCTIONS - SESSION BUNDLES
+# ============================================================================
+
+def write_decoded_csv(csv_path: str, timestamps: np.ndarray, tags: np.ndarray, counts: np.ndarray,
+                      chunk_rows: int = PLAN_CHUNK_ROWS) -> str:
+    """Scrive un CSV nel formato del decoder (scrittura atomica, a blocchi)."""
+    tmp_path = f"{csv_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(','.join(DECODED_CSV_COLUMNS) + '\n')
+        for start in range(0, len(timestamps), chunk_rows):
+            end = start + chunk_rows
+            block = np.column_stack((timestamps[start:end], tags[start:end], counts[start:end]))
+            np.savetxt(f, block, fmt='%d', delimiter=',')
+    os.replace(tmp_path, csv_path)
+    return csv_path
+
+
+def export_session_bundle(session_dir: str, dest_path: str) -> str:
+    """
+    Esporta una sessione in un singolo file bundle.
+    
+    Contiene telemetria originale, indice dei pacchetti, campioni decodificati
+    per sensore (int16 non calibrati, come nel CSV), configurazioni, feature
+    e riassunto. Le sessioni compresse vengono lette senza decomprimerle su disco.
+    
+    Returns:
+        Path del bundle
+    """
+    telemetry_path = find_session_telemetry(session_dir)
+    meta = {
+        'session_id': os.path.basename(session_dir),
+        'created_at': time.time(),
+        'pipeline_version': PIPELINE_VERSION,
+        'raw_filename': os.path.basename(telemetry_path) if telemetry_path else None,
+        'sensors': []
+    }
+    
+    with BundleWriter(dest_path, meta) as writer:
+        if telemetry_path is not None:
+            with open_maybe_compressed(telemetry_path) as f:
+                writer.add_stream('raw', f)
+            packets = load_packet_index(telemetry_path)
+            if packets is not None:
+                writer.add_array('packets', packets)
+        
+        for csv_path in find_session_csvs(session_dir):
+            columns = read_decoded_csv_chunked(csv_path, PLAN_CHUNK_ROWS)
+            if columns is None:
+                continue
+            sensor = sensor_id_from_csv(csv_path)
+            for name, array in zip(BUNDLE_SENSOR_ARRAYS, columns):
+                writer.add_array(f"sensor/{sensor}/{name}", array)
+            writer.meta['sensors'].append(sensor)
+        
+        for name in BUNDLE_CONFIG_FILES:
+            config_path = os.path.join(session_dir, name)
+            if os.path.exists(config_path):
+                with open(config_path, 'r') as f:
+                    writer.add_json(f"config/{name}", json.load(f))
+        
+        feature_table = FeatureTable.load(session_dir)
+        if feature_table is not None:
+            for name, column in feature_table.columns.items():
+                writer.add_array(f"features/{name}", column)
+        
+        summary = load_summary(session_dir)
+        if summary is not None:
+            writer.add_json('summary', summary)
+    
+    logging.info(f"📦 Bundle exported: {dest_path} ({os.path.getsize(dest_path) / 2**20:.1f} MB)")
+    return dest_path
+
+
+def import_session_bundle(bundle_path: str, session_id: Optional[str] = None) -> str:
+    """
+    Importa un bundle come nuova sessione.
+    
+    La cartella viene costruita a parte e rinominata alla fine: una
+    sessione importata è completa o non esiste. Eventi e finestre vengono
+    rigenerati alla prima richiesta, l'allineamento dal riprocessamento.
+    
+    Returns:
+        Cartella della sessione
+        
+    Raises:
+        BundleError: Se il bundle non è valido o ha sezioni corrotte
+        FileExistsError: Se la sessione esiste già
+    """
+    with SessionBundle(bundle_path) as bundle:
+        session_id = secure_filename(session_id or bundle.meta.get('session_id') or '') or f"session_{int(time.time())}"
+        session_dir = os.path.join(UPLOAD_FOLDER, session_id)
+        if os.path.exists(session_dir):
+            raise FileExistsError(f"Session already exists: {session_id}")
+        
+        corrupted = bundle.verify()
+        if corrupted:
+            raise BundleError(f"Corrupted bundle sections: {corrupted}")
+        try:
+            sensors = [int(sensor) for sensor in bundle.meta.get('sensors', [])]
+        except (TypeError, ValueError) as e:
+            raise BundleError(f"Invalid sensor list in bundle metadata: {e}") from e
+        missing = [f"sensor/{sensor}/{name}" for sensor in sensors for name in BUNDLE_SENSOR_ARRAYS
+                   if f"sensor/{sensor}/{name}" not in bundle.sections]
+        if missing:
+            raise BundleError(f"Missing bundle sections: {missing}")
+        
+        staging_dir = tempfile.mkdtemp(prefix=f".import_{session_id}_", dir=UPLOAD_FOLDER)
+        try:
+            raw_filename = secure_filename(bundle.meta.get('raw_filename') or '') or 'telemetry.bin'
+            base_name = os.path.splitext(raw_filename)[0]
+            if 'raw' in bundle.sections:
+                bundle.copy_to('raw', os.path.join(staging_dir, raw_filename))
+            if 'packets' in bundle.sections:
+                np.save(os.path.join(staging_dir, f"{base_name}{PACKET_INDEX_SUFFIX}"), bundle.array('packets'))
+            
+            for sensor in sensors:
+                write_decoded_csv(
+                    os.path.join(staging_dir, f"{base_name}_sensor_{sensor}.csv"),
+                    *(bundle.array(f"sensor/{sensor}/{name}") for name in BUNDLE_SENSOR_ARRAYS)
+                )
+            
+            for name in BUNDLE_CONFIG_FILES:
+                if f"config/{name}" in bundle.sections:
+                    with open(os.path.join(staging_dir, name), 'w') as f:
+                        json.dump(bundle.json(f"config/{name}"), f, indent=2)
+            
+            feature_sections = bundle.names('features/')
+            if feature_sections:
+                FeatureTable({
+                    name.split('/', 1)[1]: np.array(bundle.array(name)) for name in feature_sections
+                }).save(staging_dir)
+            if 'summary' in bundle.sections:
+                save_summary(staging_dir, bundle.json('summary'))
+            
+            os.rename(staging_dir, session_dir)
+        except BaseException:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+    
+    touch(session_dir)
+    logging.info(f"📦 Bundle imported: {session_dir}")
+    return session_dir
+
+
+# ============================================================================
+# REQUEST TIMING
+# ============================================================================
+
+@app.before_request
+def start_request_timing():
+    start_trace()
+
+
+@app.before_request
+def start_storage_manager():
+    # Avviato alla prima richiesta di ogni worker (non dagli script che importano train)
+    if STORAGE_MANAGER_ENABLED:
+        storage_manager.start()
+
+
+@app.after_request
+def add_server_timing(response):
+    """Durate degli stadi della richiesta nell'header Server-Timing."""
+    trace = finish_trace()
+    if trace is not None:
+        response.headers['Server-Timing'] = trace.server_timing()
+        metrics.observe_request(request.endpoint or 'unmatched', request.method, response.status_code,
+                                trace.elapsed_s)
+    return response
+
+
+def profiling_requested() -> bool:
+    if PROFILE_ALL_REQUESTS:
+        return True
+    token = request.headers.get(PROFILE_HEADER)
+    return bool(PROFILING_TOKEN and token and hmac.compare_digest(token, PROFILING_TOKEN))
+
+
+def request_session_dir() -> Optional[str]:
+    """Cartella della sessione toccata dalla richiesta (URL o session_name dell'upload)."""
+    session_id = (request.view_args or {}).get('session_id')
+    if session_id is None and request.method == 'POST':
+        session_id = request.form.get('session_name')
+    return get_session_dir(session_id) if session_id else None
+
+
+@app.before_request
+def start_request_profiling():
+    if request.blueprint == 'api' and request.endpoint not in ('api.get_metrics', 'api.list_session_profiles',
+                                                               'api.download_profile') and profiling_requested():
+        profiler = RequestProfiler().start()
+        if profiler is None:
+            logging.info(f"🔬 Profile of {request.path} skipped: another request is being profiled")
+        else:
+            g.profiler = profiler
+
+
+def save_request_profile() -> Optional[str]:
+    """Ferma il profiler della richiesta e salva il profilo nella sessione."""
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return None
+    profiler.stop()
+    session_dir = request_session_dir()
+    if session_dir is None:
+        logging.warning(f"Profile of {request.path} discarded: no session directory")
+        return None
+    try:
+        name = profiler.save(session_dir, request.endpoint.split('.')[-1])
+        logging.info(f"🔬 Profile saved: {session_dir}/{name} ({profiler.elapsed_s:.2f}s)")
+        return name
+    except OSError as e:
+        logging.error(f"Profile save failed: {e}")
+        return None
+
+
+@app.after_request
+def attach_request_profile(response):
+    name = save_request_profile()
+    if name:
+        response.headers['X-BCP-Profile-Name'] = name
+    return response
+
+
+@app.teardown_request
+def stop_request_profiling(exc):
+    # Richieste terminate con eccezione: after_request non viene chiamato
+    save_request_profile()
+
+
 # ============================================================================
 # API ROUTES
 # ============================================================================
@@ -515,7 +1551,11 @@ def index():
         "status": "online",
         "version": "2.0.0",
         "api_prefix": "/api",
-        "endpoints": ["/api/health", "/api/upload", "/api/upload_and_analyze", "/api/analysis/<session_id>"]
+        "endpoints": ["/api/health", "/api/upload", "/api/upload_and_analyze", "/api/analysis/<session_id>",
+                      "/api/events/<session_id>", "/api/windows/<session_id>", "/api/compare?ids=a,b",
+                      "/api/calibration/<device_id>", "/api/metrics", "/api/profiles/<session_id>",
+                      "/api/bundle/<session_id>", "/api/progress/<session_id>",
+                      "/api/live/<session_id>", "/api/export/<session_id>"]
     }), 200
 
 
@@ -533,7 +1573,8 @@ def health_check():
             "timestamp": pd.Timestamp.now().isoformat(),
             "disk_free_mb": int(free_space_mb),
             "decoder_present": os.path.exists(DECODER_EXECUTABLE),
-            "upload_folder": UPLOAD_FOLDER
+            "upload_folder": UPLOAD_FOLDER,
+            "storage": storage_manager.stats()
         }), 200
         
     except Exception as e:
@@ -544,6 +1585,14 @@ def health_check():
         }), 500
 
 
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Istogrammi degli stadi, contatori e byte elaborati in formato Prometheus."""
+    if not metrics.enabled:
+        return jsonify({'error': 'Metrics disabled'}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 @api.route('/upload', methods=['POST'])
 def upload_file():
     """
@@ -637,23 +1686,47 @@ def upload_and_analyze():
         session_config_file = request.files.get('session_config')
 
         # Salvataggio
-        file_path, _, _, bike_config, _ = save_uploaded_file(
+        file_path, _, _, bike_config, session_dir = save_uploaded_file(
             file, session_name, bike_config_str, session_config_file
         )
         
-        # Processing pipeline
-        csv_paths = process_binary_to_csv(file_path)
-        
-        # Plotting
-        img_buf = analyze_and_plot(csv_paths, bike_config)
+        # Avanzamento su /api/progress/<session_id> mentre l'analisi procede
+        started = time.perf_counter()
+        channel = progress_registry.open(os.path.basename(session_dir), os.path.join(session_dir, PROGRESS_FILENAME))
+        token = bind_progress(channel)
+        try:
+            emit('stage', stage='uploaded', bytes=os.path.getsize(file_path))
+            
+            # Processing pipeline (picco RSS misurato sull'intera analisi)
+            with PeakRSSMonitor() as mem:
+                session = analyze_session(file_path, session_dir, bike_config)
+                img_buf = analyze_and_plot(session, bike_config)
+            emit('stage', stage='plot', bytes=img_buf.getbuffer().nbytes)
+        except Exception as e:
+            emit('error', error=str(e))
+            raise
+        else:
+            emit('done', elapsed_s=round(time.perf_counter() - started, 3), peak_rss_mb=round(mem.peak_mb, 1))
+        finally:
+            unbind_progress(token)
         
         logging.info(f"✅ Analysis completed: {session_name}")
-        return send_file(img_buf, mimetype='image/png', download_name=f'{session_name}_analysis.png')
+        response = send_file(img_buf, mimetype='image/png', download_name=f'{session_name}_analysis.png')
+        response.headers['X-Analysis-Peak-RSS-MB'] = f"{mem.peak_mb:.1f}"
+        response.headers['X-Analysis-Memory-Headroom-MB'] = str(ANALYSIS_MEMORY_HEADROOM_MB)
+        memory_plan = load_memory_plan(session_dir)
+        if memory_plan is not None:
+            response.headers['X-Analysis-Within-Headroom'] = str(memory_plan['within_headroom']).lower()
+        return response
 
     except FileNotFoundError as e:
         logging.error(f"File not found: {e}")
         return jsonify({'error': str(e)}), 500
         
+    except MemoryBudgetError as e:
+        logging.error(f"Analysis rejected: {e}")
+        return jsonify({'error': str(e)}), 413
+        
     except RuntimeError as e:
         logging.error(f"Processing failed: {e}")
         return jsonify({'error': str(e)}), 500
@@ -667,6 +1740,132 @@ def upload_and_analyze():
         return jsonify({'error': 'Internal server error', 'detail': str(e)}), 500
 
 
+@api.route('/progress/<session_id>', methods=['GET'])
+def progress_stream(session_id: str):
+    """
+    Avanzamento di un'analisi come Server-Sent Events.
+    
+    Ci si può collegare dopo l'inizio dell'analisi (gli eventi già emessi
+    vengono rimandati, anche da Last-Event-ID alla riconnessione) o prima
+    dell'upload con ?wait=<s>: lo stream attende l'inizio dell'analisi al
+    massimo `wait` secondi (non oltre PENDING_TIMEOUT_SEC).
+    
+    Se l'analisi gira in un altro worker (o è già conclusa) gli eventi
+    vengono letti dal progress.jsonl della sessione.
+    
+    Query params:
+        - wait: Secondi di attesa di un'analisi non ancora iniziata (optional)
+    
+    Events:
+        - stage: {'stage': 'uploaded'|'demuxed'|'decoded'|'events'|'features'|'windows'|'alignment'|'plot', ...}
+        - preview: accelerazione verticale decimata e statistiche per sensore, appena decodificato
+        - done / error: fine dell'analisi, lo stream si chiude
+        - timeout: l'analisi non è partita entro l'attesa, lo stream si chiude
+    """
+    try:
+        last_id = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        last_id = 0
+    wait_s = request.args.get('wait', type=float)
+    
+    if not valid_session_id(session_id):
+        return jsonify({'error': 'Invalid session_id', 'session_id': session_id}), 404
+    key = session_id
+    channel = progress_registry.get(key)
+    if channel is None:
+        if wait_s is None and get_session_dir(key) is None:
+            return jsonify({'error': 'Session not found', 'session_id': session_id}), 404
+        channel = FileProgressChannel(key, os.path.join(UPLOAD_FOLDER, key, PROGRESS_FILENAME))
+    
+    pending_timeout_s = min(max(wait_s, 0.0), PENDING_TIMEOUT_SEC) if wait_s is not None else PENDING_TIMEOUT_SEC
+    return Response(sse_stream(channel, last_id, pending_timeout_s=pending_timeout_s), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@api.route('/live/<session_id>', methods=['POST'])
+def live_ingest(session_id: str):
+    """
+    Ingest in diretta di pacchetti `<HIH` (stesso formato del file .bin),
+    con corpo chunked: i pacchetti vengono decodificati man mano che
+    arrivano, anche spezzati tra un blocco e l'altro. Più POST successive
+    (es. riconnessione del telefono) continuano la stessa sessione live.
+    
+    Returns:
+        JSON con byte e pacchetti ricevuti e le statistiche correnti
+    """
+    try:
+        live = live_registry.open(secure_filename(session_id))
+        received = 0
+        while True:
+            chunk = request.stream.read(LIVE_READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            live.feed(chunk)
+            received += len(chunk)
+        
+        logging.info(f"📡 Live stream {live.session_id}: {received} bytes")
+        stats = live.stats()
+        stats['received'] = received
+        return jsonify(stats), 200
+
+    except Exception as e:
+        logging.error(f"❌ Live ingest error: {e}", exc_info=True)
+        return jsonify({'error': 'Internal server error', 'detail': str(e)}), 500
+
+
+@api.route('/live', methods=['GET'])
+def list_live_sessions():
+    return jsonify({'sessions': live_registry.list()}), 200
+
+
+@api.route('/live/<session_id>', methods=['GET'])
+def get_live_stats(session_id: str):
+    """
+    Statistiche mobili di una sessione live: RMS (media rimossa) ed
+    energia per banda dell'accelerometro, per sensore.
+    
+    Query params:
+        - window: Durata finestra [s] (default LIVE_STATS_WINDOW_SEC)
+    """
+    live = live_registry.get(secure_filename(session_id))
+    if live is None:
+        return jsonify({'error': 'Live session not found', 'session_id': session_id}), 404
+    window_s = request.args.get('window', default=LIVE_STATS_WINDOW_SEC, type=float)
+    if not 0 < window_s <= LIVE_MAX_WINDOW_SEC:
+        return jsonify({'error': f'Invalid window (0 < window <= {LIVE_MAX_WINDOW_SEC})'}), 400
+    try:
+        return jsonify(live.stats(window_s)), 200
+    except ValueError as e:
+        # Finestra più lunga del buffer al BDR del sensore
+        return jsonify({'error': str(e)}), 400
+
+
+@api.route('/live/<session_id>/<int:sensor>', methods=['GET'])
+def get_live_window(session_id: str, sensor: int):
+    """
+    Ultima finestra di campioni di un sensore live.
+    
+    Query params:
+        - window: Durata [s] (default 5)
+        - group: acc|gyro (default acc)
+        - max_points: Decimazione min/max sull'asse z (default MAX_PLOT_POINTS)
+    """
+    live = live_registry.get(secure_filename(session_id))
+    if live is None:
+        return jsonify({'error': 'Live session not found', 'session_id': session_id}), 404
+    window_s = request.args.get('window', default=5.0, type=float)
+    group = request.args.get('group', default='acc')
+    max_points = request.args.get('max_points', default=MAX_PLOT_POINTS, type=int)
+    if not 0 < window_s <= LIVE_MAX_WINDOW_SEC or group not in ('acc', 'gyro') or max_points < 2:
+        return jsonify({'error': f'Invalid window/group/max_points (0 < window <= {LIVE_MAX_WINDOW_SEC})'}), 400
+    try:
+        return jsonify(live.window(sensor, window_s, group, max_points)), 200
+    except KeyError:
+        return jsonify({'error': 'Sensor not in live stream', 'sensor': sensor}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
 @api.route('/analysis/<session_id>', methods=['GET'])
 def get_analysis(session_id: str):
     """
@@ -679,11 +1878,12 @@ def get_analysis(session_id: str):
         JSON con dettagli sessione, file generati e configurazioni
     """
     try:
-        safe_session_id = secure_filename(session_id)
-        session_dir = os.path.join(UPLOAD_FOLDER, safe_session_id)
-        
-        if not os.path.exists(session_dir):
+        session_dir = get_session_dir(session_id)
+        if session_dir is None:
             return jsonify({'error': 'Session not found', 'session_id': session_id}), 404
+        safe_session_id = os.path.basename(session_dir)
+        # Calibrazione cambiata dopo l'analisi: si servono i dati vecchi mentre si rianalizza
+        calibration_is_stale = check_calibration(session_dir)
         
         # Lista file
         files = os.listdir(session_dir)
@@ -702,9 +1902,22 @@ def get_analysis(session_id: str):
             with open(session_config_path, 'r') as f:
                 session_config = json.load(f)
         
+        # Parametri di allineamento clock tra sensori
+        alignment = None
+        alignment_path = os.path.join(session_dir, ALIGNMENT_INFO_FILENAME)
+        if os.path.exists(alignment_path):
+            with open(alignment_path, 'r') as f:
+                alignment = json.load(f)
+        
+        # Feature precalcolate (nessuna rilettura dei campioni)
+        feature_table = FeatureTable.load(session_dir)
+        
+        # Stima e picco di memoria dell'analisi (within_headroom False: margine superato)
+        memory_plan = load_memory_plan(session_dir)
+        
         # Conta CSV generati (sensori decodificati)
-        csv_files = [f for f in files if f.endswith('.csv')]
-        bin_files = [f for f in files if f.endswith('.bin')]
+        csv_files = [f for f in files if f.endswith(('.csv', '.csv.gz'))]
+        bin_files = [f for f in files if f.endswith(('.bin', '.bin.gz'))]
         
         response = {
             'session_id': safe_session_id,
@@ -720,7 +1933,11 @@ def get_analysis(session_id: str):
                 'session_config_present': session_config is not None,
                 'bike_config': bike_config,
                 'session_config': session_config
-            }
+            },
+            'alignment': alignment,
+            'features': feature_table.to_records() if feature_table is not None else None,
+            'memory': memory_plan,
+            'calibration_stale': calibration_is_stale
         }
         
         return jsonify(response), 200
@@ -730,6 +1947,350 @@ def get_analysis(session_id: str):
         return jsonify({'error': 'Internal server error', 'detail': str(e)}), 500
 
 
+@api.route('/events/<session_id>', methods=['GET'])
+def get_events(session_id: str):
+    """
+    Interroga l'indice impatti/atterraggi di una sessione.
+    
+    Query params:
+        - min_g: Ampiezza minima del picco [g] (optional)
+        - t0, t1: Intervallo temporale [ms] (optional)
+        - sensor: conn_handle del sensore (optional)
+    
+    Returns:
+        JSON con lista eventi ordinata per tempo
+    """
+    try:
+        session_dir = get_session_dir(session_id)
+        if session_dir is None:
+            return jsonify({'error': 'Session not found', 'session_id': session_id}), 404
+        
+        min_g = request.args.get('min_g', type=float)
+        t0 = request.args.get('t0', type=float)
+        t1 = request.args.get('t1', type=float)
+        sensor = request.args.get('sensor', type=int)
+        
+        calibration_is_stale = check_calibration(session_dir)
+        index = EventIndex.load(session_dir)
+        if index is None:
+            # Sessione decodificata prima dell'indicizzazione: costruisci ora
+            csv_paths = find_session_csvs(session_dir)
+            if not csv_paths:
+                return jsonify({'error': 'Session not decoded yet', 'session_id': session_id}), 409
+            bike_config = load_session_bike_config(session_dir)
+            session = load_session_data(csv_paths, extract_device_id(bike_config))
+            index = build_event_index(session_dir, session, bike_config)
+        
+        events = index.query(min_g=min_g, t0=t0, t1=t1, sensor=sensor)
+        
+        return jsonify({
+            'session_id': os.path.basename(session_dir),
+            'total_events': len(index),
+            'count': len(events),
+            'events': events_to_json(events),
+            'calibration_stale': calibration_is_stale
+        }), 200
+
+    except Exception as e:
+        logging.error(f"❌ Get events error: {e}", exc_info=True)
+        return jsonify({'error': 'Internal server error', 'detail': str(e)}), 500
+
+
+@api.route('/windows/<session_id>', methods=['GET'])
+def get_windows(session_id: str):
+    """
+    Statistiche a finestra mobile di una sessione.
+    
+    Query params:
+        - window: Durata finestra [s] (default 1)
+        - hop: Passo tra finestre [s] (default metà finestra)
+        - sensor, group (acc|gyro), axis (x|y|z): filtri (optional)
+    
+    Le configurazioni non calcolate all'ingest vengono calcolate alla prima
+    richiesta e salvate nella sessione.
+    
+    Returns:
+        JSON con una serie per sensore/gruppo/asse
+    """
+    try:
+        session_dir = get_session_dir(session_id)
+        if session_dir is None:
+            return jsonify({'error': 'Session not found', 'session_id': session_id}), 404
+        
+        window_s = request.args.get('window', default=1.0, type=float)
+        hop_s = request.args.get('hop', default=window_s / 2.0, type=float)
+        if not (0 < window_s <= MAX_WINDOW_SEC) or not (0 < hop_s <= window_s):
+            return jsonify({'error': f'Invalid window/hop (0 < hop <= window <= {MAX_WINDOW_SEC})'}), 400
+        
+        calibration_is_stale = check_calibration(session_dir)
+        arrays = load_session_windows(session_dir, window_s, hop_s)
+        if arrays is None:
+            csv_paths = find_session_csvs(session_dir)
+            if not csv_paths:
+                return jsonify({'error': 'Session not decoded yet', 'session_id': session_id}), 409
+            bike_config = load_session_bike_config(session_dir)
+            session = load_session_data(csv_paths, extract_device_id(bike_config))
+            arrays = build_session_windows(session_dir, session, bike_config, [(window_s, hop_s)])[(window_s, hop_s)]
+        
+        series = select_windows(
+            arrays,
+            sensor=request.args.get('sensor', type=int),
+            group=request.args.get('group'),
+            axis=request.args.get('axis')
+        )
+        
+        return jsonify({
+            'session_id': os.path.basename(session_dir),
+            'window_s': window_s,
+            'hop_s': hop_s,
+            'series': series,
+            'calibration_stale': calibration_is_stale
+        }), 200
+
+    except Exception as e:
+        logging.error(f"❌ Get windows error: {e}", exc_info=True)
+        return jsonify({'error': 'Internal server error', 'detail': str(e)}), 500
+
+
+@api.route('/export/<session_id>', methods=['GET'])
+def export_columns(session_id: str):
+    """
+    Esporta i campioni decodificati e calibrati come archivio .npz
+    (np.load), una colonna per array: s<sensore>_<gruppo>_time_ms e
+    s<sensore>_<gruppo>_<asse>.
+    
+    Query params:
+        - sensors: Lista di conn_handle, es. 0,2 (default tutti)
+        - channels: Lista di canali, es. acc_z,gyro (default tutti)
+        - t0, t1: Finestra temporale [ms sul clock del sensore, come le colonne time_ms] (optional)
+    
+    Le colonne sono lette dalle mappe dei file e inviate a blocchi: la
+    risposta non viene mai materializzata in memoria.
+    """
+    try:
+        session_dir = get_session_dir(session_id)
+        if session_dir is None:
+            return jsonify({'error': 'Session not found', 'session_id': session_id}), 404
+        
+        # Colonne calibrate con profili ormai cambiati: servite (segnalate)
+        # mentre la sessione viene rianalizzata in background
+        bike_config = load_session_bike_config(session_dir)
+        calibration = session_calibration_fingerprint(bike_config)
+        store = ColumnStore.open(session_dir)
+        calibration_is_stale = store is not None and store.manifest.get('calibration') != calibration
+        if calibration_is_stale:
+            schedule_calibration_rebuild(session_dir)
+        if store is None:
+            csv_paths = find_session_csvs(session_dir)
+            if not csv_paths:
+                return jsonify({'error': 'Session not decoded yet', 'session_id': session_id}), 409
+            session = load_session_data(csv_paths, extract_device_id(bike_config))
+            save_session_columns(session_dir, session, calibration)
+            del session
+            store = ColumnStore.open(session_dir)
+        
+        sensors = request.args.get('sensors')
+        try:
+            sensor_list = [int(s) for s in sensors.split(',') if s.strip()] if sensors else None
+        except ValueError:
+            return jsonify({'error': 'Invalid sensors (comma-separated conn_handle list)'}), 400
+        try:
+            members = store.select(sensor_list, request.args.get('channels'),
+                                   request.args.get('t0', type=float), request.args.get('t1', type=float))
+        except KeyError as e:
+            return jsonify({'error': e.args[0]}), 400
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        session_name = os.path.basename(session_dir)
+        response = Response(stream_npz(members), mimetype='application/octet-stream')
+        response.headers['Content-Disposition'] = f'attachment; filename="{session_name}.npz"'
+        response.headers['X-Export-Columns'] = str(len(members))
+        response.headers['X-Export-Bytes'] = str(sum(array.nbytes for _, array in members))
+        if calibration_is_stale:
+            response.headers['X-Calibration-Stale'] = 'true'
+        return response
+
+    except Exception as e:
+        logging.error(f"❌ Export error: {e}", exc_info=True)
+        return jsonify({'error': 'Internal server error', 'detail': str(e)}), 500
+
+
+@api.route('/compare', methods=['GET'])
+def compare_sessions():
+    """
+    Confronta più sessioni a partire dai riassunti salvati in analisi.
+    
+    Query params:
+        - ids: Lista session_id separati da virgola (required)
+    
+    Returns:
+        JSON con metriche affiancate (RMS, energie per banda, frequenza
+        dominante, conteggio eventi) e curve PSD decimate
+    """
+    try:
+        ids = [i.strip() for i in request.args.get('ids', '').split(',') if i.strip()]
+        if not ids:
+            return jsonify({'error': 'Missing ids query parameter'}), 400
+        if len(ids) > MAX_COMPARE_SESSIONS:
+            return jsonify({'error': f'Too many sessions (max {MAX_COMPARE_SESSIONS})'}), 400
+        
+        summaries = []
+        missing = []
+        stale = []
+        
+        for session_id in ids:
+            session_dir = get_session_dir(session_id)
+            if session_dir and check_calibration(session_dir):
+                stale.append(session_id)
+            summary = load_summary(session_dir) if session_dir else None
+            if summary is None:
+                missing.append(session_id)
+            else:
+                summaries.append(summary)
+        
+        if not summaries:
+            return jsonify({'error': 'No analyzed sessions found', 'missing': missing}), 404
+        
+        response = compare_summaries(summaries)
+        response['missing'] = missing
+        response['calibration_stale'] = stale
+        return jsonify(response), 200
+
+    except Exception as e:
+        logging.error(f"❌ Compare error: {e}", exc_info=True)
+        return jsonify({'error': 'Internal server error', 'detail': str(e)}), 500
+
+
+@api.route('/profiles/<session_id>', methods=['GET'])
+def list_session_profiles(session_id: str):
+    """Profili catturati per una sessione (.pstats e .collapsed)."""
+    session_dir = get_session_dir(session_id)
+    if session_dir is None:
+        return jsonify({'error': 'Session not found', 'session_id': session_id}), 404
+    return jsonify({'session_id': os.path.basename(session_dir), 'profiles': list_profiles(session_dir)}), 200
+
+
+@api.route('/profiles/<session_id>/<name>', methods=['GET'])
+def download_profile(session_id: str, name: str):
+    """Scarica un profilo catturato."""
+    session_dir = get_session_dir(session_id)
+    path = profile_path(session_dir, name) if session_dir else None
+    if path is None:
+        return jsonify({'error': 'Profile not found', 'session_id': session_id, 'name': name}), 404
+    return send_file(os.path.abspath(path), mimetype='application/octet-stream', as_attachment=True, download_name=name)
+
+
+@api.route('/bundle/<session_id>', methods=['GET'])
+def export_bundle(session_id: str):
+    """Scarica la sessione come bundle in un singolo file (.bcpb)."""
+    session_dir = get_session_dir(session_id)
+    if session_dir is None:
+        return jsonify({'error': 'Session not found', 'session_id': session_id}), 404
+
+    fd, bundle_path = tempfile.mkstemp(prefix='.export_', suffix=BUNDLE_EXTENSION, dir=UPLOAD_FOLDER)
+    os.close(fd)
+    try:
+        export_session_bundle(session_dir, bundle_path)
+        # Il file resta leggibile dal descrittore aperto fino alla fine della risposta
+        bundle_file = open(bundle_path, 'rb')
+    except Exception as e:
+        logging.error(f"❌ Bundle export error: {e}", exc_info=True)
+        return jsonify({'error': 'Internal server error', 'detail': str(e)}), 500
+    finally:
+        os.remove(bundle_path)
+    return send_file(bundle_file, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f"{os.path.basename(session_dir)}{BUNDLE_EXTENSION}")
+
+
+@api.route('/bundle', methods=['POST'])
+def import_bundle():
+    """
+    Importa un bundle come nuova sessione.
+
+    Expected form-data:
+        - file: Bundle .bcpb (required)
+        - session_name: Nome sessione (optional, default quello del bundle)
+    """
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+
+    fd, bundle_path = tempfile.mkstemp(prefix='.import_', suffix=BUNDLE_EXTENSION, dir=UPLOAD_FOLDER)
+    os.close(fd)
+    try:
+        request.files['file'].save(bundle_path)
+        session_dir = import_session_bundle(bundle_path, request.form.get('session_name'))
+        with SessionBundle(bundle_path) as bundle:
+            sections = bundle.names()
+        return jsonify({
+            'session_id': os.path.basename(session_dir),
+            'sensor_count': len(find_session_csvs(session_dir)),
+            'sections': sections
+        }), 201
+    except FileExistsError as e:
+        return jsonify({'error': str(e)}), 409
+    except BundleError as e:
+        return jsonify({'error': 'Invalid bundle', 'detail': str(e)}), 400
+    except Exception as e:
+        logging.error(f"❌ Bundle import error: {e}", exc_info=True)
+        return jsonify({'error': 'Internal server error', 'detail': str(e)}), 500
+    finally:
+        os.remove(bundle_path)
+
+
+@api.route('/calibration', methods=['GET'])
+def list_calibrations():
+    """Elenca i dispositivi con un profilo di calibrazione."""
+    return jsonify({'devices': calibration_store.list_devices()}), 200
+
+
+@api.route('/calibration/<device_id>', methods=['GET'])
+def get_calibration(device_id: str):
+    """Restituisce il profilo di calibrazione di un dispositivo."""
+    profile = calibration_store.get(secure_filename(device_id))
+    if profile is None:
+        return jsonify({'error': 'Calibration profile not found', 'device_id': device_id}), 404
+    return jsonify(profile), 200
+
+
+@api.route('/calibration/<device_id>', methods=['PUT', 'POST'])
+def put_calibration(device_id: str):
+    """
+    Carica (o sostituisce) il profilo di calibrazione di un dispositivo.
+    
+    Expected JSON body:
+        {"sensors": {"<conn_handle>": {
+            "acc":  {"offset": [3], "scale": [3], "rotation": [[3x3]] | "axes": ["x", "y", "z"]},
+            "gyro": {...}}}}
+    
+    Offset in g (acc) e deg/s (gyro). La rotazione deve essere ortonormale
+    con determinante +1, altrimenti 400. Il profilo 'default' si applica ai
+    dispositivi senza profilo dedicato.
+    
+    Returns:
+        JSON con il profilo normalizzato salvato
+    """
+    try:
+        safe_device_id = secure_filename(device_id)
+        if not safe_device_id:
+            return jsonify({'error': 'Invalid device_id'}), 400
+        
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return jsonify({'error': 'Expected JSON object body'}), 400
+        
+        profile = calibration_store.put(safe_device_id, payload)
+        return jsonify(profile), 200
+
+    except ValueError as e:
+        logging.error(f"Validation error: {e}")
+        return jsonify({'error': str(e)}), 400
+        
+    except Exception as e:
+        logging.error(f"❌ Calibration upload error: {e}", exc_info=True)
+        return jsonify({'error': 'Internal server error', 'detail': str(e)}), 500
+
+
 # ============================================================================
 # REGISTER BLUEPRINT & RUN
 # ============================================================================
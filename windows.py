@@ -0,0 +1,263 @@
+import os
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.signal import butter
+
+from spectral import FREQUENCY_BANDS, sosfiltfilt_lean
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+WINDOWS_FILENAME_FORMAT = 'windows_{window_s:g}s_{hop_s:g}s.npz'
+
+# Configurazioni calcolate all'ingest: (finestra [s], passo [s])
+DEFAULT_WINDOW_CONFIGS = [(1.0, 0.5), (10.0, 5.0)]
+
+# Configurazioni calcolate su richiesta tenute in ogni sessione, oltre a
+# quelle dell'ingest: oltre il tetto si eliminano le meno usate (LRU sul
+# mtime, aggiornato a ogni lettura al più una volta per intervallo)
+MAX_ON_DEMAND_WINDOW_CONFIGS = 4
+WINDOWS_TOUCH_INTERVAL_SEC = 60
+
+BAND_FILTER_ORDER = 4
+AXES = ('x', 'y', 'z')
+
+
+# ============================================================================
+# ROLLING KERNELS
+# ============================================================================
+
+def window_starts(n: int, window: int, hop: int) -> np.ndarray:
+    """Indici di inizio delle finestre complete."""
+    if n < window or window < 1 or hop < 1:
+        return np.empty(0, dtype=np.int64)
+    return np.arange(0, n - window + 1, hop, dtype=np.int64)
+
+
+def rolling_mean(x: np.ndarray, window: int, starts: np.ndarray) -> np.ndarray:
+    """
+    Media mobile lungo l'asse 0 tramite somme cumulative: O(n).
+
+    Args:
+        x: Segnale (n,) oppure (n, k)
+        window: Lunghezza finestra [campioni]
+        starts: Indici di inizio finestra
+
+    Returns:
+        Array (len(starts),) oppure (len(starts), k)
+    """
+    csum = np.zeros((len(x) + 1,) + x.shape[1:], dtype=np.float64)
+    np.cumsum(x, axis=0, dtype=np.float64, out=csum[1:])
+    return (csum[starts + window] - csum[starts]) / window
+
+
+def rolling_max(x: np.ndarray, window: int, starts: np.ndarray) -> np.ndarray:
+    """
+    Massimo mobile lungo l'asse 0 (van Herk / Gil-Werman): O(n).
+
+    Il segnale è diviso in blocchi lunghi `window`; per ogni blocco si
+    calcolano massimo prefisso e suffisso con ufunc.accumulate, e il
+    massimo di una finestra è max(suffisso[i], prefisso[i + window - 1]).
+    """
+    n = len(x)
+    n_blocks = -(-n // window)
+    padded = np.full((n_blocks * window,) + x.shape[1:], -np.inf, dtype=x.dtype)
+    padded[:n] = x
+    blocks = padded.reshape((n_blocks, window) + x.shape[1:])
+
+    prefix = np.maximum.accumulate(blocks, axis=1).reshape(padded.shape)
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(padded.shape)
+
+    return np.maximum(suffix[starts], prefix[starts + window - 1])
+
+
+def band_power_signals(x: np.ndarray, fs: float) -> Dict[str, Optional[np.ndarray]]:
+    """
+    Segnali filtrati passa-banda (uno per banda di FREQUENCY_BANDS).
+
+    Bande oltre Nyquist o segnali troppo corti per il filtro restituiscono None.
+    I segnali filtrati mantengono il dtype dell'ingresso (float32).
+    """
+    nyq = fs / 2.0
+    filtered = {}
+    for name, (f_lo, f_hi) in FREQUENCY_BANDS.items():
+        if f_lo >= nyq:
+            filtered[name] = None
+            continue
+        f_hi = min(f_hi, 0.99 * nyq)
+        sos = butter(BAND_FILTER_ORDER, [f_lo, f_hi], btype='band', fs=fs, output='sos')
+        try:
+            filtered[name] = sosfiltfilt_lean(sos, x)
+        except ValueError:
+            # Segnale più corto del padding del filtro
+            filtered[name] = None
+    return filtered
+
+
+def window_stats(t: np.ndarray, x: np.ndarray, fs: float, window_s: float, hop_s: float) -> Dict[str, np.ndarray]:
+    """
+    Statistiche a finestra mobile di un canale o blocco di canali.
+
+    RMS (media rimossa per finestra) e energia per banda (potenza media del
+    segnale filtrato, equivalente per Parseval all'integrale della PSD nella
+    banda) derivano da somme cumulative; il picco-picco da max/min mobili.
+
+    Args:
+        t: Timestamp dei campioni
+        x: Segnale (n,) oppure (n, k)
+        fs: Frequenza di campionamento [Hz]
+        window_s: Durata finestra [s]
+        hop_s: Passo tra finestre [s]
+
+    Returns:
+        Dict con time_ms (centro finestra), rms, p2p, energy_<banda>
+    """
+    window = max(int(round(window_s * fs)), 1)
+    hop = max(int(round(hop_s * fs)), 1)
+    starts = window_starts(len(x), window, hop)
+
+    empty = np.empty((0,) + x.shape[1:], dtype=np.float32)
+    if len(starts) == 0:
+        stats = {'time_ms': np.empty(0, dtype=t.dtype), 'rms': empty, 'p2p': empty}
+        stats.update({f'energy_{band}': empty for band in FREQUENCY_BANDS})
+        return stats
+
+    mean = rolling_mean(x, window, starts)
+    # I quadrati restano float32: le somme cumulative sono comunque in float64
+    mean_sq = rolling_mean(np.square(x), window, starts)
+    p2p = rolling_max(x, window, starts) + rolling_max(-x, window, starts)
+
+    stats = {
+        'time_ms': t[starts + window // 2],
+        'rms': np.sqrt(np.maximum(mean_sq - mean ** 2, 0.0)).astype(np.float32),
+        'p2p': p2p.astype(np.float32),
+    }
+
+    for band, filtered in band_power_signals(x, fs).items():
+        if filtered is None:
+            stats[f'energy_{band}'] = np.full((len(starts),) + x.shape[1:], np.nan, dtype=np.float32)
+        else:
+            stats[f'energy_{band}'] = rolling_mean(np.square(filtered), window, starts).astype(np.float32)
+
+    return stats
+
+
+# ============================================================================
+# PERSISTENCE
+# ============================================================================
+
+def windows_filename(window_s: float, hop_s: float) -> str:
+    return WINDOWS_FILENAME_FORMAT.format(window_s=window_s, hop_s=hop_s)
+
+
+def compute_session_windows(
+    streams: Dict[int, Dict[str, Tuple[np.ndarray, np.ndarray]]],
+    fs: float,
+    window_s: float,
+    hop_s: float
+) -> Dict[str, np.ndarray]:
+    """
+    Statistiche a finestra per tutti i sensori e gruppi.
+
+    Args:
+        streams: conn_handle -> {gruppo -> (timestamp, valori (n, 3))}
+
+    Returns:
+        Dict piatto 's<sensor>_<gruppo>_<stat>' -> array (n_windows[, 3])
+    """
+    arrays = {}
+    for sensor, groups in streams.items():
+        for group, (t, values) in groups.items():
+            for stat, array in window_stats(t, values, fs, window_s, hop_s).items():
+                arrays[f"s{sensor}_{group}_{stat}"] = array
+    return arrays
+
+
+def save_session_windows(session_dir: str, arrays: Dict[str, np.ndarray], window_s: float, hop_s: float) -> str:
+    path = os.path.join(session_dir, windows_filename(window_s, hop_s))
+    np.savez(path, **arrays)
+    logging.info(f"  🪟 Window stats saved: {window_s:g}s / {hop_s:g}s -> {path}")
+    prune_session_windows(session_dir)
+    return path
+
+
+def load_session_windows(session_dir: str, window_s: float, hop_s: float) -> Optional[Dict[str, np.ndarray]]:
+    path = os.path.join(session_dir, windows_filename(window_s, hop_s))
+    try:
+        with np.load(path) as npz:
+            arrays = {name: npz[name] for name in npz.files}
+    except FileNotFoundError:
+        return None
+    if time.time() - os.path.getmtime(path) >= WINDOWS_TOUCH_INTERVAL_SEC:
+        os.utime(path)
+    return arrays
+
+
+def prune_session_windows(session_dir: str, max_configs: int = MAX_ON_DEMAND_WINDOW_CONFIGS) -> List[str]:
+    """
+    Elimina le configurazioni su richiesta meno usate oltre `max_configs`
+    (quelle dell'ingest restano sempre).
+
+    Returns:
+        Nomi dei file eliminati
+    """
+    defaults = {windows_filename(window_s, hop_s) for window_s, hop_s in DEFAULT_WINDOW_CONFIGS}
+    on_demand = []
+    for entry in os.scandir(session_dir):
+        if entry.name.startswith('windows_') and entry.name.endswith('.npz') and entry.name not in defaults:
+            try:
+                on_demand.append((entry.stat().st_mtime, entry.name))
+            except FileNotFoundError:
+                pass
+    removed = []
+    for _, name in sorted(on_demand, reverse=True)[max_configs:]:
+        try:
+            os.remove(os.path.join(session_dir, name))
+            removed.append(name)
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def select_windows(
+    arrays: Dict[str, np.ndarray],
+    sensor: Optional[int] = None,
+    group: Optional[str] = None,
+    axis: Optional[str] = None
+) -> List[Dict]:
+    """
+    Estrae le serie richieste in forma serializzabile.
+
+    Returns:
+        Lista di dict {sensor, group, axis, time_ms, rms, p2p, energy_<banda>}
+    """
+    series = []
+    bases = sorted(name[:-len('_time_ms')] for name in arrays if name.endswith('_time_ms'))
+    stat_names = ['rms', 'p2p'] + [f'energy_{band}' for band in FREQUENCY_BANDS]
+
+    for base in bases:
+        key_sensor, key_group = base[1:].split('_', 1)
+        if sensor is not None and int(key_sensor) != sensor:
+            continue
+        if group is not None and key_group != group:
+            continue
+        for axis_idx, axis_name in enumerate(AXES):
+            if axis is not None and axis_name != axis:
+                continue
+            entry = {
+                'sensor': int(key_sensor),
+                'group': key_group,
+                'axis': axis_name,
+                'time_ms': arrays[f"{base}_time_ms"].tolist()
+            }
+            for stat in stat_names:
+                values = arrays[f"{base}_{stat}"][:, axis_idx]
+                entry[stat] = [None if np.isnan(v) else float(f"{v:.4e}") for v in values]
+            series.append(entry)
+
+    return series